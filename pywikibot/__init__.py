@@ -35,6 +35,14 @@ from pywikibot.logging import (
     critical, debug, error, exception, log, output, stdout, warning
 )
 
+from pywikibot.tools import LazyModuleWrapper as _LazyModuleWrapper
+
+# The wrapper replaces this module before the other modules are imported, so
+# that they can use the attributes which are only imported on first use. The
+# modules which need the network or many other modules are imported lazily
+# to speed up the start of scripts.
+wrapper = _LazyModuleWrapper(__name__)
+
 from pywikibot import config2 as config
 
 from pywikibot.bot import (
@@ -46,8 +54,6 @@ from pywikibot.bot import (
 from pywikibot.bot_choice import (
     QuitKeyboardInterrupt as _QuitKeyboardInterrupt,
 )
-from pywikibot.data.api import UploadWarning as _UploadWarning
-from pywikibot.diff import PatchManager
 from pywikibot.exceptions import (
     Error, InvalidTitle, BadTitle, NoPage, NoMoveTarget, SectionError,
     SiteDefinitionError, NoSuchSite, UnknownSite, UnknownFamily,
@@ -63,9 +69,8 @@ from pywikibot.exceptions import (
     DeprecatedPageNotFoundError as _DeprecatedPageNotFoundError,
     _EmailUserError,
 )
-from pywikibot.family import Family
+from pywikibot.family import Family, get_family_registry as _family_registry
 from pywikibot.i18n import translate
-from pywikibot.site import BaseSite
 from pywikibot.tools import (
     # __ to avoid conflict with ModuleDeprecationWrapper._deprecated
     deprecated as __deprecated,
@@ -73,14 +78,11 @@ from pywikibot.tools import (
     normalize_username,
     MediaWikiVersion,
     redirect_func,
-    ModuleDeprecationWrapper as _ModuleDeprecationWrapper,
     PY2,
     UnicodeMixin,
 )
 from pywikibot.tools.formatter import color_format
 
-import pywikibot.textlib as textlib
-
 textlib_methods = (
     'unescape', 'replaceExcept', 'removeDisabledParts', 'removeHTMLParts',
     'isDisabled', 'interwikiFormat', 'interwikiSort',
@@ -123,11 +125,6 @@ if PY2:
     # T111615: Python 2 requires __all__ is bytes
     globals()['__all__'] = tuple(bytes(item) for item in __all__)
 
-for _name in textlib_methods:
-    target = getattr(textlib, _name)
-    wrapped_func = redirect_func(target)
-    globals()[_name] = wrapped_func
-
 
 deprecated = redirect_func(__deprecated)
 deprecate_arg = redirect_func(__deprecate_arg)
@@ -235,6 +232,9 @@ class Coordinate(_WbRepresentation):
 
     _items = ('lat', 'lon', 'globe')
 
+    __slots__ = ('lat', 'lon', 'alt', '_precision', 'globe', '_entity',
+                 'type', 'name', '_dim', 'site')
+
     def __init__(self, lat, lon, alt=None, precision=None, globe='earth',
                  typ="", name="", dim=None, site=None, entity=''):
         """
@@ -423,6 +423,8 @@ class WbTime(_WbRepresentation):
     _items = ('year', 'month', 'day', 'hour', 'minute', 'second',
               'precision', 'before', 'after', 'timezone', 'calendarmodel')
 
+    __slots__ = _items
+
     def __init__(self, year=None, month=None, day=None,
                  hour=None, minute=None, second=None,
                  precision=None, before=0, after=0,
@@ -597,6 +599,8 @@ class WbQuantity(_WbRepresentation):
 
     _items = ('amount', 'upperBound', 'lowerBound', 'unit')
 
+    __slots__ = ('amount', 'upperBound', 'lowerBound', '_unit', 'site')
+
     @staticmethod
     def _require_errors(site):
         """
@@ -650,8 +654,8 @@ class WbQuantity(_WbRepresentation):
     def __eq__(self, other):
         """Override equality to handle different unit representations."""
         if isinstance(other, self.__class__):
-            self_dict = self.__dict__.copy()
-            other_dict = other.__dict__.copy()
+            self_dict = self._values()
+            other_dict = other._values()
             self_dict['_unit'] = self.unit
             other_dict['_unit'] = other.unit
             return self_dict == other_dict
@@ -702,6 +706,7 @@ class WbQuantity(_WbRepresentation):
     @property
     def unit(self):
         """Return _unit's entity uri or '1' if _unit is None."""
+        from pywikibot.page import ItemPage
         if isinstance(self._unit, ItemPage):
             return self._unit.concept_uri()
         return self._unit or '1'
@@ -726,6 +731,7 @@ class WbQuantity(_WbRepresentation):
         if not isinstance(self._unit, basestring):
             return self._unit
 
+        from pywikibot.page import ItemPage
         repo = repo or self.site
         self._unit = ItemPage.from_entity_uri(repo, self._unit, lazy_load)
         return self._unit
@@ -772,6 +778,8 @@ class WbQuantity(_WbRepresentation):
 class WbMonolingualText(_WbRepresentation):
     """A Wikibase monolingual text representation."""
 
+    __slots__ = ('text', 'language')
+
     def __init__(self, text, language):
         """
         Create a new WbMonolingualText object.
@@ -847,9 +855,9 @@ def Site(code=None, fam=None, user=None, sysop=None, interface=None, url=None):
     if url:
         if url not in _url_cache:
             matched_sites = []
-            # Iterate through all families and look, which does apply to
-            # the given URL
-            for fam in config.family_files:
+            # Iterate through the families which have a code on the host of
+            # the URL and look, which does apply to the given URL
+            for fam in _family_registry().families(url):
                 family = Family.load(fam)
                 code = family.from_url(url)
                 if code is not None:
@@ -901,6 +909,7 @@ def Site(code=None, fam=None, user=None, sysop=None, interface=None, url=None):
         except ImportError:
             raise ValueError('Invalid interface name: {0}'.format(interface))
 
+    from pywikibot.site import BaseSite
     if not issubclass(interface, BaseSite):
         warning('Site called with interface=%s' % interface.__name__)
 
@@ -922,19 +931,6 @@ def Site(code=None, fam=None, user=None, sysop=None, interface=None, url=None):
 getSite = redirect_func(Site, old_name='getSite')
 
 
-# These imports depend on Wb* classes above.
-from pywikibot.page import (
-    Page,
-    FilePage,
-    Category,
-    Link,
-    User,
-    ItemPage,
-    PropertyPage,
-    Claim,
-)
-from pywikibot.page import html2unicode, url2unicode, unicode2html
-
 
 link_regex = re.compile(r'\[\[(?P<title>[^\]|[<>{}]*)(\|.*?)?\]\]')
 
@@ -952,6 +948,7 @@ def showDiff(oldtext, newtext, context=0):
     The differences are highlighted (only on compatible systems) to show which
     changes were made.
     """
+    from pywikibot.diff import PatchManager
     PatchManager(oldtext, newtext, context=context).print_hunks()
 
 
@@ -1053,8 +1050,22 @@ _putthread = threading.Thread(target=async_manager)
 _putthread.setName('Put-Thread')
 _putthread.setDaemon(True)
 
-wrapper = _ModuleDeprecationWrapper(__name__)
-wrapper._add_deprecated_attr('ImagePage', FilePage)
+for _name in ('Page', 'FilePage', 'Category', 'Link', 'User', 'ItemPage',
+              'PropertyPage', 'Claim', 'html2unicode', 'url2unicode',
+              'unicode2html'):
+    wrapper._add_lazy_attr(_name, 'pywikibot.page', _name)
+wrapper._add_lazy_attr('BaseSite', 'pywikibot.site', 'BaseSite')
+wrapper._add_lazy_attr('PatchManager', 'pywikibot.diff', 'PatchManager')
+for _name in ('page', 'site', 'diff', 'textlib'):
+    wrapper._add_lazy_attr(_name, 'pywikibot.' + _name)
+wrapper._add_lazy_attr('data', 'pywikibot.data.api')
+wrapper._add_lazy_attr('comms', 'pywikibot.comms.http')
+
+for _name in textlib_methods:
+    wrapper._add_deprecated_attr(
+        _name, replacement_name='pywikibot.textlib.' + _name)
+wrapper._add_deprecated_attr('ImagePage',
+                             replacement_name='pywikibot.page.FilePage')
 wrapper._add_deprecated_attr(
     'cookie_jar', replacement_name='pywikibot.comms.http.cookie_jar')
 wrapper._add_deprecated_attr(
@@ -1070,6 +1081,8 @@ wrapper._add_deprecated_attr(
     warning_message='pywikibot.QuitKeyboardInterrupt is deprecated; '
                     'use pywikibot.bot.QuitKeyboardInterrupt instead.')
 wrapper._add_deprecated_attr(
-    'UploadWarning', _UploadWarning,
+    'UploadWarning', replacement_name='pywikibot.data.api.UploadWarning',
     warning_message='pywikibot.UploadWarning is deprecated; '
                     'use APISite.upload with a warning handler instead.')
+
+wrapper._update()
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 """Wikibase data type classes."""
 #
-# (C) Pywikibot team, 2013-2015
+# (C) Pywikibot team, 2013-2017
 #
 # Distributed under the terms of the MIT license.
 #
@@ -17,7 +17,15 @@ from pywikibot.tools import StringTypes
 
 class WbRepresentation(object):
 
-    """Abstract class for Wikibase representations."""
+    """
+    Abstract class for Wikibase representations.
+
+    Subclasses declare their attributes in __slots__, so that their
+    instances don't need a __dict__. The values of claims of many items can
+    then be kept in memory at the same time.
+    """
+
+    __slots__ = ()
 
     def __init__(self):
         """Constructor."""
@@ -45,8 +53,35 @@ class WbRepresentation(object):
                           for attr, value in values)
         return '{0}({1})'.format(self.__class__.__name__, attrs)
 
+    def _values(self):
+        """
+        Return the attributes which are set.
+
+        @rtype: dict
+        """
+        values = dict(getattr(self, '__dict__', {}))
+        for cls in type(self).__mro__:
+            for attr in cls.__dict__.get('__slots__', ()):
+                if hasattr(self, attr):
+                    values[attr] = getattr(self, attr)
+        return values
+
+    def __getstate__(self):
+        """Return the attributes for pickling."""
+        return self._values()
+
+    def __setstate__(self, state):
+        """Restore the attributes after unpickling."""
+        for attr, value in state.items():
+            setattr(self, attr, value)
+
     def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+        if not isinstance(other, WbRepresentation):
+            return NotImplemented
+        return self._values() == other._values()
 
     def __ne__(self, other):
-        return not self.__eq__(other)
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
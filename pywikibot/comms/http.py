@@ -6,6 +6,7 @@ This module handles communication between the bot and the HTTP threads.
 
 This module is responsible for
     - Setting up a connection pool
+    - Running the HTTP threads which execute the requests per host
     - Providing a (blocking) interface for HTTP requests
     - Translate site objects with query strings into URLs
     - URL-encoding all data
@@ -24,6 +25,7 @@ __docformat__ = 'epytext'
 
 import atexit
 import sys
+import threading
 
 from distutils.version import StrictVersion
 from string import Formatter
@@ -38,9 +40,11 @@ except ImportError as e:
 
 if sys.version_info[0] > 2:
     from http import cookiejar as cookielib
+    from queue import Full, Queue
     from urllib.parse import quote, urlparse
 else:
     import cookielib
+    from Queue import Full, Queue
     from urllib2 import quote
     from urlparse import urlparse
 
@@ -118,9 +122,28 @@ else:
 session = requests.Session()
 session.cookies = cookie_jar
 
+# The request queues per scheme and host, each one is processed by
+# config.http_threads_per_host HTTP threads.
+_host_queues = {}
+_host_queues_lock = threading.Lock()
+
+
+def _stop_http_threads():
+    """Tell all HTTP threads to stop after their queued requests."""
+    with _host_queues_lock:
+        for queue, threads in _host_queues.values():
+            for _ in threads:
+                try:
+                    queue.put(None, block=False)
+                except Full:
+                    # Threads are daemonic and won't block the exit
+                    break
+        _host_queues.clear()
+
 
 # Prepare flush on quit
 def _flush():
+    _stop_http_threads()
     session.close()
     message = 'Closing network session.'
     if hasattr(sys, 'last_type'):
@@ -312,6 +335,68 @@ def request(site=None, uri=None, method='GET', params=None, body=None,
         r = fetch(uri, method, params, body, headers, **kwargs)
         return r.content
 
+    baseuri, headers = _prepare_site_request(site, uri, headers, kwargs)
+    r = fetch(baseuri, method, params, body, headers, **kwargs)
+    return r.content
+
+
+def request_stream(site, uri, method='GET', params=None, body=None,
+                   headers=None, **kwargs):
+    """
+    Request to Site without receiving the response body in advance.
+
+    It accepts the same parameters as L{request}. The body is received while
+    it is read from the response, e.g. by C{response.data.iter_content()}.
+    The response must be read completely or closed.
+
+    @param site: The Site to connect to
+    @type site: L{pywikibot.site.BaseSite}
+    @param uri: the URI relative to the document root '/'
+    @type uri: str
+    @return: the response
+    @rtype: L{threadedhttp.HttpRequest}
+    """
+    baseuri, headers = _prepare_site_request(site, uri, headers, kwargs)
+    return fetch(baseuri, method, params, body, headers, stream=True,
+                 **kwargs)
+
+
+def enqueue_request(site, uri, method='GET', params=None, body=None,
+                    headers=None, **kwargs):
+    """
+    Enqueue a request to a site without waiting for it.
+
+    It accepts the same parameters as L{request} and the callbacks of
+    L{_enqueue}. Callbacks are invoked in the HTTP thread, so they should
+    call L{error_handling_callback} themselves or hand the request over to
+    the thread which does.
+
+    @param site: The Site to connect to
+    @type site: L{pywikibot.site.BaseSite}
+    @param uri: the URI relative to the document root '/'
+    @type uri: str
+    @rtype: L{threadedhttp.HttpRequest}
+    """
+    baseuri, headers = _prepare_site_request(site, uri, headers, kwargs)
+    return _enqueue(baseuri, method, params, body, headers, **kwargs)
+
+
+def _prepare_site_request(site, uri, headers, kwargs):
+    """
+    Return the absolute URI and the headers for a request to a site.
+
+    The keyword arguments are updated with the site specific defaults.
+
+    @param site: The Site to connect to
+    @type site: L{pywikibot.site.BaseSite}
+    @param uri: the URI relative to the document root '/'
+    @type uri: str
+    @param headers: the headers of the request, may be None
+    @type headers: dict or None
+    @param kwargs: the keyword arguments of the request
+    @type kwargs: dict
+    @rtype: tuple of str and dict
+    """
     baseuri = site.base_url(uri)
 
     kwargs.setdefault("disable_ssl_certificate_validation",
@@ -325,8 +410,21 @@ def request(site=None, uri=None, method='GET', params=None, body=None,
 
     headers['user-agent'] = user_agent(site, format_string)
 
-    r = fetch(baseuri, method, params, body, headers, **kwargs)
-    return r.content
+    kwargs['callbacks'] = (list(kwargs.get('callbacks', [])) +
+                           [_site_response_callback(site)])
+    return baseuri, headers
+
+
+def _site_response_callback(site):
+    """Return a callback which records the response in the site throttle."""
+    def record_response(request):
+        """Record the latency and the status of the response."""
+        if request.exception:
+            site.throttle.record_response(None)
+        else:
+            site.throttle.record_response(
+                request.data.elapsed.total_seconds(), request.status)
+    return record_response
 
 
 def get_authentication(uri):
@@ -373,18 +471,51 @@ def _http_process(session, http_request):
     try:
         ignore_validation = http_request.kwargs.pop(
             'disable_ssl_certificate_validation', False)
+        stream = http_request.kwargs.pop('stream', False)
         # Note that the connections are pooled which mean that a future
         # HTTPS request can succeed even if the certificate is invalid and
         # verify=True, when a request with verify=False happened before
         response = session.request(method, uri, params=params, data=body,
                                    headers=headers, auth=auth, timeout=timeout,
-                                   verify=not ignore_validation)
+                                   verify=not ignore_validation, stream=stream)
     except Exception as e:
         http_request.data = e
     else:
         http_request.data = response
 
 
+def _get_host_queue(uri):
+    """
+    Return the request queue for the host of the uri.
+
+    The HTTP threads for the host are started on first use and a connection
+    pool with one connection per thread is mounted into the session.
+
+    @param uri: the URI to access
+    @type uri: str
+    @rtype: Queue.Queue
+    """
+    parsed_uri = urlparse(uri)
+    prefix = '{0}://{1}/'.format(parsed_uri.scheme, parsed_uri.netloc)
+    with _host_queues_lock:
+        if prefix not in _host_queues:
+            numthreads = config.http_threads_per_host
+            if parsed_uri.scheme in ('http', 'https'):
+                session.mount(prefix, requests.adapters.HTTPAdapter(
+                    pool_connections=1, pool_maxsize=numthreads))
+            queue = Queue(max(config.http_queue_size, 0))
+            threads = [threadedhttp.HttpProcessor(
+                queue, session, _http_process,
+                name='HttpProcessor-{0}-{1}'.format(parsed_uri.netloc, i))
+                for i in range(numthreads)]
+            for thread in threads:
+                thread.start()
+            debug('Started %d HTTP threads for %s', _logger, numthreads,
+                  prefix)
+            _host_queues[prefix] = (queue, threads)
+        return _host_queues[prefix][0]
+
+
 def error_handling_callback(request):
     """
     Raise exceptions and log alerts.
@@ -425,9 +556,12 @@ def _enqueue(uri, method="GET", params=None, body=None, headers=None, data=None,
     invoked, even if the default error handler detects a problem, so they
     must check request.exception before using the response data.
 
-    Note: multiple async requests do not automatically run concurrently,
-    as they are limited by the number of http threads in L{numthreads},
-    which is set to 1 by default.
+    Note: multiple async requests to the same host run concurrently up to
+    the number of HTTP threads per host set in
+    L{config.http_threads_per_host}. When that is 0, or when called from an
+    HTTP thread (e.g. by a callback), the request is executed synchronously.
+    Enqueueing blocks while more than L{config.http_queue_size} requests are
+    waiting for the host.
 
     @see: L{requests.Session.request} for parameters.
 
@@ -464,7 +598,14 @@ def _enqueue(uri, method="GET", params=None, body=None, headers=None, data=None,
 
     request = threadedhttp.HttpRequest(
         uri, method, params, body, all_headers, callbacks, **kwargs)
-    _http_process(session, request)
+    if (config.http_threads_per_host < 1 or
+            isinstance(threading.current_thread(),
+                       threadedhttp.HttpProcessor)):
+        # Processing it in a queue could deadlock when it is enqueued by an
+        # HTTP thread which is waiting for it
+        _http_process(session, request)
+    else:
+        _get_host_queue(uri).put(request)
     return request
 
 
@@ -474,6 +615,9 @@ def fetch(uri, method="GET", params=None, body=None, headers=None,
     """
     Blocking HTTP request.
 
+    The request is executed by an HTTP thread and this function waits until
+    it and its callbacks are done.
+
     Note: The callback runs in the HTTP thread, where exceptions are logged
     but are not able to be caught.
 
@@ -508,6 +652,7 @@ def fetch(uri, method="GET", params=None, body=None, headers=None,
             headers['user-agent'] = fake_user_agent()
 
     request = _enqueue(uri, method, params, body, headers, **kwargs)
+    request.wait()
     assert(request._data is not None)  # if there's no data in the answer we're in trouble
     # Run the error handling callback in the callers thread so exceptions
     # may be caught.
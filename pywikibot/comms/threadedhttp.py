@@ -9,6 +9,7 @@ __docformat__ = 'epytext'
 # standard python libraries
 import codecs
 import sys
+import threading
 
 if sys.version_info[0] > 2:
     from urllib.parse import urlparse
@@ -59,10 +60,13 @@ class HttpRequest(UnicodeMixin):
 
         self._parsed_uri = None
         self._data = None
+        self._completed = threading.Event()
 
     @property
     def data(self):
-        """Return the requests response tuple."""
+        """Return the requests response tuple, waiting for it if needed."""
+        if self._data is None:
+            self._completed.wait()
         assert(self._data is not None)
         return self._data
 
@@ -71,9 +75,29 @@ class HttpRequest(UnicodeMixin):
         """Set the requests response and invoke each callback."""
         self._data = value
 
-        if self.callbacks:
-            for callback in self.callbacks:
-                callback(self)
+        try:
+            if self.callbacks:
+                for callback in self.callbacks:
+                    callback(self)
+        finally:
+            self._completed.set()
+
+    @property
+    def completed(self):
+        """Return whether the request and all its callbacks are done."""
+        return self._completed.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Block until the request and all its callbacks are done.
+
+        @param timeout: seconds to wait at most, None to wait forever
+        @type timeout: float or None
+        @return: whether the request is completed
+        @rtype: bool
+        """
+        self._completed.wait(timeout)
+        return self.completed
 
     @property
     def exception(self):
@@ -187,3 +211,52 @@ class HttpRequest(UnicodeMixin):
     def __bytes__(self):
         """Return the undecoded response."""
         return self.raw
+
+
+class HttpProcessor(threading.Thread):
+
+    """Thread executing the queued L{HttpRequest} objects of one host."""
+
+    def __init__(self, queue, session, process, name='HttpProcessor'):
+        """
+        Constructor.
+
+        @param queue: The queue containing the L{HttpRequest} objects. Putting
+            C{None} into it stops one thread.
+        @type queue: Queue.Queue
+        @param session: The session used to execute the requests
+        @type session: requests.Session
+        @param process: Callable executing a request with the session, and
+            setting the request data.
+        @type process: callable
+        @param name: The name of the thread
+        @type name: str
+        """
+        super(HttpProcessor, self).__init__(name=name)
+        self.daemon = True
+        self.queue = queue
+        self.session = session
+        self.process = process
+
+    def run(self):
+        """Execute requests until C{None} is read from the queue."""
+        while True:
+            request = self.queue.get()
+            try:
+                if request is None:
+                    return
+                try:
+                    self.process(self.session, request)
+                except Exception as e:
+                    # Exceptions raised by callbacks can't be caught by the
+                    # thread which enqueued the request.
+                    pywikibot.exception(
+                        'Exception in {0} while processing {1}'.format(
+                            self.name, request.uri), tb=True)
+                    if not request.completed:
+                        # Don't let the waiting thread block forever
+                        if request._data is None:
+                            request._data = e
+                        request._completed.set()
+            finally:
+                self.queue.task_done()
@@ -161,6 +161,22 @@ site_interface = 'APISite'
 # number of days to cache namespaces, api configuration, etc.
 API_config_expiry = 30
 
+# How the API cache in the apicache directory is stored:
+#  'files': one file per cached request.
+#  'sqlite': a single SQLite database, cache.sqlite, which keeps an index of
+#            the expiry times. Expired entries can be removed with
+#            scripts/maintenance/cache.py -purge.
+API_cache_backend = 'files'
+# Maximum size in MiB of the 'sqlite' API cache. When it grows larger, the
+# least recently used entries are removed. 0 means unlimited.
+API_cache_size = 0
+
+# Decode the pages of API responses while they are received, so that each
+# page is processed as soon as it arrives and the complete response text is
+# never held in memory. This applies to the queries of pages, e.g. when
+# preloading pages or loading revisions. Cached requests are not streamed.
+API_stream_pages = False
+
 # The maximum number of bytes which uses a GET request, if not positive
 # it'll always use POST requests
 maximum_GET_length = 255
@@ -561,6 +577,11 @@ interwiki_graph = False
 # once.
 interwiki_min_subjects = 100
 
+# Number of sites which interwiki.py queries at the same time. The pages of
+# one site are still loaded by a single query at once, which respects the
+# throttle of that site. Default is to query one site after the other.
+interwiki_parallel_sites = 1
+
 # If interwiki graphs are enabled, which format(s) should be used?
 # Supported formats include png, jpg, ps, and svg. See:
 # http://www.graphviz.org/doc/info/output.html
@@ -623,6 +644,24 @@ maxthrottle = 60
 # 'put_throttle' seconds.
 put_throttle = 10
 
+# How the delays are coordinated between several bots running on the same
+# host:
+#  'ctrlfile': each bot registers itself in the throttle.ctrl file and the
+#              delays are multiplied by the number of bots using the same site.
+#  'tokenbucket': all bots take tokens from read and write buckets per site,
+#              which are shared in the throttle.buckets file. A bucket is
+#              refilled with one token per delay and holds at most
+#              'throttle_bucket_size' tokens, so short bursts are possible.
+throttle_backend = 'ctrlfile'
+throttle_bucket_size = 1
+
+# Adapt the read and write delays to the server load. The delays are
+# multiplied when the server lag exceeds 'maxlag' or the server responds with
+# HTTP status 429, 503 or 504, and are decreased again after successful
+# responses until they are back at 'minthrottle' and 'put_throttle'. The
+# current rates are available in site.throttle.metrics.
+throttle_adaptive = False
+
 # Sometimes you want to know when a delay is inserted. If a delay is larger
 # than 'noisysleep' seconds, it is logged on the screen.
 noisysleep = 3.0
@@ -646,6 +685,49 @@ special_page_limit = 500
 # -1 indicates limit by api restriction
 step = -1
 
+# Number of page groups which the PreloadingGenerator loads in advance in
+# background threads while the bot is working on the current group. Set it
+# to 0 to load a group only when the previous group has been processed.
+preload_prefetch = 0
+
+# Number of categories whose members Category.crawl retrieves in advance in
+# background threads while the members of the current category are
+# processed. Set it to 0 to retrieve the members of one category at a time.
+category_crawl_workers = 4
+
+# Number of items which API query generators retrieve in advance in a
+# background thread while the bot is processing the previous items. If it is
+# at least the number of items per request, the continuation request is
+# submitted as soon as the previous response is parsed. Set it to 0 to submit
+# a request only when all previous items have been processed.
+query_prefetch = 0
+
+# Maximum size in MiB of the cache of revision texts. If the latest revision
+# of a page is in the cache, only its revision id is requested when the text
+# of the page is loaded. Set it to 0 to disable the cache. The cache is
+# stored in 'revision_cache_file', by default revisions.sqlite in base_dir.
+revision_cache_size = 0
+revision_cache_file = None
+
+# The categories used by category.py are stored in 'category_graph_file', by
+# default categories.sqlite in base_dir. A stored category is refreshed when
+# it is older than 'category_graph_max_age' hours; only the pages added to it
+# since then are requested if none were removed.
+category_graph_file = None
+category_graph_max_age = 24
+
+# The codes and hostnames of the families, which are used to find the family
+# of a URL without loading all family files, are stored in
+# 'family_registry_file', by default families.json in base_dir.
+family_registry_file = None
+
+# Store the siteinfo and the API parameter information of each site in a
+# snapshot file in the 'snapshots' directory of base_dir, so that a site is
+# constructed without any request. A snapshot older than
+# 'site_snapshot_expiry' days is used while it is refreshed in the background.
+use_site_snapshots = False
+site_snapshot_expiry = 1
+
 # Maximum number of times to retry an API request before quitting.
 max_retries = 25
 # Minimum time to wait before resubmitting a failed API request.
@@ -670,11 +752,22 @@ table2wikiSkipWarnings = False
 # that slow servers won't slow you down.
 max_external_links = 50
 
+# How many requests should weblinkchecker.py send to the same host at the
+# same time, and how many seconds should it wait at least between starting
+# two requests to the same host?
+weblink_host_connections = 2
+weblink_host_delay = 1.0
+
 report_dead_links_on_talk = False
 
 # Don't alert on links days_dead old or younger
 weblink_dead_days = 7
 
+# How should weblinkchecker.py store the dead links it found? 'sqlite' stores
+# each link when it is found and imports an existing history, 'pickle' keeps
+# all links in memory and writes them into a .dat file at the end.
+weblink_history_backend = 'sqlite'
+
 # ############# DATABASE SETTINGS ##############
 # Setting to connect the database or replica of the database of the wiki.
 # db_name_format can be used to manipulate the dbName of site.
@@ -785,6 +878,15 @@ persistent_http = False
 # read timeout, or a single value for both in a tuple (since requests 2.4.0).
 socket_timeout = 30
 
+# Number of threads per host which execute the HTTP requests. Requests to
+# different hosts are always handled by different threads. Set to 0 to execute
+# each request synchronously in the thread which issued it.
+http_threads_per_host = 4
+
+# How many HTTP requests may be waiting per host before issuing another
+# request blocks. If it is <= 0, the queue size is infinite.
+http_queue_size = 64
+
 
 # ############# COSMETIC CHANGES SETTINGS ##############
 # The bot can make some additional changes to each page it edits, e.g. fix
@@ -862,6 +964,11 @@ simulate = False
 # processing. As higher this value this effect will decrease.
 max_queue_size = 64
 
+# Number of processes which parse a multistream bz2 XML dump in parallel.
+# The index file of the dump, *-multistream-index.txt.bz2, must be stored
+# next to the dump. Other dumps are always parsed by a single process.
+xml_dump_processes = 1
+
 # Define the line separator. Pages retrieved via API have "\n" whereas
 # pages fetched from screen (mostly) have "\r\n". Interwiki and category
 # separator settings in family files should use multiplied of this.
@@ -875,6 +982,12 @@ line_separator = LS = u'\n'
 # if the user has already installed the library.
 use_mwparserfromhell = True
 
+# Extract the templates in textlib.extract_templates_and_params by
+# tokenizing the text once. The time is linear in the size of the page,
+# and the result is the same as by mwparserfromhell.
+# If enabled, it is used even if mwparserfromhell is installed.
+use_template_tokenizer = False
+
 # Pickle protocol version to use for storing dumps.
 # This config variable is not used for loading dumps.
 # Version 2 is common to both Python 2 and 3, and should
@@ -16,6 +16,7 @@ import json
 import os
 import pprint
 import re
+import sys
 import time
 import traceback
 
@@ -23,24 +24,20 @@ from collections import Container, MutableMapping
 from email.mime.nonmultipart import MIMENonMultipart
 from warnings import warn
 
-try:
-    import cPickle as pickle
-except ImportError:
-    import pickle
-
 import pywikibot
 
 from pywikibot import config, login
 
 from pywikibot.comms import http
+from pywikibot.data import apicache, jsonstream
 from pywikibot.exceptions import (
-    Server504Error, Server414Error, FatalServerError, NoUsername,
+    Server504Error, Server414Error, FatalServerError, NoUsername, ServerError,
     Error,
     InvalidTitle
 )
 from pywikibot.tools import (
     MediaWikiVersion, deprecated, itergroup, ip, PY2, getargspec,
-    UnicodeType
+    UnicodeType, PrefetchIterator,
 )
 from pywikibot.tools.formatter import color_format
 
@@ -835,6 +832,54 @@ class ParamInfo(Container):
 
         return result_data
 
+    def snapshot(self):
+        """
+        Return the loaded parameter information as JSON serializable data.
+
+        @return: the data or None if it isn't initialised
+        @rtype: dict or None
+        """
+        if 'query' not in self._modules:
+            return None
+        paraminfo = {}
+        for path, module in self._paraminfo.items():
+            module = dict(module)
+            if 'parameters' in module:
+                module['parameters'] = list(module['parameters'])
+            paraminfo[path] = module
+        return {
+            'paraminfo': paraminfo,
+            'modules': dict((name, sorted(modules))
+                            for name, modules in self._modules.items()),
+            'action_modules': sorted(self._action_modules),
+            'limit': self._limit,
+            'modules_only_mode': self.modules_only_mode,
+            'preloaded_modules': sorted(self.preloaded_modules),
+        }
+
+    def restore(self, data):
+        """
+        Restore the parameter information of a snapshot.
+
+        The modules of the snapshot are not requested again and no
+        initialisation request is necessary.
+
+        @param data: the data as returned by L{snapshot}
+        @type data: dict
+        """
+        self._paraminfo = data['paraminfo']
+        self._modules = dict((name, frozenset(modules))
+                             for name, modules in data['modules'].items())
+        self._action_modules = frozenset(data['action_modules'])
+        self._limit = data['limit']
+        self.preloaded_modules = frozenset(data['preloaded_modules'])
+        self.modules_only_mode = data['modules_only_mode']
+        if self.modules_only_mode:
+            self.paraminfo_keys = frozenset(['modules'])
+        self._prefixes = {}
+        self._prefix_map = {}
+        self._with_limits = None
+
     def __getitem__(self, key):
         """
         Return a paraminfo module for the module path, caching it.
@@ -1333,6 +1378,10 @@ class Request(MutableMapping):
     # To make sure the default value of 'parameters' can be identified.
     _PARAM_DEFAULT = object()
 
+    #: Whether the entries of query.pages are decoded while the response is
+    #: received. The result then contains an iterator of them instead.
+    stream_pages = False
+
     def __init__(self, site=None, mime=None, throttle=True, mime_params=None,
                  max_retries=None, retry_wait=None, use_get=None,
                  parameters=_PARAM_DEFAULT, **kwargs):
@@ -1886,6 +1935,79 @@ class Request(MutableMapping):
                             not self._warning_handler(mod, single_warning)):
                         pywikibot.warning(u"API warning (%s): %s" % (mod, single_warning))
 
+    def _relogin_if_other_user(self, result):
+        """
+        Force a re-login if the result is for another user.
+
+        @return: whether it was necessary to log in again
+        @rtype: bool
+        """
+        if self.action == 'query' and 'userinfo' in result.get('query', ()):
+            # if we get passed userinfo in the query result, we can confirm
+            # that we are logged in as the correct user. If this is not the
+            # case, force a re-login.
+            username = result['query']['userinfo']['name']
+            if self.site.user() is not None and self.site.user() != username:
+                pywikibot.error(
+                    "Logged in as '{actual}' instead of '{expected}'. "
+                    "Forcing re-login.".format(
+                        actual=username,
+                        expected=self.site.user()
+                    )
+                )
+                self.site._relogin()
+                return True
+        return False
+
+    def _parse_stream(self, response):
+        """
+        Decode the response while it is received.
+
+        The response is decoded until the entries of query.pages are
+        reached. They are then decoded by iterating query.pages in the
+        returned result, which is completed when all of them are iterated.
+
+        @param response: the response whose body is not yet received
+        @type response: L{pywikibot.comms.threadedhttp.HttpRequest}
+        @rtype: dict
+        @raise ValueError: the response is no valid JSON object
+        """
+        pywikibot.debug('API response from %s is decoded while it is '
+                        'received', _logger, self.site)
+        encoding = (response.charset or response.header_encoding or
+                    self.site.encoding())
+        events = jsonstream.iterparse(response.data.iter_content(65536),
+                                      ('query', 'pages'), encoding)
+        try:
+            event, result = next(events)
+        except Exception:
+            response.data.close()
+            raise
+        if event == 'start':
+            result['query']['pages'] = self._iter_stream(
+                events, response, 'warnings' in result)
+        return result
+
+    def _iter_stream(self, events, response, warned):
+        """
+        Yield the pages of a response while it is decoded.
+
+        The warnings and the user info which follow the pages are handled at
+        the end, but the request can't be repeated then.
+        """
+        try:
+            for event, value in events:
+                if event == 'item':
+                    yield value
+        except ValueError as e:
+            raise ServerError('Incomplete API response from {0}: {1}'
+                              .format(self.site, e))
+        finally:
+            response.data.close()
+        if not warned:
+            self._handle_warnings(value)
+        self._relogin_if_other_user(value)
+
     def submit(self):
         """
         Submit a query and parse the response.
@@ -1893,6 +2015,47 @@ class Request(MutableMapping):
         @return: a dict containing data retrieved from api.php
         @rtype: dict
         """
+        steps = self._submit_steps()
+        step, value = next(steps)
+        while step != 'result':
+            response = None
+            try:
+                if step == 'throttle':
+                    self.site.throttle(write=value)
+                elif step == 'http':
+                    response = http.request(**value)
+                elif step == 'stream':
+                    response = http.request_stream(**value)
+                elif step == 'wait':
+                    self.wait()
+                elif step == 'lag':
+                    self.site.throttle.lag(value)
+            except Exception:
+                step, value = steps.throw(*sys.exc_info())
+            else:
+                step, value = steps.send(response)
+        return value
+
+    def _submit_steps(self):
+        """
+        Generate the steps to submit the request and to parse the response.
+
+        This generator contains the logic of L{submit} without doing any
+        blocking operation itself, so that it can also be driven by an event
+        loop. Each yielded step is a tuple of a name and a value, and the
+        generator must be resumed after the step has been executed:
+
+         - 'throttle': wait for the site throttle; the value is the write flag
+         - 'http': send the value as keyword arguments to L{http.request} and
+           send the response back, or throw the exception it raised
+         - 'stream': like 'http', but L{http.request_stream} may be used
+           to send back the response whose body is not yet received
+         - 'wait': wait before retrying, see L{wait}
+         - 'lag': wait for the server lag in seconds given as the value
+         - 'result': the value is the final result, stop resuming
+
+        @rtype: generator of tuple (str, object)
+        """
         self._add_defaults()
         if (not config.enable_GET_without_SSL and
                 self.site.protocol() != 'https' or
@@ -1920,9 +2083,10 @@ class Request(MutableMapping):
             paramstring = self._http_param_string()
             simulate = self._simulate(self.action)
             if simulate:
-                return simulate
+                yield 'result', simulate
+                return
             if self.throttle:
-                self.site.throttle(write=self.write)
+                yield 'throttle', self.write
             else:
                 pywikibot.log(
                     "Submitting unthrottled action '{0}'.".format(self.action))
@@ -1943,24 +2107,23 @@ class Request(MutableMapping):
                     else:
                         body = paramstring
 
-                pywikibot.debug('API request to {0} (uses get: {1}):\n'
-                                'Headers: {2!r}\nURI: {3!r}\n'
-                                'Body: {4!r}'.format(self.site, use_get,
-                                                     headers, uri, body),
-                                _logger)
+                pywikibot.debug('API request to %s (uses get: %s):\n'
+                                'Headers: %r\nURI: %r\nBody: %r', _logger,
+                                self.site, use_get, headers, uri, body)
 
-                rawdata = http.request(
-                    site=self.site, uri=uri, method='GET' if use_get else 'POST',
-                    body=body, headers=headers)
+                rawdata = yield 'stream' if self.stream_pages else 'http', {
+                    'site': self.site, 'uri': uri,
+                    'method': 'GET' if use_get else 'POST',
+                    'body': body, 'headers': headers}
             except Server504Error:
                 pywikibot.log(u"Caught HTTP 504 error; retrying")
-                self.wait()
+                yield 'wait', None
                 continue
             except Server414Error:
                 if use_get:
                     pywikibot.log('Caught HTTP 414 error; retrying')
                     use_get = False
-                    self.wait()
+                    yield 'wait', None
                     continue
                 else:
                     pywikibot.warning('Caught HTTP 414 error, although not '
@@ -1975,16 +2138,20 @@ class Request(MutableMapping):
                 # for any other error on the http request, wait and retry
                 pywikibot.error(traceback.format_exc())
                 pywikibot.log(u"%s, %s" % (uri, paramstring))
-                self.wait()
+                yield 'wait', None
                 continue
-            if not isinstance(rawdata, unicode):
+            if isinstance(rawdata, bytes):
                 rawdata = rawdata.decode(self.site.encoding())
-            pywikibot.debug((u"API response received from %s:\n" % self.site) +
-                            rawdata, _logger)
-            if rawdata.startswith(u"unknown_action"):
-                raise APIError(rawdata[:14], rawdata[16:])
+            if isinstance(rawdata, unicode):
+                pywikibot.debug(u'API response received from %s:\n%s',
+                                _logger, self.site, rawdata)
+                if rawdata.startswith(u"unknown_action"):
+                    raise APIError(rawdata[:14], rawdata[16:])
             try:
-                result = json.loads(rawdata)
+                if isinstance(rawdata, unicode):
+                    result = json.loads(rawdata)
+                else:
+                    result = self._parse_stream(rawdata)
             except ValueError:
                 # if the result isn't valid JSON, there must be a server
                 # problem. Wait a few seconds and try again
@@ -2002,7 +2169,7 @@ class Request(MutableMapping):
                                              % (param, self._params[param]))
                         except:
                             pass
-                self.wait()
+                yield 'wait', None
                 continue
             if not result:
                 result = {}
@@ -2012,26 +2179,14 @@ class Request(MutableMapping):
                                % type(result),
                                data=result)
 
-            if self.action == 'query' and 'userinfo' in result.get('query', ()):
-                # if we get passed userinfo in the query result, we can confirm
-                # that we are logged in as the correct user. If this is not the
-                # case, force a re-login.
-                username = result['query']['userinfo']['name']
-                if self.site.user() is not None and self.site.user() != username:
-                    pywikibot.error(
-                        "Logged in as '{actual}' instead of '{expected}'. "
-                        "Forcing re-login.".format(
-                            actual=username,
-                            expected=self.site.user()
-                        )
-                    )
-                    self.site._relogin()
-                    continue
+            if self._relogin_if_other_user(result):
+                continue
 
             self._handle_warnings(result)
 
             if "error" not in result:
-                return result
+                yield 'result', result
+                return
 
             error = result['error'].copy()
             for key in result:
@@ -2078,14 +2233,15 @@ class Request(MutableMapping):
                 if lag:
                     pywikibot.log(
                         u"Pausing due to database lag: " + info)
-                    self.site.throttle.lag(int(lag.group("lag")))
+                    yield 'lag', int(lag.group('lag'))
                     continue
             elif code == 'help' and self.action == 'help':
                 # The help module returns an error result with the complete
                 # API information. As this data was requested, return the
                 # data instead of raising an exception.
-                return {'help': {'mime': 'text/plain',
-                                 'help': result['error']['help']}}
+                yield 'result', {'help': {'mime': 'text/plain',
+                                          'help': result['error']['help']}}
+                return
 
             pywikibot.warning('API error %s: %s' % (code, info))
 
@@ -2117,7 +2273,7 @@ class Request(MutableMapping):
                                  result))
 
                 if retry:
-                    self.wait()
+                    yield 'wait', None
                     continue
 
                 raise e
@@ -2126,7 +2282,7 @@ class Request(MutableMapping):
             if code == "failed-save" and \
                self.action == 'wbeditentity' and \
                self._is_wikibase_error_retryable(result["error"]):
-                self.wait()
+                yield 'wait', None
                 continue
             # If readapidenied is returned try to login
             if code == 'readapidenied' and self.site._loginstatus in (-3, -1):
@@ -2192,14 +2348,25 @@ class Request(MutableMapping):
 
     def wait(self):
         """Determine how long to wait after a failed request."""
+        time.sleep(self._next_retry_wait())
+
+    def _next_retry_wait(self):
+        """
+        Count a retry and return how long to wait before it.
+
+        @return: seconds to wait
+        @rtype: int or float
+        @raises TimeoutError: no retries are left
+        """
         self.max_retries -= 1
         if self.max_retries < 0:
             raise TimeoutError("Maximum retries attempted without success.")
         pywikibot.warning(u"Waiting %s seconds before retrying."
                           % self.retry_wait)
-        time.sleep(self.retry_wait)
+        retry_wait = self.retry_wait
         # double the next wait, but do not exceed 120 seconds
         self.retry_wait = min(120, self.retry_wait * 2)
+        return retry_wait
 
 
 class CachedRequest(Request):
@@ -2300,6 +2467,15 @@ class CachedRequest(Request):
         return os.path.join(CachedRequest._get_cache_dir(),
                             self._create_file_name())
 
+    @classmethod
+    def _get_cache_backend(cls):
+        """
+        Return the backend storing the cache entries.
+
+        @rtype: L{apicache.CacheBackend}
+        """
+        return apicache.get_backend(cls._get_cache_dir())
+
     def _expired(self, dt):
         return dt + self.expiry < datetime.datetime.now()
 
@@ -2311,39 +2487,49 @@ class CachedRequest(Request):
         """
         self._add_defaults()
         try:
-            filename = self._cachefile_path()
-            with open(filename, 'rb') as f:
-                uniquedescr, self._data, self._cachetime = pickle.load(f)
-            assert(uniquedescr == self._uniquedescriptionstr())
-            if self._expired(self._cachetime):
-                self._data = None
+            key = self._create_file_name()
+            entry = self._get_cache_backend().load(key, self._expired)
+            if entry is None:
+                # not cached or expired
                 return False
-            pywikibot.debug(u"%s: cache hit (%s) for API request: %s"
-                            % (self.__class__.__name__, filename, uniquedescr),
-                            _logger)
+            uniquedescr, self._data, self._cachetime = entry
+            assert(uniquedescr == self._uniquedescriptionstr())
+            pywikibot.debug(u'%s: cache hit (%s) for API request: %s',
+                            _logger, self.__class__.__name__, key, uniquedescr)
             return True
-        except IOError:
-            # file not found
-            return False
         except Exception as e:
+            self._data = None
             pywikibot.output("Could not load cache: %r" % e)
             return False
 
     def _write_cache(self, data):
-        """Write data to self._cachefile_path()."""
-        data = [self._uniquedescriptionstr(), data, datetime.datetime.now()]
-        with open(self._cachefile_path(), 'wb') as f:
-            pickle.dump(data, f, protocol=config.pickle_protocol)
-
-    def submit(self):
-        """Submit cached request."""
+        """Write data into the cache backend."""
+        self._get_cache_backend().store(
+            self._create_file_name(), self._uniquedescriptionstr(), data,
+            datetime.datetime.now(), self.expiry)
+
+    def _submit_steps(self):
+        """Use the cached data or write the data of the request into it."""
+        # the pages must be decoded before the data is cached
+        self.stream_pages = False
         cached_available = self._load_cache()
-        if not cached_available:
-            self._data = super(CachedRequest, self).submit()
-            self._write_cache(self._data)
-        else:
+        if cached_available:
             self._handle_warnings(self._data)
-        return self._data
+            yield 'result', self._data
+            return
+
+        steps = super(CachedRequest, self)._submit_steps()
+        step = next(steps)
+        while step[0] != 'result':
+            try:
+                response = yield step
+            except Exception:
+                step = steps.throw(*sys.exc_info())
+            else:
+                step = steps.send(response)
+        self._data = step[1]
+        self._write_cache(self._data)
+        yield step
 
 
 class _RequestWrapper(object):
@@ -2452,8 +2638,8 @@ class APIGenerator(_RequestWrapper):
         n = 0
         while True:
             self.request[self.continue_name] = offset
-            pywikibot.debug(u"%s: Request: %s" % (self.__class__.__name__,
-                                                  self.request), _logger)
+            pywikibot.debug(u'%s: Request: %s', _logger,
+                            self.__class__.__name__, self.request)
             data = self.request.submit()
 
             n_items = len(data[self.data_name])
@@ -2578,6 +2764,8 @@ class QueryGenerator(_RequestWrapper):
             self.prefix = "g" + self.prefix
 
         self.limit = None
+        self.prefetch = config.query_prefetch
+        self.stream_pages = config.API_stream_pages
         self.query_limit = self.api_limit
         if 'generator' in parameters:
             self.resultkey = "pages"        # name of the "query" subelement key
@@ -2626,6 +2814,20 @@ class QueryGenerator(_RequestWrapper):
         """
         self.limit = int(value)
 
+    def set_prefetch(self, value):
+        """Set the number of items to be retrieved in advance.
+
+        If it is positive, the requests are submitted in a separate thread
+        while the caller processes the items. That thread stops when that
+        number of items is waiting to be processed, so it should be at least
+        the number of items per request to submit the continuation request
+        as soon as the previous response is parsed.
+
+        If not called, config.query_prefetch is used.
+
+        """
+        self.prefetch = int(value)
+
     def _update_limit(self):
         """Set query limit for self.module based on api response."""
         param = self.site._paraminfo.parameter('query+' + self.limited_module,
@@ -2703,6 +2905,64 @@ class QueryGenerator(_RequestWrapper):
 
         Continues response as needed until limit (if any) is reached.
 
+        """
+        if self.prefetch > 0:
+            return self._iter_prefetched()
+        return self._iter_submitted()
+
+    def _iter_submitted(self):
+        """Iterate the response submitting the requests when needed."""
+        steps = self._iter_steps()
+        data = None
+        while True:
+            try:
+                step, value = steps.send(data)
+            except StopIteration:
+                return
+            data = None
+            if step == 'submit':
+                data = value.submit()
+            else:
+                yield value
+
+    def _iter_prefetched(self):
+        """
+        Iterate the response while a thread submits the requests.
+
+        The thread puts up to self.prefetch items into a queue, from which
+        they are yielded. Any exception of the thread is raised when all
+        items before it have been yielded. The thread stops when the
+        iteration is stopped early.
+        """
+        items = PrefetchIterator(self._iter_submitted(), self.prefetch)
+        try:
+            for item in items:
+                yield item
+        finally:
+            items.stop()
+
+    def __aiter__(self):
+        """
+        Return an asynchronous iterator submitting on the default event loop.
+
+        @rtype: L{pywikibot.data.asyncapi.AsyncQueryIterator}
+        """
+        from pywikibot.data.asyncapi import AsyncQueryIterator
+        return AsyncQueryIterator(self)
+
+    def _iter_steps(self):
+        """
+        Generate the steps to iterate the response.
+
+        This generator contains the logic of L{__iter__} without submitting
+        any request itself. Each yielded step is a tuple of a name and a
+        value:
+
+         - 'submit': submit the request given as the value and send the
+           result back
+         - 'item': the value is the next item to be yielded by the iterator
+
+        @rtype: generator of tuple (str, object)
         """
         previous_result_had_data = True
         prev_limit = new_limit = None
@@ -2737,20 +2997,18 @@ class QueryGenerator(_RequestWrapper):
                     self.request[self.prefix + "limit"] = str(new_limit)
                 if prev_limit != new_limit:
                     pywikibot.debug(
-                        u"%s: query_limit: %s, api_limit: %s, "
-                        u"limit: %s, new_limit: %s, count: %s"
-                        % (self.__class__.__name__,
-                           self.query_limit, self.api_limit,
-                           self.limit, new_limit, count),
-                        _logger)
+                        u'%s: query_limit: %s, api_limit: %s, '
+                        u'limit: %s, new_limit: %s, count: %s', _logger,
+                        self.__class__.__name__, self.query_limit,
+                        self.api_limit, self.limit, new_limit, count)
                     pywikibot.debug(
-                        u"%s: %s: %s"
-                        % (self.__class__.__name__,
-                           self.prefix + "limit",
-                           self.request[self.prefix + "limit"]),
-                        _logger)
+                        u'%s: %s: %s', _logger, self.__class__.__name__,
+                        self.prefix + 'limit',
+                        self.request[self.prefix + 'limit'])
             if not hasattr(self, "data"):
-                self.data = self.request.submit()
+                self.request.stream_pages = (self.stream_pages and
+                                             self.resultkey == 'pages')
+                self.data = yield 'submit', self.request
             if not self.data or not isinstance(self.data, dict):
                 pywikibot.debug(
                     u"%s: stopped iteration because no dict retrieved from api."
@@ -2760,11 +3018,9 @@ class QueryGenerator(_RequestWrapper):
             if 'query' in self.data and self.resultkey in self.data["query"]:
                 resultdata = self.data["query"][self.resultkey]
                 if isinstance(resultdata, dict):
-                    pywikibot.debug(u"%s received %s; limit=%s"
-                                    % (self.__class__.__name__,
-                                       list(resultdata.keys()),
-                                       self.limit),
-                                    _logger)
+                    pywikibot.debug(u'%s received %s; limit=%s', _logger,
+                                    self.__class__.__name__,
+                                    list(resultdata.keys()), self.limit)
                     if "results" in resultdata:
                         resultdata = resultdata["results"]
                     elif "pageids" in self.data["query"]:
@@ -2776,11 +3032,9 @@ class QueryGenerator(_RequestWrapper):
                         resultdata = [resultdata[k]
                                       for k in sorted(resultdata.keys())]
                 else:
-                    pywikibot.debug(u"%s received %s; limit=%s"
-                                    % (self.__class__.__name__,
-                                       resultdata,
-                                       self.limit),
-                                    _logger)
+                    pywikibot.debug(u'%s received %s; limit=%s', _logger,
+                                    self.__class__.__name__, resultdata,
+                                    self.limit)
                 if "normalized" in self.data["query"]:
                     self.normalized = dict((item['to'], item['from'])
                                            for item in
@@ -2788,7 +3042,7 @@ class QueryGenerator(_RequestWrapper):
                 else:
                     self.normalized = {}
                 for item in resultdata:
-                    yield self.result(item)
+                    yield 'item', self.result(item)
                     if isinstance(item, dict) and set(self.continuekey) & set(item.keys()):
                         # if we need to count elements contained in items in
                         # self.data["query"]["pages"], we want to count
@@ -2808,7 +3062,7 @@ class QueryGenerator(_RequestWrapper):
                 if 'query' not in self.data:
                     pywikibot.log("%s: 'query' not found in api response." %
                                   self.__class__.__name__)
-                    pywikibot.log(unicode(self.data))
+                    pywikibot.log('%s', self.data)
                 # if (query-)continue is present, self.resultkey might not have
                 # been fetched yet
                 if self.continue_name not in self.data:
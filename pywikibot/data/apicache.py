@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+"""
+Storage backends of the API cache used by L{api.CachedRequest}.
+
+A backend stores for each key the unique description of the request, the
+response data and the time it was cached. Two backends are available and
+selected by config.API_cache_backend:
+
+ - 'files': one pickle file per request in the apicache directory, named by
+   the key. This is the traditional format.
+ - 'sqlite': a single SQLite database in the apicache directory. The cache
+   time and the expiry time are stored in separate indexed columns, so an
+   expired entry is detected without loading its data and expired entries
+   can be removed in bulk. If config.API_cache_size is positive, the least
+   recently used entries are removed when the data grows larger than that
+   number of MiB.
+
+Both backends write an entry atomically, so several processes can share the
+same cache.
+"""
+#
+# (C) Pywikibot team, 2017
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+__version__ = '$Id$'
+
+import datetime
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import pywikibot
+
+from pywikibot import config
+from pywikibot.data.sqlitecache import sqlite3, SQLiteLRUCache
+
+_logger = 'data.apicache'
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def _timestamp(dt):
+    """Return the POSIX timestamp of a naive local datetime."""
+    return time.mktime(dt.timetuple()) + dt.microsecond / 1e6
+
+
+def get_backend(directory, name=None):
+    """
+    Return the cache backend for the directory.
+
+    @param directory: the apicache directory
+    @type directory: basestring
+    @param name: the name of the backend, by default config.API_cache_backend
+    @type name: str
+    @rtype: CacheBackend
+    """
+    name = name or config.API_cache_backend
+    with _backends_lock:
+        if (name, directory) not in _backends:
+            if name == 'files':
+                backend = FileCacheBackend(directory)
+            elif name == 'sqlite':
+                backend = SQLiteCacheBackend(
+                    os.path.join(directory, SQLiteCacheBackend.filename),
+                    config.API_cache_size * 1024 * 1024)
+            else:
+                raise ValueError('Unknown API cache backend: {0}'.format(name))
+            _backends[name, directory] = backend
+        return _backends[name, directory]
+
+
+class CacheBackend(object):
+
+    """Interface of the cache backends."""
+
+    def load(self, key, expired=None):
+        """
+        Return the cache entry of the key.
+
+        @param key: the key of the entry
+        @type key: str
+        @param expired: called with the cache time; if it returns True, the
+            entry is treated as missing and its data isn't loaded
+        @type expired: callable
+        @return: the unique description, the data and the cache time or
+            None if there is no entry
+        @rtype: tuple or None
+        """
+        raise NotImplementedError
+
+    def store(self, key, description, data, cachetime, expiry):
+        """
+        Store the cache entry of the key.
+
+        @param key: the key of the entry
+        @type key: str
+        @param description: the unique description of the request
+        @type description: unicode
+        @param data: the response data
+        @param cachetime: the time the data was retrieved
+        @type cachetime: datetime.datetime
+        @param expiry: the time after which the entry expires
+        @type expiry: datetime.timedelta
+        """
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Delete the cache entry of the key."""
+        raise NotImplementedError
+
+    def keys(self):
+        """Return the keys of all entries."""
+        raise NotImplementedError
+
+    def purge(self, before=None):
+        """
+        Delete all entries which expired before the given time.
+
+        @param before: the time, by default now
+        @type before: datetime.datetime
+        @return: the number of deleted entries
+        @rtype: int
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """Delete all entries."""
+        for key in self.keys():
+            self.delete(key)
+
+
+class FileCacheBackend(CacheBackend):
+
+    """One pickle file per entry named by its key."""
+
+    def __init__(self, directory):
+        """
+        Constructor.
+
+        @param directory: the directory of the pickle files
+        @type directory: basestring
+        """
+        self.directory = directory
+
+    def path(self, key):
+        """Return the path of the file of the key."""
+        return os.path.join(self.directory, key)
+
+    def load(self, key, expired=None):
+        """Return the cache entry of the key."""
+        try:
+            with open(self.path(key), 'rb') as f:
+                entry = pickle.load(f)
+        except IOError:
+            # file not found
+            return None
+        if expired is not None and expired(entry[2]):
+            return None
+        return tuple(entry)
+
+    def store(self, key, description, data, cachetime, expiry):
+        """Write the entry into a temporary file and rename it."""
+        fd, filename = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump([description, data, cachetime], f,
+                            protocol=config.pickle_protocol)
+            # mkstemp creates the file only readable by the user
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(filename, 0o666 & ~umask)
+            if hasattr(os, 'replace'):
+                os.replace(filename, self.path(key))
+            else:
+                if os.name == 'nt' and os.path.exists(self.path(key)):
+                    os.remove(self.path(key))
+                os.rename(filename, self.path(key))
+        except Exception:
+            os.remove(filename)
+            raise
+
+    def delete(self, key):
+        """Delete the file of the key."""
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def keys(self):
+        """Return the names of the cache files."""
+        # the database of the sqlite backend is in the same directory
+        database = SQLiteCacheBackend.filename
+        ignored = set([database, database + '-journal', database + '-wal',
+                       database + '-shm'])
+        return [filename for filename in os.listdir(self.directory)
+                if not filename.startswith('.') and filename not in ignored]
+
+    def purge(self, before=None):
+        """
+        Delete all entries which expired before the given time.
+
+        The files don't contain the expiry of a request, so all entries
+        older than config.API_config_expiry days are deleted.
+        """
+        before = before or datetime.datetime.now()
+        before -= datetime.timedelta(config.API_config_expiry)
+        deleted = 0
+        for key in self.keys():
+            try:
+                entry = self.load(key)
+            except Exception as e:
+                pywikibot.warning('Could not load cache entry {0}: {1!r}'
+                                  .format(key, e))
+                continue
+            if entry is not None and entry[2] < before:
+                self.delete(key)
+                deleted += 1
+        return deleted
+
+
+class SQLiteCacheBackend(SQLiteLRUCache, CacheBackend):
+
+    """All entries in an SQLite database with indexed expiry times."""
+
+    filename = 'cache.sqlite'
+
+    table = 'entries'
+    key_columns = ('key', )
+    schema = (
+        'CREATE TABLE IF NOT EXISTS entries ('
+        'key TEXT PRIMARY KEY, description TEXT NOT NULL, '
+        'data BLOB NOT NULL, size INTEGER NOT NULL, '
+        'cachetime REAL NOT NULL, expires REAL NOT NULL, '
+        'accessed REAL NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires)',
+        'CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)',
+    )
+
+    def __init__(self, filename, max_size=0):
+        """
+        Constructor.
+
+        @param filename: the database file
+        @type filename: basestring
+        @param max_size: the maximum size of the data in bytes; unlimited if
+            it is not positive
+        @type max_size: int
+        """
+        super(SQLiteCacheBackend, self).__init__(filename, max_size)
+        self.path = filename
+
+    def load(self, key, expired=None):
+        """Return the cache entry of the key."""
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT cachetime FROM entries WHERE key = ?',
+                (key, )).fetchone()
+            if row is None:
+                return None
+            cachetime = datetime.datetime.fromtimestamp(row[0])
+            if expired is not None and expired(cachetime):
+                return None
+            with self._connection:
+                row = self._connection.execute(
+                    'SELECT description, data FROM entries WHERE key = ?',
+                    (key, )).fetchone()
+                self._connection.execute(
+                    'UPDATE entries SET accessed = ? WHERE key = ?',
+                    (time.time(), key))
+        if row is None:
+            # deleted by another process
+            return None
+        return row[0], pickle.loads(bytes(row[1])), cachetime
+
+    def store(self, key, description, data, cachetime, expiry):
+        """Store the entry in a transaction."""
+        data = pickle.dumps(data, protocol=config.pickle_protocol)
+        cachetime = _timestamp(cachetime)
+        with self._lock:
+            self._insert({'key': key, 'description': description,
+                          'data': sqlite3.Binary(data),
+                          'cachetime': cachetime,
+                          'expires': cachetime + expiry.total_seconds(),
+                          'accessed': time.time()}, len(data))
+
+    def delete(self, key):
+        """Delete the entry of the key."""
+        with self._lock:
+            with self._connection:
+                self._connection.execute(
+                    'DELETE FROM entries WHERE key = ?', (key, ))
+
+    def keys(self):
+        """Return the keys of all entries."""
+        with self._lock:
+            return [row[0] for row in self._connection.execute(
+                'SELECT key FROM entries')]
+
+    def purge(self, before=None):
+        """Delete all entries which expired before the given time."""
+        before = _timestamp(before or datetime.datetime.now())
+        with self._lock:
+            with self._connection:
+                deleted = self._connection.execute(
+                    'DELETE FROM entries WHERE expires < ?',
+                    (before, )).rowcount
+            self._size = self._stored_size()
+        return deleted
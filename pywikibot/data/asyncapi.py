@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Submit API requests on an asyncio event loop.
+
+The requests and query generators of L{pywikibot.data.api} describe their
+logic as steps (see L{api.Request._submit_steps} and
+L{api.QueryGenerator._iter_steps}), which are executed here by callbacks on
+the event loop. The HTTP requests themselves are handled by the HTTP threads
+of L{pywikibot.comms.http}, so many requests can be in flight at the same
+time without one thread per request::
+
+    async def titles(site):
+        gen = api.ListGenerator('allpages', site=site)
+        async for page in gen:
+            print(page['title'])
+
+    async def userinfo(site):
+        request = AsyncRequest(site=site, parameters={
+            'action': 'query', 'meta': 'userinfo'})
+        return (await request.submit())['query']['userinfo']
+
+The throttle, the retries and the maxlag handling only pause the request
+which needs to wait. Loading missing parameter information, logging in again
+and renewing tokens are still done synchronously by the request steps.
+
+This module requires Python 3.4; C{async for} requires Python 3.5.
+"""
+#
+# (C) Pywikibot team, 2017
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+__version__ = '$Id$'
+
+try:
+    import asyncio
+except ImportError as e:
+    asyncio = e
+
+from pywikibot.comms import http
+from pywikibot.data import api
+
+try:
+    StopAsyncIteration
+except NameError:
+    StopAsyncIteration = StopIteration
+
+_logger = 'data.asyncapi'
+
+
+def _get_loop(loop):
+    """Return the loop or the default event loop if it is None."""
+    if isinstance(asyncio, ImportError):
+        raise asyncio
+    return loop or asyncio.get_event_loop()
+
+
+def submit(request, loop=None):
+    """
+    Submit a request on the event loop.
+
+    @param request: The request to be submitted
+    @type request: L{api.Request}
+    @param loop: The event loop, the default event loop if None
+    @type loop: asyncio.AbstractEventLoop
+    @return: The future of the result of L{api.Request.submit}
+    @rtype: asyncio.Future
+    """
+    loop = _get_loop(loop)
+    future = asyncio.Future(loop=loop)
+    _RequestSteps(request, future, loop).send()
+    return future
+
+
+class _RequestSteps(object):
+
+    """Execute the steps of a request by callbacks on the event loop."""
+
+    def __init__(self, request, future, loop):
+        """Constructor."""
+        self.request = request
+        self.future = future
+        self.loop = loop
+        self.steps = request._submit_steps()
+
+    def send(self, value=None):
+        """Resume the steps with the value."""
+        self._resume(self.steps.send, value)
+
+    def throw(self, exception):
+        """Resume the steps by raising the exception."""
+        self._resume(self.steps.throw, exception)
+
+    def call_later(self, delay, callback, *args):
+        """Call the callback after delay seconds."""
+        self.loop.call_later(delay, self._call, callback, *args)
+
+    def _call(self, callback, *args):
+        """Call the callback and set any exception on the future."""
+        if self.future.done():
+            self.steps.close()
+            return
+        try:
+            callback(*args)
+        except Exception as e:
+            self.future.set_exception(e)
+
+    def _resume(self, method, value):
+        """Resume the steps and start executing the next one."""
+        if self.future.done():
+            # cancelled while waiting
+            self.steps.close()
+            return
+        try:
+            step, value = method(value)
+            if step == 'result':
+                self.future.set_result(value)
+            else:
+                getattr(self, '_step_' + step)(value)
+        except Exception as e:
+            self.future.set_exception(e)
+
+    def _step_throttle(self, write):
+        """Wait until the throttle allows the request."""
+        throttle = self.request.site.throttle
+        delay = throttle.waittime(write=write)
+        if delay > 0:
+            self.call_later(delay, self._step_throttle, write)
+        else:
+            # It doesn't need to wait anymore but updates the throttle
+            throttle(write=write)
+            self.send()
+
+    def _step_http(self, kwargs):
+        """Enqueue the HTTP request."""
+        kwargs['callback'] = self._http_callback
+        http.enqueue_request(**kwargs)
+
+    def _step_stream(self, kwargs):
+        """Enqueue the HTTP request, whose body is received completely."""
+        self._step_http(kwargs)
+
+    def _http_callback(self, request):
+        """Hand the completed HTTP request over to the event loop."""
+        self.loop.call_soon_threadsafe(self._call, self._http_done, request)
+
+    def _http_done(self, request):
+        """Resume with the content of the HTTP request."""
+        try:
+            http.error_handling_callback(request)
+            content = request.content
+        except Exception as e:
+            self.throw(e)
+        else:
+            self.send(content)
+
+    def _step_wait(self, value):
+        """Wait before retrying."""
+        self.call_later(self.request._next_retry_wait(), self.send)
+
+    def _step_lag(self, lagtime):
+        """Wait because of the server lag."""
+        throttle = self.request.site.throttle
+        throttle.record_lag(lagtime)
+        self.call_later(throttle.lag_delay(lagtime), self.send)
+
+
+class AsyncRequest(api.Request):
+
+    """
+    Request which is submitted on an asyncio event loop.
+
+    Its L{submit} method returns a future instead of the result.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Constructor.
+
+        @kwarg loop: The event loop, the default event loop if None
+        @type loop: asyncio.AbstractEventLoop
+
+        See L{api.Request} for the other parameters.
+        """
+        self.loop = kwargs.pop('loop', None)
+        super(AsyncRequest, self).__init__(*args, **kwargs)
+
+    def submit(self):
+        """
+        Submit the request on the event loop.
+
+        @return: The future of the result dict
+        @rtype: asyncio.Future
+        """
+        return submit(self, self.loop)
+
+
+class AsyncQueryIterator(object):
+
+    """
+    Asynchronous iterator over the items of a query generator.
+
+    The requests of the generator are submitted on the event loop.
+    """
+
+    def __init__(self, generator, loop=None):
+        """
+        Constructor.
+
+        @param generator: The query generator to iterate
+        @type generator: L{api.QueryGenerator}
+        @param loop: The event loop, the default event loop if None
+        @type loop: asyncio.AbstractEventLoop
+        """
+        self.generator = generator
+        self.loop = loop
+        self.steps = generator._iter_steps()
+
+    def __aiter__(self):
+        """Return the iterator itself."""
+        return self
+
+    def __anext__(self):
+        """
+        Return the future of the next item.
+
+        @rtype: asyncio.Future
+        """
+        loop = _get_loop(self.loop)
+        future = asyncio.Future(loop=loop)
+        self._resume(future, loop, None)
+        return future
+
+    def _resume(self, future, loop, data):
+        """Resume the steps until the next item is available."""
+        try:
+            step, value = self.steps.send(data)
+        except StopIteration:
+            future.set_exception(StopAsyncIteration())
+            return
+        except Exception as e:
+            future.set_exception(e)
+            return
+
+        if step == 'item':
+            future.set_result(value)
+        else:
+            submitted = submit(value, loop)
+            submitted.add_done_callback(
+                lambda submitted: self._submitted(future, loop, submitted))
+
+    def _submitted(self, future, loop, submitted):
+        """Resume with the result of a submitted request."""
+        if future.done():
+            # cancelled while waiting
+            return
+        if submitted.cancelled():
+            future.cancel()
+        elif submitted.exception() is not None:
+            future.set_exception(submitted.exception())
+        else:
+            self._resume(future, loop, submitted.result())
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent store of the category graph of wikis.
+
+L{CategoryGraph} stores the members of each category in an SQLite database,
+with one row per category and per edge between a category and a member. The
+edges are indexed in both directions, so the subcategories and the
+supercategories of a category are found without loading the whole graph.
+
+A category which was stored before is refreshed incrementally: only the
+members added since the last refresh are requested, sorted by the timestamp
+at which they were added. If the number of members then differs from the
+category information of the wiki, members were removed and all members of
+the category are requested again.
+"""
+#
+# (C) Pywikibot team, 2017
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+__version__ = '$Id$'
+
+import datetime
+import threading
+import time
+
+try:
+    import sqlite3
+except ImportError as e:
+    sqlite3 = e
+
+import pywikibot
+
+from pywikibot import config2 as config
+from pywikibot.data import api
+from pywikibot.tools import itergroup
+
+_logger = 'data.categorygraph'
+
+
+class CategoryGraph(object):
+
+    """
+    Categories and their members stored in an SQLite database.
+
+    The stored members of a category are used as long as they are younger
+    than max_age, otherwise the category is refreshed when its members are
+    requested. The database may contain the categories of several sites.
+    """
+
+    #: The members added this many seconds before a refresh are requested
+    #: again at the next refresh, in case the clocks differ.
+    refresh_margin = 300
+
+    def __init__(self, filename=None, max_age=None):
+        """
+        Constructor.
+
+        @param filename: the database file; config.category_graph_file or
+            categories.sqlite in the base directory if None
+        @type filename: str
+        @param max_age: the age in hours after which a category is refreshed;
+            config.category_graph_max_age if None
+        @type max_age: float
+        """
+        if isinstance(sqlite3, ImportError):
+            raise sqlite3
+        if filename is None:
+            filename = config.category_graph_file or config.datafilepath(
+                'categories.sqlite')
+        if max_age is None:
+            max_age = config.category_graph_max_age
+        self.filename = filename
+        self.max_age = max_age * 3600
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(filename, timeout=60,
+                                           check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS categories ('
+                'site TEXT NOT NULL, title TEXT NOT NULL, '
+                'size INTEGER NOT NULL, since TEXT NOT NULL, '
+                'refreshed REAL NOT NULL, PRIMARY KEY (site, title))')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS members ('
+                'site TEXT NOT NULL, category TEXT NOT NULL, '
+                'member TEXT NOT NULL, ns INTEGER NOT NULL, '
+                'PRIMARY KEY (site, category, member))')
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS members_member '
+                'ON members (site, member, ns)')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS supercategories ('
+                'site TEXT NOT NULL, title TEXT NOT NULL, '
+                'refreshed REAL NOT NULL, PRIMARY KEY (site, title))')
+
+    @staticmethod
+    def _key(site):
+        """Return the key of the site."""
+        return '{0}:{1}'.format(site.family.name, site.code)
+
+    @staticmethod
+    def _title(page):
+        """Return the title of the page as stored in the database."""
+        return page.title(withSection=False)
+
+    def _refreshed(self, table, category):
+        """Return the time of the last refresh or None if it is too old."""
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT refreshed FROM {0} WHERE site = ? AND title = ?'
+                ''.format(table),
+                (self._key(category.site), self._title(category))).fetchone()
+        if row is None or row[0] < time.time() - self.max_age:
+            return None
+        return row[0]
+
+    def _stored(self, category):
+        """Return the size and the since timestamp of a stored category."""
+        with self._lock:
+            return self._connection.execute(
+                'SELECT size, since FROM categories '
+                'WHERE site = ? AND title = ?',
+                (self._key(category.site),
+                 self._title(category))).fetchone()
+
+    def _count(self, category):
+        """Return the number of stored members of the category."""
+        with self._lock:
+            return self._connection.execute(
+                'SELECT count(*) FROM members '
+                'WHERE site = ? AND category = ?',
+                (self._key(category.site),
+                 self._title(category))).fetchone()[0]
+
+    def _store(self, category, members, size, since, full):
+        """Store the members of the category."""
+        key = self._key(category.site)
+        title = self._title(category)
+        rows = [(key, title, self._title(member), int(member.namespace()))
+                for member in members]
+        with self._lock:
+            with self._connection:
+                if full:
+                    self._connection.execute(
+                        'DELETE FROM members WHERE site = ? AND category = ?',
+                        (key, title))
+                self._connection.executemany(
+                    'INSERT OR IGNORE INTO members '
+                    '(site, category, member, ns) VALUES (?, ?, ?, ?)', rows)
+                self._connection.execute(
+                    'INSERT OR REPLACE INTO categories '
+                    '(site, title, size, since, refreshed) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (key, title, size, since, time.time()))
+
+    @staticmethod
+    def _sizes(categories):
+        """
+        Return the number of members of the categories.
+
+        @param categories: categories of one site
+        @type categories: list of Category
+        @rtype: dict
+        """
+        site = categories[0].site
+        sizes = dict((category.title(withSection=False), 0)
+                     for category in categories)
+        for group in itergroup(list(sizes), 50):
+            gen = api.PropertyGenerator('categoryinfo', site=site,
+                                        parameters={'titles': group})
+            for pagedata in gen:
+                if 'categoryinfo' in pagedata:
+                    sizes[pagedata['title']] = (
+                        pagedata['categoryinfo']['size'])
+        return sizes
+
+    def refresh(self, category, full=False, size=None):
+        """
+        Retrieve the members of the category and store them.
+
+        If the category was stored before, only the members added since then
+        are retrieved. If the number of stored members then differs from
+        size, members were removed and all members are retrieved.
+
+        @param category: the category to refresh
+        @type category: Category
+        @param full: retrieve all members even if the category was stored
+        @type full: bool
+        @param size: the number of members of the category; it is retrieved
+            if the category was stored before and it is None
+        @type size: int
+        """
+        since = pywikibot.Timestamp.utcnow() - datetime.timedelta(
+            seconds=self.refresh_margin)
+        stored = None if full else self._stored(category)
+        if stored is not None:
+            if size is None:
+                size = self._sizes([category])[category.title(
+                    withSection=False)]
+            members = list(category.site.categorymembers(
+                category, sortby='timestamp',
+                starttime=pywikibot.Timestamp.fromISOformat(stored[1])))
+            self._store(category, members, size, since.isoformat(), False)
+            if self._count(category) == size:
+                pywikibot.debug('{0} refreshed with {1} new members'.format(
+                    category, len(members)), _logger)
+                return
+        members = list(category.site.categorymembers(category))
+        self._store(category, members, len(members), since.isoformat(), True)
+        pywikibot.debug('{0} loaded with {1} members'.format(
+            category, len(members)), _logger)
+
+    def members(self, category, namespaces=None):
+        """
+        Return the members of the category.
+
+        The category is refreshed if it is not stored or too old.
+
+        @param category: the category
+        @type category: Category
+        @param namespaces: only return members in these namespaces
+        @type namespaces: iterable of int
+        @rtype: list of Page
+        """
+        if self._refreshed('categories', category) is None:
+            self.refresh(category)
+        query = ('SELECT member, ns FROM members '
+                 'WHERE site = ? AND category = ?')
+        with self._lock:
+            rows = self._connection.execute(
+                query, (self._key(category.site),
+                        self._title(category))).fetchall()
+        return [self._page(category.site, title, ns) for title, ns in rows
+                if namespaces is None or ns in namespaces]
+
+    @staticmethod
+    def _page(site, title, ns):
+        """Return the page of a stored member."""
+        if ns == 14:
+            return pywikibot.Category(site, title)
+        return pywikibot.Page(site, title)
+
+    def subcategories(self, category):
+        """
+        Return the subcategories of the category.
+
+        @rtype: list of Category
+        """
+        return self.members(category, namespaces=[14])
+
+    def articles(self, category):
+        """
+        Return the members of the category which are not categories.
+
+        @rtype: list of Page
+        """
+        return [page for page in self.members(category)
+                if page.namespace() != 14]
+
+    def supercategories(self, category):
+        """
+        Return the categories which contain the category.
+
+        The categories of the category page are requested if they were not
+        stored or they are too old.
+
+        @rtype: list of Category
+        """
+        key = self._key(category.site)
+        title = self._title(category)
+        if self._refreshed('supercategories', category) is None:
+            rows = [(key, self._title(supercat), title, 14)
+                    for supercat in category.categories()]
+            with self._lock:
+                with self._connection:
+                    self._connection.execute(
+                        'DELETE FROM members WHERE site = ? AND member = ? '
+                        'AND ns = 14', (key, title))
+                    self._connection.executemany(
+                        'INSERT OR IGNORE INTO members '
+                        '(site, category, member, ns) VALUES (?, ?, ?, ?)',
+                        rows)
+                    self._connection.execute(
+                        'INSERT OR REPLACE INTO supercategories '
+                        '(site, title, refreshed) VALUES (?, ?, ?)',
+                        (key, title, time.time()))
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT category FROM members '
+                'WHERE site = ? AND member = ? AND ns = 14',
+                (key, title)).fetchall()
+        return [pywikibot.Category(category.site, row[0]) for row in rows]
+
+    def _subcategories(self, category, **kwargs):
+        """Return the stored subcategories for L{Category.crawl}."""
+        return self.subcategories(category)
+
+    def descendants(self, category, depth=None, workers=None):
+        """
+        Yield the subcategories of the category tree breadth-first.
+
+        Each category is yielded once with its depth; the depth of the
+        subcategories of the category is 1. The tree is crawled by
+        L{Category.crawl} with the stored subcategories, so the categories
+        which must be refreshed are refreshed in background threads.
+
+        @param category: the root of the tree
+        @type category: Category
+        @param depth: the maximum depth of the yielded categories; no limit
+            if None
+        @type depth: int
+        @param workers: the number of categories which are refreshed at the
+            same time; config.category_crawl_workers if None
+        @type workers: int
+        @rtype: generator of tuple (Category, int)
+        """
+        if depth is not None and depth < 1:
+            return
+        yielded = set([category])
+        for member in category.crawl(
+                recurse=True if depth is None else depth - 1,
+                member_type='subcat', workers=workers,
+                members=self._subcategories):
+            if member.page not in yielded:
+                yielded.add(member.page)
+                yield member.page, member.depth + 1
+
+    def refresh_tree(self, category, depth=None, workers=None):
+        """
+        Refresh the categories of the tree which are not stored or too old.
+
+        @param category: the root of the tree
+        @type category: Category
+        @param depth: the maximum depth of the refreshed categories; the
+            depth of the subcategories of the category is 1; no limit if None
+        @type depth: int
+        @param workers: the number of categories which are refreshed at the
+            same time; config.category_crawl_workers if None
+        @type workers: int
+        @return: the number of subcategories in the tree up to the depth
+        @rtype: int
+        """
+        # the categories up to the depth are refreshed to find those below
+        subcats = self.descendants(category,
+                                   None if depth is None else depth + 1,
+                                   workers)
+        return sum(1 for subcat, level in subcats
+                   if depth is None or level <= depth)
+
+    def clear(self, site=None):
+        """
+        Remove the stored categories.
+
+        @param site: only remove the categories of this site
+        @type site: BaseSite
+        """
+        with self._lock:
+            with self._connection:
+                for table in ('categories', 'members', 'supercategories'):
+                    if site is None:
+                        self._connection.execute(
+                            'DELETE FROM {0}'.format(table))
+                    else:
+                        self._connection.execute(
+                            'DELETE FROM {0} WHERE site = ?'.format(table),
+                            (self._key(site), ))
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental decoding of JSON documents.
+
+L{iterparse} decodes a JSON object from chunks of bytes while they are
+received. The items of one nested object or array are yielded as soon as
+each of them is decoded, so neither the complete text nor the decoded items
+need to be kept in memory at the same time:
+
+>>> chunks = [b'{"query": {"pages": {"1": {"title": "Foo"}, "2"',
+...           b': {"title": "Bar"}}}, "batchcomplete": ""}']
+>>> for event, value in iterparse(chunks, ('query', 'pages')):
+...     print(event, ', '.join(sorted(value)))
+start query
+item title
+item title
+end batchcomplete, query
+
+The other values of the document are decoded completely by L{json}.
+"""
+#
+# (C) Pywikibot team, 2017
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, print_function, unicode_literals
+
+__version__ = '$Id$'
+
+import codecs
+import json
+import re
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r'[ \t\n\r]*')
+
+
+class _Reader(object):
+
+    """Text which is decoded from chunks of bytes when it is needed."""
+
+    def __init__(self, chunks, encoding):
+        """
+        Constructor.
+
+        @param chunks: the chunks of the encoded text
+        @type chunks: iterable of bytes
+        @param encoding: the encoding of the text
+        @type encoding: str
+        """
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def read(self, size=0):
+        """
+        Read at least one chunk and until more than size chars are unread.
+
+        The text before the current position is dropped.
+
+        @return: False if the end of the chunks was reached before
+        @rtype: bool
+        """
+        if self.eof:
+            return False
+        parts = [self.text[self.pos:]]
+        length = len(parts[0])
+        while True:
+            try:
+                chunk = next(self._chunks)
+            except StopIteration:
+                part = self._decoder.decode(b'', True)
+                self.eof = True
+            else:
+                part = self._decoder.decode(chunk)
+            parts.append(part)
+            length += len(part)
+            if self.eof or length > size:
+                break
+        self.text = ''.join(parts)
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """
+        Skip whitespace and return the next char.
+
+        @return: the next char or an empty string at the end of the text
+        @rtype: unicode
+        """
+        while True:
+            self.pos = _whitespace.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.read():
+                return ''
+
+    def expect(self, char):
+        """Skip the next char, which must be the given one."""
+        if self.peek() != char:
+            raise ValueError('Expecting {0!r} at char {1!r}'.format(
+                char, self.peek()))
+        self.pos += 1
+
+    def value(self):
+        """Decode the next value."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except ValueError:
+                # the text may be incomplete; read at least as much again,
+                # so that decoding a large value doesn't take quadratic time
+                if not self.read(2 * (len(self.text) - self.pos)):
+                    raise
+                continue
+            # a number might continue in the next chunk
+            if end < len(self.text) or not self.read():
+                self.pos = end
+                return value
+
+    def members(self):
+        """
+        Yield the keys of an object after its '{'.
+
+        The value of each key must be read before the next key is requested.
+        """
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                raise ValueError('Expecting property name')
+            key = self.value()
+            self.expect(':')
+            yield key
+            char = self.peek()
+            self.pos += 1
+            if char == '}':
+                return
+            if char != ',':
+                raise ValueError("Expecting ',' delimiter")
+
+    def elements(self):
+        """Yield the values of an array after its '['."""
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            char = self.peek()
+            self.pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError("Expecting ',' delimiter")
+
+
+def _iter_object(reader, obj, path, result):
+    """Decode the members of an object and its items at the path."""
+    for key in reader.members():
+        char = reader.peek()
+        if key != path[0] or char not in (('{', '[') if len(path) == 1
+                                          else ('{', )):
+            obj[key] = reader.value()
+        elif len(path) > 1:
+            reader.pos += 1
+            obj[key] = {}
+            for event in _iter_object(reader, obj[key], path[1:], result):
+                yield event
+        else:
+            reader.pos += 1
+            yield 'start', result
+            if char == '{':
+                for key in reader.members():
+                    yield 'item', reader.value()
+            else:
+                for value in reader.elements():
+                    yield 'item', value
+
+
+def iterparse(chunks, path, encoding='utf-8'):
+    """
+    Decode a JSON object and yield the items at the path while decoding.
+
+    The events are tuples of a name and a value:
+
+     - 'start': the items at the path follow; the value is the object
+       decoded so far. It does not contain the last key of the path.
+     - 'item': the value is the next item at the path. The items of an
+       object are yielded without their keys.
+     - 'end': the value is the complete object without the items.
+
+    The object is updated in place, so the values after the items are added
+    to the same object.
+
+    @param chunks: the chunks of the encoded JSON text
+    @type chunks: iterable of bytes
+    @param path: the keys of the objects which contain the items
+    @type path: tuple of unicode
+    @param encoding: the encoding of the text
+    @type encoding: str
+    @rtype: generator of tuple (str, object)
+    @raise ValueError: the text is not a valid JSON object
+    """
+    reader = _Reader(chunks, encoding)
+    result = {}
+    reader.expect('{')
+    for event in _iter_object(reader, result, path, result):
+        yield event
+    if reader.peek():
+        raise ValueError('Extra data after the JSON object')
+    yield 'end', result
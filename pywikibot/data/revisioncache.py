@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent cache of revision texts.
+
+The texts of the latest revisions loaded by L{APISite.loadrevisions} and
+L{APISite.preloadpages} are stored on disk with the site and the revision id
+as key. When a page is loaded again, only the id of its latest revision is
+requested and the text is taken from the cache if that revision is known.
+A revision never changes, so a cached revision never needs to be refreshed.
+
+The cache is enabled by setting config.revision_cache_size to the maximum
+size of the cache file in MiB. When the cache grows larger, the revisions
+which were used least recently are removed.
+"""
+#
+# (C) Pywikibot team, 2017
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+__version__ = '$Id$'
+
+import json
+import threading
+import time
+import zlib
+
+import pywikibot
+
+from pywikibot import config2 as config
+from pywikibot.data.sqlitecache import sqlite3, SQLiteLRUCache
+
+_logger = 'data.revisioncache'
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_revision_cache():
+    """
+    Return the revision cache if it is enabled in the config.
+
+    @rtype: RevisionCache or None
+    """
+    if config.revision_cache_size <= 0:
+        return None
+    filename = config.revision_cache_file or config.datafilepath(
+        'revisions.sqlite')
+    with _caches_lock:
+        if filename not in _caches:
+            _caches[filename] = RevisionCache(
+                filename, config.revision_cache_size * 1024 * 1024)
+        return _caches[filename]
+
+
+class RevisionCache(SQLiteLRUCache):
+
+    """
+    Revisions stored in an SQLite database with LRU eviction.
+
+    A revision is stored as the revision dict of the API response, which
+    contains the text in the '*' key. The dicts are stored compressed.
+
+    The database may be shared by several processes.
+    """
+
+    table = 'revisions'
+    key_columns = ('site', 'revid')
+    schema = (
+        'CREATE TABLE IF NOT EXISTS revisions ('
+        'site TEXT NOT NULL, revid INTEGER NOT NULL, '
+        'data BLOB NOT NULL, size INTEGER NOT NULL, '
+        'accessed REAL NOT NULL, PRIMARY KEY (site, revid))',
+        'CREATE INDEX IF NOT EXISTS revisions_accessed '
+        'ON revisions (accessed)',
+    )
+
+    def __init__(self, filename, max_size):
+        """
+        Constructor.
+
+        @param filename: the database file
+        @type filename: str
+        @param max_size: the maximum size of the stored revisions in bytes
+        @type max_size: int
+        """
+        super(RevisionCache, self).__init__(filename, max_size)
+        self.filename = filename
+
+    @staticmethod
+    def _key(site):
+        """Return the key of the site."""
+        return '{0}:{1}'.format(site.family.name, site.code)
+
+    def get(self, site, revid):
+        """
+        Return the revision dict or None if it is not cached.
+
+        @param site: the site of the revision
+        @type site: BaseSite
+        @param revid: the revision id
+        @type revid: int
+        @rtype: dict or None
+        """
+        key = self._key(site)
+        with self._lock:
+            with self._connection:
+                row = self._connection.execute(
+                    'SELECT data FROM revisions WHERE site = ? AND revid = ?',
+                    (key, revid)).fetchone()
+                if row is None:
+                    return None
+                self._connection.execute(
+                    'UPDATE revisions SET accessed = ? '
+                    'WHERE site = ? AND revid = ?', (time.time(), key, revid))
+        pywikibot.debug('Revision {0} of {1} loaded from the cache'.format(
+            revid, key), _logger)
+        return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+
+    def store(self, site, revision):
+        """
+        Store a revision dict, which must contain the revision text.
+
+        @param site: the site of the revision
+        @type site: BaseSite
+        @param revision: the revision dict of the API response
+        @type revision: dict
+        """
+        data = zlib.compress(json.dumps(revision).encode('utf-8'))
+        with self._lock:
+            self._insert({'site': self._key(site),
+                          'revid': revision['revid'],
+                          'data': sqlite3.Binary(data),
+                          'accessed': time.time()}, len(data))
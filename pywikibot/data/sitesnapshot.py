@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent snapshots of the configuration of sites.
+
+A snapshot stores the siteinfo properties and the API parameter information
+which were loaded for a site in a JSON file, one file per site. When an
+L{APISite} is constructed, its snapshot is restored, so the namespaces, the
+interwiki map, the magic words and the API modules which were used before are
+available without any request. The snapshot is written when Python exits if
+these data changed.
+
+A snapshot whose general siteinfo is older than config.site_snapshot_expiry
+days is still used, but it is refreshed in a background thread. If the
+MediaWiki version of the site changed, the stored parameter information is
+discarded and requested again when it is used.
+
+The snapshots are enabled by setting config.use_site_snapshots to True.
+"""
+#
+# (C) Pywikibot team, 2017
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+__version__ = '$Id$'
+
+import atexit
+import codecs
+import copy
+import datetime
+import json
+import threading
+
+import pywikibot
+
+from pywikibot import config2 as config
+from pywikibot.data import api
+
+_logger = 'data.sitesnapshot'
+
+
+class SiteSnapshot(object):
+
+    """The siteinfo and the parameter information of a site in a file."""
+
+    #: The format of the snapshot file; other formats are ignored
+    version = 1
+
+    #: The siteinfo properties which are requested at every refresh
+    properties = ('general', 'namespaces', 'namespacealiases',
+                  'interwikimap', 'magicwords')
+
+    def __init__(self, site, filename=None):
+        """
+        Constructor.
+
+        @param site: the site of the snapshot
+        @type site: APISite
+        @param filename: the snapshot file; the file of the site in the
+            snapshots directory of the base directory if None
+        @type filename: str
+        """
+        if filename is None:
+            filename = config.datafilepath(
+                'snapshots', '{0}-{1}.json'.format(site.family.name,
+                                                   site.code))
+        self.site = site
+        self.filename = filename
+        self._lock = threading.RLock()
+        self._stored = None
+        self._thread = None
+
+    def _key(self):
+        """Return the key of the site."""
+        return '{0}:{1}'.format(self.site.family.name, self.site.code)
+
+    def _read(self):
+        """Return the stored snapshot or None if it is invalid."""
+        try:
+            with codecs.open(self.filename, 'r', 'utf-8') as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if (not isinstance(data, dict) or
+                data.get('version') != self.version or
+                data.get('site') != self._key()):
+            return None
+        return data
+
+    def dump(self):
+        """
+        Return the snapshot of the data loaded for the site.
+
+        @rtype: dict
+        """
+        with self._lock:
+            return {
+                'version': self.version,
+                'site': self._key(),
+                'siteinfo': self.site.siteinfo.snapshot(),
+                'paraminfo': self.site._paraminfo.snapshot(),
+            }
+
+    def load(self):
+        """
+        Restore the snapshot of the site if it is stored.
+
+        The snapshot is refreshed in a background thread if it is expired,
+        and it is saved when Python exits.
+
+        @return: whether a snapshot was restored
+        @rtype: bool
+        """
+        atexit.register(self.save)
+        data = self._read()
+        if data is None:
+            pywikibot.debug('No snapshot of %s', _logger, self.site)
+            return False
+        with self._lock:
+            # the restored data may be changed by the site
+            self._stored = copy.deepcopy(data)
+        self.site.siteinfo.restore(data['siteinfo'])
+        if data['paraminfo'] is not None:
+            self.site._paraminfo.restore(data['paraminfo'])
+        pywikibot.debug('Snapshot of %s restored', _logger, self.site)
+        if self.expired():
+            self._thread = threading.Thread(
+                target=self._refresh_in_background,
+                name='Refresh snapshot of {0}'.format(self.site))
+            self._thread.daemon = True
+            self._thread.start()
+        return True
+
+    def expired(self):
+        """Return whether the general siteinfo is older than the expiry."""
+        cache_time = self.site.siteinfo.get_requested_time('general')
+        return not cache_time or cache_time + datetime.timedelta(
+            days=config.site_snapshot_expiry) < datetime.datetime.utcnow()
+
+    def _refresh_in_background(self):
+        """Refresh the snapshot and log the errors."""
+        try:
+            self.refresh()
+        except Exception as e:
+            pywikibot.log('Unable to refresh the snapshot of %s: %r',
+                          self.site, e)
+
+    def refresh(self):
+        """
+        Request the cached siteinfo properties again and save the snapshot.
+
+        The parameter information is discarded if the MediaWiki version of
+        the site changed.
+        """
+        siteinfo = self.site.siteinfo
+        old = None
+        if siteinfo.get_requested_time('general'):
+            old = siteinfo['generator']
+        props = set(self.properties)
+        props.update(list(siteinfo._cache))
+        refreshed = siteinfo._get_siteinfo(sorted(props), None)
+        with self._lock:
+            # The site may use the data in other threads, so the new data
+            # replace the dict and the parameter information instead of
+            # changing them.
+            cache = dict(siteinfo._cache)
+            cache.update(refreshed)
+            siteinfo._cache = cache
+            new = siteinfo['generator']
+            if old != new:
+                pywikibot.log('The version of %s changed from %s to %s',
+                              self.site, old, new)
+                self.site._paraminfo = api.ParamInfo(self.site)
+        self.save()
+
+    def save(self):
+        """Write the snapshot if the data loaded for the site changed."""
+        with self._lock:
+            data = self.dump()
+            if not data['siteinfo'] or data == self._stored:
+                return
+            try:
+                with codecs.open(self.filename, 'w', 'utf-8') as f:
+                    json.dump(data, f)
+            except (IOError, OSError) as e:
+                pywikibot.debug('Unable to store the snapshot of %s: %s',
+                                _logger, self.site, e)
+            else:
+                self._stored = data
+                pywikibot.debug('Snapshot of %s stored', _logger, self.site)
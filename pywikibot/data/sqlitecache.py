@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Size bounded caches in an SQLite database.
+
+The entries of a cache are the rows of one table, which has a column with
+the size of each entry and a column with the time it was accessed last.
+When the entries grow larger than the maximum size, the least recently used
+entries are removed. The database may be shared by several processes.
+
+This is the base of L{apicache.SQLiteCacheBackend} and
+L{revisioncache.RevisionCache}.
+"""
+#
+# (C) Pywikibot team, 2017
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+__version__ = '$Id$'
+
+import threading
+
+try:
+    import sqlite3
+except ImportError as e:
+    sqlite3 = e
+
+import pywikibot
+
+_logger = 'data.sqlitecache'
+
+
+class SQLiteLRUCache(object):
+
+    """
+    Base class of a table of entries with least recently used eviction.
+
+    Subclasses define the table and its key columns. The table must have the
+    columns 'size' and 'accessed' and an index on 'accessed'.
+    """
+
+    #: The name of the table
+    table = None
+
+    #: The columns of the primary key
+    key_columns = ()
+
+    #: The statements which create the table and its indexes
+    schema = ()
+
+    #: Fraction of the maximum size to which the cache is reduced
+    evict_to = 0.9
+
+    def __init__(self, filename, max_size=0):
+        """
+        Constructor.
+
+        @param filename: the database file
+        @type filename: basestring
+        @param max_size: the maximum size of the entries in bytes; unlimited
+            if it is not positive
+        @type max_size: int
+        """
+        if isinstance(sqlite3, ImportError):
+            raise sqlite3
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(filename, timeout=60,
+                                           check_same_thread=False)
+        with self._connection:
+            for statement in self.schema:
+                self._connection.execute(statement)
+        self._size = self._stored_size()
+
+    def _stored_size(self):
+        """Return the size of all stored entries."""
+        return self._connection.execute(
+            'SELECT total(size) FROM {0}'.format(self.table)).fetchone()[0]
+
+    def _insert(self, values, size):
+        """
+        Insert or replace an entry and evict entries if it is too large.
+
+        The caller must hold the lock.
+
+        @param values: the values of the columns
+        @type values: dict
+        @param size: the size of the entry
+        @type size: int
+        """
+        values = dict(values, size=size)
+        columns = sorted(values)
+        with self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO {0} ({1}) VALUES ({2})'.format(
+                    self.table, ', '.join(columns),
+                    ', '.join('?' * len(columns))),
+                [values[column] for column in columns])
+        self._size += size
+        if 0 < self.max_size < self._size:
+            self._evict()
+
+    def _evict(self):
+        """Delete the least recently used entries."""
+        # other processes may have changed the size
+        self._size = self._stored_size()
+        excess = self._size - self.max_size * self.evict_to
+        if excess <= 0:
+            return
+        removed = 0
+        keys = []
+        with self._connection:
+            cursor = self._connection.execute(
+                'SELECT {0}, size FROM {1} ORDER BY accessed'.format(
+                    ', '.join(self.key_columns), self.table))
+            for row in cursor:
+                keys.append(row[:-1])
+                removed += row[-1]
+                if removed >= excess:
+                    break
+            cursor.close()
+            self._connection.executemany(
+                'DELETE FROM {0} WHERE {1}'.format(
+                    self.table, ' AND '.join(
+                        '{0} = ?'.format(column)
+                        for column in self.key_columns)),
+                keys)
+        self._size -= removed
+        pywikibot.debug('Removed %d entries from the table %s', _logger,
+                        len(keys), self.table)
+
+    def clear(self):
+        """Delete all entries."""
+        with self._lock:
+            with self._connection:
+                self._connection.execute(
+                    'DELETE FROM {0}'.format(self.table))
+            self._size = 0
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._connection.close()
@@ -19,8 +19,9 @@ import calendar
 import datetime
 import re
 import sys
+import threading
 
-from pywikibot.tools import first_lower, first_upper, deprecated
+from pywikibot.tools import first_lower, first_upper, deprecated, OrderedDict
 
 if sys.version_info[0] > 2:
     unicode = str
@@ -214,6 +215,8 @@ def slh(value, lst):
 
     """
     if isinstance(value, basestring):
+        if _samples is not None:
+            _samples.extend(lst)
         return lst.index(value) + 1
     else:
         return lst[value - 1]
@@ -232,6 +235,8 @@ def dh_constVal(value, ind, match):
 
     """
     if isinstance(value, basestring):
+        if _samples is not None:
+            _samples.append(match)
         if value == match:
             return ind
         else:
@@ -361,6 +366,15 @@ _escPtrnCache2 = {}
 
 _listTypes = [list, tuple]
 
+# Runs of the digits of all parameters; a title and a pattern which matches it
+# are the same if each run is replaced by one digit.
+_reDigitRuns = re.compile(u'[%s]+' % u''.join(
+    re.escape(dec[0]) for dec in _digitDecoders.values()
+    if not isinstance(dec, basestring)))
+
+# The strings which the formats accept while _getAutoFormatIndex collects them
+_samples = None
+
 
 def escapePattern2(pattern):
     """
@@ -444,6 +458,9 @@ def dh(value, pattern, encf, decf, filter=None):
     """
     compPattern, strPattern, decoders = escapePattern2(pattern)
     if isinstance(value, basestring):
+        if _samples is not None:
+            # any digit of each parameter
+            _samples.append(strPattern % tuple(dec[0][0] for dec in decoders))
         m = compPattern.match(value)
         if m:
             # decode each found value using provided decoder
@@ -2345,18 +2362,88 @@ def getNumberOfDaysInMonth(month):
     return calendar.monthrange(2000, month)[1]
 
 
+# The names of the formats by the skeletons of the titles they accept, per
+# language, and the results of the recent calls of getAutoFormat
+_autoFormatIndex = {}
+_autoFormatCache = OrderedDict()
+_autoFormatCacheSize = 1000
+_autoFormatLock = threading.RLock()
+
+
+def _skeleton(title):
+    """Return the title with each run of digits replaced by one digit."""
+    return _reDigitRuns.sub('0', title)
+
+
+def _getAutoFormatIndex(lang):
+    """
+    Return the names of the formats of a language per skeleton of a title.
+
+    Each format is called once with an empty string, which collects the
+    patterns and names it compares a title with. The formats which don't
+    collect anything are listed with the key None.
+
+    @param lang: language code
+    @rtype: dict
+    """
+    global _samples
+    with _autoFormatLock:
+        if lang not in _autoFormatIndex:
+            index = {}
+            for dictName, dict in formats.items():
+                if lang not in dict:
+                    continue
+                _samples = []
+                try:
+                    dict[lang]('')
+                except Exception:
+                    pass
+                finally:
+                    samples, _samples = _samples, None
+                keys = set(_skeleton(sample) for sample in samples) or [None]
+                for key in keys:
+                    index.setdefault(key, []).append(dictName)
+            _autoFormatIndex[lang] = index
+        return _autoFormatIndex[lang]
+
+
 def getAutoFormat(lang, title, ignoreFirstLetterCase=True):
     """
     Return first matching formatted date value.
 
+    Only the formats which accept titles with the same skeleton are tried,
+    and the results of the recent titles are cached.
+
     @param lang: language code
     @param title: value to format
     @return: dictName ('YearBC', 'December', ...) and value (a year, date, ...)
     @rtype: tuple
     """
-    for dictName, dict in formats.items():
+    key = (lang, title, ignoreFirstLetterCase)
+    with _autoFormatLock:
+        if key in _autoFormatCache:
+            # move it to the end of the recently used results
+            result = _autoFormatCache[key] = _autoFormatCache.pop(key)
+            return result
+    result = _getAutoFormat(lang, title, ignoreFirstLetterCase)
+    with _autoFormatLock:
+        _autoFormatCache[key] = result
+        if len(_autoFormatCache) > _autoFormatCacheSize:
+            _autoFormatCache.popitem(last=False)
+    return result
+
+
+def _getAutoFormat(lang, title, ignoreFirstLetterCase):
+    """Return first matching formatted date value without the cache."""
+    index = _getAutoFormatIndex(lang)
+    dictNames = index.get(_skeleton(title), [])
+    if None in index:
+        dictNames = set(dictNames + index[None])
+        dictNames = [dictName for dictName in formats
+                     if dictName in dictNames]
+    for dictName in dictNames:
         try:
-            year = dict[lang](title)
+            year = formats[dictName][lang](title)
             return dictName, year
         except:
             pass
@@ -2369,7 +2456,7 @@ def getAutoFormat(lang, title, ignoreFirstLetterCase=True):
                 title = first_lower(title)
             else:
                 title = first_upper(title)
-            return getAutoFormat(lang, title, ignoreFirstLetterCase=False)
+            return _getAutoFormat(lang, title, ignoreFirstLetterCase=False)
         except:
             pass
     return None, None
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 """Objects representing MediaWiki families."""
 #
-# (C) Pywikibot team, 2004-2016
+# (C) Pywikibot team, 2004-2017
 #
 # Distributed under the terms of the MIT license.
 #
@@ -10,12 +10,16 @@ from __future__ import absolute_import, unicode_literals
 __version__ = '$Id$'
 #
 
+import codecs
 import collections
 import imp
+import json
 import logging
+import os
 import re
 import string
 import sys
+import threading
 import warnings
 
 if sys.version_info[0] > 2:
@@ -1662,3 +1666,157 @@ class AutoFamily(SingleSiteFamily):
             return self.url.path[0:-8]
         else:
             return super(AutoFamily, self).scriptpath(code)
+
+
+class FamilyRegistry(object):
+
+    """
+    Data of the family files which is stored in a file.
+
+    Finding the family of a URL requires the codes and hostnames of all
+    families, and loading a family imports its family file. The registry
+    stores these data for each family, so only the families which have a
+    code on the host of the URL are loaded. The entry of a family is renewed
+    when the modification time of its family file or of this module, which
+    implements the hostnames, changes.
+    """
+
+    def __init__(self, filename):
+        """
+        Constructor.
+
+        @param filename: the file in which the registry is stored
+        @type filename: str
+        """
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._entries = None
+        module = __file__
+        if module.endswith(('.pyc', '.pyo')) and os.path.exists(module[:-1]):
+            module = module[:-1]
+        self._module_mtime = os.path.getmtime(module)
+
+    def _read(self):
+        """Return the stored entries or an empty dict if they are invalid."""
+        try:
+            with codecs.open(self.filename, 'r', 'utf-8') as f:
+                entries = json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def _write(self):
+        """Store the entries."""
+        try:
+            with codecs.open(self.filename, 'w', 'utf-8') as f:
+                json.dump(self._entries, f)
+        except (IOError, OSError) as e:
+            pywikibot.debug('Unable to store the family registry: %s',
+                            'wiki.family', e)
+
+    def _entry(self, family, filename, mtime):
+        """Return the registry entry of the family."""
+        hostnames = {}
+        try:
+            if family._ignore_from_url is not True:
+                for code in family.codes:
+                    if code not in family._ignore_from_url:
+                        hostnames[code] = family._hostname(code)[1]
+        except Exception as e:
+            # the family is checked for every URL
+            pywikibot.debug('Unable to get the hostnames of %s: %r',
+                            'wiki.family', family, e)
+            hostnames = None
+        return {
+            'file': filename,
+            'mtime': mtime,
+            'module_mtime': self._module_mtime,
+            'hostnames': hostnames,
+        }
+
+    def get(self, fam):
+        """
+        Return the entry of the family.
+
+        The family is loaded if it has no entry or its family file changed.
+
+        @param fam: family name
+        @type fam: str
+        @return: the family file, its modification time, the modification
+            time of this module and the hostname of each code (None if
+            unknown)
+        @rtype: dict
+        @raises UnknownFamily: family not known
+        """
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._read()
+            entry, changed = self._get(fam)
+            if changed:
+                self._write()
+        return entry
+
+    def _get(self, fam):
+        """Return the entry of the family and whether it was renewed."""
+        try:
+            filename = config.family_files[fam]
+        except KeyError:
+            raise UnknownFamily('Family %s does not exist' % fam)
+        mtime = os.path.getmtime(filename)
+        entry = self._entries.get(fam)
+        if (entry is not None and entry['file'] == filename and
+                entry['mtime'] == mtime and
+                entry.get('module_mtime') == self._module_mtime):
+            return entry, False
+        entry = self._entry(Family.load(fam), filename, mtime)
+        self._entries[fam] = entry
+        return entry, True
+
+    def families(self, url):
+        """
+        Return the names of the families which may contain the URL.
+
+        These are the families with a code whose hostname is the host of
+        the URL; L{Family.from_url} of them determines the code. The
+        families defined by the URL of their API are always returned.
+
+        @param url: the URL
+        @type url: str
+        @rtype: list of str
+        """
+        hostname = urlparse.urlparse(url).netloc
+        result = []
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._read()
+            renewed = False
+            for fam, filename in config.family_files.items():
+                if filename.startswith(('http://', 'https://')):
+                    result.append(fam)
+                    continue
+                entry, changed = self._get(fam)
+                renewed = renewed or changed
+                if (entry['hostnames'] is None or
+                        hostname in entry['hostnames'].values()):
+                    result.append(fam)
+            if renewed:
+                self._write()
+        return result
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_family_registry():
+    """
+    Return the family registry of the configured file.
+
+    @rtype: FamilyRegistry
+    """
+    filename = config.family_registry_file or config.datafilepath(
+        'families.json')
+    with _registries_lock:
+        if filename not in _registries:
+            _registries[filename] = FamilyRegistry(filename)
+        return _registries[filename]
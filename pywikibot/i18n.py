@@ -27,9 +27,13 @@ __version__ = '$Id$'
 #
 
 import json
+import mmap
 import os
 import pkgutil
 import re
+import struct
+import tempfile
+import zlib
 
 from collections import defaultdict, Mapping
 from warnings import warn
@@ -55,6 +59,12 @@ _messages_available = None
 # Cache of translated messages
 _cache = defaultdict(dict)
 
+# The opened catalogs, or None if there is none, by package name and bundle
+_catalogs = {}
+
+# The languages which twtranslate tries for a language
+_fallback_chains = {}
+
 
 def set_messages_package(package_name):
     """Set the package name where i18n messages are located."""
@@ -296,6 +306,23 @@ def _altlang(code):
     return []
 
 
+def _fallback_chain(lang):
+    """
+    Return the language and its fallback languages for twtranslate.
+
+    @param lang: The language code
+    @type lang: str
+    @rtype: tuple of str
+    """
+    if lang not in _fallback_chains:
+        chain = [lang]
+        for alt in _altlang(lang) + ['en']:
+            if alt not in chain:
+                chain.append(alt)
+        _fallback_chains[lang] = tuple(chain)
+    return _fallback_chains[lang]
+
+
 class TranslationError(Error, ImportError):
 
     """Raised when no correct translation could be found."""
@@ -307,15 +334,242 @@ class TranslationError(Error, ImportError):
     pass
 
 
+class _Catalog(object):
+
+    """
+    The messages of all languages of a bundle in one indexed file.
+
+    The file is mapped into memory and only the requested messages are
+    decoded. It starts with the magic bytes and a header of the number of
+    slots of the index and the position and length of the language list.
+    The index is a hash table of slots with the position and length of a
+    key and of its message. A key is the language and the message title
+    separated by a null char. Empty slots have a key of length 0.
+    """
+
+    magic = b'PWBI18N1'
+    header = struct.Struct(str('<III'))
+    slot = struct.Struct(str('<IIII'))
+
+    def __init__(self, filename):
+        """
+        Constructor.
+
+        @param filename: the catalog file
+        @type filename: str
+        @raise ValueError: the file is not a catalog
+        """
+        with open(filename, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        start = len(self.magic)
+        if self._map[:start] != self.magic:
+            self._map.close()
+            raise ValueError('{0} is not an i18n catalog'.format(filename))
+        self._slots, offset, length = self.header.unpack(
+            self._map[start:start + self.header.size])
+        self._index = start + self.header.size
+        self.languages = json.loads(
+            self._map[offset:offset + length].decode('utf-8'))
+
+    @staticmethod
+    def _key(lang, twtitle):
+        """Return the encoded key of a message."""
+        return '{0}\0{1}'.format(lang, twtitle).encode('utf-8')
+
+    @classmethod
+    def _hash(cls, key):
+        """Return the hash of an encoded key."""
+        return zlib.crc32(key) & 0xffffffff
+
+    def get(self, lang, twtitle):
+        """
+        Return the message of a language, or None if it is missing.
+
+        @param lang: The language code
+        @type lang: str
+        @param twtitle: The TranslateWiki string title
+        @type twtitle: str
+        @rtype: unicode or None
+        """
+        key = self._key(lang, twtitle)
+        slot = self._hash(key) % self._slots
+        while True:
+            position = self._index + slot * self.slot.size
+            key_offset, key_length, offset, length = self.slot.unpack(
+                self._map[position:position + self.slot.size])
+            if not key_length:
+                return None
+            if self._map[key_offset:key_offset + key_length] == key:
+                return self._map[offset:offset + length].decode('utf-8')
+            slot = (slot + 1) % self._slots
+
+    def close(self):
+        """Unmap the file."""
+        self._map.close()
+
+    @classmethod
+    def build(cls, directory, filename):
+        """
+        Write the messages of the JSON files in a directory to a catalog.
+
+        @param directory: the directory with a <lang>.json file per language
+        @type directory: str
+        @param filename: the catalog file
+        @type filename: str
+        @return: the number of messages
+        @rtype: int
+        """
+        languages = []
+        messages = []
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith('.json'):
+                continue
+            lang = name[:-len('.json')]
+            languages.append(lang)
+            with open(os.path.join(directory, name), 'rb') as f:
+                transdict = json.loads(f.read().decode('utf-8'))
+            for twtitle, message in sorted(transdict.items()):
+                # skip @metadata
+                if isinstance(message, StringTypes):
+                    messages.append((cls._key(lang, twtitle),
+                                     message.encode('utf-8')))
+
+        count = max(2 * len(messages), 1)
+        slots = [None] * count
+        for key, message in messages:
+            slot = cls._hash(key) % count
+            while slots[slot] is not None:
+                slot = (slot + 1) % count
+            slots[slot] = (key, message)
+
+        data = [json.dumps(languages).encode('utf-8')]
+        offset = len(cls.magic) + cls.header.size + count * cls.slot.size
+        index = []
+        position = offset + len(data[0])
+        for entry in slots:
+            if entry is None:
+                index.append(cls.slot.pack(0, 0, 0, 0))
+                continue
+            key, message = entry
+            index.append(cls.slot.pack(position, len(key),
+                                       position + len(key), len(message)))
+            data += [key, message]
+            position += len(key) + len(message)
+
+        # Other processes may have mapped the old catalog, which must not
+        # change under them. The new catalog is written to a temporary
+        # file which replaces the old file in one step.
+        fd, tempname = tempfile.mkstemp(dir=os.path.dirname(filename),
+                                        prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(cls.magic)
+                f.write(cls.header.pack(count, offset, len(data[0])))
+                f.write(b''.join(index))
+                f.write(b''.join(data))
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tempname, 0o666 & ~umask)
+            if hasattr(os, 'replace'):
+                os.replace(tempname, filename)
+            else:
+                if os.name == 'nt' and os.path.exists(filename):
+                    os.remove(filename)
+                os.rename(tempname, filename)
+        except Exception:
+            os.remove(tempname)
+            raise
+        return len(messages)
+
+
+def _package_directory():
+    """Return the directory of the messages package or None."""
+    try:
+        mod = __import__(_messages_package_name, fromlist=[str('__path__')])
+    except ImportError:
+        return None
+    return next(iter(mod.__path__))
+
+
+def _open_catalog(message_bundle):
+    """
+    Return the catalog of a bundle or None if it has no catalog.
+
+    A catalog which is older than a JSON file of the bundle is ignored.
+    """
+    directory = _package_directory()
+    if directory is None:
+        return None
+    filename = os.path.join(directory, message_bundle + '.catalog')
+    if not os.path.isfile(filename):
+        return None
+    bundle_directory = os.path.join(directory, message_bundle)
+    if os.path.isdir(bundle_directory):
+        mtime = os.path.getmtime(filename)
+        for name in os.listdir(bundle_directory):
+            if (name.endswith('.json') and os.path.getmtime(
+                    os.path.join(bundle_directory, name)) > mtime):
+                pywikibot.warning(
+                    'The i18n catalog {0} is older than {1} and is not '
+                    'used.'.format(filename, name))
+                return None
+    return _Catalog(filename)
+
+
+def _get_catalog(message_bundle):
+    """Return the opened catalog of a bundle or None."""
+    key = (_messages_package_name, message_bundle)
+    if key not in _catalogs:
+        _catalogs[key] = _open_catalog(message_bundle)
+    return _catalogs[key]
+
+
+def compile_catalogs():
+    """
+    Write a catalog for each bundle of the messages package.
+
+    The catalog of a bundle is written to <bundle>.catalog next to the
+    directory of the bundle. It is used instead of the JSON files until
+    a JSON file is changed. An existing catalog is replaced by the new
+    file, so processes which still map it keep reading the old messages.
+
+    @return: the catalog files
+    @rtype: list of str
+    @raise TranslationError: the messages package is not available
+    """
+    directory = _package_directory()
+    if directory is None:
+        raise TranslationError('Unable to load messages package {0}'.format(
+            _messages_package_name))
+    filenames = []
+    for name in sorted(os.listdir(directory)):
+        bundle_directory = os.path.join(directory, name)
+        if not os.path.isdir(bundle_directory):
+            continue
+        if not any(filename.endswith('.json')
+                   for filename in os.listdir(bundle_directory)):
+            continue
+        catalog = _catalogs.pop((_messages_package_name, name), None)
+        if catalog is not None:
+            catalog.close()
+        filename = os.path.join(directory, name + '.catalog')
+        _Catalog.build(bundle_directory, filename)
+        filenames.append(filename)
+    return filenames
+
+
 def _get_translation(lang, twtitle):
     """
     Return message of certain twtitle if exists.
 
     For internal use, don't use it directly.
     """
+    message_bundle = twtitle.split('-')[0]
+    catalog = _get_catalog(message_bundle)
+    if catalog is not None:
+        return catalog.get(lang, twtitle)
     if twtitle in _cache[lang]:
         return _cache[lang][twtitle]
-    message_bundle = twtitle.split('-')[0]
     trans_text = None
     filename = '%s/%s.json' % (message_bundle, lang)
     try:
@@ -612,9 +866,7 @@ def twtranslate(code, twtitle, parameters=None, fallback=True,
     # There are two possible failure modes: the translation dict might not have
     # the language altogether, or a specific key could be untranslated. Both
     # modes are caught with the KeyError.
-    langs = [lang]
-    if fallback:
-        langs += _altlang(lang) + ['en']
+    langs = _fallback_chain(lang) if fallback else (lang, )
     for alt in langs:
         trans = _get_translation(alt, twtitle)
         if trans:
@@ -697,13 +949,17 @@ def twget_keys(twtitle):
     """
     # obtain the directory containing all the json files for this package
     package = twtitle.split("-")[0]
-    mod = __import__(_messages_package_name, fromlist=[str('__file__')])
-    pathname = os.path.join(next(iter(mod.__path__)), package)
+    catalog = _get_catalog(package)
+    if catalog is not None:
+        langs = catalog.languages
+    else:
+        mod = __import__(_messages_package_name, fromlist=[str('__file__')])
+        pathname = os.path.join(next(iter(mod.__path__)), package)
 
-    # build a list of languages in that directory
-    langs = [filename.partition('.')[0]
-             for filename in sorted(os.listdir(pathname))
-             if filename.endswith('.json')]
+        # build a list of languages in that directory
+        langs = [filename.partition('.')[0]
+                 for filename in sorted(os.listdir(pathname))
+                 if filename.endswith('.json')]
 
     # exclude languages does not have this specific message in that package
     # i.e. an incomplete set of translated messages.
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 """Logging functions."""
 #
-# (C) Pywikibot team, 2010-2016
+# (C) Pywikibot team, 2010-2017
 #
 # Distributed under the terms of the MIT license.
 #
@@ -62,13 +62,21 @@ def _init():
 # the user console. debug() takes a required second argument, which is a
 # string indicating the debugging layer.
 
+# The functions log() and debug() accept additional arguments which are
+# merged into text with the % operator, like the arguments of the logging
+# module. They are only formatted if the record is emitted, so expensive
+# representations of large objects are not built if the logging level
+# discards the record.
+
 
 def logoutput(text, decoder=None, newline=True, _level=INFO, _logger="",
-              **kwargs):
+              _args=(), **kwargs):
     """Format output and send to the logging module.
 
     Helper function used by all the user-output convenience functions.
 
+    @param _args: the arguments merged into text when the record is emitted
+    @type _args: tuple
     """
     if _logger:
         logger = logging.getLogger("pywiki." + _logger)
@@ -79,6 +87,9 @@ def logoutput(text, decoder=None, newline=True, _level=INFO, _logger="",
     if _init_routines:
         _init()
 
+    if not logger.isEnabledFor(_level):
+        return
+
     # frame 0 is logoutput() in this module,
     # frame 1 is the convenience function (output(), etc.)
     # frame 2 is whatever called the convenience function
@@ -104,7 +115,7 @@ def logoutput(text, decoder=None, newline=True, _level=INFO, _logger="",
             except UnicodeDecodeError:
                 text = text.decode('iso8859-1')
 
-    logger.log(_level, text, extra=context, **kwargs)
+    logger.log(_level, text, *_args, extra=context, **kwargs)
 
 
 def output(text, decoder=None, newline=True, toStdout=False, **kwargs):
@@ -156,9 +167,20 @@ def error(text, decoder=None, newline=True, **kwargs):
     logoutput(text, decoder, newline, ERROR, **kwargs)
 
 
-def log(text, decoder=None, newline=True, **kwargs):
-    """Output a record to the log file."""
-    logoutput(text, decoder, newline, VERBOSE, **kwargs)
+def log(text, *args, **kwargs):
+    """Output a record to the log file.
+
+    The args are merged into text with the % operator only if the record is
+    emitted::
+
+        pywikibot.log('API response: %r', data)
+
+    @keyword decoder: the encoding of text if it is a bytes string
+    @keyword newline: add a line feed after the text (default True)
+    """
+    decoder = kwargs.pop('decoder', None)
+    newline = kwargs.pop('newline', True)
+    logoutput(text, decoder, newline, VERBOSE, _args=args, **kwargs)
 
 
 def critical(text, decoder=None, newline=True, **kwargs):
@@ -166,12 +188,21 @@ def critical(text, decoder=None, newline=True, **kwargs):
     logoutput(text, decoder, newline, CRITICAL, **kwargs)
 
 
-def debug(text, layer, decoder=None, newline=True, **kwargs):
+def debug(text, layer, *args, **kwargs):
     """Output a debug record to the log file.
 
+    The args are merged into text with the % operator only if debugging is
+    enabled for the layer::
+
+        pywikibot.debug('Preloading %s', _logger, pagedata)
+
     @param layer: The name of the logger that text will be sent to.
+    @keyword decoder: the encoding of text if it is a bytes string
+    @keyword newline: add a line feed after the text (default True)
     """
-    logoutput(text, decoder, newline, DEBUG, layer, **kwargs)
+    decoder = kwargs.pop('decoder', None)
+    newline = kwargs.pop('newline', True)
+    logoutput(text, decoder, newline, DEBUG, layer, _args=args, **kwargs)
 
 
 def exception(msg=None, decoder=None, newline=True, tb=False, **kwargs):
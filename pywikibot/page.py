@@ -21,6 +21,7 @@ from __future__ import absolute_import, unicode_literals
 __version__ = '$Id$'
 #
 
+import copy
 import hashlib
 import logging
 import os.path
@@ -32,7 +33,7 @@ try:
 except ImportError:
     import unicodedata
 
-from collections import defaultdict, namedtuple
+from collections import defaultdict, deque, namedtuple, MutableMapping
 from warnings import warn
 
 from pywikibot.tools import PY2
@@ -73,7 +74,7 @@ from pywikibot.tools import (
     deprecated, deprecate_arg, deprecated_args, issue_deprecation_warning,
     ModuleDeprecationWrapper as _ModuleDeprecationWrapper,
     first_upper, redirect_func, remove_last_args, _NotImplementedWarning,
-    OrderedDict, Counter,
+    OrderedDict, Counter, PrefetchIterator,
 )
 from pywikibot.tools.ip import ip_regexp
 from pywikibot.tools.ip import is_IP
@@ -86,9 +87,11 @@ __all__ = (
     'User',
     'WikibasePage',
     'ItemPage',
+    'WikibaseEditBatch',
     'Property',
     'PropertyPage',
     'Claim',
+    'ClaimCollection',
     'Revision',
     'FileInfo',
     'Link',
@@ -2580,6 +2583,12 @@ class Category(Page):
 
     """A page in the Category: namespace."""
 
+    TreeMember = namedtuple('TreeMember', ['page', 'depth', 'category'])
+
+    #: The number of members of each following category which L{crawl}
+    #: retrieves in advance
+    crawl_prefetch = 500
+
     @deprecate_arg("insite", None)
     def __init__(self, source, title=u"", sortKey=None):
         """
@@ -2766,6 +2775,120 @@ class Category(Page):
                         if total == 0:
                             return
 
+    def crawl(self, recurse=True, member_type=('page', 'file'),
+              namespaces=None, content=False, total=None, workers=None,
+              members=None):
+        """
+        Yield the members of the category tree breadth-first.
+
+        The members of the category are yielded first, then the members of
+        its subcategories, then those of their subcategories and so on. Each
+        category is only visited once, so cycles in the category graph and
+        subcategories of several categories don't cause the same members to
+        be retrieved again. A member of several visited categories is yielded
+        once for each of them.
+
+        The members of each category are yielded while they are retrieved.
+        The members of the next categories are retrieved in background
+        threads at the same time, up to crawl_prefetch members of each. The
+        threads are stopped when the generator is closed.
+
+        Each member is yielded as a TreeMember tuple of the page, its depth
+        and the category it was found in. The depth of the members of this
+        category is 0, that of the members of its subcategories 1 and so on.
+
+        @param recurse: if not False or 0, also iterate the members of
+            subcategories. If an int, limit recursion to this number of
+            levels, like in L{articles}.
+        @type recurse: int or bool
+        @param member_type: the types of the members to yield; subcategories
+            are only yielded if it contains 'subcat'
+        @type member_type: str or iterable of str; values: page, subcat, file
+        @param namespaces: only yield members in these namespaces
+        @type namespaces: int or list of ints
+        @param content: if True, retrieve the content of the current version
+            of each member (default False)
+        @param total: iterate no more than this number of members in total
+        @param workers: the number of categories whose members are retrieved
+            in advance; config.category_crawl_workers if None
+        @type workers: int
+        @param members: the function which returns the members of a category,
+            with the same parameters as L{APISite.categorymembers};
+            site.categorymembers if None
+        @type members: callable
+        @rtype: generator of TreeMember
+        """
+        if isinstance(member_type, basestring):
+            member_type = [member_type]
+        member_type = set(member_type)
+        query_types = set(member_type)
+        query_namespaces = None
+        if namespaces is not None:
+            namespaces = set(ns.id for ns
+                             in self.site.namespaces.resolve(namespaces))
+            query_namespaces = set(namespaces)
+        # the total is passed on unless subcategories are retrieved which
+        # are not yielded
+        query_total = (not recurse or 'subcat' in member_type and
+                       (namespaces is None or 14 in namespaces))
+        if recurse:
+            # subcategories must be retrieved to visit them
+            query_types.add('subcat')
+            if query_namespaces is not None:
+                query_namespaces.add(14)
+        if workers is None:
+            workers = config.category_crawl_workers
+        if members is None:
+            members = self.site.categorymembers
+
+        def retrieve(category, total):
+            for member in members(category, namespaces=query_namespaces,
+                                  member_type=query_types, content=content,
+                                  total=total):
+                yield member
+
+        def start(category, depth):
+            gen = retrieve(category, total if query_total else None)
+            if workers > 0:
+                gen = PrefetchIterator(gen, self.crawl_prefetch)
+            return category, depth, gen
+
+        visited = set([self])
+        waiting = deque([(self, 0)])
+        started = deque()
+        current = None
+        try:
+            while waiting or started:
+                # the current category and up to workers following ones
+                while waiting and len(started) <= workers:
+                    started.append(start(*waiting.popleft()))
+                current = started.popleft()
+                category, depth, gen = current
+                expand = recurse is True or depth < recurse
+                for member in gen:
+                    if member.namespace() == 14:
+                        member = Category(member)
+                        if expand and member not in visited:
+                            visited.add(member)
+                            waiting.append((member, depth + 1))
+                            if len(started) < workers:
+                                started.append(start(*waiting.popleft()))
+                        if ('subcat' not in member_type or
+                                namespaces is not None and
+                                14 not in namespaces):
+                            continue
+                    yield self.TreeMember(member, depth, category)
+                    if total is not None:
+                        total -= 1
+                        if total == 0:
+                            return
+        finally:
+            if current is not None:
+                started.append(current)
+            for category, depth, gen in started:
+                if isinstance(gen, PrefetchIterator):
+                    gen.stop()
+
     @need_version('1.13')
     def isEmptyCategory(self):
         """
@@ -3642,14 +3765,8 @@ class WikibasePage(BasePage):
                     'descriptions'][lang]['value']
 
         # claims
-        self.claims = {}
-        if 'claims' in self._content:
-            for pid in self._content['claims']:
-                self.claims[pid] = []
-                for claim in self._content['claims'][pid]:
-                    c = Claim.fromJSON(self.repo, claim)
-                    c.on_item = self
-                    self.claims[pid].append(c)
+        self.claims = ClaimCollection(self.repo, self,
+                                      self._content.get('claims', {}))
 
         return {'aliases': self.aliases,
                 'labels': self.labels,
@@ -3710,8 +3827,13 @@ class WikibasePage(BasePage):
 
         claims = {}
         for prop in self.claims:
-            if len(self.claims[prop]) > 0:
-                claims[prop] = [claim.toJSON() for claim in self.claims[prop]]
+            if isinstance(self.claims, ClaimCollection):
+                # claims which were not loaded are still the JSON
+                prop_claims = self.claims.toJSON(prop)
+            else:
+                prop_claims = [claim.toJSON() for claim in self.claims[prop]]
+            if len(prop_claims) > 0:
+                claims[prop] = prop_claims
 
         if diffto and 'claims' in diffto:
             temp = defaultdict(list)
@@ -4205,6 +4327,11 @@ class ItemPage(WikibasePage):
         list can either be a Page object, or a dict
         with a value for 'site' and 'title'.
         """
+        data = {'sitelinks': self._sitelinks_data(sitelinks)}
+        self.editEntity(data, **kwargs)
+
+    def _sitelinks_data(self, sitelinks):
+        """Return the sitelinks data per dbName for editEntity."""
         data = {}
         for obj in sitelinks:
             if isinstance(obj, Page):
@@ -4214,8 +4341,7 @@ class ItemPage(WikibasePage):
                 # TODO: Do some verification here
                 dbName = obj['site']
                 data[dbName] = obj
-        data = {'sitelinks': data}
-        self.editEntity(data, **kwargs)
+        return data
 
     def addClaim(self, claim, bot=True, **kwargs):
         """
@@ -4293,6 +4419,175 @@ class ItemPage(WikibasePage):
                                 class_name='ItemPage')
 
 
+class WikibaseEditBatch(object):
+
+    """
+    Collect changes of Wikibase items and save them with one edit per item.
+
+    Every method of ItemPage which changes claims, labels, descriptions,
+    aliases or sitelinks makes its own edit. A batch collects these changes
+    instead and L{flush} saves all changes of an item with a single
+    wbeditentity request, based on the revision which was loaded::
+
+        with WikibaseEditBatch(repo, summary='Importing data') as batch:
+            batch.addClaim(item, claim, sources=[source])
+            batch.editLabels(item, {'en': 'Foo'})
+
+    The changes are saved when the with statement is left without an
+    exception. The edit fails with an edit conflict if the item was changed
+    since it was loaded.
+    """
+
+    def __init__(self, repo, bot=True, summary=None):
+        """
+        Constructor.
+
+        @param repo: the repository of the items
+        @type repo: DataSite
+        @param bot: Whether to flag the edits as bot edits (if possible)
+        @type bot: bool
+        @param summary: the edit summary of the edits
+        @type summary: unicode
+        """
+        self.repo = repo
+        self.bot = bot
+        self.summary = summary
+        self._pending = OrderedDict()
+
+    def __enter__(self):
+        """Return the batch."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Save the changes unless an exception occurred."""
+        if exc_type is None:
+            self.flush()
+
+    def __len__(self):
+        """Return the number of items with pending changes."""
+        return len(self._pending)
+
+    def _entry(self, item):
+        """Return the pending changes of the item."""
+        if item.repo != self.repo:
+            raise ValueError('{0} is not on the repository {1}'.format(
+                item, self.repo))
+        if not hasattr(item, '_content'):
+            item.get()
+        key = item.getID()
+        if key not in self._pending:
+            self._pending[key] = {'item': item, 'data': {}, 'claims': []}
+        elif self._pending[key]['item'] is not item:
+            raise ValueError('Changes of another object of {0} are '
+                             'pending'.format(item))
+        return self._pending[key]
+
+    def _update(self, item, type_key, values):
+        """Merge the values into the pending data of the item."""
+        data = self._entry(item)['data'].setdefault(type_key, {})
+        for key, value in values.items():
+            if isinstance(key, pywikibot.site.BaseSite):
+                key = key.lang
+            data[key] = value
+
+    def addClaim(self, item, claim, sources=None):
+        """
+        Add a claim to the item.
+
+        The claim is added to the claims of the item at once, but it gets
+        its id when the batch is flushed.
+
+        @param item: the item to add the claim to
+        @type item: ItemPage
+        @param claim: the claim to add
+        @type claim: Claim
+        @param sources: the claims of one source of the claim
+        @type sources: list of Claim
+        """
+        entry = self._entry(item)
+        if sources:
+            source = OrderedDict()
+            for source_claim in sources:
+                source_claim.isReference = True
+                source.setdefault(source_claim.getID(), []).append(
+                    source_claim)
+            claim.sources.append(source)
+        entry['data'].setdefault('claims', []).append(claim.toJSON())
+        entry['claims'].append(claim)
+        claim.on_item = item
+        item.claims.setdefault(claim.getID(), []).append(claim)
+
+    def editLabels(self, item, labels):
+        """
+        Edit the labels of the item.
+
+        @param labels: the label per language or site; '' removes the label
+        @type labels: dict
+        """
+        self._update(item, 'labels', labels)
+
+    def editDescriptions(self, item, descriptions):
+        """
+        Edit the descriptions of the item.
+
+        @param descriptions: the description per language or site; ''
+            removes the description
+        @type descriptions: dict
+        """
+        self._update(item, 'descriptions', descriptions)
+
+    def editAliases(self, item, aliases):
+        """
+        Edit the aliases of the item.
+
+        @param aliases: the list of aliases per language or site
+        @type aliases: dict
+        """
+        self._update(item, 'aliases', aliases)
+
+    def setSitelinks(self, item, sitelinks):
+        """
+        Set sitelinks of the item.
+
+        @param sitelinks: Page objects or dicts with a value for 'site' and
+            'title'; an empty title removes the sitelink
+        @type sitelinks: list
+        """
+        self._update(item, 'sitelinks', item._sitelinks_data(sitelinks))
+
+    def flush(self):
+        """Save the pending changes with one edit per item."""
+        while self._pending:
+            key, entry = self._pending.popitem(last=False)
+            self._save(entry['item'], entry['data'], entry['claims'])
+
+    def _save(self, item, data, claims):
+        """Save the changes of the item and update the new claims."""
+        known = item.claims.ids()
+        data = WikibasePage._normalizeData(data)
+        updates = self.repo.editEntity(item._defined_by(singular=True), data,
+                                       bot=self.bot, summary=self.summary,
+                                       baserevid=item.latest_revision_id)
+        entity = updates['entity']
+        item.latest_revision_id = entity['lastrevid']
+
+        new_claims = defaultdict(list)
+        for pid, values in entity.get('claims', {}).items():
+            for value in values:
+                if value['id'] not in known:
+                    new_claims[pid.upper()].append(value)
+        for claim in claims:
+            if not new_claims[claim.getID()]:
+                continue
+            value = new_claims[claim.getID()].pop(0)
+            claim.snak = value['id']
+            for source, reference in zip(claim.sources,
+                                         value.get('references', [])):
+                for source_claims in source.values():
+                    for source_claim in source_claims:
+                        source_claim.hash = reference['hash']
+
+
 class Property(object):
 
     """
@@ -4329,6 +4624,8 @@ class Property(object):
                    'external-id': 'string',
                    }
 
+    __slots__ = ('repo', 'id', '_type')
+
     def __init__(self, site, id, datatype=None):
         """
         Constructor.
@@ -4467,6 +4764,9 @@ class Claim(Property):
 
     SNAK_TYPES = ('value', 'somevalue', 'novalue')
 
+    __slots__ = ('snak', 'hash', 'isReference', 'isQualifier', 'sources',
+                 'qualifiers', 'target', 'snaktype', 'rank', 'on_item')
+
     def __init__(self, site, pid, snak=None, hash=None, isReference=False,
                  isQualifier=False, **kwargs):
         """
@@ -4903,6 +5203,104 @@ class Claim(Property):
                 }
 
 
+class ClaimCollection(MutableMapping):
+
+    """
+    The claims of a Wikibase entity per property id.
+
+    The Claim objects of a property are created from the JSON of the entity
+    when the claims of the property are accessed the first time. Until then
+    only the JSON, which the entity keeps anyway, is held in memory.
+    """
+
+    def __init__(self, repo, on_item, data):
+        """
+        Constructor.
+
+        @param repo: the data repository of the claims
+        @type repo: DataSite
+        @param on_item: the entity of the claims
+        @type on_item: WikibasePage
+        @param data: the JSON of the claims per property id
+        @type data: dict
+        """
+        self.repo = repo
+        self.on_item = on_item
+        self._claims = OrderedDict(data)
+        self._loaded = set()
+
+    def _load(self, pid):
+        """Create the Claim objects of the property from the JSON."""
+        claims = []
+        for data in self._claims[pid]:
+            claim = Claim.fromJSON(self.repo, data)
+            claim.on_item = self.on_item
+            claims.append(claim)
+        self._claims[pid] = claims
+        self._loaded.add(pid)
+
+    def __getitem__(self, pid):
+        """Return the claims of the property."""
+        if pid not in self._loaded and pid in self._claims:
+            self._load(pid)
+        return self._claims[pid]
+
+    def __setitem__(self, pid, claims):
+        """Set the claims of the property."""
+        self._claims[pid] = claims
+        self._loaded.add(pid)
+
+    def __delitem__(self, pid):
+        """Remove the claims of the property."""
+        del self._claims[pid]
+        self._loaded.discard(pid)
+
+    def __contains__(self, pid):
+        """Return whether there are claims of the property."""
+        return pid in self._claims
+
+    def __iter__(self):
+        """Iterate over the property ids."""
+        return iter(self._claims)
+
+    def __len__(self):
+        """Return the number of properties."""
+        return len(self._claims)
+
+    def __repr__(self):
+        """Return the representation with the property ids."""
+        return '{0}({1!r})'.format(self.__class__.__name__,
+                                   list(self._claims))
+
+    def ids(self):
+        """
+        Return the ids of all claims without creating the Claim objects.
+
+        The ids of the claims which were not loaded are taken from the JSON.
+
+        @rtype: set of str
+        """
+        ids = set()
+        for pid, values in self._claims.items():
+            if pid in self._loaded:
+                ids.update(claim.snak for claim in values)
+            else:
+                ids.update(value.get('id') for value in values)
+        return ids
+
+    def toJSON(self, pid):
+        """
+        Return the JSON of the claims of the property.
+
+        The JSON is not created from the claims unless they were loaded.
+
+        @rtype: list of dict
+        """
+        if pid in self._loaded:
+            return [claim.toJSON() for claim in self._claims[pid]]
+        return copy.deepcopy(self._claims[pid])
+
+
 class Revision(DotReadableDict):
 
     """A structure holding information about a single revision of a Page."""
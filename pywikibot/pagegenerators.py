@@ -26,6 +26,7 @@ __version__ = '$Id$'
 import calendar
 import codecs
 import datetime
+import functools
 import itertools
 import json
 import re
@@ -47,6 +48,7 @@ from pywikibot.tools import (
     intersect_generators,
     IteratorNextMixin,
     filter_unique,
+    prefetch_results,
 )
 
 from pywikibot import date, config, i18n, xmlreader
@@ -1271,7 +1273,16 @@ def CategorizedPageGenerator(category, recurse=False, start=None,
     If content is True (default is False), the current page text of each
     retrieved page will be downloaded.
 
+    Unless start is given, the subcategories are visited breadth-first by
+    L{pywikibot.page.Category.crawl}, so every subcategory is visited only
+    once even if the category graph contains cycles.
+
     """
+    if recurse and not start:
+        for member in category.crawl(recurse=recurse, total=total,
+                                     content=content, namespaces=namespaces):
+            yield member.page
+        return
     kwargs = dict(recurse=recurse, total=total,
                   content=content, namespaces=namespaces)
     if start:
@@ -1297,10 +1308,19 @@ def SubCategoriesPageGenerator(category, recurse=False, start=None,
     If content is True (default is False), the current page text of each
     category description page will be downloaded.
 
+    If recurse is set, the subcategories are visited breadth-first by
+    L{pywikibot.page.Category.crawl}, so every subcategory is visited only
+    once even if the category graph contains cycles.
+
     """
+    if recurse:
+        subcats = (member.page for member in category.crawl(
+            recurse=recurse, member_type='subcat', total=total,
+            content=content))
+    else:
+        subcats = category.subcategories(total=total, content=content)
     # TODO: page generator could be modified to use cmstartsortkey ...
-    for s in category.subcategories(recurse=recurse,
-                                    total=total, content=content):
+    for s in subcats:
         if start is None or s.title(withNamespace=False) >= start:
             yield s
 
@@ -1906,14 +1926,38 @@ def RepeatingGenerator(generator, key_func=lambda x: x, sleep_duration=60,
 
 
 @deprecated_args(pageNumber='groupsize', step='groupsize', lookahead=None)
-def PreloadingGenerator(generator, groupsize=50):
+def PreloadingGenerator(generator, groupsize=50, prefetch=None):
     """
     Yield preloaded pages taken from another generator.
 
+    With prefetch, the following groups are loaded in background threads
+    while the pages of a group are processed. The pages are still yielded in
+    the same order as without prefetch.
+
     @param generator: pages to iterate over
     @param groupsize: how many pages to preload at once
     @type groupsize: int
-    """
+    @param prefetch: how many groups are loaded in advance; the default is
+        config.preload_prefetch
+    @type prefetch: int
+    """
+    if prefetch is None:
+        prefetch = config.preload_prefetch
+    groups = _preloading_groups(generator, groupsize)
+    if prefetch > 0:
+        tasks = (functools.partial(list, site.preloadpages(group, groupsize))
+                 for site, group in groups)
+        for pages in prefetch_results(tasks, prefetch):
+            for i in pages:
+                yield i
+    else:
+        for site, group in groups:
+            for i in site.preloadpages(group, groupsize):
+                yield i
+
+
+def _preloading_groups(generator, groupsize):
+    """Yield the site and a group of pages of that site from the generator."""
     # pages may be on more than one site, for example if an interwiki
     # generator is used, so use a separate preloader for each site
     sites = {}
@@ -1923,13 +1967,10 @@ def PreloadingGenerator(generator, groupsize=50):
         sites.setdefault(site, []).append(page)
         if len(sites[site]) >= groupsize:
             # if this site is at the groupsize, process it
-            group = sites.pop(site)
-            for i in site.preloadpages(group, groupsize):
-                yield i
+            yield site, sites.pop(site)
     for site, pages in sites.items():
         # process any leftover sites that never reached the groupsize
-        for i in site.preloadpages(pages, groupsize):
-            yield i
+        yield site, pages
 
 
 @deprecated_args(step='groupsize')
@@ -2574,6 +2615,10 @@ class XMLDumpOldPageGenerator(IteratorNextMixin):
     @param text_predicate: a callable with entry.text as parameter and boolean
         as result to indicate the generator should return the page or not
     @type text_predicate: function identifier or None
+    @param entry_filter: a filter evaluated while the dump is parsed, which
+        can be done by several processes (see L{xmlreader.XmlDump}); by
+        default it filters the namespaces
+    @type entry_filter: L{xmlreader.XmlEntryFilter} or None
 
     @ivar text_predicate: holds text_predicate function
     @ivar skipping: True if start parameter is given, else False
@@ -2582,9 +2627,11 @@ class XMLDumpOldPageGenerator(IteratorNextMixin):
     @ivar parser: holds the xmlreader.XmlDump parse method
     """
 
+    _load_text = True
+
     @deprecated_args(xmlFilename='filename', xmlStart='start')
     def __init__(self, filename, start=None, namespaces=None, site=None,
-                 text_predicate=None):
+                 text_predicate=None, entry_filter=None):
         """Constructor."""
         self.text_predicate = text_predicate
 
@@ -2599,8 +2646,15 @@ class XMLDumpOldPageGenerator(IteratorNextMixin):
             self.namespaces = self.site.namespaces
         else:
             self.namespaces = self.site.namespaces.resolve(namespaces)
-
-        dump = xmlreader.XmlDump(filename)
+            if entry_filter is None:
+                entry_filter = xmlreader.XmlEntryFilter(
+                    namespaces=[ns.id for ns in self.namespaces])
+
+        # the text is only read if it is needed
+        metadata_only = (not self._load_text and text_predicate is None and
+                         (entry_filter is None or entry_filter.text is None))
+        dump = xmlreader.XmlDump(filename, entry_filter=entry_filter,
+                                 metadata_only=metadata_only)
         self.parser = dump.parse()
 
     @property
@@ -2638,6 +2692,8 @@ class XMLDumpPageGenerator(XMLDumpOldPageGenerator):
 
     """Xml generator that yields Page objects without text loaded."""
 
+    _load_text = False
+
     def __next__(self):
         """Get next Page from dump and remove the text."""
         page = super(XMLDumpPageGenerator, self).__next__()
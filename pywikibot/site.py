@@ -36,6 +36,8 @@ import pywikibot.family
 
 from pywikibot.comms.http import get_authentication
 from pywikibot.data import api
+from pywikibot.data.revisioncache import get_revision_cache
+from pywikibot.data.sitesnapshot import SiteSnapshot
 from pywikibot.echo import Notification
 from pywikibot.exceptions import (
     Error,
@@ -65,7 +67,7 @@ from pywikibot.exceptions import (
     PageSaveRelatedError,
 )
 from pywikibot.family import WikimediaFamily
-from pywikibot.throttle import Throttle
+from pywikibot.throttle import Throttle, TokenBucketThrottle
 from pywikibot.tools import (
     compute_file_hash,
     itergroup, UnicodeMixin, ComparableMixin, SelfCallMixin, SelfCallString,
@@ -75,6 +77,7 @@ from pywikibot.tools import (
     merge_unique_dicts,
     PY2,
     filter_unique,
+    prefetch_results,
 )
 from pywikibot.tools.ip import is_IP
 
@@ -800,7 +803,10 @@ class BaseSite(ComparableMixin):
     def throttle(self):
         """Return this Site's throttle. Initialize a new one if needed."""
         if not hasattr(self, "_throttle"):
-            self._throttle = Throttle(self, multiplydelay=True)
+            if pywikibot.config.throttle_backend == 'tokenbucket':
+                self._throttle = TokenBucketThrottle(self)
+            else:
+                self._throttle = Throttle(self, multiplydelay=True)
         return self._throttle
 
     @property
@@ -1405,6 +1411,9 @@ class Siteinfo(Container):
     WARNING_REGEX = re.compile(r'^Unrecognized values? for parameter '
                                r'["\']siprop["\']: (.+?)\.?$')
 
+    # The format of the request times in a snapshot
+    TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
     # Until we get formatversion=2, we have to convert empty-string properties
     # into booleans so they are easier to use.
     BOOLEAN_PROPS = {
@@ -1739,6 +1748,38 @@ class Siteinfo(Container):
             self.get(key, expiry=0 if force else False)
             return self._cache
 
+    def snapshot(self):
+        """
+        Return the cached properties as JSON serializable data.
+
+        The time at which a property was requested is stored as a string.
+        The value of a property which the site doesn't support is not
+        stored, as it is the default value.
+
+        @rtype: dict
+        """
+        data = {}
+        for prop, (value, cache_time) in self._cache.items():
+            if cache_time:
+                data[prop] = [value, cache_time.strftime(self.TIME_FORMAT)]
+            else:
+                data[prop] = [None, False]
+        return data
+
+    def restore(self, data):
+        """
+        Cache the properties of a snapshot.
+
+        @param data: the properties as returned by L{snapshot}
+        @type data: dict
+        """
+        for prop, (value, cache_time) in data.items():
+            if cache_time:
+                self._cache[prop] = (value, datetime.datetime.strptime(
+                    cache_time, self.TIME_FORMAT))
+            else:
+                self._cache[prop] = (Siteinfo._get_default(prop), False)
+
 
 class TokenWallet(object):
 
@@ -1861,12 +1902,17 @@ class APISite(BaseSite):
         self._paraminfo = api.ParamInfo(self)
         self._interwikimap = _InterwikiMap(self)
         self.tokens = TokenWallet(self)
+        self._snapshot = None
+        if pywikibot.config.use_site_snapshots:
+            self._snapshot = SiteSnapshot(self)
+            self._snapshot.load()
 
     def __getstate__(self):
         """Remove TokenWallet before pickling, for security reasons."""
         new = super(APISite, self).__getstate__()
         del new['tokens']
         del new['_interwikimap']
+        new['_snapshot'] = None
         return new
 
     def __setstate__(self, attrs):
@@ -3211,12 +3257,15 @@ class APISite(BaseSite):
                 yield page
 
     def preloadpages(self, pagelist, groupsize=50, templates=False,
-                     langlinks=False, pageprops=False):
+                     langlinks=False, pageprops=False, prefetch=0):
         """Return a generator to a list of preloaded pages.
 
         Pages are iterated in the same order than in the underlying pagelist.
         In case of duplicates in a groupsize batch, return the first entry.
 
+        With prefetch, the following batches are loaded in the background
+        while the pages of a batch are processed by the caller.
+
         @param pagelist: an iterable that returns Page objects
         @param groupsize: how many Pages to query at a time
         @type groupsize: int
@@ -3228,6 +3277,8 @@ class APISite(BaseSite):
         @type langlinks: bool
         @param pageprops: preload various properties defined in the page content
         @type pageprops: bool
+        @param prefetch: the number of batches which are loaded in advance
+        @type prefetch: int
 
         """
         props = 'revisions|info|categoryinfo'
@@ -3238,74 +3289,166 @@ class APISite(BaseSite):
         if pageprops:
             props += '|pageprops'
 
-        rvprop = ['ids', 'flags', 'timestamp', 'user', 'comment', 'content']
+        groups = itergroup(pagelist, groupsize)
+        if prefetch > 0:
+            tasks = (functools.partial(list, self._preload_group(group, props))
+                     for group in groups)
+            for pages in prefetch_results(tasks, prefetch):
+                for page in pages:
+                    yield page
+        else:
+            for group in groups:
+                for page in self._preload_group(group, props):
+                    yield page
 
-        for sublist in itergroup(pagelist, groupsize):
-            # Do not use p.pageid property as it will force page loading.
-            pageids = [str(p._pageid) for p in sublist
-                       if hasattr(p, "_pageid") and p._pageid > 0]
-            cache = {}
-            # In case of duplicates, return the first entry.
-            for priority, page in enumerate(sublist):
-                try:
-                    cache.setdefault(page.title(withSection=False),
-                                     (priority, page))
-                except pywikibot.InvalidTitle:
-                    pywikibot.exception()
+    def _preload_group(self, sublist, props):
+        """Preload the pages of one batch and yield them in the same order."""
+        # Do not use p.pageid property as it will force page loading.
+        pageids = [str(p._pageid) for p in sublist
+                   if hasattr(p, "_pageid") and p._pageid > 0]
+        cache = {}
+        # In case of duplicates, return the first entry.
+        for priority, page in enumerate(sublist):
+            try:
+                cache.setdefault(page.title(withSection=False),
+                                 (priority, page))
+            except pywikibot.InvalidTitle:
+                pywikibot.exception()
+
+        prio_queue = []
+        next_prio = 0
+        if len(pageids) == len(sublist):
+            # only use pageids if all pages have them
+            query = {'pageids': set(pageids)}
+        else:
+            query = {'titles': list(cache.keys())}
+        pywikibot.output(u"Retrieving %s pages from %s."
+                         % (len(cache), self))
 
-            prio_queue = []
-            next_prio = 0
-            rvgen = api.PropertyGenerator(props, site=self)
-            rvgen.set_maximum_items(-1)  # suppress use of "rvlimit" parameter
-            if len(pageids) == len(sublist):
-                # only use pageids if all pages have them
-                rvgen.request['pageids'] = set(pageids)
+        for pagedata, data_props in self._preload_data(props, query):
+            pywikibot.debug(u'Preloading %s', _logger, pagedata)
+            try:
+                if pagedata['title'] not in cache:
+                    # API always returns a "normalized" title which is
+                    # usually the same as the canonical form returned by
+                    # page.title(), but sometimes not (e.g.,
+                    # gender-specific localizations of "User" namespace).
+                    # This checks to see if there is a normalized title in
+                    # the response that corresponds to the canonical form
+                    # used in the query.
+                    for key in cache:
+                        if self.sametitle(key, pagedata['title']):
+                            cache[pagedata['title']] = cache[key]
+                            break
+                    else:
+                        pywikibot.warning(
+                            u"preloadpages: Query returned unexpected "
+                            u"title '%s'" % pagedata['title'])
+                        continue
+            except KeyError:
+                pywikibot.debug(u"No 'title' in %s", _logger, pagedata)
+                pywikibot.debug(u'pageids=%s', _logger, pageids)
+                pywikibot.debug(u'titles=%s', _logger, list(cache.keys()))
+                continue
+            priority, page = cache[pagedata['title']]
+            api.update_page(page, pagedata, data_props)
+            priority, page = heapq.heappushpop(prio_queue, (priority, page))
+            # Smallest priority matches expected one; yield.
+            if priority == next_prio:
+                yield page
+                next_prio += 1
             else:
-                rvgen.request['titles'] = list(cache.keys())
-            rvgen.request['rvprop'] = rvprop
-            pywikibot.output(u"Retrieving %s pages from %s."
-                             % (len(cache), self))
+                # Push back onto the heap.
+                heapq.heappush(prio_queue, (priority, page))
+
+        # Empty the heap.
+        while prio_queue:
+            priority, page = heapq.heappop(prio_queue)
+            yield page
+
+    def _preload_data(self, props, query):
+        """
+        Yield the page data of the preloaded pages and the props used.
+
+        If the revision cache is enabled, only the latest revision ids are
+        requested at first. The texts of those revisions are taken from the
+        cache and only the other pages are requested with their text.
+
+        @param props: the properties to be requested
+        @type props: str
+        @param query: the 'pageids' or 'titles' parameter of the pages
+        @type query: dict
+        """
+        revision_cache = get_revision_cache()
+        if revision_cache:
+            infogen = api.PropertyGenerator(props.replace('revisions|', ''),
+                                            site=self)
+            infogen.request.update(query)
+            cached_props = infogen.props | set(['revisions'])
+            uncached = set()
+            for pagedata in infogen:
+                if 'lastrevid' in pagedata:
+                    revision = revision_cache.get(self, pagedata['lastrevid'])
+                    if not self._complete_revision(revision):
+                        uncached.add(pagedata['pageid'])
+                        continue
+                    pagedata['revisions'] = [revision]
+                    yield pagedata, cached_props
+                elif pagedata.get('pageid') not in uncached:
+                    # missing pages and continued data of cached pages
+                    yield pagedata, infogen.props
+            if not uncached:
+                return
+            query = {'pageids': uncached}
+
+        rvgen = api.PropertyGenerator(props, site=self)
+        rvgen.set_maximum_items(-1)  # suppress use of "rvlimit" parameter
+        rvgen.request.update(query)
+        if revision_cache:
+            # the cached revisions are also used by loadrevisions
+            rvgen.request['rvprop'] = self._revision_props()
+        else:
+            rvgen.request['rvprop'] = ['ids', 'flags', 'timestamp', 'user',
+                                       'comment', 'content']
+        for pagedata in rvgen:
+            if revision_cache:
+                self._cache_revisions(revision_cache, pagedata)
+            yield pagedata, rvgen.props
 
-            for pagedata in rvgen:
-                pywikibot.debug(u"Preloading %s" % pagedata, _logger)
-                try:
-                    if pagedata['title'] not in cache:
-                        # API always returns a "normalized" title which is
-                        # usually the same as the canonical form returned by
-                        # page.title(), but sometimes not (e.g.,
-                        # gender-specific localizations of "User" namespace).
-                        # This checks to see if there is a normalized title in
-                        # the response that corresponds to the canonical form
-                        # used in the query.
-                        for key in cache:
-                            if self.sametitle(key, pagedata['title']):
-                                cache[pagedata['title']] = cache[key]
-                                break
-                        else:
-                            pywikibot.warning(
-                                u"preloadpages: Query returned unexpected "
-                                u"title '%s'" % pagedata['title'])
-                            continue
-                except KeyError:
-                    pywikibot.debug(u"No 'title' in %s" % pagedata, _logger)
-                    pywikibot.debug(u"pageids=%s" % pageids, _logger)
-                    pywikibot.debug(u"titles=%s" % list(cache.keys()), _logger)
-                    continue
-                priority, page = cache[pagedata['title']]
-                api.update_page(page, pagedata, rvgen.props)
-                priority, page = heapq.heappushpop(prio_queue, (priority, page))
-                # Smallest priority matches expected one; yield.
-                if priority == next_prio:
-                    yield page
-                    next_prio += 1
-                else:
-                    # Push back onto the heap.
-                    heapq.heappush(prio_queue, (priority, page))
+    def _revision_props(self, content=True):
+        """Return the revision props which are requested by loadrevisions."""
+        props = ['ids', 'timestamp', 'flags', 'comment', 'user']
+        if MediaWikiVersion(self.version()) >= MediaWikiVersion('1.21'):
+            props.append('contentmodel')
+        if MediaWikiVersion(self.version()) >= MediaWikiVersion('1.19'):
+            props.append('sha1')
+        if content:
+            props.append('content')
+        return props
 
-            # Empty the heap.
-            while prio_queue:
-                priority, page = heapq.heappop(prio_queue)
-                yield page
+    def _complete_revision(self, revision):
+        """
+        Return whether a revision dict contains the loadrevisions data.
+
+        @param revision: the revision dict or None
+        @type revision: dict
+        @rtype: bool
+        """
+        if not revision or '*' not in revision or 'texthidden' in revision:
+            return False
+        if ('contentmodel' in self._revision_props(False) and
+                'contentmodel' not in revision):
+            return False
+        if ('sha1' in self._revision_props(False) and
+                'sha1' not in revision and 'sha1hidden' not in revision):
+            return False
+        return True
+
+    def _cache_revisions(self, revision_cache, pagedata):
+        """Store the revisions of the page data which are complete."""
+        for revision in pagedata.get('revisions', []):
+            if self._complete_revision(revision):
+                revision_cache.store(self, revision)
 
     def validate_tokens(self, types):
         """Validate if requested tokens are acceptable.
@@ -3920,13 +4063,8 @@ class APISite(BaseSite):
 
         rvargs = {'type_arg': 'info|revisions'}
 
-        rvargs['rvprop'] = ['ids', 'timestamp', 'flags', 'comment', 'user']
-        if MediaWikiVersion(self.version()) >= MediaWikiVersion('1.21'):
-            rvargs['rvprop'].append('contentmodel')
-        if MediaWikiVersion(self.version()) >= MediaWikiVersion('1.19'):
-            rvargs['rvprop'].append('sha1')
+        rvargs['rvprop'] = self._revision_props(getText)
         if getText:
-            rvargs['rvprop'].append('content')
             if section is not None:
                 rvargs[u"rvsection"] = unicode(section)
         if rollback:
@@ -3960,6 +4098,13 @@ class APISite(BaseSite):
             rvargs[u"rvexcludeuser"] = excludeuser
         # TODO if sysop: something
 
+        revision_cache = None
+        if getText and latest and section is None and not rollback:
+            revision_cache = get_revision_cache()
+            if (revision_cache and
+                    self._load_cached_revision(page, revision_cache)):
+                return
+
         # assemble API request
         rvgen = self._generator(api.PropertyGenerator, total=total, **rvargs)
         if step:
@@ -3974,8 +4119,37 @@ class APISite(BaseSite):
                 raise InconsistentTitleReceived(page, pagedata['title'])
             if "missing" in pagedata:
                 raise NoPage(page)
+            if revision_cache:
+                self._cache_revisions(revision_cache, pagedata)
             api.update_page(page, pagedata, rvgen.props)
 
+    def _load_cached_revision(self, page, revision_cache):
+        """
+        Load the latest revision of the page from the revision cache.
+
+        Only the id of the latest revision is requested from the site.
+
+        @return: whether the latest revision was cached
+        @rtype: bool
+        """
+        infogen = self._generator(
+            api.PropertyGenerator, type_arg='info',
+            titles=page.title(withSection=False).encode(self.encoding()))
+        for pagedata in infogen:
+            if not self.sametitle(pagedata['title'],
+                                  page.title(withSection=False)):
+                raise InconsistentTitleReceived(page, pagedata['title'])
+            if 'missing' in pagedata:
+                raise NoPage(page)
+            revision = revision_cache.get(self, pagedata['lastrevid'])
+            if not self._complete_revision(revision):
+                return False
+            pagedata['revisions'] = [revision]
+            api.update_page(page, pagedata,
+                            infogen.props | set(['revisions']))
+            return True
+        return False
+
     # TODO: expand support to other parameters of action=parse?
     def get_parsed_page(self, page):
         """Retrieve parsed text of the page using action=parse."""
@@ -7255,18 +7429,27 @@ class DataSite(APISite):
             raise api.APIError(data['errors'])
         return data['entities']
 
-    def preloaditempages(self, pagelist, groupsize=50):
+    def preloaditempages(self, pagelist, groupsize=50, props=None):
         """
         Yield ItemPages with content prefilled.
 
         Note that pages will be iterated in a different order
         than in the underlying pagelist.
 
+        When props is given, only these parts of the items are loaded and
+        the other parts of the yielded items are empty, e.g. props=['claims']
+        loads only the claims. The 'info' of the items is always loaded.
+
         @param pagelist: an iterable that yields either WikibasePage objects,
                          or Page objects linked to an ItemPage.
         @param groupsize: how many pages to query at a time
         @type groupsize: int
+        @param props: the parts of the items to load, e.g. 'claims',
+            'sitelinks' or 'labels'; all parts if None
+        @type props: iterable of str
         """
+        if props is not None:
+            props = set(props) | set(['info'])
         for sublist in itergroup(pagelist, groupsize):
             req = {'ids': [], 'titles': [], 'sites': []}
             for p in sublist:
@@ -7284,6 +7467,8 @@ class DataSite(APISite):
                         req['sites'].append(p.site.dbName())
                         req['titles'].append(p._link._text)
 
+            if props is not None:
+                req['props'] = sorted(props)
             req = self._simple_request(action='wbgetentities', **req)
             data = req.submit()
             for qid in data['entities']:
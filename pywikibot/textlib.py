@@ -16,6 +16,7 @@ from __future__ import absolute_import, unicode_literals
 __version__ = '$Id$'
 #
 
+import bisect
 import collections
 import datetime
 import re
@@ -58,6 +59,20 @@ _ETP_REGEX = re.compile(
     r'{{(?:msg:)?(?P<name>[^{\|]+?)'
     r'(?:\|(?P<params>[^{]+?(?:{[^{]+?}[^{]*?)?)?)?}}')
 
+# The tokens which are significant for extract_templates_and_params_tokenizer.
+# The content of comments and of the tags is not parsed.
+_ETP_TOKEN_REGEX = re.compile(
+    r'[|=]|{{+|}}+|\[\[+|]]+|<(?:!--|(?P<tag>[a-zA-Z]+))')
+_ETP_TAG_END_REGEX = re.compile(r'(?=[\s/>])[^<>]*?(?P<selfclosing>/?)>')
+_ETP_CLOSING_TAGS = dict(
+    (tag, re.compile(r'</%s\s*>' % tag, re.IGNORECASE))
+    for tag in ('nowiki', 'pre', 'math', 'source', 'syntaxhighlight'))
+# The comments and nested templates or template variables of a name, and
+# the chars which make a template name invalid.
+_ETP_NAME_COMMENT_REGEX = re.compile(r'<!--.*?(?:-->|$)', re.DOTALL)
+_ETP_NAME_NESTED_REGEX = re.compile(r'{{{?[^{}]*}}}?')
+_ETP_NAME_INVALID_REGEX = re.compile(r'[<>\[\]{}]|\S\s*\n\s*\S')
+
 # This template is a more inclusive template matching algorithm
 # that allows system variables, but does not match nested templates.
 # It exists for backwards compatibility to the old 'TEMP_REGEX'
@@ -308,44 +323,147 @@ def _get_regexes(keys, site):
     return result
 
 
-def replaceExcept(text, old, new, exceptions, caseInsensitive=False,
-                  allowoverlap=False, marker='', site=None, count=0):
-    """
-    Return text with 'old' replaced by 'new', ignoring specified types of text.
+class _ExceptionMatcher(object):
 
-    Skips occurrences of 'old' within exceptions; e.g., within nowiki tags or
-    HTML comments. If caseInsensitive is true, then use case insensitive
-    regex matching. If allowoverlap is true, overlapping occurrences are all
-    replaced (watch out when using this, it might lead to infinite loops!).
+    """
+    Find the next exception in a text which is changed by replacements.
 
-    @type text: unicode
-    @param old: a compiled or uncompiled regular expression
-    @param new: a unicode string (which can contain regular
-        expression references), or a function which takes
-        a match object as parameter. See parameter repl of
-        re.sub().
-    @param exceptions: a list of strings which signal what to leave out,
-        e.g. ['math', 'table', 'template']
-    @type caseInsensitive: bool
-    @param marker: a string that will be added to the last replacement;
-        if nothing is changed, it is added at the end
-    @param count: how many replacements to do at most. See parameter
-        count of re.sub().
-    @type count: int
+    The result of searching an exception regex from an index is kept and
+    reused by later searches from any index up to the start of the found
+    match. When the text is changed, the results after the change are moved
+    if the regex can't look back into the changed part; the other results
+    are discarded.
     """
-    # if we got a string, compile it as a regular expression
-    if isinstance(old, basestring):
-        if caseInsensitive:
-            old = re.compile(old, re.IGNORECASE | re.UNICODE)
+
+    def __init__(self, text):
+        """
+        Constructor.
+
+        @param text: the text which is searched
+        @type text: unicode
+        """
+        self.text = text
+        # regex -> (search indices, match spans or None)
+        self._results = {}
+        self._lookbehind = {}
+
+    @staticmethod
+    def _get_lookbehind(regex):
+        """
+        Return how many characters before a match the regex may examine.
+
+        @return: 0 or 1 or None if it is unknown
+        """
+        pattern = regex.pattern
+        if '(?<' in pattern or '\\A' in pattern:
+            return None
+        if '^' in pattern or '\\b' in pattern or '\\B' in pattern:
+            return 1
+        return 0
+
+    def search(self, regex, index):
+        """Return the span of the first match starting at the index or after."""
+        if regex not in self._results:
+            self._results[regex] = ([], [])
+            self._lookbehind[regex] = self._get_lookbehind(regex)
+        indices, spans = self._results[regex]
+        i = bisect.bisect_right(indices, index)
+        if i and (spans[i - 1] is None or spans[i - 1][0] >= index):
+            return spans[i - 1]
+        match = regex.search(self.text, index)
+        span = match.span() if match else None
+        if i < len(spans) and spans[i] == span:
+            # the following result is valid from this index on
+            indices[i] = index
         else:
-            old = re.compile(old)
+            indices.insert(i, index)
+            spans.insert(i, span)
+        return span
+
+    def next_exception(self, regexes, index):
+        """Return the span of the next match of any of the regexes."""
+        result = None
+        for regex in regexes:
+            span = self.search(regex, index)
+            if span and (result is None or span[0] < result[0]):
+                result = span
+        return result
+
+    def replace(self, text, start, end, length):
+        """
+        Update the results after text[start:end] was replaced.
 
-    # early termination if not relevant
-    if not old.search(text):
-        return text + marker
+        @param text: the new text
+        @type text: unicode
+        @param length: the length of the replacement
+        @type length: int
+        """
+        self.text = text
+        delta = length - (end - start)
+        for regex, (indices, spans) in self._results.items():
+            lookbehind = self._lookbehind[regex]
+            old_indices, old_spans = indices[:], spans[:]
+            del indices[:], spans[:]
+            if lookbehind is None:
+                continue
+            # a match from limit on doesn't depend on the changed part
+            limit = end + lookbehind
+            for index, span in zip(old_indices, old_spans):
+                if span is not None:
+                    if span[0] < limit:
+                        continue
+                    span = (span[0] + delta, span[1] + delta)
+                if spans and spans[-1] == span:
+                    # the previous result is valid up to this match
+                    continue
+                indices.append(max(index, limit) + delta)
+                spans.append(span)
 
-    dontTouchRegexes = _get_regexes(exceptions, site)
 
+_GROUP_REGEX = re.compile(r'\\(\d+)|\\g<(.+?)>')
+
+
+def _expand_replacement(new, match):
+    """Return the replacement string with the group references expanded."""
+    # We cannot just insert the new string, as it may contain regex
+    # group references such as \2 or \g<name>.
+    # On the other hand, this approach does not work because it
+    # can't handle lookahead or lookbehind (see bug T123185):
+    #
+    #  replacement = old.sub(new, text[match.start():match.end()])
+    #  text = text[:match.start()] + replacement + text[match.end():]
+
+    # So we have to process the group references manually.
+    replacement = ''
+
+    last = 0
+    for group_match in _GROUP_REGEX.finditer(new):
+        group_id = group_match.group(1) or group_match.group(2)
+        try:
+            group_id = int(group_id)
+        except ValueError:
+            pass
+        try:
+            replacement += new[last:group_match.start()]
+            replacement += match.group(group_id) or ''
+        except IndexError:
+            raise IndexError(
+                'Invalid group reference: {0}\nGroups found: {1}'
+                ''.format(group_id, match.groups()))
+        last = group_match.end()
+    replacement += new[last:]
+    return replacement
+
+
+def _replace_except(matcher, old, new, dontTouchRegexes, allowoverlap=False,
+                    marker='', count=0):
+    """Replace old by new in the text of the matcher; see L{replaceExcept}."""
+    if not callable(new):
+        # it is a little hack to make \n work. It would be better
+        # to fix it previously, but better than nothing.
+        new = new.replace('\\n', '\n')
+
+    text = matcher.text
     index = 0
     replaced = 0
     markerpos = len(text)
@@ -358,19 +476,13 @@ def replaceExcept(text, old, new, exceptions, caseInsensitive=False,
             break
 
         # check which exception will occur next.
-        nextExceptionMatch = None
-        for dontTouchR in dontTouchRegexes:
-            excMatch = dontTouchR.search(text, index)
-            if excMatch and (
-                    nextExceptionMatch is None or
-                    excMatch.start() < nextExceptionMatch.start()):
-                nextExceptionMatch = excMatch
+        nextExceptionMatch = matcher.next_exception(dontTouchRegexes, index)
 
         if nextExceptionMatch is not None \
-                and nextExceptionMatch.start() <= match.start():
+                and nextExceptionMatch[0] <= match.start():
             # an HTML comment or text in nowiki tags stands before the next
             # valid match. Skip.
-            index = nextExceptionMatch.end()
+            index = nextExceptionMatch[1]
         else:
             # We found a valid match. Replace it.
             if callable(new):
@@ -379,41 +491,10 @@ def replaceExcept(text, old, new, exceptions, caseInsensitive=False,
                 replacement = new(match)
             else:
                 # it is not a function, but a string.
-
-                # it is a little hack to make \n work. It would be better
-                # to fix it previously, but better than nothing.
-                new = new.replace('\\n', '\n')
-
-                # We cannot just insert the new string, as it may contain regex
-                # group references such as \2 or \g<name>.
-                # On the other hand, this approach does not work because it
-                # can't handle lookahead or lookbehind (see bug T123185):
-                #
-                #  replacement = old.sub(new, text[match.start():match.end()])
-                #  text = text[:match.start()] + replacement + text[match.end():]
-
-                # So we have to process the group references manually.
-                replacement = ''
-
-                group_regex = re.compile(r'\\(\d+)|\\g<(.+?)>')
-                last = 0
-                for group_match in group_regex.finditer(new):
-                    group_id = group_match.group(1) or group_match.group(2)
-                    try:
-                        group_id = int(group_id)
-                    except ValueError:
-                        pass
-                    try:
-                        replacement += new[last:group_match.start()]
-                        replacement += match.group(group_id) or ''
-                    except IndexError:
-                        raise IndexError(
-                            'Invalid group reference: {0}\nGroups found: {1}'
-                            ''.format(group_id, match.groups()))
-                    last = group_match.end()
-                replacement += new[last:]
+                replacement = _expand_replacement(new, match)
 
             text = text[:match.start()] + replacement + text[match.end():]
+            matcher.replace(text, match.start(), match.end(), len(replacement))
 
             # continue the search on the remaining text
             if allowoverlap:
@@ -425,10 +506,96 @@ def replaceExcept(text, old, new, exceptions, caseInsensitive=False,
                 index += 1
             markerpos = match.start() + len(replacement)
             replaced += 1
-    text = text[:markerpos] + marker + text[markerpos:]
+    if marker:
+        text = text[:markerpos] + marker + text[markerpos:]
+        matcher.replace(text, markerpos, markerpos, len(marker))
     return text
 
 
+def replaceExcept(text, old, new, exceptions, caseInsensitive=False,
+                  allowoverlap=False, marker='', site=None, count=0):
+    """
+    Return text with 'old' replaced by 'new', ignoring specified types of text.
+
+    Skips occurrences of 'old' within exceptions; e.g., within nowiki tags or
+    HTML comments. If caseInsensitive is true, then use case insensitive
+    regex matching. If allowoverlap is true, overlapping occurrences are all
+    replaced (watch out when using this, it might lead to infinite loops!).
+
+    @type text: unicode
+    @param old: a compiled or uncompiled regular expression
+    @param new: a unicode string (which can contain regular
+        expression references), or a function which takes
+        a match object as parameter. See parameter repl of
+        re.sub().
+    @param exceptions: a list of strings which signal what to leave out,
+        e.g. ['math', 'table', 'template']
+    @type caseInsensitive: bool
+    @param marker: a string that will be added to the last replacement;
+        if nothing is changed, it is added at the end
+    @param count: how many replacements to do at most. See parameter
+        count of re.sub().
+    @type count: int
+    """
+    # if we got a string, compile it as a regular expression
+    if isinstance(old, basestring):
+        if caseInsensitive:
+            old = re.compile(old, re.IGNORECASE | re.UNICODE)
+        else:
+            old = re.compile(old)
+
+    # early termination if not relevant
+    if not old.search(text):
+        return text + marker
+
+    dontTouchRegexes = _get_regexes(exceptions, site)
+    return _replace_except(_ExceptionMatcher(text), old, new,
+                           dontTouchRegexes, allowoverlap, marker, count)
+
+
+def replace_except_all(text, replacements, exceptions, allowoverlap=False,
+                       site=None):
+    """
+    Return text with several replacements applied, ignoring exceptions.
+
+    The result is the same as calling L{replaceExcept} for each replacement
+    on the result of the previous one. But the text is searched for the
+    exceptions only once for all replacements; only the parts changed by a
+    replacement are searched again.
+
+    @param text: the text
+    @type text: unicode
+    @param replacements: tuples of the old regex and the new text, as in
+        replaceExcept, optionally followed by a list of exceptions which only
+        apply to that replacement
+    @type replacements: iterable of tuple
+    @param exceptions: the exceptions of all replacements
+    @type exceptions: list
+    @return: the new text and the indices of the replacements which changed
+        the text
+    @rtype: tuple of unicode and list of int
+    """
+    matcher = _ExceptionMatcher(text)
+    changed = []
+    for i, replacement in enumerate(replacements):
+        old, new = replacement[:2]
+        if isinstance(old, basestring):
+            old = re.compile(old)
+        # early termination if not relevant
+        if not old.search(matcher.text):
+            continue
+        if len(replacement) > 2 and replacement[2]:
+            dontTouchRegexes = _get_regexes(
+                list(exceptions) + list(replacement[2]), site)
+        else:
+            dontTouchRegexes = _get_regexes(exceptions, site)
+        old_text = matcher.text
+        _replace_except(matcher, old, new, dontTouchRegexes, allowoverlap)
+        if matcher.text != old_text:
+            changed.append(i)
+    return matcher.text, changed
+
+
 def removeDisabledParts(text, tags=['*'], include=[]):
     """
     Return text without portions where wiki markup is disabled.
@@ -1367,9 +1534,14 @@ def extract_templates_and_params(text, remove_disabled_parts=None, strip=None):
 
     This uses the package L{mwparserfromhell} (mwpfh) if it is installed
     and enabled by config.mwparserfromhell. Otherwise it falls back on a
-    regex based implementation.
+    regex based implementation. If config.use_template_tokenizer is
+    enabled, a tokenizer which scans the text once is used instead of both.
+    Its result mostly equals the mwpfh result, but it follows the MediaWiki
+    preprocessor where the two differ, see
+    L{extract_templates_and_params_tokenizer}.
 
-    There are minor differences between the two implementations.
+    There are minor differences between the mwpfh and regex
+    implementations.
 
     The two implementations return nested templates in a different order.
     i.e. for {{a|b={{c}}}}, mwpfh returns [a, c], whereas regex returns [c, a].
@@ -1387,29 +1559,34 @@ def extract_templates_and_params(text, remove_disabled_parts=None, strip=None):
     @param remove_disabled_parts: Remove disabled wikitext such as comments
         and pre. If None (default), this is enabled when mwparserfromhell
         is not available or is disabled in the config, and disabled if
-        mwparserfromhell is present and enabled in the config.
+        mwparserfromhell is present and enabled in the config or if the
+        tokenizer is enabled.
     @type remove_disabled_parts: bool or None
     @param strip: if enabled, strip arguments and values of templates.
         If None (default), this is enabled when mwparserfromhell
         is not available or is disabled in the config, and disabled if
-        mwparserfromhell is present and enabled in the config.
+        mwparserfromhell is present and enabled in the config or if the
+        tokenizer is enabled.
     @type strip: bool
     @return: list of template name and params
     @rtype: list of tuple
     """
     use_mwparserfromhell = (config.use_mwparserfromhell and
                             not isinstance(mwparserfromhell, Exception))
+    parsed = use_mwparserfromhell or config.use_template_tokenizer
 
     if remove_disabled_parts is None:
-        remove_disabled_parts = not use_mwparserfromhell
+        remove_disabled_parts = not parsed
 
     if strip is None:
-        strip = not use_mwparserfromhell
+        strip = not parsed
 
     if remove_disabled_parts:
         text = removeDisabledParts(text)
 
-    if use_mwparserfromhell:
+    if config.use_template_tokenizer:
+        return extract_templates_and_params_tokenizer(text, strip)
+    elif use_mwparserfromhell:
         return extract_templates_and_params_mwpfh(text, strip)
     else:
         return extract_templates_and_params_regex(text, False, strip)
@@ -1634,6 +1811,142 @@ def extract_templates_and_params_regex(text, remove_disabled_parts=True,
     return result
 
 
+def _etp_template(text, parts, end, strip):
+    """Return the name and params of a template found by the tokenizer."""
+    ends = [start - 1 for start, equals in parts[1:]] + [end]
+    name = text[parts[0][0]:ends[0]].strip()
+    if not name:
+        return None
+    checked = _ETP_NAME_COMMENT_REGEX.sub('', name)
+    if not checked.strip():
+        return None
+    count = 1
+    while count:
+        checked, count = _ETP_NAME_NESTED_REGEX.subn('', checked)
+    if _ETP_NAME_INVALID_REGEX.search(checked):
+        return None
+    params = OrderedDict()
+    numbered_param = 1
+    for (start, equals), stop in zip(parts[1:], ends[1:]):
+        if equals is None:
+            key = unicode(numbered_param)
+            value = text[start:stop]
+            numbered_param += 1
+        else:
+            key = text[start:equals]
+            value = text[equals + 1:stop]
+            if strip:
+                key = key.strip()
+                value = value.strip()
+        params[key] = value
+    return name, params
+
+
+def extract_templates_and_params_tokenizer(text, strip=False):
+    """
+    Extract templates with params by tokenizing the text once.
+
+    This function should not be called directly.
+
+    Use extract_templates_and_params, which will select this
+    implementation if it is enabled by config.use_template_tokenizer.
+
+    The braces are matched like the MediaWiki preprocessor does it: an
+    opening run of braces is closed by the closing run of its own nesting
+    level, which is a template variable for three and a template for two
+    braces. The pipes in links and the attributes of tags don't separate
+    parameters. Comments and the content of nowiki, pre, math, source and
+    syntaxhighlight tags are kept in the parameter values but are not
+    parsed. A name which contains a link, a tag, braces or brackets, or
+    text on more than one line, is not a template.
+
+    The templates are returned in the order of their positions in the text,
+    like the mwparserfromhell implementation does it. The results differ
+    where mwparserfromhell deviates from the MediaWiki preprocessor:
+
+     - a tag may contain newlines, e.g. in {{a|<pre\\n>|</pre>}} the pipe
+       is part of the pre tag
+     - braces don't close an open link, e.g. {{a|[[b}}|c]]}} has the
+       parameter '[[b}}|c]]'
+     - an unclosed comment extends to the end of the text
+     - an invalid nested template is still closed by its braces, e.g.
+       {{a|{{b\\nc}}|d}} has the parameters '{{b\\nc}}' and 'd'
+     - the braces are not matched again after a run of unclosed braces
+
+    @param text: The wikitext from which templates are extracted
+    @type text: unicode or string
+    @param strip: if enabled, strip arguments and values of templates
+    @type strip: bool
+    @return: list of template name and params
+    @rtype: list of tuple
+    """
+    result = []
+    # the open runs of braces and brackets as [char, start, count, parts],
+    # where parts are [start, position of the first '='] of each part
+    stack = []
+    # tags without a closing tag after the current position
+    unclosed = set()
+    # the end of the last skipped comment or tag
+    pos = 0
+    for match in _ETP_TOKEN_REGEX.finditer(text):
+        start = match.start()
+        if start < pos:
+            continue
+        token = match.group()
+        char = token[0]
+        if char in '|=':
+            if stack and stack[-1][0] == '{':
+                parts = stack[-1][3]
+                if char == '|':
+                    parts.append([start + 1, None])
+                elif len(parts) > 1 and parts[-1][1] is None:
+                    parts[-1][1] = start
+        elif char in '{[':
+            count = len(token)
+            stack.append([char, start, count, [[start + count, None]]])
+        elif char in '}]':
+            opening = '{' if char == '}' else '['
+            count = len(token)
+            while count and stack and stack[-1][0] == opening:
+                element = stack[-1]
+                matching = min(count, element[2], 3 if char == '}' else 2)
+                if matching < 2:
+                    # no element is closed by a single char
+                    break
+                element[2] -= matching
+                if char == '}' and matching == 2:
+                    template = _etp_template(text, element[3], start, strip)
+                    if template:
+                        result.append((element[1] + element[2], template))
+                if element[2] < 2:
+                    stack.pop()
+                else:
+                    # the closed element is part of the remaining one
+                    element[3] = [[element[1] + element[2], None]]
+                start += matching
+                count -= matching
+        elif token == '<!--':
+            pos = text.find('-->', match.end())
+            pos = len(text) if pos < 0 else pos + 3
+        else:
+            tag_end = _ETP_TAG_END_REGEX.match(text, match.end())
+            if tag_end is None:
+                continue
+            # the attributes don't separate the parameters
+            pos = tag_end.end()
+            tag = match.group('tag').lower()
+            if (tag not in _ETP_CLOSING_TAGS or tag in unclosed or
+                    tag_end.group('selfclosing')):
+                continue
+            closing = _ETP_CLOSING_TAGS[tag].search(text, pos)
+            if closing is None:
+                unclosed.add(tag)
+            else:
+                pos = closing.end()
+    result.sort(key=lambda item: item[0])
+    return [template for start, template in result]
+
+
 def extract_templates_and_params_regex_simple(text):
     """
     Extract top-level templates with params using only a simple regex.
@@ -10,10 +10,17 @@ from __future__ import absolute_import, unicode_literals
 __version__ = '$Id$'
 #
 
+import hashlib
 import math
+import struct
 import threading
 import time
 
+try:
+    import fcntl
+except ImportError as e:
+    fcntl = e
+
 import pywikibot
 from pywikibot import config
 
@@ -37,12 +44,42 @@ class Throttle(object):
     Each Site initiates one Throttle object (site.throttle) to control the
     rate of access.
 
+    The throttle also records the server lag, the response latency and the
+    congestion responses of the site. If it is adaptive, the read and write
+    delays are adjusted to them: the delays are multiplied after congestion
+    and the rate is increased additively after each successful response
+    until the nominal delays are reached again.
+
     """
 
+    # Factor by which the delays are multiplied when the server is congested
+    backoff_factor = 2.0
+    # Requests per second added to the rate after a successful response
+    rate_increase = 0.1
+    # Rate in requests per second above which the nominal delay is used
+    max_rate = 10.0
+    # Weight of a new value in the moving averages of lag and latency
+    smoothing = 0.2
+    # HTTP status codes which show that the server is congested
+    congestion_status = (429, 503, 504)
+
     def __init__(self, site, mindelay=None, maxdelay=None, writedelay=None,
-                 multiplydelay=True):
-        """Constructor."""
+                 multiplydelay=True, adaptive=None):
+        """
+        Constructor.
+
+        @param adaptive: Whether to adapt the delays to the server load,
+            config.throttle_adaptive if None
+        @type adaptive: bool
+        """
         self.lock = threading.RLock()
+        self._stats_lock = threading.Lock()
+        self.adaptive = (config.throttle_adaptive if adaptive is None
+                         else adaptive)
+        self.server_lag = None
+        self.latency = None
+        self.responses = 0
+        self.congestions = 0
         self.mysite = str(site)
         self.ctrlfilename = config.datafilepath('throttle.ctrl')
         self.mindelay = mindelay
@@ -153,9 +190,10 @@ class Throttle(object):
             if absolute:
                 self.maxdelay = delay
                 self.mindelay = delay
-            self.delay = delay
+            self.delay = self.nominal_delay = delay
             self.writedelay = min(max(self.mindelay, writedelay),
                                   self.maxdelay)
+            self.nominal_writedelay = self.writedelay
             # Start the delay count now, not at the next check
             self.last_read = self.last_write = time.time()
         finally:
@@ -282,18 +320,111 @@ class Throttle(object):
         finally:
             self.lock.release()
 
+    def lag_delay(self, lagtime):
+        """Return how many seconds to pause due to server lag."""
+        if self.adaptive and self.server_lag is not None:
+            # 1/2 of the smoothed server lag, so that a single spike
+            # doesn't stall the bot
+            return min(max(1, self.server_lag // 2), 120)
+        # start at 1/2 the current server lag time
+        # wait at least 5 seconds but not more than 120 seconds
+        return min(max(5, lagtime // 2), 120)
+
+    def _average(self, average, value):
+        """Return the exponential moving average updated with value."""
+        if average is None:
+            return value
+        return average + self.smoothing * (value - average)
+
+    def _adapted_delay(self, delay, nominal, congested):
+        """Return the delay adapted after a response."""
+        if congested:
+            return min(self.maxdelay,
+                       max(delay, 1.0 / self.max_rate) * self.backoff_factor)
+        if delay <= nominal:
+            return nominal
+        rate = 1.0 / delay + self.rate_increase
+        if rate >= self.max_rate:
+            return nominal
+        return max(nominal, 1.0 / rate)
+
+    def _adapt(self, congested):
+        """Adapt the read and write delays if the throttle is adaptive."""
+        if congested:
+            self.congestions += 1
+        if not self.adaptive:
+            return
+        delay = self._adapted_delay(self.delay, self.nominal_delay, congested)
+        writedelay = self._adapted_delay(self.writedelay,
+                                         self.nominal_writedelay, congested)
+        if congested:
+            pywikibot.debug('{0}: server congested, delays set to {1:.2f}s '
+                            'and {2:.2f}s'.format(self.mysite, delay,
+                                                  writedelay), _logger)
+        self.delay = delay
+        self.writedelay = writedelay
+
+    def record_response(self, latency, status=None):
+        """
+        Record a response of the server.
+
+        @param latency: Seconds until the response was received, None if
+            no response was received
+        @type latency: float or None
+        @param status: The HTTP status code, None if no response was received
+        @type status: int or None
+        """
+        with self._stats_lock:
+            self.responses += 1
+            if latency is not None:
+                self.latency = self._average(self.latency, latency)
+            self._adapt(status is None or status in self.congestion_status)
+
+    def record_lag(self, lagtime):
+        """
+        Record a server lag which exceeded the maxlag parameter.
+
+        @param lagtime: The lag in seconds
+        @type lagtime: int
+        """
+        with self._stats_lock:
+            self.server_lag = self._average(self.server_lag, lagtime)
+            self._adapt(True)
+
+    @property
+    def metrics(self):
+        """
+        Return the current rates and the recorded server behaviour.
+
+        The rates are the requests per second allowed by the current delays,
+        None if they are not limited.
+
+        @rtype: dict
+        """
+        read_delay = self.getDelay()
+        write_delay = self.getDelay(write=True)
+        return {
+            'read_delay': read_delay,
+            'write_delay': write_delay,
+            'read_rate': 1.0 / read_delay if read_delay > 0 else None,
+            'write_rate': 1.0 / write_delay if write_delay > 0 else None,
+            'server_lag': self.server_lag,
+            'latency': self.latency,
+            'responses': self.responses,
+            'congestions': self.congestions,
+        }
+
     def lag(self, lagtime):
         """Seize the throttle lock due to server lag.
 
         This will prevent any thread from accessing this site.
 
         """
+        self.record_lag(lagtime)
         started = time.time()
         self.lock.acquire()
         try:
-            # start at 1/2 the current server lag time
-            # wait at least 5 seconds but not more than 120 seconds
-            delay = min(max(5, lagtime // 2), 120)
+            delay = self.lag_delay(lagtime)
             # account for any time we waited while acquiring the lock
             wait = delay - (time.time() - started)
 
@@ -301,3 +432,187 @@ class Throttle(object):
 
         finally:
             self.lock.release()
+
+
+class SharedBuckets(object):
+
+    """
+    Token bucket states shared by all processes using the same file.
+
+    The file consists of fixed size records of a key, the number of tokens
+    and the time they were counted. It is locked using C{fcntl.lockf} while
+    a bucket is updated. Without C{fcntl} (e.g. on Windows) the buckets are
+    only shared between the threads of this process.
+    """
+
+    record = struct.Struct(str('<64sdd'))
+
+    _lock = threading.Lock()
+
+    def __init__(self, filename):
+        """
+        Constructor.
+
+        @param filename: The path of the shared file
+        @type filename: str
+        """
+        self.filename = filename
+
+    @classmethod
+    def _encode_key(cls, key):
+        """Return the key as bytes which fit into a record."""
+        key = key.encode('utf-8')
+        if len(key) > 64:
+            key = hashlib.sha1(key).hexdigest().encode('ascii')
+        return key
+
+    def update(self, key, func):
+        """
+        Update a bucket while no other process can access it.
+
+        @param key: The key of the bucket
+        @type key: str
+        @param func: Callable which gets the tokens and their time, or None
+            for both if the bucket is new. It returns the new tokens, their
+            time and a value which is returned by this method.
+        @type func: callable
+        @return: The third value returned by func
+        """
+        key = self._encode_key(key)
+        size = self.record.size
+        with self._lock:
+            with open(self.filename, 'a+b') as f:
+                if not isinstance(fcntl, ImportError):
+                    fcntl.lockf(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    data = f.read()
+                    for offset in range(0, len(data) - size + 1, size):
+                        record_key, tokens, timestamp = self.record.unpack_from(
+                            data, offset)
+                        if record_key.rstrip(b'\0') == key:
+                            break
+                    else:
+                        # append a new record after the last complete one
+                        offset = len(data) - len(data) % size
+                        tokens = timestamp = None
+                    tokens, timestamp, result = func(tokens, timestamp)
+                    # 'a' mode always appends, so rewrite the file if needed
+                    data = (data[:offset] +
+                            self.record.pack(key, tokens, timestamp) +
+                            data[offset + size:])
+                    f.seek(0)
+                    f.truncate()
+                    f.write(data)
+                    f.flush()
+                finally:
+                    if not isinstance(fcntl, ImportError):
+                        fcntl.lockf(f, fcntl.LOCK_UN)
+        return result
+
+
+class TokenBucketThrottle(Throttle):
+
+    """
+    Throttle taking tokens from buckets shared by all bot processes.
+
+    Each site has a read and a write bucket which are refilled with one
+    token per read or write delay and hold at most C{bucket_size} tokens.
+    Each request takes tokens from the bucket, and if there are not enough
+    it waits exactly as long as the missing tokens need to be refilled. As
+    the buckets are kept in a locked shared file, processes on the same host
+    share the request budget of a site instead of multiplying their delays
+    by the number of running processes.
+    """
+
+    def __init__(self, site, mindelay=None, maxdelay=None, writedelay=None,
+                 bucket_size=None, filename=None, adaptive=None):
+        """
+        Constructor.
+
+        The buckets are refilled according to the current delays, so they
+        also adapt to the server load if the throttle is adaptive.
+
+        @param bucket_size: The number of tokens a full bucket contains,
+            config.throttle_bucket_size if None
+        @type bucket_size: int
+        @param filename: The shared file of the buckets, 'throttle.buckets'
+            in the data directory if None
+        @type filename: str
+        """
+        super(TokenBucketThrottle, self).__init__(
+            site, mindelay, maxdelay, writedelay, multiplydelay=False,
+            adaptive=adaptive)
+        if bucket_size is None:
+            bucket_size = config.throttle_bucket_size
+        self.bucket_size = max(bucket_size, 1)
+        self.buckets = SharedBuckets(
+            filename or config.datafilepath('throttle.buckets'))
+
+    def _bucket_key(self, write):
+        """Return the key of the read or write bucket of the site."""
+        return '{0} {1}'.format('write' if write else 'read', self.mysite)
+
+    def _refill(self, tokens, timestamp, delay, now):
+        """Return the tokens after refilling them since timestamp."""
+        if tokens is None:
+            return self.bucket_size
+        return min(self.bucket_size, tokens + (now - timestamp) / delay)
+
+    def take(self, write=False, tokens=1):
+        """
+        Take tokens from the bucket even if there are not enough.
+
+        @param write: Whether to use the write bucket
+        @type write: bool
+        @param tokens: The number of tokens to take
+        @type tokens: float
+        @return: Seconds to wait until the missing tokens are refilled
+        @rtype: float
+        """
+        delay = self.getDelay(write=write)
+        if delay <= 0:
+            return 0.0
+
+        def take_tokens(available, timestamp):
+            now = time.time()
+            available = self._refill(available, timestamp, delay, now)
+            available -= tokens
+            return available, now, max(0.0, -available * delay)
+
+        return self.buckets.update(self._bucket_key(write), take_tokens)
+
+    def waittime(self, write=False):
+        """Return waiting time in seconds if a query would be made right now."""
+        delay = self.getDelay(write=write)
+        if delay <= 0:
+            return 0.0
+
+        def peek(available, timestamp):
+            now = time.time()
+            if available is not None:
+                available = self._refill(available, timestamp, delay, now)
+                return (available, now,
+                        max(0.0, (1 - available) * delay))
+            return self.bucket_size, now, 0.0
+
+        return self.buckets.update(self._bucket_key(write), peek)
+
+    def drop(self):
+        """Do nothing as no process is registered."""
+        pass
+
+    def __call__(self, requestsize=1, write=False):
+        """
+        Block the calling thread until there are enough tokens in the bucket.
+
+        A request for several pages takes one token for each factor of two
+        in its size.
+        """
+        tokens = math.log(1 + requestsize) / math.log(2.0)
+        with self.lock:
+            self.wait(self.take(write=write, tokens=tokens))
+            if write:
+                self.last_write = time.time()
+            else:
+                self.last_read = time.time()
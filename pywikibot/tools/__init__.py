@@ -822,6 +822,152 @@ def intersect_generators(genlist):
                     return
 
 
+class _PrefetchThread(threading.Thread):
+
+    """Thread which calls a function and stores its result or exception."""
+
+    def __init__(self, func):
+        """Constructor."""
+        super(_PrefetchThread, self).__init__(name='PrefetchThread')
+        self.daemon = True
+        self.func = func
+        self.result = None
+        self.exception = None
+
+    def run(self):
+        """Call the function."""
+        try:
+            self.result = self.func()
+        except Exception as e:
+            self.exception = e
+
+
+def prefetch_results(tasks, depth):
+    """
+    Yield the results of callables while the next ones run in the background.
+
+    The results are yielded in the order of the tasks. While the caller
+    processes a result, up to depth following tasks are running in separate
+    threads. New tasks are only taken from the iterable when the caller
+    requests the next result, so a slow caller does not cause more than depth
+    results to be computed in advance.
+
+    The tasks iterable itself is consumed in the calling thread.
+
+    >>> list(prefetch_results((lambda i=i: i * i for i in range(5)), 2))
+    [0, 1, 4, 9, 16]
+
+    @param tasks: callables without arguments
+    @type tasks: iterable
+    @param depth: the number of tasks to run in advance; if it is less than
+        1, the tasks are called in the calling thread
+    @type depth: int
+    @raise Exception: any exception of a task when its result is due
+    """
+    if depth < 1:
+        for task in tasks:
+            yield task()
+        return
+
+    tasks = iter(tasks)
+    pending = collections.deque()
+
+    def start_tasks():
+        for task in itertools.islice(tasks, depth - len(pending)):
+            thread = _PrefetchThread(task)
+            thread.start()
+            pending.append(thread)
+
+    start_tasks()
+    while pending:
+        thread = pending.popleft()
+        start_tasks()
+        thread.join()
+        if thread.exception is not None:
+            raise thread.exception
+        yield thread.result
+
+
+class PrefetchIterator(object):
+
+    """
+    Iterator over an iterable which is iterated in a background thread.
+
+    The thread starts when the iterator is created and puts up to size
+    items into a queue, from which they are taken by the iterator. Any
+    exception of the thread is raised when all items before it have been
+    taken. The thread stops when the iterator is exhausted or L{stop} is
+    called, so the iterator must be stopped if it isn't exhausted.
+
+    >>> items = PrefetchIterator(range(5), 2)
+    >>> list(items)
+    [0, 1, 2, 3, 4]
+    """
+
+    def __init__(self, iterable, size):
+        """
+        Constructor.
+
+        @param iterable: the iterable, which is only iterated by the thread
+        @param size: the maximum number of items retrieved in advance
+        @type size: int
+        """
+        self._items = Queue.Queue(size)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._fetch,
+                                        args=(iterable, ),
+                                        name='PrefetchIterator')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _put(self, entry):
+        """Put the entry into the queue unless the iterator is stopped."""
+        while not self._stopped.is_set():
+            try:
+                self._items.put(entry, timeout=1)
+            except Queue.Full:
+                continue
+            return True
+        return False
+
+    def _fetch(self, iterable):
+        """Put the items of the iterable into the queue."""
+        try:
+            for item in iterable:
+                if not self._put(('item', item)):
+                    return
+        except Exception as e:
+            self._put(('error', e))
+        else:
+            self._put(('done', None))
+
+    def __iter__(self):
+        """Return the iterator itself."""
+        return self
+
+    def __next__(self):
+        """Return the next item."""
+        while not self._stopped.is_set():
+            # wait with a timeout, as Ctrl-C doesn't interrupt it otherwise
+            try:
+                kind, value = self._items.get(timeout=1)
+            except Queue.Empty:
+                continue
+            if kind == 'item':
+                return value
+            self.stop()
+            if kind == 'error':
+                raise value
+        raise StopIteration
+
+    if PY2:
+        next = __next__
+
+    def stop(self):
+        """Stop the background thread."""
+        self._stopped.set()
+
+
 def filter_unique(iterable, container=None, key=None, add=None):
     """
     Yield unique items from an iterable, omitting duplicates.
@@ -1606,6 +1752,7 @@ class ModuleDeprecationWrapper(types.ModuleType):
         if isinstance(module, basestring):
             module = sys.modules[module]
         super(ModuleDeprecationWrapper, self).__setattr__('_deprecated', {})
+        super(ModuleDeprecationWrapper, self).__setattr__('_lazy', {})
         super(ModuleDeprecationWrapper, self).__setattr__('_module', module)
         self.__dict__.update(module.__dict__)
 
@@ -1667,8 +1814,36 @@ class ModuleDeprecationWrapper(types.ModuleType):
         self.__dict__[attr] = value
         setattr(self._module, attr, value)
 
+    def _add_lazy_attr(self, name, module_name, attr_name=None):
+        """
+        Add an attribute which is imported when it is first used.
+
+        The wrapper must replace the module to import the attribute, which
+        L{LazyModuleWrapper} does in any case.
+
+        @param name: The name of the attribute
+        @type name: str
+        @param module_name: The module which is imported
+        @type module_name: str
+        @param attr_name: The attribute of the imported module which is
+            returned. If None, the attribute is the submodule of the wrapped
+            module which is called like the attribute; the imported module
+            may then be a submodule of it.
+        @type attr_name: str
+        """
+        self._lazy[name] = module_name, attr_name
+
     def __getattr__(self, attr):
         """Return the attribute with a deprecation warning if required."""
+        if attr in self._lazy:
+            module_name, attr_name = self._lazy[attr]
+            __import__(module_name)
+            if attr_name is None:
+                value = sys.modules[self._module.__name__ + '.' + attr]
+            else:
+                value = getattr(sys.modules[module_name], attr_name)
+            setattr(self, attr, value)
+            return value
         if attr in self._deprecated:
             warning_message = self._deprecated[attr][2]
             warn(warning_message.format(self._module.__name__, attr,
@@ -1693,6 +1868,33 @@ class ModuleDeprecationWrapper(types.ModuleType):
         return getattr(self._module, attr)
 
 
+class LazyModuleWrapper(ModuleDeprecationWrapper):
+
+    """
+    A wrapper for a module which imports some attributes on first use.
+
+    Unlike L{ModuleDeprecationWrapper}, it always replaces the module in
+    C{sys.modules}. It may be created at the beginning of the module, so
+    that the modules imported while the module is initialised also get the
+    wrapper; attributes which are defined later are looked up in the module
+    until L{_update} is called.
+    """
+
+    def __init__(self, module):
+        """
+        Initialise the wrapper.
+
+        @param module: The module name or instance
+        @type module: str or module
+        """
+        super(LazyModuleWrapper, self).__init__(module)
+        sys.modules[self._module.__name__] = self
+
+    def _update(self):
+        """Copy the attributes of the wrapped module to the wrapper."""
+        self.__dict__.update(self._module.__dict__)
+
+
 @deprecated('open_archive()')
 def open_compressed(filename, use_extension=False):
     """DEPRECATED: Open a file and uncompress it if needed."""
@@ -25,14 +25,6 @@ from distutils.sysconfig import get_python_lib
 from io import BytesIO
 from warnings import warn
 
-try:
-    from setuptools import svn_utils
-except ImportError:
-    try:
-        from setuptools_svn import svn_utils
-    except ImportError as e:
-        svn_utils = e
-
 import pywikibot
 
 from pywikibot import config2 as config
@@ -216,8 +208,11 @@ def getversion_svn_setuptools(path=None):
         - hash (git hash for the Subversion revision)
     @rtype: C{tuple} of three C{str} and a C{time.struct_time}
     """
-    if isinstance(svn_utils, Exception):
-        raise svn_utils
+    # setuptools is slow to import, so it is only imported when it is used
+    try:
+        from setuptools import svn_utils
+    except ImportError:
+        from setuptools_svn import svn_utils
     tag = 'pywikibot-core'
     _program_dir = path or _get_program_dir()
     svninfo = svn_utils.SvnInfo(_program_dir)
@@ -7,6 +7,16 @@ Each XmlEntry object represents a page, as read from an XML source
 The XmlDump class reads a pages_current XML dump (like the ones offered on
 https://dumps.wikimedia.org/backup-index.html) and offers a generator over
 XmlEntry objects which can be used by other bots.
+
+Multistream bz2 dumps can be parsed by several processes, which return only
+the entries matching an XmlEntryFilter::
+
+    dump = XmlDump('enwiki-latest-pages-articles-multistream.xml.bz2',
+                   entry_filter=XmlEntryFilter(namespaces=[0],
+                                               text='Infobox'),
+                   processes=4)
+    for entry in dump.parse():
+        ...
 """
 #
 # (C) Pywikibot team, 2005-2013
@@ -18,14 +28,25 @@ from __future__ import absolute_import, unicode_literals
 __version__ = '$Id$'
 #
 
+import multiprocessing
+import os
 import re
 import threading
 
+from io import BytesIO
 from xml.etree.cElementTree import iterparse
 
 import xml.sax
 
-from pywikibot.tools import open_archive
+from pywikibot import config2 as config
+from pywikibot.logging import debug
+from pywikibot.tools import bz2, open_archive, StringTypes
+
+_logger = 'xmlreader'
+
+_TAG_NAMES = ('page', 'revision', 'title', 'ns', 'id', 'restrictions',
+              'redirect', 'timestamp', 'comment', 'contributor', 'ip',
+              'username', 'text')
 
 
 def parseRestrictions(restrictions):
@@ -53,7 +74,17 @@ def parseRestrictions(restrictions):
 
 class XmlEntry(object):
 
-    """Represent a page."""
+    """
+    Represent a page.
+
+    The entries use slots instead of a dict to reduce their memory usage.
+    The text is converted to unicode when it is accessed the first time. It
+    is None if the dump was parsed in metadata only mode.
+    """
+
+    __slots__ = ('title', 'ns', 'id', '_text', 'username', 'ipedit',
+                 'timestamp', 'editRestriction', 'moveRestriction',
+                 'revisionid', 'comment', 'isredirect')
 
     def __init__(self, title, ns, id, text, username, ipedit, timestamp,
                  editRestriction, moveRestriction, revisionid, comment,
@@ -63,7 +94,7 @@ class XmlEntry(object):
         self.title = title
         self.ns = ns
         self.id = id
-        self.text = text
+        self._text = text
         self.username = username.strip()
         self.ipedit = ipedit
         self.timestamp = timestamp
@@ -73,6 +104,134 @@ class XmlEntry(object):
         self.comment = comment
         self.isredirect = redirect
 
+    @property
+    def text(self):
+        """Return the text of the revision."""
+        # cElementTree returns ASCII-only texts as bytes in Python 2
+        if isinstance(self._text, bytes):
+            self._text = self._text.decode('utf-8')
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        """Set the text of the revision."""
+        self._text = value
+
+    def _asdict(self):
+        """Return the attributes as a dict."""
+        result = dict((name, getattr(self, name))
+                      for name in self.__slots__ if name != '_text')
+        result['text'] = self.text
+        return result
+
+
+class XmlEntryFilter(object):
+
+    """
+    Filter of the entries of an XML dump.
+
+    An entry matches if all given conditions are true. The namespace and the
+    redirect conditions are already checked before the revision is read.
+    With several processes the filter is evaluated in the worker processes,
+    so it must be picklable.
+    """
+
+    def __init__(self, namespaces=None, title=None, text=None,
+                 redirects=None):
+        """
+        Constructor.
+
+        @param namespaces: the namespace numbers of the entries; entries of
+            dumps without namespace information are not filtered
+        @type namespaces: iterable of int
+        @param title: a regex which must be found in the title; if it is a
+            list, any of the regexes must be found
+        @type title: str, compiled regex or list of them
+        @param text: a regex which must be found in the text; if it is a
+            list, any of the regexes must be found
+        @type text: str, compiled regex or list of them
+        @param redirects: True to accept only redirects, False to accept only
+            pages which aren't redirects
+        @type redirects: bool or None
+        """
+        self.namespaces = (None if namespaces is None
+                           else frozenset(int(ns) for ns in namespaces))
+        self.title = self._compile(title)
+        self.text = self._compile(text)
+        self.redirects = redirects
+
+    @staticmethod
+    def _compile(regexes):
+        """Return a list of compiled regexes or None."""
+        if regexes is None:
+            return None
+        if isinstance(regexes, StringTypes) or hasattr(regexes, 'search'):
+            regexes = [regexes]
+        return [re.compile(regex) if isinstance(regex, StringTypes)
+                else regex for regex in regexes]
+
+    @staticmethod
+    def _search(regexes, value):
+        """Return whether any of the regexes is found in the value."""
+        return regexes is None or any(regex.search(value)
+                                      for regex in regexes)
+
+    def match_headers(self, title, ns, isredirect):
+        """Return whether the page headers match the filter."""
+        if (self.namespaces is not None and ns is not None and
+                int(ns) not in self.namespaces):
+            return False
+        if self.redirects is not None and isredirect != self.redirects:
+            return False
+        return self._search(self.title, title)
+
+    def __call__(self, entry):
+        """Return whether the entry matches the filter."""
+        return (self.match_headers(entry.title, entry.ns, entry.isredirect) and
+                self._search(self.text, entry.text))
+
+
+def _decompress_streams(data):
+    """Decompress the concatenated bz2 streams in data."""
+    result = []
+    while data:
+        decompressor = bz2.BZ2Decompressor()
+        result.append(decompressor.decompress(data))
+        data = decompressor.unused_data
+    return b''.join(result)
+
+
+def _read_stream_offsets(index):
+    """Return the sorted offsets of the streams in a multistream index."""
+    offsets = set()
+    with open_archive(index) as f:
+        for line in f:
+            if line.strip():
+                offsets.add(int(line.split(b':', 1)[0]))
+    return sorted(offsets)
+
+
+def _parse_streams(job):
+    """
+    Parse streams of a multistream dump and return the matching entries.
+
+    This is executed by the worker processes of L{XmlDump}.
+    """
+    filename, ranges, uri, allrevisions, entry_filter, metadata_only = job
+    dump = XmlDump(filename, allrevisions, entry_filter, processes=1,
+                   metadata_only=metadata_only)
+    start_tag = b'<mediawiki xmlns="' + uri.encode('utf-8') + b'">'
+    entries = []
+    with open(filename, 'rb') as f:
+        for start, end in ranges:
+            f.seek(start)
+            data = f.read() if end is None else f.read(end - start)
+            # the pages are not enclosed by the root element
+            data = _decompress_streams(data).replace(b'</mediawiki>', b'')
+            source = BytesIO(start_tag + data + b'</mediawiki>')
+            entries.extend(dump._parse_source(source))
+    return entries
+
 
 class XmlParserThread(threading.Thread):
 
@@ -105,14 +264,46 @@ class XmlDump(object):
     Reads the local file at initialization,
     parses it, and offers access to the resulting XmlEntries via a generator.
 
+    A multistream bz2 dump can be parsed by several processes using its
+    index file. Each process parses a part of the streams and returns only
+    the entries matching the filter. The entries are yielded in the order
+    of the dump.
+
     @param allrevisions: boolean
         If True, parse all revisions instead of only the latest one.
         Default: False.
+    @param entry_filter: only entries matching the filter are yielded
+    @type entry_filter: XmlEntryFilter or None
+    @param index: the index file of a multistream dump; if None, an index
+        file next to the dump with the usual name is used
+    @type index: str or None
+    @param processes: the number of processes parsing a multistream dump,
+        by default config.xml_dump_processes; other dumps are always parsed
+        by a single process
+    @type processes: int or None
+    @param metadata_only: if True, the text of the revisions is not read
+        and the text of the entries is None; the entry filter must not
+        contain a text condition
+    @type metadata_only: bool
     """
 
-    def __init__(self, filename, allrevisions=False):
+    #: Number of streams parsed by one job of a worker process
+    streams_per_job = 10
+
+    def __init__(self, filename, allrevisions=False, entry_filter=None,
+                 index=None, processes=None, metadata_only=False):
         """Constructor."""
+        if (metadata_only and entry_filter is not None and
+                entry_filter.text is not None):
+            raise ValueError('The entries can not be filtered by their text '
+                             'in metadata only mode.')
         self.filename = filename
+        self.metadata_only = metadata_only
+        self.allrevisions = allrevisions
+        self.entry_filter = entry_filter
+        self.index = index
+        self.processes = (config.xml_dump_processes if processes is None
+                          else processes)
         if allrevisions:
             self._parse = self._parse_all
         else:
@@ -120,65 +311,136 @@ class XmlDump(object):
 
     def parse(self):
         """Generator using cElementTree iterparse function."""
+        if self.processes > 1:
+            index = self.index or self._find_index()
+            if index:
+                for entry in self._parse_parallel(index):
+                    yield entry
+                return
+            debug('No multistream index found for {0}; parsing it in one '
+                  'process'.format(self.filename), _logger)
+
         with open_archive(self.filename) as source:
-            # iterparse's event must be a str but they are unicode with
-            # unicode_literals in Python 2
-            context = iterparse(source, events=(str('start'), str('end'),
-                                                str('start-ns')))
-            self.root = None
-
-            for event, elem in context:
-                if event == "start-ns" and elem[0] == "":
-                    self.uri = elem[1]
-                    continue
-                if event == "start" and self.root is None:
-                    self.root = elem
-                    continue
-                for rev in self._parse(event, elem):
+            for entry in self._parse_source(source):
+                yield entry
+
+    def _parse_source(self, source):
+        """Parse the XML file object and yield the matching entries."""
+        # iterparse's event must be a str but they are unicode with
+        # unicode_literals in Python 2
+        context = iterparse(source, events=(str('start'), str('end'),
+                                            str('start-ns')))
+        self.root = None
+
+        for event, elem in context:
+            if event == "start-ns" and elem[0] == "":
+                self._set_uri(elem[1])
+                continue
+            if event == "start" and self.root is None:
+                self.root = elem
+                continue
+            for rev in self._parse(event, elem):
+                if self.entry_filter is None or self.entry_filter(rev):
                     yield rev
 
+    def _find_index(self):
+        """Return the index file of a multistream dump or None."""
+        match = re.match(r'(.*-multistream)\.xml\.bz2$', self.filename)
+        if match:
+            for suffix in ('-index.txt.bz2', '-index.txt'):
+                if os.path.exists(match.group(1) + suffix):
+                    return match.group(1) + suffix
+        return None
+
+    def _parse_parallel(self, index):
+        """Parse the streams of a multistream dump in several processes."""
+        offsets = _read_stream_offsets(index)
+        # the first stream only contains the siteinfo
+        with open(self.filename, 'rb') as f:
+            header = _decompress_streams(f.read(offsets[0]))
+        uri = re.search(br'<mediawiki[^>]* xmlns="([^"]+)"', header)
+        uri = uri.group(1).decode('utf-8')
+
+        ranges = list(zip(offsets, offsets[1:] + [None]))
+        jobs = ((self.filename, ranges[i:i + self.streams_per_job], uri,
+                 self.allrevisions, self.entry_filter, self.metadata_only)
+                for i in range(0, len(ranges), self.streams_per_job))
+        pool = multiprocessing.Pool(self.processes)
+        try:
+            for entries in pool.imap(_parse_streams, jobs):
+                for entry in entries:
+                    yield entry
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _headers_match(self):
+        """Return whether the current page headers match the filter."""
+        return (self.entry_filter is None or
+                self.entry_filter.match_headers(self.title, self.ns,
+                                                self.isredirect))
+
+    def _set_uri(self, uri):
+        """Set the namespace uri and the qualified names of the tags."""
+        self.uri = uri
+        self._tags = dict((name, '{%s}%s' % (uri, name))
+                          for name in _TAG_NAMES)
+
     def _parse_only_latest(self, event, elem):
         """Parser that yields only the latest revision."""
-        if event == "end" and elem.tag == "{%s}page" % self.uri:
+        if event == "end" and elem.tag == self._tags['page']:
             self._headers(elem)
-            revision = elem.find("{%s}revision" % self.uri)
-            yield self._create_revision(revision)
+            if self._headers_match():
+                revision = elem.find(self._tags['revision'])
+                yield self._create_revision(revision)
             elem.clear()
             self.root.clear()
+        elif (event == "end" and self.metadata_only and
+                elem.tag == self._tags['text']):
+            elem.clear()
 
     def _parse_all(self, event, elem):
         """Parser that yields all revisions."""
-        if event == "start" and elem.tag == "{%s}page" % self.uri:
+        if event == "start" and elem.tag == self._tags['page']:
             self._headers(elem)
-        if event == "end" and elem.tag == "{%s}revision" % self.uri:
-            yield self._create_revision(elem)
+        if event == "end" and elem.tag == self._tags['revision']:
+            if self._headers_match():
+                yield self._create_revision(elem)
             elem.clear()
             self.root.clear()
+        elif (event == "end" and self.metadata_only and
+                elem.tag == self._tags['text']):
+            elem.clear()
 
     def _headers(self, elem):
         """Extract headers from XML chunk."""
-        self.title = elem.findtext("{%s}title" % self.uri)
-        self.ns = elem.findtext("{%s}ns" % self.uri)
-        self.pageid = elem.findtext("{%s}id" % self.uri)
-        self.restrictions = elem.findtext("{%s}restrictions" % self.uri)
-        self.isredirect = elem.findtext("{%s}redirect" % self.uri) is not None
+        tags = self._tags
+        self.title = elem.findtext(tags['title'])
+        self.ns = elem.findtext(tags['ns'])
+        self.pageid = elem.findtext(tags['id'])
+        self.restrictions = elem.findtext(tags['restrictions'])
+        self.isredirect = elem.find(tags['redirect']) is not None
         self.editRestriction, self.moveRestriction = parseRestrictions(
             self.restrictions)
 
     def _create_revision(self, revision):
         """Create a Single revision."""
-        revisionid = revision.findtext("{%s}id" % self.uri)
-        timestamp = revision.findtext("{%s}timestamp" % self.uri)
-        comment = revision.findtext("{%s}comment" % self.uri)
-        contributor = revision.find("{%s}contributor" % self.uri)
-        ipeditor = contributor.findtext("{%s}ip" % self.uri)
-        username = ipeditor or contributor.findtext("{%s}username" % self.uri)
+        tags = self._tags
+        revisionid = revision.findtext(tags['id'])
+        timestamp = revision.findtext(tags['timestamp'])
+        comment = revision.findtext(tags['comment'])
+        contributor = revision.find(tags['contributor'])
+        ipeditor = contributor.findtext(tags['ip'])
+        username = ipeditor or contributor.findtext(tags['username'])
         # could get comment, minor as well
-        text = revision.findtext("{%s}text" % self.uri)
+        if self.metadata_only:
+            text = None
+        else:
+            text = revision.findtext(tags['text']) or u''
         return XmlEntry(title=self.title,
                         ns=self.ns,
                         id=self.pageid,
-                        text=text or u'',
+                        text=text,
                         username=username or u'',  # username might be deleted
                         ipedit=bool(ipeditor),
                         timestamp=timestamp,
@@ -85,9 +85,10 @@ Options for several actions:
                   listed.
 
 For the actions tidy and tree, the bot will store the category structure
-locally in category.dump. This saves time and server load, but if it uses
-these data later, they may be outdated; use the -rebuild parameter in this
-case.
+locally in categories.sqlite. This saves time and server load. Categories
+stored longer than category_graph_max_age hours (see config.py) are
+refreshed, requesting only the pages added to them since then if possible;
+use the -rebuild parameter to reset the database.
 
 For example, to create a new category from a list of persons, type:
 
@@ -121,7 +122,6 @@ __version__ = '$Id$'
 
 import codecs
 import os
-import pickle
 import re
 import sys
 
@@ -132,8 +132,9 @@ from pywikibot import i18n, textlib
 from pywikibot.bot import (
     MultipleSitesBot, IntegerOption, StandardOption, ContextOption,
 )
+from pywikibot.data.categorygraph import CategoryGraph
 from pywikibot.tools import (
-    deprecated_args, deprecated, ModuleDeprecationWrapper, open_archive
+    deprecated_args, deprecated, ModuleDeprecationWrapper
 )
 from pywikibot.tools.formatter import color_format
 
@@ -166,126 +167,98 @@ cfd_templates = {
 
 class CategoryDatabase(object):
 
-    """Temporary database saving pages and subcategories for each category.
+    """Database saving pages and subcategories for each category.
 
-    This prevents loading the category pages over and over again.
+    This prevents loading the category pages over and over again. The
+    categories are stored by L{CategoryGraph} in an SQLite database, which
+    is opened on first access and refreshes the changed categories
+    incrementally.
     """
 
-    def __init__(self, rebuild=False, filename='category.dump.bz2'):
-        """Constructor."""
-        if not os.path.isabs(filename):
+    def __init__(self, rebuild=False, filename=None, site=None):
+        """
+        Constructor.
+
+        @param rebuild: remove the stored categories of the site
+        @type rebuild: bool
+        @param filename: the database file; see L{CategoryGraph}
+        @type filename: str
+        @param site: the site whose categories are removed by rebuild; the
+            default site if None
+        @type site: BaseSite
+        """
+        if filename and not os.path.isabs(filename):
             filename = config.datafilepath(filename)
         self.filename = filename
         if rebuild:
-            self.rebuild()
+            self.rebuild(site)
 
     @property
     def is_loaded(self):
-        """Return whether the contents have been loaded."""
-        return hasattr(self, 'catContentDB') and hasattr(self, 'superclassDB')
+        """Return whether the database has been opened."""
+        return hasattr(self, 'graph')
 
     def _load(self):
         if not self.is_loaded:
-            try:
-                pywikibot.output(u'Reading dump from %s'
-                                 % config.shortpath(self.filename))
-                with open_archive(self.filename, 'rb') as f:
-                    databases = pickle.load(f)
-                # keys are categories, values are 2-tuples with lists as
-                # entries.
-                self.catContentDB = databases['catContentDB']
-                # like the above, but for supercategories
-                self.superclassDB = databases['superclassDB']
-                del databases
-            except:
-                # If something goes wrong, just rebuild the database
-                self.rebuild()
-
-    def rebuild(self):
-        """Rebuild the dabatase."""
-        self.catContentDB = {}
-        self.superclassDB = {}
+            self.graph = CategoryGraph(self.filename)
+            pywikibot.output(u'Reading categories from %s'
+                             % config.shortpath(self.graph.filename))
+
+    def rebuild(self, site=None):
+        """
+        Rebuild the dabatase.
+
+        @param site: the site whose categories are removed; the default
+            site if None
+        @type site: BaseSite
+        """
+        self._load()
+        self.graph.clear(site or pywikibot.Site())
 
     def getSubcats(self, supercat):
-        """Return the list of subcategories for a given supercategory.
+        """Return the set of subcategories for a given supercategory.
 
-        Saves this list in a temporary database so that it won't be loaded from
+        Saves this set in the database so that it won't be loaded from
         the server next time it's required.
         """
         self._load()
-        # if we already know which subcategories exist here
-        if supercat in self.catContentDB:
-            return self.catContentDB[supercat][0]
-        else:
-            subcatset = set(supercat.subcategories())
-            articleset = set(supercat.articles())
-            # add to dictionary
-            self.catContentDB[supercat] = (subcatset, articleset)
-            return subcatset
+        return set(self.graph.subcategories(supercat))
 
     def getArticles(self, cat):
-        """Return the list of pages for a given category.
+        """Return the set of pages for a given category.
 
-        Saves this list in a temporary database so that it won't be loaded from
+        Saves this set in the database so that it won't be loaded from
         the server next time it's required.
         """
         self._load()
-        # if we already know which articles exist here
-        if cat in self.catContentDB:
-            return self.catContentDB[cat][1]
-        else:
-            subcatset = set(cat.subcategories())
-            articleset = set(cat.articles())
-            # add to dictionary
-            self.catContentDB[cat] = (subcatset, articleset)
-            return articleset
+        return set(self.graph.articles(cat))
 
-    def getSupercats(self, subcat):
-        """Return the supercategory (or a set of) for a given subcategory."""
+    def preload(self, category, depth):
+        """Retrieve the subcategories and articles of a category tree.
+
+        The categories are visited breadth-first and the following
+        categories are refreshed in background threads. The contents of the
+        category and of its subcategories up to the depth are saved in the
+        database.
+        """
         self._load()
-        # if we already know which subcategories exist here
-        if subcat in self.superclassDB:
-            return self.superclassDB[subcat]
-        else:
-            supercatset = set(subcat.categories())
-            # add to dictionary
-            self.superclassDB[subcat] = supercatset
-            return supercatset
+        self.graph.refresh_tree(category, depth)
 
-    def dump(self, filename=None):
-        """Save the dictionaries to disk if not empty.
+    def getSupercats(self, subcat):
+        """Return the set of supercategories for a given subcategory."""
+        self._load()
+        return set(self.graph.supercategories(subcat))
 
-        Pickle the contents of the dictionaries superclassDB and catContentDB
-        if at least one is not empty. If both are empty, removes the file from
-        the disk.
+    @deprecated_args(filename=None)
+    def dump(self):
+        """Close the database.
 
-        If the filename is None, it'll use the filename determined in __init__.
+        The categories are saved when they are retrieved, so nothing is
+        written to the disk.
         """
-        if filename is None:
-            filename = self.filename
-        elif not os.path.isabs(filename):
-            filename = config.datafilepath(filename)
-        if self.is_loaded and (self.catContentDB or self.superclassDB):
-            pywikibot.output(u'Dumping to %s, please wait...'
-                             % config.shortpath(filename))
-            databases = {
-                'catContentDB': self.catContentDB,
-                'superclassDB': self.superclassDB
-            }
-            # store dump to disk in binary format
-            with open_archive(filename, 'wb') as f:
-                try:
-                    pickle.dump(databases, f, protocol=config.pickle_protocol)
-                except pickle.PicklingError:
-                    pass
-        else:
-            try:
-                os.remove(filename)
-            except EnvironmentError:
-                pass
-            else:
-                pywikibot.output(u'Database is empty. %s removed'
-                                 % config.shortpath(filename))
+        if self.is_loaded:
+            self.graph.close()
+            del self.graph
 
 
 class CategoryAddBot(MultipleSitesBot):
@@ -1077,6 +1050,7 @@ class CategoryTreeRobot(object):
         """
         cat = pywikibot.Category(self.site, self.catTitle)
         pywikibot.output('Generating tree...', newline=False)
+        self.catDB.preload(cat, self.maxDepth)
         tree = self.treeview(cat)
         pywikibot.output(u'')
         if self.filename:
@@ -96,6 +96,7 @@ class ClaimRobot(WikidataBot):
         self.current_page = page
 
         if item:
+            batch = pywikibot.page.WikibaseEditBatch(self.repo)
             for claim in self.claims:
                 skip = False
                 # If claim with same property already exists...
@@ -144,13 +145,18 @@ class ClaimRobot(WikidataBot):
                 if not skip:
                     pywikibot.output('Adding %s --> %s'
                                      % (claim.getID(), claim.getTarget()))
-                    item.addClaim(claim)
+                    # the claims are added to every item, so each item
+                    # gets its own copy with its own sources
+                    new_claim = pywikibot.Claim(self.repo, claim.getID())
+                    new_claim.setTarget(claim.getTarget())
                     # A generator might yield pages from multiple languages
                     source = self.getSource(page.site)
-                    if source:
-                        claim.addSource(source, bot=True)
+                    batch.addClaim(item, new_claim,
+                                   sources=[source] if source else None)
                     # TODO FIXME: We need to check that we aren't adding a
                     # duplicate
+            # add all claims and their sources with a single edit
+            batch.flush()
 
 
 def listsEqual(list1, list2):
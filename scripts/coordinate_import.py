@@ -97,11 +97,11 @@ class CoordImportRobot(WikidataBot):
                                                    coordinate.lon,
                                                    item.title()))
         try:
-            item.addClaim(newclaim)
-
+            # add the claim and its source with a single edit
             source = self.getSource(page.site)
-            if source:
-                newclaim.addSource(source, bot=True)
+            with pywikibot.page.WikibaseEditBatch(self.repo) as batch:
+                batch.addClaim(item, newclaim,
+                               sources=[source] if source else None)
         except CoordinateGlobeUnknownException as e:
             pywikibot.output(u'Skipping unsupported globe: %s' % e.args)
 
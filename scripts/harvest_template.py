@@ -140,6 +140,12 @@ class HarvestRobot(WikidataBot):
 
         pagetext = page.get()
         templates = textlib.extract_templates_and_params(pagetext)
+        # add all claims and their sources with a single edit
+        with pywikibot.page.WikibaseEditBatch(self.repo) as batch:
+            self._harvest(page, item, templates, batch)
+
+    def _harvest(self, page, item, templates, batch):
+        """Add the claims of the template fields to the batch."""
         for (template, fielddict) in templates:
             # Clean up template
             try:
@@ -214,11 +220,11 @@ class HarvestRobot(WikidataBot):
                             pywikibot.output(
                                 'Adding %s --> %s'
                                 % (claim.getID(), claim.getTarget()))
-                            item.addClaim(claim)
                             # A generator might yield pages from multiple sites
                             source = self.getSource(page.site)
-                            if source:
-                                claim.addSource(source, bot=True)
+                            batch.addClaim(
+                                item, claim,
+                                sources=[source] if source else None)
 
 
 def main(*args):
@@ -304,11 +304,19 @@ The following arguments influence how many pages the bot works on at once:
     -query:        The maximum number of pages that the bot will load at once.
                    Default value is 50.
 
+    -parallel:     The number of sites which are queried at the same time.
+                   Each site still gets at most one query at once and its
+                   throttle is respected. The default is 1, but can be changed
+                   in the config variable interwiki_parallel_sites
+
 Some configuration option can be used to change the working of this bot:
 
 interwiki_min_subjects: the minimum amount of subjects that should be processed
                     at the same time.
 
+interwiki_parallel_sites: the number of sites which are queried at the same
+                    time.
+
 interwiki_backlink: if set to True, all problems in foreign wikis will
                     be reported
 
@@ -353,6 +361,7 @@ import re
 import shelve
 import socket
 import sys
+import threading
 import time
 
 import pywikibot
@@ -365,7 +374,10 @@ from pywikibot.tools import first_upper
 from pywikibot.tools.formatter import color_format
 
 if sys.version_info[0] > 2:
+    from queue import Queue, Empty
     unicode = str
+else:
+    from Queue import Queue, Empty
 
 docuReplacements = {
     '&pagegenerators_help;': pagegenerators.parameterHelp
@@ -494,6 +506,7 @@ class InterwikiBotConfig(object):
     rememberno = False
     followinterwiki = True
     minsubjects = config.interwiki_min_subjects
+    parallelsites = config.interwiki_parallel_sites
     nobackonly = False
     askhints = False
     hintnobracket = False
@@ -608,6 +621,8 @@ class InterwikiBotConfig(object):
             self.minsubjects = int(arg[7:])
         elif arg.startswith('-query:'):
             self.maxquerysize = int(arg[7:])
+        elif arg.startswith('-parallel:'):
+            self.parallelsites = int(arg[10:])
         elif arg == '-back':
             self.nobackonly = True
         elif arg == '-quiet':
@@ -2188,34 +2203,44 @@ class InterwikiBot(object):
         if self.subjects:
             return self.subjects[0]
 
-    def maxOpenSite(self):
+    def maxOpenSite(self, exclude=()):
         """
         Return the site that has the most open queries plus the number.
 
         If there is nothing left, return None.
-        Only languages that are TODO for the first Subject are returned.
+        Only languages that are TODO for the first Subject are returned,
+        unless all of them are excluded.
+
+        @param exclude: sites which must not be returned
+        @type exclude: collection of BaseSite
         """
         max = 0
         maxlang = None
         if not self.firstSubject():
             return None
         oc = dict(self.firstSubject().openSites())
-        if not oc:
-            # The first subject is done. This might be a recursive call made
-            # because we have to wait before submitting another modification to
-            # go live. Select any language from counts.
+        if all(site in exclude for site in oc):
+            # The first subject is done or all its sites are excluded. This
+            # might be a recursive call made because we have to wait before
+            # submitting another modification to go live. Select any language
+            # from counts.
             oc = self.counts
-        if pywikibot.Site() in oc:
+        if pywikibot.Site() in oc and pywikibot.Site() not in exclude:
             return pywikibot.Site()
         for lang in oc:
             count = self.counts[lang]
-            if count > max:
+            if count > max and lang not in exclude:
                 max = count
                 maxlang = lang
         return maxlang
 
-    def selectQuerySite(self):
-        """Select the site the next query should go out for."""
+    def selectQuerySite(self, exclude=()):
+        """
+        Select the site the next query should go out for.
+
+        @param exclude: sites which must not be returned
+        @type exclude: collection of BaseSite
+        """
         # How many home-language queries we still have?
         mycount = self.counts.get(pywikibot.Site(), 0)
         # Do we still have enough subjects to work on for which the
@@ -2239,7 +2264,7 @@ class InterwikiBot(object):
                     else:
                         break
             # If we have a few, getting the home language is a good thing.
-            if not self.conf.restoreAll:
+            if not self.conf.restoreAll and pywikibot.Site() not in exclude:
                 try:
                     if self.counts[pywikibot.Site()] > 4:
                         return pywikibot.Site()
@@ -2247,24 +2272,25 @@ class InterwikiBot(object):
                     pass
         # If getting the home language doesn't make sense, see how many
         # foreign page queries we can find.
-        return self.maxOpenSite()
+        return self.maxOpenSite(exclude)
 
-    def oneQuery(self):
+    def assembleQuery(self, site, busy=()):
         """
-        Perform one step in the solution process.
+        Assemble a reasonable list of pages to get from a site.
 
-        Returns True if pages could be preloaded, or false
-        otherwise.
+        The subjects which have pages on the site are promised that the work
+        on the site will be done.
+
+        @param busy: subjects which are still waiting for another query
+        @type busy: collection of Subject
+        @return: the subjects and their pages to be loaded
+        @rtype: tuple of list
         """
-        # First find the best language to work on
-        site = self.selectQuerySite()
-        if site is None:
-            pywikibot.output(u"NOTE: Nothing left to do")
-            return False
-        # Now assemble a reasonable list of pages to get
         subjectGroup = []
         pageGroup = []
         for subject in self.subjects:
+            if subject in busy:
+                continue
             # Promise the subject that we will work on the site.
             # We will get a list of pages we can do.
             pages = subject.whatsNextPageBatch(site)
@@ -2274,30 +2300,152 @@ class InterwikiBot(object):
                 if len(pageGroup) >= self.conf.maxquerysize:
                     # We have found enough pages to fill the bandwidth.
                     break
-        if len(pageGroup) == 0:
-            pywikibot.output(u"NOTE: Nothing left to do 2")
-            return False
-        # Get the content of the assembled list in one blow
-        gen = site.preloadpages(pageGroup, templates=True, langlinks=True, pageprops=True)
+        return subjectGroup, pageGroup
+
+    @staticmethod
+    def loadPages(site, pageGroup):
+        """Get the content of the assembled list of pages in one blow."""
+        gen = site.preloadpages(pageGroup, templates=True, langlinks=True,
+                                pageprops=True)
         for page in gen:
             # we don't want to do anything with them now. The
             # page contents will be read via the Subject class.
             pass
+
+    def oneQuery(self):
+        """
+        Perform one step in the solution process.
+
+        Returns True if pages could be preloaded, or false
+        otherwise.
+        """
+        # First find the best language to work on
+        site = self.selectQuerySite()
+        if site is None:
+            pywikibot.output(u"NOTE: Nothing left to do")
+            return False
+        # Now assemble a reasonable list of pages to get
+        subjectGroup, pageGroup = self.assembleQuery(site)
+        if len(pageGroup) == 0:
+            pywikibot.output(u"NOTE: Nothing left to do 2")
+            return False
+        self.loadPages(site, pageGroup)
         # Tell all of the subjects that the promised work is done
         for subject in subjectGroup:
             subject.batchLoaded(self)
         return True
 
-    def queryStep(self):
-        """Delete the ones that are done now."""
-        self.oneQuery()
+    def removeDone(self, busy=()):
+        """
+        Finish and delete the subjects which are done.
+
+        @param busy: subjects which are still waiting for a query and are
+            kept even if they have nothing left to do
+        @type busy: collection of Subject
+        """
         for i in range(len(self.subjects) - 1, -1, -1):
             subj = self.subjects[i]
-            if subj.isDone():
+            if subj.isDone() and subj not in busy:
                 subj.finish()
                 subj.clean()
                 del self.subjects[i]
 
+    def queryStep(self):
+        """Delete the ones that are done now."""
+        self.oneQuery()
+        self.removeDone()
+
+    def _queryThread(self, site, pageGroup, results):
+        """Load the pages of a site and put the site into the results."""
+        try:
+            self.loadPages(site, pageGroup)
+        except Exception as e:
+            results.put((site, e))
+        else:
+            results.put((site, None))
+
+    def parallelQueries(self):
+        """
+        Query several sites at the same time until finished.
+
+        Up to conf.parallelsites sites are queried in background threads.
+        A subject can only work on one site at a time, so it is part of at
+        most one running query. The subjects process the loaded pages in the
+        main thread as soon as the query of their site has finished, and
+        new queries are started for the sites which are then free.
+
+        The throttle of each site is respected, as every site has at most
+        one running query.
+        """
+        results = Queue()
+        # sites are keys, the subjects waiting for their query are values
+        running = {}
+        while not self.isDone():
+            busy = set()
+            for subjectGroup in running.values():
+                busy.update(subjectGroup)
+            tried = set(running)
+            while len(running) < self.conf.parallelsites:
+                site = self.selectQuerySite(tried)
+                if site is None:
+                    break
+                tried.add(site)
+                subjectGroup, pageGroup = self.assembleQuery(site, busy)
+                if not pageGroup:
+                    continue
+                busy.update(subjectGroup)
+                running[site] = subjectGroup
+                thread = threading.Thread(
+                    target=self._queryThread, args=(site, pageGroup, results),
+                    name='InterwikiQuery-{0}'.format(site))
+                thread.daemon = True
+                thread.start()
+            if not running:
+                pywikibot.output(u"NOTE: Nothing left to do")
+                self.removeDone()
+                continue
+            if not self.conf.quiet:
+                self.showQueueDepths(running)
+            # wait with a timeout, as Ctrl-C doesn't interrupt it otherwise
+            while True:
+                try:
+                    site, error = results.get(timeout=1)
+                except Empty:
+                    continue
+                break
+            subjectGroup = running.pop(site)
+            if error is not None:
+                raise error
+            # Tell all of the subjects that the promised work is done
+            for subject in subjectGroup:
+                subject.batchLoaded(self)
+            busy.difference_update(subjectGroup)
+            self.removeDone(busy)
+
+    def queueDepths(self):
+        """
+        Return the number of pages which still need to be loaded per site.
+
+        @return: the sites and their number of pages, the deepest queue first
+        @rtype: list of tuple
+        """
+        return sorted(((site, count) for site, count in self.counts.items()
+                       if count > 0), key=lambda item: (-item[1], str(item[0])))
+
+    def showQueueDepths(self, running=()):
+        """
+        Output the number of pages which still need to be loaded per site.
+
+        @param running: sites which are currently queried
+        @type running: collection of BaseSite
+        """
+        depths = ['{0}:{1}{2}'.format(site.code, count,
+                                      ' (loading)' if site in running else '')
+                  for site, count in self.queueDepths()]
+        pywikibot.output(u'NOTE: Queued pages per site: {0}; '
+                         u'{1} queries running'.format(
+                             ', '.join(depths) or 'none', len(running)))
+
     def isDone(self):
         """Check whether there is still more work to do."""
         return len(self) == 0 and self.pageGenerator is None
@@ -2315,6 +2463,9 @@ class InterwikiBot(object):
 
     def run(self):
         """Start the process until finished."""
+        if self.conf.parallelsites > 1:
+            self.parallelQueries()
+            return
         while not self.isDone():
             self.queryStep()
 
@@ -5,9 +5,12 @@ This script runs commands on each entry in the API caches.
 
 Syntax:
 
-    python pwb.py cache [-password] [-delete] [-c "..."] [-o "..."] [dir ...]
+    python pwb.py cache [-password] [-delete] [-purge] [-c "..."] [-o "..."]
+                        [dir ...]
 
-If no directory are specified, it will detect the API caches.
+If no directory are specified, it will detect the API caches. The entries of
+the 'sqlite' cache backend are processed if the directory contains its
+database cache.sqlite or if the database file itself is specified.
 
 If no command is specified, it will print the filename of all entries.
 If only -delete is specified, it will delete all entries.
@@ -15,6 +18,10 @@ If only -delete is specified, it will delete all entries.
 -delete           Delete each command filtered. If that option is set the
                   default output will be nothing.
 
+-purge            Delete all expired entries without loading each entry. The
+                  entries of the 'files' backend don't contain their expiry,
+                  so all entries older than API_config_expiry are deleted.
+
 -c                Filter command in python syntax. It must evaluate to True to
                   output anything.
 
@@ -70,11 +77,10 @@ __version__ = '$Id$'
 import datetime
 import hashlib
 import os
-import pickle
 
 import pywikibot
 
-from pywikibot.data import api
+from pywikibot.data import api, apicache
 
 # The follow attributes are used by eval()
 from pywikibot.page import User
@@ -82,7 +88,7 @@ from pywikibot.site import APISite, DataSite, LoginStatus
 
 __all__ = (
     'User', 'APISite', 'DataSite', 'LoginStatus',
-    'ParseError', 'CacheEntry', 'process_entries', 'main',
+    'ParseError', 'CacheEntry', 'process_entries', 'purge_entries', 'main',
     'has_password', 'is_logout', 'empty_response', 'not_accessed',
     'incorrect_hash',
     'older_than', 'newer_than', 'older_than_one_day', 'recent',
@@ -99,10 +105,11 @@ class CacheEntry(api.CachedRequest):
 
     """A Request cache entry."""
 
-    def __init__(self, directory, filename):
+    def __init__(self, directory, filename, backend=None):
         """Constructor."""
         self.directory = directory
         self.filename = filename
+        self.backend = backend or apicache.FileCacheBackend(directory)
 
     def __str__(self):
         """Return string equivalent of object."""
@@ -125,10 +132,16 @@ class CacheEntry(api.CachedRequest):
         return os.path.join(self._get_cache_dir(),
                             self._create_file_name())
 
+    def _get_cache_backend(self):
+        """Backend of the cached entry."""
+        return self.backend
+
     def _load_cache(self):
         """Load the cache entry."""
-        with open(self._cachefile_path(), 'rb') as f:
-            self.key, self._data, self._cachetime = pickle.load(f)
+        entry = self.backend.load(self.filename)
+        if entry is None:
+            raise ValueError('No cache entry {0}'.format(self.filename))
+        self.key, self._data, self._cachetime = entry
         return True
 
     def parse_key(self):
@@ -212,7 +225,48 @@ class CacheEntry(api.CachedRequest):
 
     def _delete(self):
         """Delete the cache entry."""
-        os.remove(self._cachefile_path())
+        self.backend.delete(self.filename)
+
+
+def _cache_entries(cache_path):
+    """Return the cache entries and their file paths in the path."""
+    sqlite_name = apicache.SQLiteCacheBackend.filename
+    if os.path.isdir(cache_path):
+        sqlite_path = os.path.join(cache_path, sqlite_name)
+        filenames = [os.path.join(cache_path, filename) for filename
+                     in apicache.FileCacheBackend(cache_path).keys()]
+    elif os.path.basename(cache_path) == sqlite_name:
+        sqlite_path = cache_path
+        filenames = []
+    else:
+        sqlite_path = None
+        filenames = [cache_path]
+
+    entries = [(CacheEntry(os.path.dirname(filepath),
+                           os.path.basename(filepath)), filepath)
+               for filepath in filenames]
+    if sqlite_path and os.path.exists(sqlite_path):
+        backend = apicache.SQLiteCacheBackend(sqlite_path)
+        entries += [(CacheEntry(os.path.dirname(sqlite_path), key, backend),
+                     None) for key in backend.keys()]
+    return entries
+
+
+def purge_entries(cache_path):
+    """
+    Delete all expired entries in the cache path.
+
+    @return: the number of deleted entries
+    @rtype: int
+    """
+    sqlite_name = apicache.SQLiteCacheBackend.filename
+    if os.path.basename(cache_path) == sqlite_name:
+        cache_path = os.path.dirname(cache_path)
+    deleted = apicache.FileCacheBackend(cache_path).purge()
+    sqlite_path = os.path.join(cache_path, sqlite_name)
+    if os.path.exists(sqlite_path):
+        deleted += apicache.SQLiteCacheBackend(sqlite_path).purge()
+    return deleted
 
 
 def process_entries(cache_path, func, use_accesstime=None, output_func=None,
@@ -240,19 +294,11 @@ def process_entries(cache_path, func, use_accesstime=None, output_func=None,
         pywikibot.error('%s: no such file or directory' % cache_path)
         return
 
-    if os.path.isdir(cache_path):
-        filenames = [os.path.join(cache_path, filename)
-                     for filename in os.listdir(cache_path)]
-    else:
-        filenames = [cache_path]
-
-    for filepath in filenames:
-        filename = os.path.basename(filepath)
-        cache_dir = os.path.dirname(filepath)
-        if use_accesstime is not False:
+    for entry, filepath in _cache_entries(cache_path):
+        # access times are only available for the files backend
+        if use_accesstime is not False and filepath:
             stinfo = os.stat(filepath)
 
-        entry = CacheEntry(cache_dir, filename)
         try:
             entry._load_cache()
         except ValueError as e:
@@ -261,11 +307,11 @@ def process_entries(cache_path, func, use_accesstime=None, output_func=None,
             pywikibot.exception(e, tb=True)
             continue
 
-        if use_accesstime is None:
+        if use_accesstime is None and filepath:
             stinfo2 = os.stat(filepath)
             use_accesstime = stinfo.st_atime != stinfo2.st_atime
 
-        if use_accesstime:
+        if use_accesstime and filepath:
             # Reset access times to values before loading cache entry.
             os.utime(filepath, (stinfo.st_atime, stinfo.st_mtime))
             entry.stinfo = stinfo
@@ -392,6 +438,7 @@ def main():
     local_args = pywikibot.handleArgs()
     cache_paths = None
     delete = False
+    purge = False
     command = None
     output = None
 
@@ -402,6 +449,8 @@ def main():
             output = arg
         elif arg == '-delete':
             delete = True
+        elif arg == '-purge':
+            purge = True
         elif arg == '-password':
             command = 'has_password(entry)'
         elif arg == '-c':
@@ -433,6 +482,13 @@ def main():
             cache_paths += [
                 os.path.join(os.path.expanduser('~/.pywikibot'), 'apicache')]
 
+    if purge:
+        for cache_path in cache_paths:
+            if os.path.exists(cache_path):
+                pywikibot.output('Deleted {0} expired entries in {1}'.format(
+                    purge_entries(cache_path), cache_path))
+        return
+
     if delete:
         action_func = CacheEntry._delete
     else:
@@ -0,0 +1,45 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Compile the i18n messages into one catalog file per message bundle.
+
+A catalog contains the messages of all languages of a bundle. It is mapped
+into memory and only the messages which are used are decoded, so that the
+JSON files don't need to be read and kept in memory for each language.
+The catalogs are ignored when a JSON file of their bundle is changed, so
+this script needs to be run again after the messages are updated.
+
+The following parameter is supported:
+
+-package:name   the messages package (default: scripts.i18n)
+"""
+#
+# (C) Pywikibot team, 2017
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+__version__ = '$Id$'
+
+import pywikibot
+
+from pywikibot import i18n
+
+
+def main(*args):
+    """Process command line arguments and compile the catalogs."""
+    for arg in pywikibot.handle_args(args):
+        option, _, value = arg.partition(':')
+        if option == '-package':
+            i18n.set_messages_package(value)
+        else:
+            pywikibot.bot.suggest_help(unknown_parameters=[arg])
+            return
+
+    for filename in i18n.compile_catalogs():
+        pywikibot.output('Compiled {0}'.format(filename))
+
+
+if __name__ == '__main__':
+    main()
@@ -131,9 +131,17 @@ class RedirectGenerator(object):
         """
         xmlFilename = self.xmlFilename
         redict = {}
-        # open xml dump and read page titles out of it
-        dump = xmlreader.XmlDump(xmlFilename)
         redirR = self.site.redirectRegex()
+        # only the redirects are needed unless all titles are requested
+        namespaces = None
+        if self.namespaces and all(isinstance(ns, int)
+                                   for ns in self.namespaces):
+            namespaces = self.namespaces
+        entry_filter = xmlreader.XmlEntryFilter(
+            namespaces=namespaces,
+            text=None if alsoGetPageTitles else redirR)
+        # open xml dump and read page titles out of it
+        dump = xmlreader.XmlDump(xmlFilename, entry_filter=entry_filter)
         readPagesCount = 0
         if alsoGetPageTitles:
             pageTitles = set()
@@ -432,7 +432,10 @@ class XmlDumpReplacePageGenerator(object):
             self.site = site
         else:
             self.site = pywikibot.Site()
-        dump = xmlreader.XmlDump(self.xmlFilename)
+        # only pages where any of the replacements may apply are needed
+        entry_filter = xmlreader.XmlEntryFilter(
+            text=[replacement.old_regex for replacement in replacements])
+        dump = xmlreader.XmlDump(self.xmlFilename, entry_filter=entry_filter)
         self.parser = dump.parse()
 
     def __iter__(self):
@@ -446,14 +449,14 @@ class XmlDumpReplacePageGenerator(object):
                 if self.isTitleExcepted(entry.title) \
                         or self.isTextExcepted(entry.text):
                     continue
-                new_text = entry.text
-                for replacement in self.replacements:
-                    # This doesn't do an actual replacement but just
-                    # checks if at least one does apply
-                    new_text = textlib.replaceExcept(
-                        new_text, replacement.old_regex, replacement.new,
-                        self.excsInside + replacement.get_inside_exceptions(),
-                        site=self.site)
+                # This doesn't do an actual replacement but just
+                # checks if at least one does apply
+                new_text = textlib.replace_except_all(
+                    entry.text,
+                    [(replacement.old_regex, replacement.new,
+                      replacement.get_inside_exceptions())
+                     for replacement in self.replacements],
+                    self.excsInside, site=self.site)[0]
                 if new_text != entry.text:
                     yield pywikibot.Page(self.site, entry.title)
 
@@ -617,9 +620,9 @@ class ReplaceRobot(Bot):
             pywikibot.warn(
                 'You must pass the target page as the "page" parameter to '
                 'apply_replacements().', DeprecationWarning, stacklevel=2)
-        new_text = original_text
         exceptions = _get_text_exceptions(self.exceptions)
         skipped_containers = set()
+        replacements = []
         for replacement in self.replacements:
             if self.sleep is not None:
                 time.sleep(self.sleep)
@@ -641,13 +644,15 @@ class ReplaceRobot(Bot):
                         'title is on the exceptions list.'.format(
                             replacement.description, page.title(asLink=True)))
                 continue
-            old_text = new_text
-            new_text = textlib.replaceExcept(
-                new_text, replacement.old_regex, replacement.new,
-                exceptions + replacement.get_inside_exceptions(),
-                allowoverlap=self.allowoverlap, site=self.site)
-            if old_text != new_text:
-                applied.add(replacement)
+            replacements.append(replacement)
+        # all replacements are applied in one pass over the exceptions
+        new_text, changed = textlib.replace_except_all(
+            original_text,
+            [(replacement.old_regex, replacement.new,
+              replacement.get_inside_exceptions())
+             for replacement in replacements],
+            exceptions, allowoverlap=self.allowoverlap, site=self.site)
+        applied.update(replacements[i] for i in changed)
 
         return new_text
 
@@ -121,7 +121,7 @@ from warnings import warn
 
 import pywikibot
 
-from pywikibot import i18n, pagegenerators, textlib, Bot
+from pywikibot import i18n, pagegenerators, textlib, xmlreader, Bot
 
 from pywikibot.exceptions import ArgumentDeprecationWarning
 from pywikibot.pagegenerators import XMLDumpPageGenerator
@@ -333,10 +333,11 @@ def main(*args):
 
     if xmlfilename:
         builder = textlib._MultiTemplateMatchBuilder(site)
-        predicate = builder.search_any_predicate(oldTemplates)
+        entry_filter = xmlreader.XmlEntryFilter(
+            text=[builder.pattern(template) for template in oldTemplates])
 
         gen = XMLDumpPageGenerator(
-            xmlfilename, site=site, text_predicate=predicate)
+            xmlfilename, site=site, entry_filter=entry_filter)
     else:
         gen = genFactory.getCombinedGenerator()
 
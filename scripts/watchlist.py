@@ -26,8 +26,6 @@ from __future__ import absolute_import, unicode_literals
 __version__ = '$Id$'
 #
 
-import os
-
 import pywikibot
 
 from pywikibot import config
@@ -60,10 +58,10 @@ def refresh(site, sysop=False):
 def refresh_all(sysop=False):
     """Reload watchlists for all wikis where a watchlist is already present."""
     cache_path = CachedRequest._get_cache_dir()
-    files = os.listdir(cache_path)
+    backend = CachedRequest._get_cache_backend()
     seen = []
-    for filename in files:
-        entry = CacheEntry(cache_path, filename)
+    for key in backend.keys():
+        entry = CacheEntry(cache_path, key, backend)
         entry._load_cache()
         entry.parse_key()
         entry._rebuild()
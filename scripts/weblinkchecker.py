@@ -9,7 +9,8 @@ max_external_links, which defaults to 50.
 The bot won't change any wiki pages, it will only report dead links such that
 people can fix or remove the links themselves.
 
-The bot will store all links found dead in a .dat file in the deadlinks
+The bot will store all links found dead in an SQLite database (or a .dat file,
+see the weblink_history_backend config variable) in the deadlinks
 subdirectory. To avoid the removing of links which are only temporarily
 unavailable, the bot ONLY reports links which were reported dead at least
 two times, with a time lag of at least one week. Such links will be logged to a
@@ -24,7 +25,7 @@ feature, set report_dead_links_on_talk = True in your user-config.py, or
 specify "-talk" on the command line. Adding "-notalk" switches this off
 irrespective of the configuration variable.
 
-When a link is found alive, it will be removed from the .dat file.
+When a link is found alive, it will be removed from the history.
 
 These command line parameters can be used to specify which pages to work on:
 
@@ -67,6 +68,12 @@ max_external_links        - The maximum number of web pages that should be
                             is congested, and will then think that the page
                             is offline.
 
+weblink_host_connections  - The maximum number of web pages that should be
+                            loaded simultaneously from the same host.
+
+weblink_host_delay        - The minimum number of seconds between starting
+                            to load two web pages from the same host.
+
 report_dead_links_on_talk - If set to true, causes the script to report dead
                             links on the article's talk page if (and ONLY if)
                             the linked page has been unavailable at least two
@@ -75,6 +82,10 @@ report_dead_links_on_talk - If set to true, causes the script to report dead
 weblink_dead_days         - sets the timespan (default: one week) after which
                             a dead link will be reported
 
+weblink_history_backend   - 'sqlite' (default) to store each dead link when
+                            it is found or 'pickle' to store all of them in
+                            a .dat file at the end
+
 Syntax examples:
     python pwb.py weblinkchecker -start:!
         Loads all wiki pages in alphabetical order using the Special:Allpages
@@ -104,7 +115,10 @@ from __future__ import absolute_import, unicode_literals
 __version__ = '$Id$'
 
 import codecs
+import collections
 import datetime
+import heapq
+import itertools
 import pickle
 import re
 import socket
@@ -115,6 +129,11 @@ import time
 from functools import partial
 from warnings import warn
 
+try:
+    import sqlite3
+except ImportError as e:
+    sqlite3 = e
+
 try:
     import memento_client
 except ImportError as e:
@@ -542,11 +561,13 @@ class LinkChecker(object):
 
 class LinkCheckThread(threading.Thread):
 
-    """A thread responsible for checking one URL.
+    """
+    DEPRECATED: A thread responsible for checking one URL.
 
-    After checking the page, it will die.
+    After checking the page, it will die. Use L{LinkCheckEngine} instead.
     """
 
+    @deprecated('LinkCheckEngine')
     def __init__(self, page, url, history, HTTPignore, day):
         """Constructor."""
         threading.Thread.__init__(self)
@@ -600,6 +621,301 @@ class LinkCheckThread(threading.Thread):
                                      config.weblink_dead_days)
 
 
+class LinkCheckEngine(object):
+
+    """
+    Check URLs with a fixed pool of worker threads.
+
+    The URLs are checked in the order they were added, but at most per_host
+    requests to the same host run at the same time and the requests to a
+    host are started at least delay seconds apart, so a worker never waits
+    for a slow host while URLs of other hosts are pending.
+
+    A URL is first requested with HEAD and, if the server doesn't answer it
+    with 200, with GET without reading the body. All requests use one
+    session, so the connections to a host are reused. If a request can't
+    connect and the host name can't be resolved either, the host is
+    remembered and the following URLs of that host fail without any
+    request. Hosts which can be resolved are not remembered, as the
+    resolution is left to the HTTP connections.
+
+    The callback is called by the worker thread with the URL, the data
+    passed to L{add}, the HTTP status or None and the exception or None.
+    """
+
+    default_headers = {
+        'Accept': 'text/xml,application/xml,application/xhtml+xml,'
+                  'text/html;q=0.9,text/plain;q=0.8,image/png,*/*;q=0.5',
+        'Accept-Language': 'de-de,de;q=0.8,en-us;q=0.5,en;q=0.3',
+        'Accept-Charset': 'ISO-8859-1,utf-8;q=0.7,*;q=0.7',
+    }
+
+    def __init__(self, callback, workers=None, per_host=None, delay=None,
+                 max_queued=None, headers=None, use_fake_user_agent=False):
+        """
+        Constructor.
+
+        @param callback: called with the result of each URL
+        @type callback: callable
+        @param workers: the number of worker threads, by default
+            config.max_external_links
+        @type workers: int
+        @param per_host: the number of concurrent requests per host, by
+            default config.weblink_host_connections
+        @type per_host: int
+        @param delay: the minimum time between starting two requests to the
+            same host, by default config.weblink_host_delay
+        @type delay: float
+        @param max_queued: the number of unfinished URLs after which L{add}
+            blocks, by default twice the number of workers
+        @type max_queued: int
+        @param headers: the HTTP headers, by default default_headers; the
+            user agent is added
+        @type headers: dict
+        @param use_fake_user_agent: True to use a fake user agent, False to
+            use the user agent of pywikibot or the user agent as str; it is
+            overridden by config.fake_user_agent_exceptions
+        @type use_fake_user_agent: bool or str
+        """
+        self.callback = callback
+        self.workers = workers or config.max_external_links
+        self.per_host = per_host or config.weblink_host_connections
+        self.delay = config.weblink_host_delay if delay is None else delay
+        self.max_queued = max_queued or self.workers * 2
+        self.headers = (self.default_headers if headers is None
+                        else headers)
+        self.use_fake_user_agent = use_fake_user_agent
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.workers, pool_maxsize=self.per_host)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._condition = threading.Condition()
+        # host -> deque of pending (url, data)
+        self._pending = {}
+        # host -> number of running requests
+        self._active = {}
+        # host -> earliest time of the next request
+        self._next_time = {}
+        # (time, sequence number, host) of hosts which can be requested
+        self._heap = []
+        self._scheduled = set()
+        self._sequence = itertools.count()
+        self._unfinished = 0
+        self._closed = False
+        # negative DNS cache: host -> exception resolving it
+        self._unresolved = {}
+        self._unresolved_lock = threading.Lock()
+        self._threads = []
+
+    @property
+    def unfinished(self):
+        """Return the number of added URLs which are not checked yet."""
+        return self._unfinished
+
+    def start(self):
+        """Start the worker threads."""
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work,
+                                      name='LinkCheckWorker-{0}'.format(i))
+            # thread dies when program terminates
+            thread.setDaemon(True)
+            thread.start()
+            self._threads.append(thread)
+
+    def add(self, url, data=None):
+        """
+        Add a URL to be checked.
+
+        This blocks while max_queued URLs are unfinished.
+
+        @param url: the URL
+        @type url: str
+        @param data: any data passed to the callback
+        """
+        host = self._host(url)
+        with self._condition:
+            while self._unfinished >= self.max_queued:
+                # with a timeout, so KeyboardInterrupt isn't blocked
+                self._condition.wait(1)
+            self._unfinished += 1
+            self._pending.setdefault(host, collections.deque()).append(
+                (url, data))
+            self._schedule(host)
+            self._condition.notify_all()
+
+    def shutdown(self, timeout=None):
+        """
+        Stop the worker threads after all added URLs are checked.
+
+        @param timeout: the maximum time to wait for the workers; if it is
+            0, the workers are not awaited
+        @type timeout: float or None
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if timeout == 0:
+            return
+        end = None if timeout is None else time.time() + timeout
+        for thread in self._threads:
+            if end is None:
+                while thread.isAlive():
+                    thread.join(1)
+            else:
+                thread.join(max(end - time.time(), 0))
+
+    @staticmethod
+    def _host(url):
+        """Return the lower case host name of the URL or ''."""
+        try:
+            return urlparse.urlparse(url).hostname or ''
+        except ValueError:
+            return ''
+
+    def _schedule(self, host):
+        """Add the host to the heap if a request to it may be started."""
+        if (host in self._scheduled or host not in self._pending or
+                self._active.get(host, 0) >= self.per_host):
+            return
+        heapq.heappush(self._heap, (self._next_time.get(host, 0),
+                                    next(self._sequence), host))
+        self._scheduled.add(host)
+
+    def _take(self):
+        """Return the next host and job or None if the engine is closed."""
+        with self._condition:
+            while True:
+                now = time.time()
+                if self._heap and self._heap[0][0] <= now:
+                    host = heapq.heappop(self._heap)[2]
+                    self._scheduled.discard(host)
+                    jobs = self._pending[host]
+                    job = jobs.popleft()
+                    if not jobs:
+                        del self._pending[host]
+                    self._active[host] = self._active.get(host, 0) + 1
+                    self._next_time[host] = now + self.delay
+                    self._schedule(host)
+                    return host, job
+                if self._closed and not self._pending:
+                    return None
+                self._condition.wait(
+                    self._heap[0][0] - now if self._heap else 1)
+
+    def _finish(self, host):
+        """Record that a request to the host has finished."""
+        with self._condition:
+            self._active[host] -= 1
+            if not self._active[host]:
+                del self._active[host]
+                if (host not in self._pending and
+                        self._next_time[host] <= time.time()):
+                    del self._next_time[host]
+            self._unfinished -= 1
+            self._schedule(host)
+            self._condition.notify_all()
+
+    def _work(self):
+        """Check the URLs until the engine is closed."""
+        while True:
+            item = self._take()
+            if item is None:
+                return
+            host, (url, data) = item
+            try:
+                status, error = self.check(url)
+                self.callback(url, data, status, error)
+            except Exception:
+                pywikibot.exception()
+            finally:
+                self._finish(host)
+
+    def _unresolvable(self, url, host):
+        """
+        Return the exception resolving the host after a connection error.
+
+        @param url: the URL
+        @type url: str
+        @param host: the lower case host name of the URL
+        @type host: str
+        @rtype: Exception or None
+        """
+        try:
+            parsed = urlparse.urlparse(url)
+            port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        except ValueError:
+            return None
+        try:
+            socket.getaddrinfo(host, port)
+        except (socket.error, UnicodeError) as e:
+            with self._unresolved_lock:
+                self._unresolved[host] = e
+            return e
+        return None
+
+    def _headers(self, url):
+        """Return the request headers of the URL."""
+        headers = self.headers.copy()
+        use_fake_user_agent = config.fake_user_agent_exceptions.get(
+            urlparse.urlparse(url).netloc, self.use_fake_user_agent)
+        if use_fake_user_agent and isinstance(use_fake_user_agent,
+                                              basestring):
+            headers['user-agent'] = use_fake_user_agent
+        elif use_fake_user_agent is True:
+            headers['user-agent'] = comms.http.fake_user_agent()
+        else:
+            headers['user-agent'] = comms.http.user_agent()
+        return headers
+
+    def check(self, url):
+        """
+        Request the URL.
+
+        @return: the HTTP status or None and the exception or None
+        @rtype: tuple
+        """
+        host = self._host(url)
+        with self._unresolved_lock:
+            error = self._unresolved.get(host)
+        if error is not None:
+            return None, error
+        headers = self._headers(url)
+        try:
+            response = self.session.head(url, headers=headers,
+                                         timeout=config.socket_timeout,
+                                         allow_redirects=True)
+            response.close()
+            if response.status_code != requests.codes.ok:
+                # some servers don't answer HEAD requests correctly
+                response = self.session.get(url, headers=headers,
+                                            timeout=config.socket_timeout,
+                                            stream=True)
+                response.close()
+        except requests.exceptions.ConnectionError as e:
+            if host:
+                return None, self._unresolvable(url, host) or e
+            return None, e
+        except Exception as e:
+            return None, e
+        return response.status_code, None
+
+
+def get_history(reportThread, site=None):
+    """
+    Return the history of dead links of the site.
+
+    The history is stored in an SQLite database unless
+    config.weblink_history_backend is 'pickle' or sqlite3 is unavailable.
+
+    @rtype: History
+    """
+    if (config.weblink_history_backend == 'sqlite' and
+            not isinstance(sqlite3, ImportError)):
+        return SQLiteHistory(reportThread, site)
+    return History(reportThread, site)
+
+
 class History(object):
 
     """
@@ -622,6 +938,8 @@ class History(object):
             ('WikiPageName2', DATE, '404: File not found'),
         ]
 
+    The whole dict is kept in memory and pickled by L{save}. L{SQLiteHistory}
+    stores each record when it is found.
     """
 
     def __init__(self, reportThread, site=None):
@@ -637,12 +955,20 @@ class History(object):
         # Count the number of logged links, so that we can insert captions
         # from time to time
         self.logCount = 0
+        self._load()
+
+    def _load(self):
+        """Load the .dat file."""
+        self.historyDict = self._read_dat()
+
+    def _read_dat(self):
+        """Return the dict stored in the .dat file."""
         try:
             with open(self.datfilename, 'rb') as datfile:
-                self.historyDict = pickle.load(datfile)
+                return pickle.load(datfile)
         except (IOError, EOFError):
             # no saved history exists yet, or history dump broken
-            self.historyDict = {}
+            return {}
 
     def log(self, url, error, containingPage, archiveURL):
         """Log an error report to a text file in the deadlinks subdirectory."""
@@ -650,7 +976,7 @@ class History(object):
             errorReport = u'* %s ([%s archive])\n' % (url, archiveURL)
         else:
             errorReport = u'* %s\n' % url
-        for (pageTitle, date, error) in self.historyDict[url]:
+        for (pageTitle, date, error) in self.get_records(url):
             # ISO 8601 formulation
             isoDate = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(date))
             errorReport += "** In [[%s]] on %s, %s\n" % (pageTitle, isoDate,
@@ -672,37 +998,79 @@ class History(object):
             self.reportThread.report(url, errorReport, containingPage,
                                      archiveURL)
 
+    def get_records(self, url):
+        """
+        Return the times the URL was found dead.
+
+        @return: the tuples (title, date, error), the oldest first
+        @rtype: list
+        """
+        return list(self.historyDict.get(url, []))
+
+    def page_titles(self):
+        """Return the titles of the pages with dead links."""
+        titles = set()
+        for records in self.historyDict.values():
+            for record in records:
+                titles.add(record[0])
+        return titles
+
+    def dead_links(self, before=None):
+        """
+        Return the dead links which were found dead first before the time.
+
+        @param before: the POSIX timestamp, by default now
+        @type before: float
+        @return: the URLs, the longest dead first
+        @rtype: list
+        """
+        if before is None:
+            before = time.time()
+        links = [(records[0][1], url)
+                 for url, records in self.historyDict.items()
+                 if records[0][1] < before]
+        return [url for first, url in sorted(links)]
+
+    def _add_record(self, url, title, now, error):
+        """
+        Add the record that the link was found dead.
+
+        @return: the time the link was found dead first
+        @rtype: float
+        """
+        with self.semaphore:
+            if url in self.historyDict:
+                timeSinceLastFound = now - self.historyDict[url][-1][1]
+                # if the last time we found this dead link is less than an
+                # hour ago, we won't save it in the history this time.
+                if timeSinceLastFound > 60 * 60:
+                    self.historyDict[url].append((title, now, error))
+                return self.historyDict[url][0][1]
+            self.historyDict[url] = [(title, now, error)]
+            return now
+
     def setLinkDead(self, url, error, page, weblink_dead_days):
         """Add the fact that the link was found dead to the .dat file."""
-        self.semaphore.acquire()
         now = time.time()
-        if url in self.historyDict:
-            timeSinceFirstFound = now - self.historyDict[url][0][1]
-            timeSinceLastFound = now - self.historyDict[url][-1][1]
-            # if the last time we found this dead link is less than an hour
-            # ago, we won't save it in the history this time.
-            if timeSinceLastFound > 60 * 60:
-                self.historyDict[url].append((page.title(), now, error))
-            # if the first time we found this link longer than x day ago
-            # (default is a week), it should probably be fixed or removed.
-            # We'll list it in a file so that it can be removed manually.
-            if timeSinceFirstFound > 60 * 60 * 24 * weblink_dead_days:
-                # search for archived page
-                try:
-                    archiveURL = get_archive_url(url)
-                except Exception as e:
-                    pywikibot.warning(
-                        'get_closest_memento_url({0}) failed: {1}'.format(
-                            url, e))
-                    archiveURL = None
-                if archiveURL is None:
-                    archiveURL = weblib.getInternetArchiveURL(url)
-                if archiveURL is None:
-                    archiveURL = weblib.getWebCitationURL(url)
-                self.log(url, error, page, archiveURL)
-        else:
-            self.historyDict[url] = [(page.title(), now, error)]
-        self.semaphore.release()
+        timeSinceFirstFound = now - self._add_record(url, page.title(), now,
+                                                     error)
+        # if the first time we found this link longer than x day ago
+        # (default is a week), it should probably be fixed or removed.
+        # We'll list it in a file so that it can be removed manually.
+        if timeSinceFirstFound > 60 * 60 * 24 * weblink_dead_days:
+            # search for archived page
+            try:
+                archiveURL = get_archive_url(url)
+            except Exception as e:
+                pywikibot.warning(
+                    'get_closest_memento_url({0}) failed: {1}'.format(
+                        url, e))
+                archiveURL = None
+            if archiveURL is None:
+                archiveURL = weblib.getInternetArchiveURL(url)
+            if archiveURL is None:
+                archiveURL = weblib.getWebCitationURL(url)
+            self.log(url, error, page, archiveURL)
 
     def setLinkAlive(self, url):
         """
@@ -730,6 +1098,149 @@ class History(object):
             pickle.dump(self.historyDict, f, protocol=config.pickle_protocol)
 
 
+class SQLiteHistory(History):
+
+    """
+    Store previously found dead links in an SQLite database.
+
+    Each time a link is found dead or alive, only the records of that link
+    are updated and committed, so the history doesn't need to be kept in
+    memory and a crash loses nothing. The links are indexed by the time they
+    were found dead first.
+
+    When the database is created, the links of an existing .dat file are
+    imported.
+    """
+
+    def _load(self):
+        """Open the database."""
+        self.dbfilename = self.datfilename[:-len('.dat')] + '.sqlite'
+        self._connection = sqlite3.connect(self.dbfilename, timeout=60,
+                                           check_same_thread=False)
+        with self._connection:
+            self._connection.execute('PRAGMA synchronous = NORMAL')
+            new = not self._connection.execute(
+                "SELECT name FROM sqlite_master WHERE name = 'links'"
+            ).fetchone()
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS links ('
+                'url TEXT PRIMARY KEY, first REAL NOT NULL, '
+                'last REAL NOT NULL)')
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS links_first ON links (first)')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS records ('
+                'url TEXT NOT NULL, title TEXT NOT NULL, date REAL NOT NULL, '
+                'error TEXT NOT NULL)')
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS records_url ON records (url)')
+        if new:
+            self._import()
+
+    def _import(self):
+        """Import the links of the .dat file."""
+        history = self._read_dat()
+        if history:
+            pywikibot.output('Importing {0} dead links from {1}'.format(
+                len(history), self.datfilename))
+            with self._connection:
+                for url, records in history.items():
+                    self._connection.execute(
+                        'INSERT INTO links VALUES (?, ?, ?)',
+                        (url, records[0][1], records[-1][1]))
+                    self._connection.executemany(
+                        'INSERT INTO records VALUES (?, ?, ?, ?)',
+                        [(url, ) + tuple(record) for record in records])
+
+    @property
+    @deprecated('get_records, page_titles or dead_links')
+    def historyDict(self):
+        """Return a dict of the records of all dead links."""
+        history = collections.defaultdict(list)
+        for record in self._connection.execute(
+                'SELECT url, title, date, error FROM records '
+                'ORDER BY url, date'):
+            history[record[0]].append(tuple(record[1:]))
+        return dict(history)
+
+    def get_records(self, url):
+        """Return the times the URL was found dead."""
+        with self.semaphore:
+            return [tuple(record) for record in self._connection.execute(
+                'SELECT title, date, error FROM records WHERE url = ? '
+                'ORDER BY date', (url, ))]
+
+    def page_titles(self):
+        """Return the titles of the pages with dead links."""
+        with self.semaphore:
+            return set(row[0] for row in self._connection.execute(
+                'SELECT DISTINCT title FROM records'))
+
+    def dead_links(self, before=None):
+        """Return the dead links which were found dead first before the time."""
+        if before is None:
+            before = time.time()
+        with self.semaphore:
+            return [row[0] for row in self._connection.execute(
+                'SELECT url FROM links WHERE first < ? ORDER BY first',
+                (before, ))]
+
+    def _add_record(self, url, title, now, error):
+        """Add the record that the link was found dead."""
+        with self.semaphore:
+            with self._connection:
+                row = self._connection.execute(
+                    'SELECT first, last FROM links WHERE url = ?',
+                    (url, )).fetchone()
+                if row is None:
+                    first = now
+                    self._connection.execute(
+                        'INSERT INTO links VALUES (?, ?, ?)', (url, now, now))
+                elif now - row[1] > 60 * 60:
+                    first = row[0]
+                    self._connection.execute(
+                        'UPDATE links SET last = ? WHERE url = ?', (now, url))
+                else:
+                    # found dead less than an hour ago
+                    return row[0]
+                self._connection.execute(
+                    'INSERT INTO records VALUES (?, ?, ?, ?)',
+                    (url, title, now, error))
+        return first
+
+    def setLinkAlive(self, url):
+        """
+        Record that the link is now alive.
+
+        If link was previously found dead, remove it from the database.
+
+        @return: True if previously found dead, else returns False.
+        """
+        with self.semaphore:
+            with self._connection:
+                found = self._connection.execute(
+                    'DELETE FROM links WHERE url = ?', (url, )).rowcount
+                if found:
+                    self._connection.execute(
+                        'DELETE FROM records WHERE url = ?', (url, ))
+        return bool(found)
+
+    def save(self):
+        """Compact the database if many links were removed."""
+        with self.semaphore:
+            pages, free = [self._connection.execute(
+                'PRAGMA ' + name).fetchone()[0]
+                for name in ('page_count', 'freelist_count')]
+            if free > pages // 4:
+                pywikibot.output('Compacting {0}'.format(self.dbfilename))
+                self._connection.execute('VACUUM')
+
+    def close(self):
+        """Close the database."""
+        with self.semaphore:
+            self._connection.close()
+
+
 class DeadLinkReportThread(threading.Thread):
 
     """
@@ -836,7 +1347,8 @@ class WeblinkCheckerRobot(SingleSiteBot, ExistingPageBot):
     """
     Bot which will search for dead weblinks.
 
-    It uses several LinkCheckThreads at once to process pages from generator.
+    It checks the links of the pages from the generator with a
+    LinkCheckEngine.
     """
 
     def __init__(self, generator, HTTPignore=None, day=7, site=True):
@@ -852,12 +1364,16 @@ class WeblinkCheckerRobot(SingleSiteBot, ExistingPageBot):
             reportThread.start()
         else:
             reportThread = None
-        self.history = History(reportThread, site=self.site)
+        self.history = get_history(reportThread, site=self.site)
         if HTTPignore is None:
             self.HTTPignore = []
         else:
             self.HTTPignore = HTTPignore
         self.day = day
+        self.engine = LinkCheckEngine(
+            self.link_checked, use_fake_user_agent=config.fake_user_agent_default.get(
+                'weblinkchecker', False))
+        self.engine.start()
 
     def treat_page(self):
         """Process one page."""
@@ -869,49 +1385,51 @@ class WeblinkCheckerRobot(SingleSiteBot, ExistingPageBot):
                 if ignoreR.match(url):
                     ignoreUrl = True
             if not ignoreUrl:
-                # Limit the number of threads started at the same time. Each
-                # thread will check one page, then die.
-                while threading.activeCount() >= config.max_external_links:
-                    time.sleep(config.retry_wait)
-                thread = LinkCheckThread(page, url, self.history,
-                                         self.HTTPignore, self.day)
-                # thread dies when program terminates
-                thread.setDaemon(True)
-                try:
-                    thread.start()
-                except threading.ThreadError:
-                    pywikibot.warning(
-                        "Can't start a new thread.\nPlease decrease "
-                        "max_external_links in your user-config.py or use\n"
-                        "'-max_external_links:' option with a smaller value. "
-                        "Default is 50.")
-                    raise
+                # This blocks while too many links are unchecked
+                self.engine.add(url, page)
+
+    def link_checked(self, url, page, status, error):
+        """Record the result of checking a link of the page."""
+        if error is not None:
+            if isinstance(error, requests.exceptions.InvalidURL):
+                message = i18n.twtranslate(page.site,
+                                           'weblinkchecker-badurl_msg',
+                                           {'URL': url})
+            else:
+                message = '{0}: {1}'.format(error.__class__.__name__, error)
+        elif status == requests.codes.ok:
+            if self.history.setLinkAlive(url):
+                pywikibot.output('*Link to %s in [[%s]] is back alive.'
+                                 % (url, page.title()))
+            return
+        elif status in self.HTTPignore or str(status) in self.HTTPignore:
+            return
+        else:
+            message = '{0}'.format(status)
+        pywikibot.output('*[[%s]] links to %s - %s.'
+                         % (page.title(), url, message))
+        self.history.setLinkDead(url, message, page, config.weblink_dead_days)
 
 
 def RepeatPageGenerator():
     """Generator for pages in History."""
-    history = History(None)
-    pageTitles = set()
-    for value in history.historyDict.values():
-        for entry in value:
-            pageTitles.add(entry[0])
+    history = get_history(None)
+    pageTitles = history.page_titles()
     for pageTitle in sorted(pageTitles):
         page = pywikibot.Page(pywikibot.Site(), pageTitle)
         yield page
 
 
+@deprecated('LinkCheckEngine')
 def countLinkCheckThreads():
     """
-    Count LinkCheckThread threads.
+    DEPRECATED: Count LinkCheckThread threads.
 
     @return: number of LinkCheckThread threads
     @rtype: int
     """
-    i = 0
-    for thread in threading.enumerate():
-        if isinstance(thread, LinkCheckThread):
-            i += 1
-    return i
+    return sum(1 for thread in threading.enumerate()
+               if isinstance(thread, LinkCheckThread))
 
 
 @deprecated('requests')
@@ -985,22 +1503,23 @@ def main(*args):
         try:
             bot.run()
         finally:
+            bot.engine.shutdown(timeout=0)
             waitTime = 0
-            # Don't wait longer than 30 seconds for threads to finish.
-            while countLinkCheckThreads() > 0 and waitTime < 30:
+            # Don't wait longer than 30 seconds for links to be checked.
+            while bot.engine.unfinished > 0 and waitTime < 30:
                 try:
-                    pywikibot.output(u"Waiting for remaining %i threads to "
-                                     u"finish, please wait..."
-                                     % countLinkCheckThreads())
+                    pywikibot.output(u"Waiting for remaining %i links to "
+                                     u"be checked, please wait..."
+                                     % bot.engine.unfinished)
                     # wait 1 second
                     time.sleep(1)
                     waitTime += 1
                 except KeyboardInterrupt:
                     pywikibot.output(u'Interrupted.')
                     break
-            if countLinkCheckThreads() > 0:
-                pywikibot.output(u'Remaining %i threads will be killed.'
-                                 % countLinkCheckThreads())
+            if bot.engine.unfinished > 0:
+                pywikibot.output(u'Remaining %i links will not be checked.'
+                                 % bot.engine.unfinished)
                 # Threads will die automatically because they are daemonic.
             if bot.history.reportThread:
                 bot.history.reportThread.shutdown()
@@ -89,10 +89,17 @@ library_test_modules = [
     'textlib',
     'diff',
     'http',
+    'throttle',
     'namespace',
     'dry_api',
     'dry_site',
     'api',
+    'apicache',
+    'asyncapi',
+    'jsonstream',
+    'revisioncache',
+    'categorygraph',
+    'sitesnapshot',
     'exceptions',
     'oauth',
     'family',
@@ -144,6 +151,7 @@ script_test_modules = [
     'replacebot',
     'uploadbot',
     'weblinkchecker',
+    'interwiki',
     'cache',
 ]
 
@@ -10,8 +10,15 @@ from __future__ import absolute_import, unicode_literals
 __version__ = '$Id$'
 
 import datetime
+import json
+import threading
 import types
 
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
 import pywikibot.data.api as api
 import pywikibot.family
 import pywikibot.login
@@ -31,7 +38,9 @@ from tests.aspects import (
     DefaultSiteTestCase,
     DefaultDrySiteTestCase,
 )
-from tests.utils import allowed_failure, FakeLoginManager, PatchedHttp
+from tests.utils import (
+    allowed_failure, FakeLoginManager, PatchedHttp, _original_Request,
+)
 
 if not PY2:
     from urllib.parse import unquote_to_bytes
@@ -818,6 +827,192 @@ class TestDryListGenerator(TestCase):
         self.gen.set_namespace(0)
 
 
+class TestDryQueryPrefetch(TestCase):
+
+    """Test retrieving the items of a ListGenerator in advance."""
+
+    family = 'wikipedia'
+    code = 'en'
+
+    dry = True
+
+    def setUp(self):
+        """Set up the generator with a fake submit."""
+        super(TestDryQueryPrefetch, self).setUp()
+        mysite = self.get_site()
+        mysite._paraminfo['query+allpages'] = {
+            'prefix': 'ap',
+            'limit': {'max': 10},
+            'namespace': {'multi': True}
+        }
+        mysite._paraminfo.query_modules_with_limits = set(['allpages'])
+        self.gen = api.ListGenerator(listaction='allpages', site=mysite)
+        self.submitted = []
+        self.second_submitted = threading.Event()
+        self.error = None
+        self.gen.request.submit = self._submit
+
+    def _submit(self):
+        """Return three items per request and a continuation."""
+        start = int(self.gen.request['apcontinue'][0]
+                    if 'apcontinue' in self.gen.request else 0)
+        self.submitted.append(start)
+        if len(self.submitted) == 2:
+            self.second_submitted.set()
+        if start == 6 and self.error:
+            raise self.error
+        data = {'query': {'allpages': [{'title': str(i)}
+                                       for i in range(start, start + 3)]}}
+        if start < 9:
+            data['continue'] = {'apcontinue': str(start + 3),
+                                'continue': '-||'}
+        return data
+
+    def test_items(self):
+        """Test that the prefetched items are the same."""
+        self.gen.set_prefetch(3)
+        self.assertEqual([item['title'] for item in self.gen],
+                         [str(i) for i in range(12)])
+        self.assertEqual(self.submitted, [0, 3, 6, 9])
+
+    def test_config(self):
+        """Test that config.query_prefetch is the default."""
+        self.assertEqual(self.gen.prefetch, 0)
+        with mock.patch.object(api.config, 'query_prefetch', 5):
+            gen = api.ListGenerator(listaction='allpages',
+                                    site=self.get_site())
+        self.assertEqual(gen.prefetch, 5)
+
+    def test_continuation(self):
+        """Test that the next request is submitted in advance."""
+        self.gen.set_prefetch(3)
+        gen = iter(self.gen)
+        self.assertEqual(next(gen)['title'], '0')
+        self.second_submitted.wait(10)
+        # the queue holds only one item of the second request, so the third
+        # request waits until items are taken
+        self.assertEqual(self.submitted, [0, 3])
+        self.assertEqual([item['title'] for item in gen],
+                         [str(i) for i in range(1, 12)])
+        self.assertEqual(self.submitted, [0, 3, 6, 9])
+
+    def test_error(self):
+        """Test that an error is raised after the previous items."""
+        self.error = api.APIError('foo', 'bar')
+        self.gen.set_prefetch(10)
+        titles = []
+        with self.assertRaisesRegex(api.APIError, 'foo'):
+            for item in self.gen:
+                titles.append(item['title'])
+        self.assertEqual(titles, [str(i) for i in range(6)])
+
+
+class _StreamedBody(object):
+
+    """Body of a streamed response in chunks."""
+
+    def __init__(self, data):
+        """Constructor."""
+        text = json.dumps(data).encode('utf-8')
+        self.chunks = [text[i:i + 10] for i in range(0, len(text), 10)]
+        self.read = 0
+        self.closed = False
+
+    def iter_content(self, size):
+        """Yield the chunks."""
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+
+    def close(self):
+        """Record that the body is closed."""
+        self.closed = True
+
+
+class _StreamedResponse(object):
+
+    """Streamed response."""
+
+    charset = None
+    header_encoding = 'utf-8'
+
+    def __init__(self, data):
+        """Constructor."""
+        self.data = _StreamedBody(data)
+
+
+class TestDryStreamedPages(TestCase):
+
+    """Test decoding the pages of a PropertyGenerator while receiving them."""
+
+    family = 'wikipedia'
+    code = 'en'
+
+    dry = True
+
+    def setUp(self):
+        """Set up the generator and the responses."""
+        super(TestDryStreamedPages, self).setUp()
+        # the dry request rejects submitting, but the HTTP request is patched
+        with mock.patch.object(api, 'Request', _original_Request):
+            self.gen = api.PropertyGenerator(
+                'info', site=self.get_site(),
+                parameters={'titles': 'A|B|C|D'})
+        self.gen.request.use_get = True
+        self.gen.request.throttle = False
+        self.responses = []
+        patcher = mock.patch('pywikibot.comms.http.request_stream',
+                             side_effect=lambda **kwargs: self.responses.pop())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _respond(self, titles, **data):
+        """Add a response with the pages of the titles."""
+        pages = dict((str(pageid), {'pageid': pageid, 'ns': 0,
+                                    'title': title})
+                     for pageid, title in enumerate(titles, 1))
+        data['query'] = {'pages': pages}
+        response = _StreamedResponse(data)
+        self.responses.insert(0, response)
+        return response
+
+    def test_pages(self):
+        """Test that the pages are yielded while they are received."""
+        first = self._respond(['A', 'B'],
+                              **{'continue': {'continue': '||',
+                                              'incontinue': '3'}})
+        second = self._respond(['C', 'D'], warnings={'info': {'*': 'foo'}})
+        self.gen.stream_pages = True
+        pages = []
+        for page in self.gen:
+            if not pages:
+                self.assertLess(first.data.read, len(first.data.chunks))
+            pages.append(page['title'])
+        self.assertEqual(sorted(pages), ['A', 'B', 'C', 'D'])
+        self.assertTrue(first.data.closed)
+        self.assertTrue(second.data.closed)
+        self.assertEqual(self.gen.request['incontinue'], ['3'])
+        self.assertEqual(self.responses, [])
+
+    def test_late_warnings(self):
+        """Test that the warnings after the pages are handled."""
+        self._respond(['A'], warnings={'query': {'*': 'foo'}})
+        self.gen.stream_pages = True
+        with mock.patch.object(pywikibot, 'warning') as warning:
+            self.assertEqual(len(list(self.gen)), 1)
+        warning.assert_called_once_with('API warning (query): foo')
+
+    def test_incomplete(self):
+        """Test that an incomplete response raises ServerError."""
+        response = self._respond(['A', 'B'])
+        del response.data.chunks[-1]
+        self.gen.stream_pages = True
+        gen = iter(self.gen)
+        self.assertEqual(next(gen)['title'], 'A')
+        self.assertRaises(pywikibot.ServerError, list, gen)
+        self.assertTrue(response.data.closed)
+
+
 class TestCachedRequest(DefaultSiteTestCase):
 
     """Test API Request caching.
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""Tests for the apicache module."""
+#
+# (C) Pywikibot team, 2017
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+__version__ = '$Id$'
+
+import datetime
+import os
+import shutil
+import tempfile
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+from pywikibot.data import apicache
+from pywikibot.data.api import CachedRequest
+
+from scripts.maintenance import cache
+
+from tests.aspects import unittest, require_modules, TestCase
+
+
+class BackendTestCase(object):
+
+    """Test the common behaviour of a cache backend."""
+
+    def setUp(self):
+        """Create the cache directory and the backend."""
+        super(BackendTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.backend = self.create_backend()
+        self.now = datetime.datetime.now()
+
+    def tearDown(self):
+        """Remove the cache directory."""
+        if hasattr(self.backend, 'close'):
+            self.backend.close()
+        shutil.rmtree(self.directory)
+        super(BackendTestCase, self).tearDown()
+
+    def _store(self, key, age=0, expiry=1):
+        """Store an entry which is age days old."""
+        self.backend.store(key, 'desc ' + key, {'key': key},
+                           self.now - datetime.timedelta(age),
+                           datetime.timedelta(expiry))
+
+    def test_store(self):
+        """Test storing and loading entries."""
+        self.assertIsNone(self.backend.load('a'))
+        self._store('a')
+        self._store('b')
+        self._store('a', age=0.5)
+        description, data, cachetime = self.backend.load('a')
+        self.assertEqual(description, 'desc a')
+        self.assertEqual(data, {'key': 'a'})
+        self.assertAlmostEqual(
+            (self.now - datetime.timedelta(0.5) - cachetime).total_seconds(),
+            0, delta=0.01)
+        self.assertEqual(sorted(self.backend.keys()), ['a', 'b'])
+
+    def test_expired(self):
+        """Test that an expired entry is treated as missing."""
+        self._store('a', age=2)
+        self.assertIsNone(self.backend.load(
+            'a', lambda dt: dt + datetime.timedelta(1) < self.now))
+        self.assertIsNotNone(self.backend.load('a'))
+
+    def test_delete(self):
+        """Test deleting entries."""
+        self._store('a')
+        self._store('b')
+        self.backend.delete('a')
+        self.assertIsNone(self.backend.load('a'))
+        self.backend.clear()
+        self.assertEqual(self.backend.keys(), [])
+
+
+class TestFileCacheBackend(BackendTestCase, TestCase):
+
+    """Test the files backend."""
+
+    net = False
+
+    def create_backend(self):
+        """Return the files backend."""
+        return apicache.FileCacheBackend(self.directory)
+
+    def test_atomic(self):
+        """Test that no temporary files are left."""
+        self._store('a')
+        self.assertEqual(os.listdir(self.directory), ['a'])
+
+    def test_mode(self):
+        """Test that the files have the mode of a new file."""
+        self._store('a')
+        umask = os.umask(0)
+        os.umask(umask)
+        self.assertEqual(
+            os.stat(os.path.join(self.directory, 'a')).st_mode & 0o777,
+            0o666 & ~umask)
+
+    def test_purge(self):
+        """Test that entries older than the config expiry are deleted."""
+        self._store('a', age=60)
+        self._store('b', age=2)
+        self.assertEqual(self.backend.purge(), 1)
+        self.assertEqual(self.backend.keys(), ['b'])
+
+
+@require_modules('sqlite3')
+class TestSQLiteCacheBackend(BackendTestCase, TestCase):
+
+    """Test the sqlite backend."""
+
+    net = False
+
+    def create_backend(self):
+        """Return the sqlite backend."""
+        return apicache.SQLiteCacheBackend(
+            os.path.join(self.directory, 'cache.sqlite'))
+
+    def test_purge(self):
+        """Test that the expired entries are deleted."""
+        self._store('a', age=2, expiry=1)
+        self._store('b', age=2, expiry=3)
+        self._store('c')
+        self.assertEqual(self.backend.purge(), 1)
+        self.assertEqual(sorted(self.backend.keys()), ['b', 'c'])
+
+    def test_evict(self):
+        """Test that the least recently used entries are deleted."""
+        for key in 'abcde':
+            self._store(key)
+        self.backend.max_size = self.backend._size
+        self.backend.load('a')
+        self._store('f')
+        # reduced to 90% of the maximum size
+        self.assertEqual(sorted(self.backend.keys()), ['a', 'd', 'e', 'f'])
+
+    def test_shared_directory(self):
+        """Test that the files backend ignores the database."""
+        self._store('a', expiry=3)
+        files = apicache.FileCacheBackend(self.directory)
+        files.store('f', 'desc f', {'key': 'f'},
+                    self.now - datetime.timedelta(60),
+                    datetime.timedelta(1))
+        for suffix in ('-journal', '-wal'):
+            open(self.backend.path + suffix, 'w').close()
+        self.assertEqual(files.keys(), ['f'])
+        with mock.patch.object(apicache.pywikibot, 'warning') as warning:
+            self.assertEqual(cache.purge_entries(self.directory), 1)
+            files.clear()
+        self.assertFalse(warning.called)
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['cache.sqlite', 'cache.sqlite-journal',
+                          'cache.sqlite-wal'])
+        self.assertEqual(self.backend.keys(), ['a'])
+
+    def test_maintenance_script(self):
+        """Test processing and purging the entries with the script."""
+        self._store('a', age=2, expiry=1)
+        self._store('b')
+        with mock.patch.object(cache.CacheEntry, 'parse_key'):
+            with mock.patch.object(cache.CacheEntry, '_rebuild'):
+                entries = []
+                cache.process_entries(self.directory, entries.append)
+        self.assertEqual(sorted(entry.key for entry in entries),
+                         ['desc a', 'desc b'])
+        self.assertEqual(cache.purge_entries(self.directory), 1)
+        self.assertEqual(self.backend.keys(), ['b'])
+
+
+@require_modules('sqlite3')
+class TestCachedRequestBackend(TestCase):
+
+    """Test storing a cached request in the sqlite backend."""
+
+    family = 'wikipedia'
+    code = 'en'
+
+    dry = True
+
+    def setUp(self):
+        """Use an sqlite backend in a temporary directory."""
+        super(TestCachedRequestBackend, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.backend = apicache.SQLiteCacheBackend(
+            os.path.join(self.directory, 'cache.sqlite'))
+        patcher = mock.patch.object(CachedRequest, '_get_cache_backend',
+                                    return_value=self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        """Remove the cache directory."""
+        self.backend.close()
+        shutil.rmtree(self.directory)
+        super(TestCachedRequestBackend, self).tearDown()
+
+    def test_cache(self):
+        """Test that the data is loaded until it expires."""
+        parameters = {'action': 'query', 'meta': 'userinfo'}
+        req = CachedRequest(expiry=1, site=self.get_site(),
+                            parameters=parameters)
+        self.assertFalse(req._load_cache())
+        req._write_cache({'query': {}})
+        req = CachedRequest(expiry=1, site=self.get_site(),
+                            parameters=parameters)
+        self.assertTrue(req._load_cache())
+        self.assertEqual(req._data, {'query': {}})
+        req = CachedRequest(expiry=0, site=self.get_site(),
+                            parameters=parameters)
+        self.assertFalse(req._load_cache())
+        self.assertIsNone(req._data)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Tests for the asyncapi module."""
+#
+# (C) Pywikibot team, 2017
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+__version__ = '$Id$'
+
+import json
+import threading
+
+import requests
+
+from pywikibot.comms import threadedhttp
+from pywikibot.data import api, asyncapi
+
+from tests.aspects import unittest, require_modules, TestCase
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+
+@require_modules('asyncio')
+class TestAsyncRequest(TestCase):
+
+    """Test submitting requests and iterating generators on a loop."""
+
+    family = 'wikipedia'
+    code = 'en'
+
+    dry = True
+
+    def setUp(self):
+        """Patch the http module and create an event loop."""
+        super(TestAsyncRequest, self).setUp()
+        self.site = self.get_site()
+        self.site._userinfo = {'name': '127.0.0.1', 'groups': []}
+        self.responses = []
+        self.uris = []
+        self._orig_enqueue = asyncapi.http.enqueue_request
+        asyncapi.http.enqueue_request = self._enqueue_request
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        """Restore the http module and close the event loop."""
+        asyncapi.http.enqueue_request = self._orig_enqueue
+        self.loop.close()
+        super(TestAsyncRequest, self).tearDown()
+
+    def _enqueue_request(self, site, uri, method='GET', params=None,
+                         body=None, headers=None, callback=None):
+        """Complete the request with the next response in another thread."""
+        self.uris.append(uri)
+        request = threadedhttp.HttpRequest(uri, callbacks=[callback])
+        response = requests.Response()
+        response.status_code = 200
+        response.headers['content-type'] = 'application/json'
+        response._content = json.dumps(self.responses.pop(0)).encode('utf-8')
+        threading.Thread(target=setattr,
+                         args=(request, 'data', response)).start()
+        return request
+
+    def test_submit(self):
+        """Test that the future contains the result."""
+        self.responses.append({'query': {'general': {'sitename': 'test'}}})
+        req = asyncapi.AsyncRequest(
+            site=self.site, loop=self.loop, throttle=False,
+            parameters={'action': 'query', 'meta': 'siteinfo'})
+        future = req.submit()
+        self.assertIsInstance(future, asyncio.Future)
+        result = self.loop.run_until_complete(future)
+        self.assertEqual(result['query']['general']['sitename'], 'test')
+        self.assertEqual(len(self.uris), 1)
+
+    def test_concurrent(self):
+        """Test that several requests can be in flight."""
+        for i in range(3):
+            self.responses.append({'query': {'general': {'sitename': i}}})
+        futures = [asyncapi.submit(api.Request(
+            site=self.site, throttle=False,
+            parameters={'action': 'query', 'meta': 'siteinfo'}), self.loop)
+            for i in range(3)]
+        # all requests are enqueued before the loop runs
+        self.assertEqual(len(self.uris), 3)
+        results = self.loop.run_until_complete(asyncio.gather(*futures))
+        self.assertEqual(
+            sorted(r['query']['general']['sitename'] for r in results),
+            [0, 1, 2])
+
+    def test_api_error(self):
+        """Test that an API error is set on the future."""
+        self.responses.append({'error': {'code': 'unknown_action',
+                                         'info': 'Unrecognized value'}})
+        future = asyncapi.submit(api.Request(
+            site=self.site, throttle=False,
+            parameters={'action': 'dummy'}), self.loop)
+        self.assertRaises(api.APIError, self.loop.run_until_complete, future)
+
+    def test_query_iterator(self):
+        """Test iterating over a generator with continuation."""
+        self.responses.append({
+            'continue': {'apcontinue': 'B', 'continue': '-||'},
+            'query': {'allpages': [{'title': 'A'}]}})
+        self.responses.append({'query': {'allpages': [{'title': 'B'}]}})
+        gen = api.ListGenerator('allpages', site=self.site)
+        gen.request.throttle = False
+        iterator = asyncapi.AsyncQueryIterator(gen, self.loop)
+        titles = []
+        while True:
+            try:
+                item = self.loop.run_until_complete(iterator.__anext__())
+            except Exception as e:
+                self.assertEqual(type(e).__name__, 'StopAsyncIteration')
+                break
+            titles.append(item['title'])
+        self.assertEqual(titles, ['A', 'B'])
+        self.assertEqual(len(self.uris), 2)
+        self.assertIn('apcontinue=B', self.uris[1])
+
+
+if __name__ == '__main__':  # pragma: no cover
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks which are run manually and are not part of the tests."""
+#
+# (C) Pywikibot team, 2017
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+__version__ = '$Id$'
@@ -0,0 +1,66 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Measure the time to start Pywikibot in a new process.
+
+Each statement is run in a new Python process and the fastest of several
+runs is printed together with the number of modules which were imported.
+
+The following parameters are supported:
+
+-number:n   run each statement n times (default: 5)
+
+Example:
+
+    python -m tests.benchmarks.startup -number:10
+"""
+#
+# (C) Pywikibot team, 2017
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, print_function, unicode_literals
+
+__version__ = '$Id$'
+
+import os
+import subprocess
+import sys
+import time
+
+import pywikibot
+
+STATEMENTS = [
+    ('import', 'import pywikibot'),
+    ('site', 'import pywikibot; pywikibot.Site("en", "wikipedia")'),
+]
+
+
+def run(statement):
+    """Return the seconds to run the statement and the number of modules."""
+    code = '{0}; import sys; print(len(sys.modules))'.format(statement)
+    start = time.time()
+    output = subprocess.check_output([sys.executable, '-c', code],
+                                     cwd=os.path.dirname(pywikibot.__path__[0]))
+    return time.time() - start, int(output.splitlines()[-1])
+
+
+def main(*args):
+    """Process command line arguments and run the benchmark."""
+    number = 5
+    for arg in pywikibot.handle_args(args):
+        option, _, value = arg.partition(':')
+        if option == '-number':
+            number = int(value)
+        else:
+            pywikibot.bot.suggest_help(unknown_parameters=[arg])
+            return
+
+    for name, statement in STATEMENTS:
+        seconds, modules = min(run(statement) for _ in range(number))
+        pywikibot.output('{0:<8}{1:>10.1f} ms {2:>6} modules'.format(
+            name, seconds * 1000, modules))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Compare the implementations of textlib.extract_templates_and_params.
+
+The templates of the wikitext pages in tests/pages are extracted with the
+tokenizer, the regex and, if it is installed, the mwparserfromhell
+implementation. The fastest of several runs is printed for each page.
+
+The following parameters are supported:
+
+-number:n   extract the templates n times per run (default: 10)
+
+-repeat:n   concatenate each page n times to benchmark a larger page
+            (default: 1)
+
+Example:
+
+    python -m tests.benchmarks.template_extraction -repeat:20
+"""
+#
+# (C) Pywikibot team, 2017
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, print_function, unicode_literals
+
+__version__ = '$Id$'
+
+import codecs
+import os
+import timeit
+
+import pywikibot
+
+from pywikibot import textlib
+
+from tests import join_pages_path
+
+RUNS = 3
+
+
+def implementations():
+    """Return the available implementations by their names."""
+    result = [
+        ('tokenizer', textlib.extract_templates_and_params_tokenizer),
+        ('regex', lambda text: textlib.extract_templates_and_params_regex(
+            text, False, False)),
+    ]
+    if not isinstance(textlib.mwparserfromhell, Exception):
+        result.append(('mwparserfromhell',
+                       textlib.extract_templates_and_params_mwpfh))
+    return result
+
+
+def load_pages():
+    """Return the names and texts of the wikitext pages."""
+    directory = join_pages_path()
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('.page'):
+            with codecs.open(os.path.join(directory, filename),
+                             'r', 'utf-8') as f:
+                yield filename, f.read()
+
+
+def benchmark(text, number):
+    """Return the number of templates and seconds per implementation."""
+    for name, func in implementations():
+        templates = len(func(text))
+        seconds = min(timeit.repeat(lambda: func(text),
+                                    repeat=RUNS, number=number)) / number
+        yield name, templates, seconds
+
+
+def main(*args):
+    """Process command line arguments and run the benchmark."""
+    number = 10
+    repeat = 1
+    for arg in pywikibot.handle_args(args):
+        option, _, value = arg.partition(':')
+        if option == '-number':
+            number = int(value)
+        elif option == '-repeat':
+            repeat = int(value)
+        else:
+            pywikibot.bot.suggest_help(unknown_parameters=[arg])
+            return
+
+    for filename, text in load_pages():
+        text *= repeat
+        pywikibot.output('{0} ({1} chars):'.format(filename, len(text)))
+        for name, templates, seconds in benchmark(text, number):
+            pywikibot.output('  {0:<18}{1:>6} templates {2:>10.3f} ms'.format(
+                name, templates, seconds * 1000))
+
+
+if __name__ == '__main__':
+    main()
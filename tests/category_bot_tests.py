@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 """Tests for the category bot script."""
 #
-# (C) Pywikibot team, 2015-2016
+# (C) Pywikibot team, 2015-2017
 #
 # Distributed under the terms of the MIT license.
 #
@@ -9,9 +9,21 @@ from __future__ import absolute_import, unicode_literals
 
 __version__ = '$Id$'
 
-from scripts.category import CategoryMoveRobot
+import os
+import shutil
+import tempfile
 
-from tests.aspects import unittest, DefaultSiteTestCase
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+import pywikibot
+
+from scripts.category import CategoryDatabase, CategoryMoveRobot
+
+from tests.aspects import unittest, DefaultSiteTestCase, TestCase
+from tests.utils import DryCategoryMembers
 
 
 class CfdActions(DefaultSiteTestCase):
@@ -59,6 +71,56 @@ class CfdActions(DefaultSiteTestCase):
         self.assertEqual(bot.newcat.text, expected)
 
 
+class TestCategoryDatabase(TestCase):
+
+    """Test preloading the category database with dry tests."""
+
+    family = 'wikipedia'
+    code = 'en'
+
+    dry = True
+
+    def test_preload(self):
+        """Test that the contents up to the depth are saved."""
+        site = self.get_site()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        db = CategoryDatabase(
+            rebuild=True, filename=os.path.join(directory, 'test.sqlite'),
+            site=site)
+        self.addCleanup(db.dump)
+        graph = DryCategoryMembers(site)
+        members = graph.patch(self)
+        root = pywikibot.Category(site, 'Root')
+        db.preload(root, 1)
+        self.assertEqual(graph.requested,
+                         ['Category:Root', 'Category:A', 'Category:B'])
+        self.assertEqual(db.getSubcats(root),
+                         set([pywikibot.Category(site, 'A'),
+                              pywikibot.Category(site, 'B')]))
+        self.assertEqual(db.getArticles(root),
+                         set([pywikibot.Page(site, 'P1')]))
+        category = pywikibot.Category(site, 'A')
+        self.assertEqual(db.getSubcats(category),
+                         set([root, pywikibot.Category(site, 'B')]))
+        self.assertEqual(db.getArticles(category),
+                         set([pywikibot.Page(site, 'P2'),
+                              pywikibot.FilePage(site, 'F')]))
+        self.assertEqual(members.call_count, 3)
+
+    def test_rebuild(self):
+        """Test that only the categories of the site are removed."""
+        site = self.get_site()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'test.sqlite')
+        db = CategoryDatabase(filename=filename)
+        self.addCleanup(db.dump)
+        with mock.patch.object(db, 'graph', create=True) as graph:
+            db.rebuild(site)
+            graph.clear.assert_called_once_with(site)
+
+
 if __name__ == '__main__':  # pragma: no cover
     try:
         unittest.main()
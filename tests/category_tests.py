@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 """Tests for the Category class."""
 #
-# (C) Pywikibot team, 2014-2015
+# (C) Pywikibot team, 2014-2017
 #
 # Distributed under the terms of the MIT license.
 #
@@ -9,10 +9,18 @@ from __future__ import absolute_import, unicode_literals
 
 __version__ = '$Id$'
 
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
 import pywikibot
 import pywikibot.page
 
+from pywikibot import pagegenerators
+
 from tests.aspects import unittest, TestCase
+from tests.utils import DryCategoryMembers
 
 
 class TestCategoryObject(TestCase):
@@ -211,6 +219,110 @@ class TestCategoryDryObject(TestCase):
         self.assertEqual(cat.aslink(sortKey='Foo'), '[[Category:Wikipedia categories|Foo]]')
 
 
+class TestCategoryCrawl(TestCase):
+
+    """Test crawling the category graph with dry tests."""
+
+    family = 'wikipedia'
+    code = 'en'
+
+    dry = True
+
+    def setUp(self):
+        """Patch the retrieval of the category members."""
+        super(TestCategoryCrawl, self).setUp()
+        self.site = self.get_site()
+        self.root = pywikibot.Category(self.site, 'Category:Root')
+        self.graph = DryCategoryMembers(self.site)
+        self.graph.patch(self)
+
+    def _crawl(self, **kwargs):
+        """Return the title, depth and category title of the members."""
+        return [(member.page.title(), member.depth, member.category.title())
+                for member in self.root.crawl(**kwargs)]
+
+    def test_crawl(self):
+        """Test that every category is visited once."""
+        for workers in (0, 1, 3):
+            del self.graph.requested[:]
+            self.assertEqual(self._crawl(workers=workers), [
+                ('P1', 0, 'Category:Root'),
+                ('P2', 1, 'Category:A'),
+                ('File:F', 1, 'Category:A'),
+                ('P3', 1, 'Category:B'),
+                ('P4', 2, 'Category:C'),
+            ])
+            self.assertEqual(self.graph.requested,
+                             ['Category:Root', 'Category:A', 'Category:B',
+                              'Category:C'])
+
+    def test_subcats(self):
+        """Test yielding the subcategories."""
+        members = self.root.crawl(member_type='subcat')
+        self.assertTrue(all(isinstance(member.page, pywikibot.Category)
+                            for member in members))
+        del self.graph.requested[:]
+        self.assertEqual(self._crawl(member_type='subcat', recurse=1), [
+            ('Category:A', 0, 'Category:Root'),
+            ('Category:B', 0, 'Category:Root'),
+            ('Category:B', 1, 'Category:A'),
+            ('Category:Root', 1, 'Category:A'),
+            ('Category:A', 1, 'Category:B'),
+            ('Category:C', 1, 'Category:B'),
+        ])
+        self.assertNotIn('Category:C', self.graph.requested)
+
+    def test_limits(self):
+        """Test the recursion depth, total and namespaces."""
+        self.assertEqual(self._crawl(recurse=False),
+                         [('P1', 0, 'Category:Root')])
+        self.assertEqual(self.graph.requested, ['Category:Root'])
+        self.assertEqual(self._crawl(total=2), [('P1', 0, 'Category:Root'),
+                                                ('P2', 1, 'Category:A')])
+        self.assertEqual(self._crawl(namespaces=[6]),
+                         [('File:F', 1, 'Category:A')])
+
+    def test_member_type(self):
+        """Test that the members are filtered by the server."""
+        self._crawl(member_type='subcat')
+        self.assertEqual(self.graph.member_types,
+                         set([frozenset(['subcat'])]))
+        self.graph.member_types.clear()
+        self._crawl(recurse=False)
+        self.assertEqual(self.graph.member_types,
+                         set([frozenset(['page', 'file'])]))
+
+    def test_streamed(self):
+        """Test that members are only retrieved when they are used."""
+        self.graph.graph['Category:Root'] = ['P{0}'.format(i)
+                                             for i in range(5000)]
+        members = self.root.crawl(workers=0)
+        self.assertEqual(next(members).page.title(), 'P0')
+        self.assertEqual(self.graph.retrieved, 1)
+        members.close()
+        self.graph.retrieved = 0
+        self.assertEqual(len(self._crawl(total=3, recurse=False)), 3)
+        self.assertEqual(self.graph.retrieved, 3)
+        # the members of the following categories are retrieved in advance
+        # up to crawl_prefetch
+        self.graph.retrieved = 0
+        with mock.patch.object(pywikibot.Category, 'crawl_prefetch', 10):
+            self.assertEqual(len(self._crawl(total=3)), 3)
+        self.assertLessEqual(self.graph.retrieved, 3 + 10 + 1)
+
+    def test_generators(self):
+        """Test the page generators of recursive categories."""
+        self.assertEqual(
+            [page.title() for page in
+             pagegenerators.CategorizedPageGenerator(self.root, recurse=True)],
+            ['P1', 'P2', 'File:F', 'P3', 'P4'])
+        self.assertEqual(
+            [page.title() for page in
+             pagegenerators.SubCategoriesPageGenerator(self.root, recurse=1,
+                                                       start='B')],
+            ['Category:B', 'Category:B', 'Category:Root', 'Category:C'])
+
+
 class CategoryNewestPages(TestCase):
 
     """Test newest_pages feature on French Wikinews."""
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""Tests for the categorygraph module."""
+#
+# (C) Pywikibot team, 2017
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+__version__ = '$Id$'
+
+import os
+import shutil
+import tempfile
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+import pywikibot
+
+from pywikibot.data.categorygraph import CategoryGraph
+
+from tests.aspects import unittest, require_modules, TestCase
+
+OLD = '2017-01-01T00:00:00Z'
+
+
+@require_modules('sqlite3')
+class TestCategoryGraph(TestCase):
+
+    """Test storing and refreshing categories with dry tests."""
+
+    family = 'wikipedia'
+    code = 'en'
+
+    dry = True
+
+    def setUp(self):
+        """Create the database in a temporary directory."""
+        super(TestCategoryGraph, self).setUp()
+        self.site = self.get_site()
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'categories.sqlite')
+        self.graph = CategoryGraph(self.filename, max_age=1)
+        # the members of each category with the time they were added
+        self.tree = {
+            'Category:Root': [('Category:A', OLD), ('P1', OLD)],
+            'Category:A': [('Category:Root', OLD), ('Category:B', OLD),
+                           ('P2', OLD)],
+            'Category:B': [('P3', OLD)],
+        }
+        self.requested = []
+        patcher = mock.patch.object(self.site, 'categorymembers',
+                                    side_effect=self._categorymembers)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(CategoryGraph, '_sizes',
+                                    side_effect=self._sizes)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        """Close the database and remove its directory."""
+        self.graph.close()
+        shutil.rmtree(self.directory)
+        super(TestCategoryGraph, self).tearDown()
+
+    def _categorymembers(self, category, sortby=None, starttime=None):
+        """Return the members of the category added since starttime."""
+        self.requested.append((category.title(), starttime))
+        for title, added in self.tree[category.title()]:
+            if starttime is None or added >= starttime.isoformat():
+                yield pywikibot.Page(self.site, title)
+
+    def _sizes(self, categories):
+        """Return the number of members of the categories."""
+        return dict((category.title(), len(self.tree[category.title()]))
+                    for category in categories)
+
+    def _category(self, title):
+        """Return the category of the site."""
+        return pywikibot.Category(self.site, title)
+
+    def test_members(self):
+        """Test that the stored members are used."""
+        root = self._category('Root')
+        self.assertEqual(self.graph.subcategories(root),
+                         [self._category('A')])
+        self.assertIsInstance(self.graph.subcategories(root)[0],
+                              pywikibot.Category)
+        self.assertEqual(self.graph.articles(root),
+                         [pywikibot.Page(self.site, 'P1')])
+        self.assertEqual(self.requested, [('Category:Root', None)])
+
+    def test_persistent(self):
+        """Test that another instance uses the stored members."""
+        root = self._category('Root')
+        self.graph.members(root)
+        other = CategoryGraph(self.filename, max_age=1)
+        try:
+            self.assertEqual(len(other.members(root)), 2)
+        finally:
+            other.close()
+        self.assertEqual(len(self.requested), 1)
+
+    def test_incremental(self):
+        """Test that only the new members of a category are requested."""
+        root = self._category('Root')
+        self.graph.members(root)
+        self.tree['Category:Root'].append(
+            ('P4', pywikibot.Timestamp.utcnow().isoformat()))
+        self.graph.max_age = -1
+        self.assertIn(pywikibot.Page(self.site, 'P4'),
+                      self.graph.members(root))
+        self.assertEqual(len(self.requested), 2)
+        self.assertIsNotNone(self.requested[1][1])
+
+    def test_removed(self):
+        """Test that all members are requested if members were removed."""
+        root = self._category('Root')
+        self.graph.members(root)
+        del self.tree['Category:Root'][1]
+        self.graph.refresh(root)
+        self.assertEqual([page for title, page in self.requested],
+                         [None, mock.ANY, None])
+        self.assertEqual(self.graph.members(root), [self._category('A')])
+
+    def test_descendants(self):
+        """Test the subcategories of the tree up to a depth."""
+        root = self._category('Root')
+        self.assertEqual(list(self.graph.descendants(root, 1, workers=0)),
+                         [(self._category('A'), 1)])
+        self.assertEqual(list(self.graph.descendants(root, workers=2)),
+                         [(self._category('A'), 1),
+                          (self._category('B'), 2)])
+        self.assertEqual(sorted(title for title, since in self.requested),
+                         ['Category:A', 'Category:B', 'Category:Root'])
+
+    def test_supercategories(self):
+        """Test that the stored edges are used in both directions."""
+        category = self._category('A')
+        with mock.patch.object(self.site, 'pagecategories',
+                               return_value=[self._category('Root')]) as cats:
+            self.assertEqual(self.graph.supercategories(category),
+                             [self._category('Root')])
+            self.graph.members(self._category('B'))
+            self.graph.members(self._category('Root'))
+            self.assertEqual(self.graph.supercategories(category),
+                             [self._category('Root')])
+            self.assertEqual(cats.call_count, 1)
+
+    def test_clear(self):
+        """Test that the categories of a site are removed."""
+        root = self._category('Root')
+        self.graph.members(root)
+        self.graph.clear(self.site)
+        self.graph.members(root)
+        self.assertEqual(self.requested, [('Category:Root', None)] * 2)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
@@ -9,6 +9,11 @@ from __future__ import absolute_import, unicode_literals
 
 from datetime import datetime
 
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
 from pywikibot import date
 
 from tests.aspects import unittest, MetaTestCaseClass, TestCase
@@ -95,6 +100,70 @@ class TestMonthDelta(TestCase):
         self.assertEqual(date.get_month_delta(datetime(2014, 3, 31), datetime(2013, 3, 31)), -12)
 
 
+class TestAutoFormat(TestCase):
+
+    """Test recognizing the format of a title."""
+
+    net = False
+
+    def setUp(self):
+        """Clear the cached results."""
+        super(TestAutoFormat, self).setUp()
+        date._autoFormatCache.clear()
+
+    def _scan(self, lang, title):
+        """Return the first format which accepts the title."""
+        for dictName, dict in date.formats.items():
+            try:
+                return dictName, dict[lang](title)
+            except Exception:
+                pass
+        return None, None
+
+    def test_formats(self):
+        """Test the titles of formats."""
+        self.assertEqual(date.getAutoFormat('en', '1999'), ('YearAD', 1999))
+        self.assertEqual(date.getAutoFormat('en', '1990s'),
+                         ('DecadeAD', 1990))
+        self.assertEqual(date.getAutoFormat('en', 'May 15'),
+                         ('Day_May', 15))
+        self.assertEqual(date.getAutoFormat('fr', 'janvier 2005'),
+                         ('Year_January', 2005))
+        self.assertEqual(date.getAutoFormat('en', 'Current events'),
+                         ('CurrEvents', 0))
+        self.assertEqual(date.getAutoFormat('en', 'Foo 1999'), (None, None))
+        self.assertEqual(date.getAutoFormat('en', ''), (None, None))
+        self.assertEqual(date.getAutoFormat('en', 'may 15', False),
+                         (None, None))
+
+    def test_same_as_scan(self):
+        """Test that the result is the same as by trying all formats."""
+        for lang in ('en', 'fr', 'ur', 'wa', 'zh', 'kn'):
+            titles = ['Foo', '12', 'XII', '12 XII']
+            for dictName, dict in date.formats.items():
+                if lang in dict:
+                    predicate, start, stop = date.formatLimits[dictName]
+                    title = dict[lang](start)
+                    titles += [title, title + '1', date.first_lower(title)]
+            for title in titles:
+                result = self._scan(lang, title)
+                if result == (None, None) and title:
+                    result = self._scan(lang, title.swapcase()[0] + title[1:])
+                self.assertEqual(date.getAutoFormat(lang, title), result)
+
+    def test_cache(self):
+        """Test that the recent results are cached."""
+        with mock.patch.object(date, '_autoFormatCacheSize', 2):
+            with mock.patch.object(date, '_getAutoFormat',
+                                   side_effect=date._getAutoFormat) as find:
+                for title in ('1999', '2000', '1999', '2001', '1999'):
+                    date.getAutoFormat('en', title)
+        self.assertEqual([call[0][1] for call in find.call_args_list],
+                         ['1999', '2000', '2001'])
+        self.assertEqual(list(date._autoFormatCache),
+                         [('en', '2001', True), ('en', '1999', True)])
+
+
 if __name__ == '__main__':  # pragma: no cover
     try:
         unittest.main()
@@ -9,10 +9,20 @@ from __future__ import absolute_import, unicode_literals
 
 __version__ = '$Id$'
 
+import json
+import os
+import shutil
+import tempfile
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
 import pywikibot.site
 
 from pywikibot.exceptions import UnknownFamily
-from pywikibot.family import Family, SingleSiteFamily
+from pywikibot.family import Family, FamilyRegistry, SingleSiteFamily
 from pywikibot.tools import StringTypes as basestring
 
 from tests.aspects import (
@@ -250,6 +260,70 @@ class TestFamilyUrlRegex(PatchingTestCase):
                     self.assertEqual(family.from_url(url), code)
 
 
+class TestFamilyRegistry(TestCase):
+
+    """Test the stored data of the families."""
+
+    net = False
+
+    def setUp(self):
+        """Create the registry in a temporary directory."""
+        super(TestFamilyRegistry, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'families.json')
+        self.registry = FamilyRegistry(self.filename)
+
+    def tearDown(self):
+        """Remove the directory of the registry."""
+        shutil.rmtree(self.directory)
+        super(TestFamilyRegistry, self).tearDown()
+
+    def test_get(self):
+        """Test that the entry of a family is stored."""
+        entry = self.registry.get('wikipedia')
+        self.assertEqual(entry['file'],
+                         pywikibot.config.family_files['wikipedia'])
+        self.assertEqual(entry['hostnames']['en'], 'en.wikipedia.org')
+        self.assertEqual(entry['mtime'], os.path.getmtime(entry['file']))
+        with open(self.filename) as f:
+            self.assertIn('wikipedia', json.load(f))
+        other = FamilyRegistry(self.filename)
+        with mock.patch.object(Family, 'load') as load:
+            self.assertEqual(other.get('wikipedia'), entry)
+            self.assertFalse(load.called)
+        self.assertRaises(UnknownFamily, other.get, 'unknown')
+
+    def test_changed(self):
+        """Test that the entry of a changed family file is renewed."""
+        self.registry.get('wikipedia')
+        other = FamilyRegistry(self.filename)
+        mtime = os.path.getmtime(pywikibot.config.family_files['wikipedia'])
+        with mock.patch('os.path.getmtime', return_value=mtime + 1):
+            self.assertEqual(other.get('wikipedia')['mtime'], mtime + 1)
+
+    def test_module_changed(self):
+        """Test that the entries are renewed when the family module changed."""
+        entry = self.registry.get('wikipedia')
+        other = FamilyRegistry(self.filename)
+        other._module_mtime += 1
+        with mock.patch.object(Family, 'load',
+                               wraps=Family.load) as load:
+            self.assertEqual(other.get('wikipedia')['module_mtime'],
+                             entry['module_mtime'] + 1)
+            load.assert_called_once_with('wikipedia')
+
+    def test_families(self):
+        """Test the families which may contain a URL."""
+        families = self.registry.families('https://de.wikibooks.org/wiki/$1')
+        self.assertIn('wikibooks', families)
+        self.assertNotIn('wikipedia', families)
+        other = FamilyRegistry(self.filename)
+        with mock.patch.object(Family, 'load') as load:
+            self.assertEqual(
+                other.families('https://de.wikibooks.org/wiki/$1'), families)
+            self.assertFalse(load.called)
+
+
 class TestOldFamilyMethod(DeprecationTestCase):
 
     """Test cases for old site.Family method."""
@@ -11,6 +11,8 @@ __version__ = '$Id$'
 
 import json
 import re
+import threading
+import time
 import warnings
 
 import requests
@@ -63,6 +65,85 @@ class HttpTestCase(TestCase):
         self.assertIsInstance(r.raw, bytes)
 
 
+class ThreadedRequestTestCase(TestCase):
+
+    """Test that enqueued requests are executed by the HTTP threads."""
+
+    net = False
+
+    def setUp(self):
+        """Patch the request processing and configure the HTTP threads."""
+        super(ThreadedRequestTestCase, self).setUp()
+        self._orig_process = http._http_process
+        self._orig_threads = config.http_threads_per_host
+        http._http_process = self._process
+        config.http_threads_per_host = 3
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.threads = set()
+
+    def tearDown(self):
+        """Restore the request processing and configuration."""
+        http._http_process = self._orig_process
+        config.http_threads_per_host = self._orig_threads
+        super(ThreadedRequestTestCase, self).tearDown()
+
+    def _process(self, session, request):
+        """Simulate a slow request and count the concurrent ones."""
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.active, self.max_active)
+            self.threads.add(threading.current_thread().name)
+        time.sleep(0.1)
+        with self.lock:
+            self.active -= 1
+        response = requests.Response()
+        response.status_code = 200
+        response._content = request.uri.encode('ascii')
+        request.data = response
+
+    def test_concurrent(self):
+        """Test that requests to one host run concurrently."""
+        called = []
+        uri = 'http://concurrent.example.invalid/{0}'
+        enqueued = [http._enqueue(uri.format(i), callback=called.append)
+                    for i in range(6)]
+        for i, request in enumerate(enqueued):
+            self.assertTrue(request.wait(5))
+            self.assertEqual(request.raw, uri.format(i).encode('ascii'))
+        self.assertEqual(len(called), 6)
+        self.assertGreater(self.max_active, 1)
+        self.assertLessEqual(self.max_active, 3)
+        self.assertTrue(all(name.startswith('HttpProcessor-')
+                            for name in self.threads))
+
+    def test_hosts(self):
+        """Test that each host has its own threads."""
+        first = http.fetch('http://first.example.invalid/')
+        second = http.fetch('http://second.example.invalid/')
+        self.assertTrue(first.completed)
+        self.assertTrue(second.completed)
+        self.assertEqual(len(self.threads), 2)
+
+    def test_synchronous(self):
+        """Test that no threads are used without configured threads."""
+        config.http_threads_per_host = 0
+        request = http._enqueue('http://sync.example.invalid/')
+        self.assertTrue(request.completed)
+        self.assertEqual(self.threads, set([threading.current_thread().name]))
+
+    def test_callback_exception(self):
+        """Test that a failing callback doesn't block the waiting thread."""
+        def callback(request):
+            raise ValueError('callback failed')
+
+        request = http._enqueue('http://callback.example.invalid/',
+                                callback=callback)
+        self.assertTrue(request.wait(5))
+        self.assertEqual(request.status, 200)
+
+
 class HttpRequestURI(DeprecationTestCase):
 
     """Tests using http.request without a site."""
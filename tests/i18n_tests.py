@@ -9,6 +9,18 @@ from __future__ import absolute_import, unicode_literals
 
 __version__ = '$Id$'
 
+import codecs
+import json
+import os
+import shutil
+import tempfile
+import time
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
 import pywikibot
 
 from pywikibot import i18n, bot, plural
@@ -18,6 +30,7 @@ from tests.aspects import (
     unittest, TestCase, DefaultSiteTestCase, PwbTestCase,
     AutoDeprecationTestCase,
 )
+from tests import join_root_path
 
 
 class TestTranslate(TestCase):
@@ -334,6 +347,111 @@ class TestTWNTranslate(TWNTestCaseBase, AutoDeprecationTestCase):
             u'Robot: Changer seulement une page.')
 
 
+class TestCatalog(TWNTestCaseBase):
+
+    """Test the compiled catalogs of the messages."""
+
+    net = False
+    message_package = 'tests.i18n'
+
+    def setUp(self):
+        """Copy the test messages to a temporary directory."""
+        super(TestCatalog, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        shutil.copytree(join_root_path('tests', 'i18n', 'test'),
+                        os.path.join(self.directory, 'test'))
+        for patcher in (
+                mock.patch.object(i18n, '_package_directory',
+                                  return_value=self.directory),
+                mock.patch.dict(i18n._catalogs, clear=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        """Close the catalogs and remove the directory."""
+        for catalog in i18n._catalogs.values():
+            if catalog is not None:
+                catalog.close()
+        shutil.rmtree(self.directory)
+        super(TestCatalog, self).tearDown()
+
+    def test_messages(self):
+        """Test that the catalog contains the messages of each language."""
+        filename = os.path.join(self.directory, 'test.catalog')
+        self.assertEqual(i18n.compile_catalogs(), [filename])
+        catalog = i18n._get_catalog('test')
+        self.assertEqual(catalog.languages,
+                         ['de', 'en', 'fr', 'fy', 'ja', 'nl'])
+        for lang in catalog.languages:
+            with codecs.open(os.path.join(self.directory, 'test',
+                                          lang + '.json'), 'r', 'utf-8') as f:
+                messages = json.load(f)
+            for twtitle, message in messages.items():
+                if twtitle != '@metadata':
+                    self.assertEqual(catalog.get(lang, twtitle), message)
+        self.assertIsNone(catalog.get('en', 'test-missing'))
+        self.assertIsNone(catalog.get('xx', 'test-localized'))
+
+    def test_translate(self):
+        """Test that the translations are taken from the catalog."""
+        i18n.compile_catalogs()
+        with mock.patch.dict(i18n._cache, clear=True):
+            self.assertEqual(i18n.twtranslate('nl', 'test-localized'),
+                             'test-localized NL')
+            self.assertEqual(i18n.twtranslate('co', 'test-plural',
+                                              {'num': 2, 'descr': 'a'}),
+                             'Robot: Changer a quelques pages.')
+            self.assertTrue(i18n.twhas_key('nl', 'test-semi-localized'))
+            self.assertFalse(i18n.twhas_key('de', 'test-semi-localized'))
+            self.assertEqual(i18n.twget_keys('test-semi-localized'),
+                             ['en', 'nl'])
+            self.assertEqual(dict(i18n._cache), {})
+
+    def test_replace(self):
+        """Test that a compiled catalog replaces the old file."""
+        filename = os.path.join(self.directory, 'test.catalog')
+        i18n.compile_catalogs()
+        cached = i18n._get_catalog('test')
+        mapped = i18n._Catalog(filename)
+        self.addCleanup(mapped.close)
+        build = i18n._Catalog.build
+        calls = []
+
+        def close():
+            calls.append('close')
+            type(cached).close(cached)
+
+        def build_catalog(directory, filename):
+            calls.append('build')
+            return build(directory, filename)
+
+        with mock.patch.object(cached, 'close', side_effect=close):
+            with mock.patch.object(i18n._Catalog, 'build',
+                                   side_effect=build_catalog):
+                i18n.compile_catalogs()
+        self.assertEqual(calls, ['close', 'build'])
+        self.assertNotIn(('tests.i18n', 'test'), i18n._catalogs)
+        self.assertEqual(mapped.get('nl', 'test-localized'),
+                         'test-localized NL')
+        self.assertEqual(os.listdir(self.directory), ['test', 'test.catalog'])
+        umask = os.umask(0)
+        os.umask(umask)
+        self.assertEqual(os.stat(filename).st_mode & 0o777, 0o666 & ~umask)
+
+    def test_outdated(self):
+        """Test that a catalog older than the messages is not used."""
+        i18n.compile_catalogs()
+        i18n._catalogs.clear()
+        filename = os.path.join(self.directory, 'test', 'en.json')
+        mtime = time.time() + 10
+        os.utime(filename, (mtime, mtime))
+        with mock.patch.object(pywikibot, 'warning') as warning:
+            self.assertIsNone(i18n._get_catalog('test'))
+        self.assertEqual(warning.call_count, 1)
+        self.assertEqual(i18n.twtranslate('en', 'test-localized'),
+                         'test-localized EN')
+
+
 class ScriptMessagesTestCase(TWNTestCaseBase):
 
     """Real messages test."""
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""Tests for the interwiki script."""
+#
+# (C) Pywikibot team, 2017
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+__version__ = '$Id$'
+
+import threading
+import time
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+import pywikibot
+
+from scripts import interwiki
+
+from tests.aspects import unittest, TestCase
+from tests.utils import DrySite
+
+
+class FakeSubject(object):
+
+    """Subject which needs a number of pages from some sites."""
+
+    def __init__(self, name, todo):
+        """Constructor."""
+        self.name = name
+        self.todo = dict(todo)
+        self.pending = None
+        self.loaded = []
+
+    def openSites(self):
+        """Return the sites and numbers of pages to be loaded."""
+        return list(self.todo.items())
+
+    def whatsNextPageBatch(self, site):
+        """Return the pages of the site."""
+        assert self.pending is None, 'still working on another site'
+        count = self.todo.pop(site, 0)
+        if count:
+            self.pending = (site, count)
+        return [(self.name, site, i) for i in range(count)]
+
+    def batchLoaded(self, counter):
+        """Record that the pages are loaded."""
+        site, count = self.pending
+        counter.minus(site, count)
+        self.loaded.append((site, threading.current_thread()))
+        self.pending = None
+
+    def isDone(self):
+        """Return True if no pages need to be loaded."""
+        return not self.todo
+
+    def finish(self):
+        """Do nothing."""
+
+    def clean(self):
+        """Do nothing."""
+
+
+class TestParallelQueries(TestCase):
+
+    """Test querying several sites at the same time."""
+
+    family = 'wikipedia'
+    code = 'en'
+
+    dry = True
+
+    def setUp(self):
+        """Create the bot with its sites and subjects."""
+        super(TestParallelQueries, self).setUp()
+        self.sites = [pywikibot.Site(code, 'wikipedia', interface=DrySite)
+                      for code in ('en', 'de', 'fr', 'nl')]
+        patcher = mock.patch.object(pywikibot, 'Site',
+                                    return_value=self.sites[0])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        conf = interwiki.InterwikiBotConfig()
+        conf.parallelsites = 3
+        conf.quiet = True
+        self.bot = interwiki.InterwikiBot(conf)
+        en, de, fr, nl = self.sites
+        self.subjects = [
+            FakeSubject('a', {en: 1, de: 2, fr: 1}),
+            FakeSubject('b', {de: 1, nl: 3}),
+            FakeSubject('c', {fr: 2, nl: 1}),
+            FakeSubject('d', {en: 1}),
+        ]
+        for subject in self.subjects:
+            self.bot.subjects.append(subject)
+            for site, count in subject.openSites():
+                self.bot.plus(site, count)
+        self.lock = threading.Lock()
+        self.running = set()
+        self.max_running = 0
+        self.queries = []
+
+    def _load_pages(self, site, pageGroup):
+        """Record the concurrent queries."""
+        with self.lock:
+            self.assertNotIn(site, self.running)
+            self.running.add(site)
+            self.max_running = max(self.max_running, len(self.running))
+            self.queries.append((site, pageGroup))
+        time.sleep(0.05)
+        with self.lock:
+            self.running.remove(site)
+
+    def test_parallel(self):
+        """Test that all pages are loaded by concurrent queries."""
+        with mock.patch.object(self.bot, 'loadPages', self._load_pages):
+            self.bot.run()
+        self.assertEqual(self.bot.subjects, [])
+        self.assertGreater(self.max_running, 1)
+        self.assertLessEqual(self.max_running, 3)
+        loaded = [page for site, pageGroup in self.queries
+                  for page in pageGroup]
+        self.assertEqual(len(loaded), 12)
+        self.assertEqual(len(set(loaded)), 12)
+        for subject in self.subjects:
+            for site, thread in subject.loaded:
+                self.assertIs(thread, threading.current_thread())
+
+    def test_error(self):
+        """Test that an error of a query is raised in the main thread."""
+        def load_pages(site, pageGroup):
+            raise pywikibot.ServerError('foo')
+
+        with mock.patch.object(self.bot, 'loadPages', load_pages):
+            self.assertRaisesRegex(pywikibot.ServerError, 'foo', self.bot.run)
+
+    def test_queue_depths(self):
+        """Test the number of pages per site."""
+        en, de, fr, nl = self.sites
+        self.bot.minus(en, 2)
+        self.assertEqual(self.bot.queueDepths(), [(nl, 4), (de, 3), (fr, 3)])
+
+
+if __name__ == '__main__':  # pragma: no cover
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
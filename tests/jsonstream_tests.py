@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""Tests for the jsonstream module."""
+#
+# (C) Pywikibot team, 2017
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+__version__ = '$Id$'
+
+import json
+
+from pywikibot.data.jsonstream import iterparse
+
+from tests.aspects import unittest, TestCase
+
+
+def _chunks(data, size):
+    """Return the encoded JSON text of the data in chunks of the size."""
+    text = json.dumps(data, ensure_ascii=False).encode('utf-8')
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class TestIterparse(TestCase):
+
+    """Test decoding the items of a JSON object while it is received."""
+
+    net = False
+
+    data = {
+        'batchcomplete': '',
+        'continue': {'rvcontinue': 12345, 'continue': '||'},
+        'query': {
+            'normalized': [{'from': 'foo', 'to': 'Foo'}],
+            'pages': {
+                '1': {'pageid': 1, 'title': 'Foo', 'length': 1.5e3},
+                '-1': {'title': 'Bär ✓', 'missing': '', 'ns': None},
+                '22': {'pageid': 22, 'title': 'Baz', 'flags': [True, False]},
+            },
+            'userinfo': {'id': 0, 'name': '127.0.0.1'},
+        },
+        'warnings': {'main': {'*': 'a "quoted" warning'}},
+    }
+
+    def _parse(self, chunks, path=('query', 'pages')):
+        """Return the events and check that the result is updated."""
+        events = list(iterparse(chunks, path))
+        self.assertEqual(events[-1][0], 'end')
+        if len(events) > 1:
+            self.assertEqual(events[0][0], 'start')
+            self.assertIs(events[0][1], events[-1][1])
+        return events
+
+    def test_chunk_sizes(self):
+        """Test that the result doesn't depend on the chunks."""
+        expected = dict(self.data)
+        expected['query'] = dict(self.data['query'])
+        pages = expected['query'].pop('pages')
+        for size in (1, 2, 3, 7, 64, 10000):
+            events = self._parse(_chunks(self.data, size))
+            self.assertEqual(events[-1][1], expected)
+            items = [value for event, value in events if event == 'item']
+            self.assertEqual(sorted(items, key=lambda page: page['title']),
+                             sorted(pages.values(),
+                                    key=lambda page: page['title']))
+
+    def test_order(self):
+        """Test that the items are yielded in the order of the text."""
+        chunks = [b'{"query": {"pages": {"2": {"title": "B"}, ',
+                  b'"1": {"title": "A"}, "3": {"title": "C"}}}}']
+        events = self._parse(chunks)
+        self.assertEqual([value['title'] for event, value in events[1:-1]],
+                         ['B', 'A', 'C'])
+
+    def test_incremental(self):
+        """Test that an item is yielded before the next chunk is read."""
+        read = []
+
+        def chunks():
+            for chunk in _chunks(self.data, 4):
+                read.append(chunk)
+                yield chunk
+
+        total = len(_chunks(self.data, 4))
+        for event, value in iterparse(chunks(), ('query', 'pages')):
+            if event == 'item':
+                break
+        self.assertLess(len(read), total)
+
+    def test_array(self):
+        """Test the items of an array."""
+        events = self._parse(_chunks({'a': {'b': [1, 22, 333]}, 'c': 4}, 1),
+                             ('a', 'b'))
+        self.assertEqual(events[1:-1],
+                         [('item', 1), ('item', 22), ('item', 333)])
+        self.assertEqual(events[-1][1], {'a': {}, 'c': 4})
+
+    def test_empty(self):
+        """Test an empty object of items."""
+        events = self._parse([b' { "query" : { "pages" : { } } } '])
+        self.assertEqual(events, [('start', {'query': {}}),
+                                  ('end', {'query': {}})])
+
+    def test_missing(self):
+        """Test a text without the items."""
+        data = {'error': {'code': 'foo', 'info': 'bar'}}
+        self.assertEqual(self._parse(_chunks(data, 3)), [('end', data)])
+        data = {'query': {'pages': 'foo'}}
+        self.assertEqual(self._parse(_chunks(data, 3)), [('end', data)])
+
+    def test_invalid(self):
+        """Test that an invalid text raises ValueError."""
+        for text in (b'', b'[]', b'{"a": 1', b'{"a": 1}}', b'{"a" 1}',
+                     b'{"query": {"pages": {"1": {}, }}}', b'{"a": tru}'):
+            with self.assertRaises(ValueError):
+                list(iterparse([text[:3], text[3:]], ('query', 'pages')))
+
+
+if __name__ == '__main__':  # pragma: no cover
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
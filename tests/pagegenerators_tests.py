@@ -8,10 +8,13 @@
 from __future__ import absolute_import, unicode_literals
 
 import calendar
+import collections
 import datetime
 import json
 import logging
 import sys
+import threading
+import time
 
 from distutils.version import LooseVersion
 
@@ -576,6 +579,64 @@ class TestPreloadingGenerator(DefaultSiteTestCase):
         self.assertEqual(len(links), count)
 
 
+class FakePreloadingSite(object):
+
+    """Site which records the groups preloaded in other threads."""
+
+    def __init__(self, name, delay=0):
+        """Constructor."""
+        self.name = name
+        self.delay = delay
+        self.groups = []
+        self.threads = set()
+
+    def preloadpages(self, pages, groupsize):
+        """Return the pages after a delay."""
+        self.groups.append([page.title for page in pages])
+        self.threads.add(threading.current_thread())
+        time.sleep(self.delay)
+        for page in pages:
+            yield page
+
+
+FakePage = collections.namedtuple('FakePage', ['site', 'title'])
+
+
+class TestPreloadingGeneratorPrefetch(TestCase):
+
+    """Test preloading groups in advance."""
+
+    net = False
+
+    def test_order(self):
+        """Test that pages of several sites are yielded in the same order."""
+        first = FakePreloadingSite('first', delay=0.05)
+        second = FakePreloadingSite('second')
+        pages = [FakePage(first if i % 3 else second, i) for i in range(20)]
+        with_prefetch = list(PreloadingGenerator(pages, groupsize=3,
+                                                 prefetch=2))
+        self.assertNotIn(threading.current_thread(), first.threads)
+        first_groups, second_groups = first.groups, second.groups
+        first.groups, second.groups = [], []
+        without_prefetch = list(PreloadingGenerator(pages, groupsize=3,
+                                                    prefetch=0))
+        self.assertEqual(with_prefetch, without_prefetch)
+        self.assertEqual(sorted(first_groups), first.groups)
+        self.assertEqual(sorted(second_groups), second.groups)
+
+    def test_backpressure(self):
+        """Test that only the given number of groups is loaded in advance."""
+        site = FakePreloadingSite('site')
+        pages = [FakePage(site, i) for i in range(20)]
+        gen = PreloadingGenerator(pages, groupsize=2, prefetch=3)
+        self.assertEqual(next(gen).title, 0)
+        time.sleep(0.1)
+        # the yielded group and three groups in advance
+        self.assertEqual(len(site.groups), 4)
+        self.assertEqual([page.title for page in gen], list(range(1, 20)))
+        self.assertEqual(len(site.groups), 10)
+
+
 class TestDequePreloadingGenerator(DefaultSiteTestCase):
 
     """Test preloading generator on lists."""
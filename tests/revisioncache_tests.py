@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""Tests for the revisioncache module."""
+#
+# (C) Pywikibot team, 2017
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+__version__ = '$Id$'
+
+import os
+import shutil
+import tempfile
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+import pywikibot
+
+from pywikibot.data import api
+from pywikibot.data.revisioncache import RevisionCache
+
+from tests.aspects import unittest, require_modules, TestCase
+from tests.utils import DrySite
+
+
+def _revision(revid, text):
+    """Return a revision dict as in the API response."""
+    return {'revid': revid, 'parentid': revid - 1, 'user': 'Foo',
+            'timestamp': '2017-01-01T00:00:00Z', 'comment': '', '*': text,
+            'sha1': 'a' * 40, 'contentmodel': 'wikitext'}
+
+
+class RevisionCacheTestCase(TestCase):
+
+    """Test case with a revision cache in a temporary directory."""
+
+    def setUp(self):
+        """Create the directory of the cache."""
+        super(RevisionCacheTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'revisions.sqlite')
+        self.cache = RevisionCache(self.filename, 1024 * 1024)
+
+    def tearDown(self):
+        """Close the cache and remove its directory."""
+        self.cache.close()
+        shutil.rmtree(self.directory)
+        super(RevisionCacheTestCase, self).tearDown()
+
+
+@require_modules('sqlite3')
+class TestRevisionCache(RevisionCacheTestCase):
+
+    """Test storing and evicting revisions."""
+
+    family = 'wikipedia'
+    code = 'en'
+
+    dry = True
+
+    def test_store(self):
+        """Test that revisions are stored per site and revision id."""
+        site = self.get_site()
+        self.assertIsNone(self.cache.get(site, 1))
+        self.cache.store(site, _revision(1, 'foo'))
+        self.assertEqual(self.cache.get(site, 1), _revision(1, 'foo'))
+        self.assertIsNone(self.cache.get(site, 2))
+        other = pywikibot.Site('de', 'wikipedia', interface=DrySite)
+        self.assertIsNone(self.cache.get(other, 1))
+
+    def test_persistent(self):
+        """Test that another instance uses the same revisions."""
+        site = self.get_site()
+        self.cache.store(site, _revision(1, 'foo'))
+        other = RevisionCache(self.filename, 1024 * 1024)
+        try:
+            self.assertEqual(other.get(site, 1)['*'], 'foo')
+        finally:
+            other.close()
+
+    def test_evict(self):
+        """Test that the least recently used revisions are removed."""
+        site = self.get_site()
+        for revid in range(1, 6):
+            self.cache.store(site, _revision(revid, 'foo'))
+        size = self.cache._size
+        self.cache.max_size = size
+        self.assertIsNotNone(self.cache.get(site, 1))
+        self.cache.store(site, _revision(6, 'foo'))
+        self.assertIsNotNone(self.cache.get(site, 1))
+        self.assertIsNone(self.cache.get(site, 2))
+        self.assertIsNotNone(self.cache.get(site, 6))
+        self.assertLessEqual(self.cache._size, size * self.cache.evict_to)
+
+
+class FakePropertyGenerator(object):
+
+    """Property generator which returns the prepared page data."""
+
+    responses = []
+
+    def __init__(self, prop, site):
+        """Constructor."""
+        self.props = frozenset(prop.split('|'))
+        self.request = {}
+
+    def set_maximum_items(self, value):
+        """Ignore the limit."""
+
+    def __iter__(self):
+        """Return the page data for the requested titles or pageids."""
+        self.responses.append((self.props, dict(self.request)))
+        for pageid, title in enumerate(['Foo', 'Bar'], 1):
+            if (title not in self.request.get('titles', []) and
+                    pageid not in self.request.get('pageids', [])):
+                continue
+            pagedata = {'pageid': pageid, 'title': title, 'ns': 0,
+                        'lastrevid': pageid * 10}
+            if 'revisions' in self.props:
+                pagedata['revisions'] = [_revision(pageid * 10, title)]
+            yield pagedata
+
+
+@require_modules('sqlite3')
+class TestPreloadingWithRevisionCache(RevisionCacheTestCase):
+
+    """Test loading texts from the revision cache when preloading."""
+
+    family = 'wikipedia'
+    code = 'en'
+
+    dry = True
+
+    def setUp(self):
+        """Patch the property generator and the revision cache."""
+        super(TestPreloadingWithRevisionCache, self).setUp()
+        FakePropertyGenerator.responses = []
+        patchers = [
+            mock.patch.object(api, 'PropertyGenerator',
+                              FakePropertyGenerator),
+            mock.patch('pywikibot.site.get_revision_cache',
+                       return_value=self.cache),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_preload(self):
+        """Test that only the text of uncached revisions is requested."""
+        site = self.get_site()
+        self.cache.store(site, _revision(10, 'cached'))
+        pages = [pywikibot.Page(site, 'Foo'), pywikibot.Page(site, 'Bar')]
+        self.assertEqual(list(site.preloadpages(pages)), pages)
+        self.assertEqual(pages[0].text, 'cached')
+        self.assertEqual(pages[1].text, 'Bar')
+        self.assertEqual(len(FakePropertyGenerator.responses), 2)
+        props, request = FakePropertyGenerator.responses[1]
+        self.assertIn('revisions', props)
+        self.assertEqual(request['pageids'], set([2]))
+        self.assertEqual(request['rvprop'], site._revision_props())
+        self.assertEqual(self.cache.get(site, 20)['*'], 'Bar')
+        self.assertEqual(pages[0].latest_revision.sha1, 'a' * 40)
+        self.assertEqual(pages[0].latest_revision.content_model, 'wikitext')
+
+    def test_incomplete(self):
+        """Test that a revision without all loadrevisions data is ignored."""
+        site = self.get_site()
+        revision = _revision(10, 'incomplete')
+        del revision['sha1']
+        self.cache.store(site, revision)
+        pages = [pywikibot.Page(site, 'Foo')]
+        self.assertEqual(list(site.preloadpages(pages)), pages)
+        self.assertEqual(pages[0].text, 'Foo')
+        self.assertEqual(FakePropertyGenerator.responses[1][1]['pageids'],
+                         set([1]))
+        self.assertEqual(self.cache.get(site, 10)['sha1'], 'a' * 40)
+
+    def test_all_cached(self):
+        """Test that no texts are requested if all revisions are cached."""
+        site = self.get_site()
+        self.cache.store(site, _revision(10, 'foo'))
+        self.cache.store(site, _revision(20, 'bar'))
+        pages = [pywikibot.Page(site, 'Bar'), pywikibot.Page(site, 'Foo')]
+        self.assertEqual(list(site.preloadpages(pages)), pages)
+        self.assertEqual([page.text for page in pages], ['bar', 'foo'])
+        self.assertEqual(len(FakePropertyGenerator.responses), 1)
+        self.assertNotIn('revisions', FakePropertyGenerator.responses[0][0])
+
+
+if __name__ == '__main__':  # pragma: no cover
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
@@ -2614,6 +2614,16 @@ class TestPagePreloading(DefaultSiteTestCase):
         pages = list(self.site.preloadpages(links, groupsize=5))
         self.assertEqual(pages, links)
 
+    def test_prefetch(self):
+        """Test outcome is following same order of input with prefetch."""
+        mainpage = self.get_mainpage()
+        links = [page for page in self.site.pagelinks(mainpage, total=20)
+                 if page.exists()]
+        pages = list(self.site.preloadpages(links, groupsize=5, prefetch=2))
+        self.assertEqual(pages, links)
+        for page in pages:
+            self.assertIsNotNone(page._revisions[page._revid].text)
+
     def test_duplicates(self):
         """Test outcome is following same order of input."""
         mainpage = self.get_mainpage()
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""Tests for the sitesnapshot module."""
+#
+# (C) Pywikibot team, 2017
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+__version__ = '$Id$'
+
+import datetime
+import json
+import os
+import shutil
+import tempfile
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+import pywikibot
+
+from pywikibot.data import sitesnapshot
+from pywikibot.data.sitesnapshot import SiteSnapshot
+from pywikibot.site import APISite, Siteinfo
+
+from tests.aspects import unittest, TestCase
+
+
+class TestSiteSnapshot(TestCase):
+
+    """Test storing and restoring the snapshot of a site."""
+
+    net = False
+
+    def setUp(self):
+        """Create a site with loaded data and a temporary directory."""
+        super(TestSiteSnapshot, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'snapshot.json')
+        patcher = mock.patch.object(sitesnapshot.atexit, 'register')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.site = APISite('en', 'wikipedia')
+        self.site.siteinfo.restore(self._siteinfo(
+            datetime.datetime.utcnow(), 'MediaWiki 1.29.0'))
+        self.site._paraminfo.restore({
+            'paraminfo': {
+                'main': {'name': 'main', 'path': 'main', 'prefix': '',
+                         'parameters': [{'name': 'action',
+                                         'type': ['paraminfo', 'query']}]},
+            },
+            'modules': {'query': ['info']},
+            'action_modules': ['paraminfo', 'query'],
+            'limit': 50,
+            'modules_only_mode': True,
+            'preloaded_modules': ['main', 'paraminfo'],
+        })
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.directory)
+        super(TestSiteSnapshot, self).tearDown()
+
+    @staticmethod
+    def _siteinfo(cache_time, generator):
+        """Return the snapshot of siteinfo properties."""
+        cache_time = cache_time.strftime(Siteinfo.TIME_FORMAT)
+        return {
+            'general': [{'generator': generator, 'case': 'first-letter',
+                         'lang': 'en'}, cache_time],
+            'namespaces': [{
+                '0': {'id': 0, '*': '', 'case': 'first-letter'},
+                '1': {'id': 1, '*': 'Talk', 'canonical': 'Talk',
+                      'case': 'first-letter'},
+            }, cache_time],
+            'namespacealiases': [[{'id': 1, '*': 'Discussion'}], cache_time],
+            'magicwords': [[{'name': 'redirect',
+                             'aliases': ['#REDIRECT']}], cache_time],
+            'unknownprop': [None, False],
+        }
+
+    def _restored_site(self):
+        """Return a new site with the restored snapshot."""
+        site = APISite('en', 'wikipedia')
+        snapshot = SiteSnapshot(site, self.filename)
+        return site, snapshot, snapshot.load()
+
+    def test_restore(self):
+        """Test that the data are restored without requests."""
+        SiteSnapshot(self.site, self.filename).save()
+        site, snapshot, restored = self._restored_site()
+        self.assertTrue(restored)
+        self.assertIsNone(snapshot._thread)
+        with mock.patch.object(site, '_request',
+                               side_effect=AssertionError('request')):
+            self.assertEqual(site.version(), '1.29.0')
+            self.assertEqual(site.namespaces[1].custom_name, 'Talk')
+            self.assertIn('Discussion', site.namespaces[1].aliases)
+            self.assertEqual(site.getmagicwords('redirect'), ['#REDIRECT'])
+            self.assertEqual(site.siteinfo.get('unknownprop'),
+                             pywikibot.tools.EMPTY_DEFAULT)
+            self.assertEqual(site._paraminfo.parameter('main', 'action'),
+                             {'name': 'action',
+                              'type': ['paraminfo', 'query']})
+            self.assertEqual(site._paraminfo.query_modules,
+                             frozenset(['info']))
+
+    def test_unchanged(self):
+        """Test that the snapshot is only written when the data changed."""
+        SiteSnapshot(self.site, self.filename).save()
+        site, snapshot, restored = self._restored_site()
+        os.remove(self.filename)
+        snapshot.save()
+        self.assertFalse(os.path.exists(self.filename))
+        site.siteinfo._cache['rightsinfo'] = (
+            {'url': ''}, datetime.datetime.utcnow())
+        snapshot.save()
+        self.assertTrue(os.path.exists(self.filename))
+
+    def test_invalid(self):
+        """Test that a snapshot of another format or site is ignored."""
+        snapshot = SiteSnapshot(self.site, self.filename)
+        snapshot.version = 0
+        snapshot.save()
+        self.assertFalse(self._restored_site()[2])
+        site = APISite('de', 'wikipedia')
+        self.assertFalse(SiteSnapshot(site, self.filename).load())
+
+    def test_refresh(self):
+        """Test that an expired snapshot is refreshed in the background."""
+        self.site.siteinfo.restore(self._siteinfo(
+            datetime.datetime(2017, 1, 1), 'MediaWiki 1.29.0'))
+        SiteSnapshot(self.site, self.filename).save()
+        refreshed = APISite('en', 'wikipedia').siteinfo
+        refreshed.restore(self._siteinfo(datetime.datetime.utcnow(),
+                                         'MediaWiki 1.30.0'))
+        with mock.patch.object(Siteinfo, '_get_siteinfo',
+                               return_value=dict(refreshed._cache)) as get:
+            site, snapshot, restored = self._restored_site()
+            snapshot._thread.join()
+        self.assertEqual(get.call_args[0][0],
+                         ['general', 'interwikimap', 'magicwords',
+                          'namespacealiases', 'namespaces', 'unknownprop'])
+        self.assertEqual(site.siteinfo['generator'], 'MediaWiki 1.30.0')
+        self.assertIsNone(site._paraminfo.snapshot())
+        with open(self.filename) as f:
+            data = json.load(f)
+        self.assertEqual(data['siteinfo']['general'][0]['generator'],
+                         'MediaWiki 1.30.0')
+        self.assertIsNone(data['paraminfo'])
+
+    def test_refresh_replaces(self):
+        """Test that the refresh replaces the data used by the site."""
+        snapshot = SiteSnapshot(self.site, self.filename)
+        cache = self.site.siteinfo._cache
+        keys = set(cache)
+        paraminfo = self.site._paraminfo
+        refreshed = APISite('en', 'wikipedia').siteinfo
+        refreshed.restore(self._siteinfo(datetime.datetime.utcnow(),
+                                         'MediaWiki 1.30.0'))
+        refreshed._cache['rightsinfo'] = ({'url': ''}, False)
+        with mock.patch.object(Siteinfo, '_get_siteinfo',
+                               return_value=dict(refreshed._cache)):
+            snapshot.refresh()
+        self.assertEqual(set(cache), keys)
+        self.assertIsNot(self.site.siteinfo._cache, cache)
+        self.assertIn('rightsinfo', self.site.siteinfo._cache)
+        self.assertIsNot(self.site._paraminfo, paraminfo)
+        self.assertIsNotNone(paraminfo.snapshot())
+
+
+if __name__ == '__main__':  # pragma: no cover
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
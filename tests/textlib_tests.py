@@ -491,6 +491,80 @@ class TestTemplateParams(TestCase):
                                ('d', OrderedDict([('1', '}')]))
                                ])
 
+    def test_extract_templates_params_tokenizer(self):
+        """Test using the tokenizer."""
+        func = textlib.extract_templates_and_params_tokenizer
+        self._common_results(func)
+        self._order_differs(func)
+        self._unstripped(func)
+        self._etp_regex_differs(func)
+
+        # Identical to mwpfh, in the order of the text
+        self.assertEqual(func('{{a|{{c|{{d|}}}}}}'),
+                         [('a', OrderedDict([('1', '{{c|{{d|}}}}')])),
+                          ('c', OrderedDict((('1', '{{d|}}'), ))),
+                          ('d', OrderedDict([('1', '')]))])
+        self.assertEqual(func('{{a|b={{{c|{{d}}}}}}}'),
+                         [('a', OrderedDict((('b', '{{{c|{{d}}}}}'), ))),
+                          ('d', OrderedDict())])
+        self.assertEqual(func('{{{{a}}}}'), [])
+        self.assertEqual(func('{{{{{a}}}|b}}'),
+                         [('{{{a}}}', OrderedDict((('1', 'b'), )))])
+
+        # links and disabled parts don't separate the parameters
+        self.assertEqual(func('{{a|[[b|c=d]]|e=[[f]]}}'),
+                         [('a', OrderedDict((('1', '[[b|c=d]]'),
+                                             ('e', '[[f]]'))))])
+        self.assertEqual(func('{{a|b<!--|c={{d}}-->|e}}'),
+                         [('a', OrderedDict((('1', 'b<!--|c={{d}}-->'),
+                                             ('2', 'e'))))])
+        self.assertEqual(func('{{a|<nowiki>b|{{c}}</nowiki>|<pre/>{{d}}}}'),
+                         [('a', OrderedDict((('1', '<nowiki>b|{{c}}</nowiki>'),
+                                             ('2', '<pre/>{{d}}')))),
+                          ('d', OrderedDict())])
+        self.assertEqual(func('{{a|<math>x}}'),
+                         [('a', OrderedDict((('1', '<math>x'), )))])
+        # unclosed link
+        self.assertEqual(func('{{a|[[b}}{{c}}'), [('c', OrderedDict())])
+        # the attributes of tags don't separate the parameters
+        self.assertEqual(func('{{a|<ref name=x/>|b}}'),
+                         [('a', OrderedDict((('1', '<ref name=x/>'),
+                                             ('2', 'b'))))])
+        self.assertEqual(func('{{a|<span style="c=d">e</span>}}'),
+                         [('a', OrderedDict((('1', '<span style="c=d">'
+                                                   'e</span>'), )))])
+        # invalid names
+        for text in ('{{a\nb|c}}', '{{-->}}', '{{</nowiki>}}', '{{[[a]]}}',
+                     '{{<!-- a -->|b}}'):
+            self.assertEqual(func(text), [])
+        self.assertEqual(func('{{a<!--\nb-->\n|c}}'),
+                         [('a<!--\nb-->', OrderedDict((('1', 'c'), )))])
+
+        # Different from mwpfh, like MediaWiki
+        self.assertEqual(func('{{a|<pre\n>|</pre>}}'),
+                         [('a', OrderedDict((('1', '<pre\n>|</pre>'), )))])
+        self.assertEqual(func('{{a|[[b}}|c]]}}'),
+                         [('a', OrderedDict((('1', '[[b}}|c]]'), )))])
+        self.assertEqual(func('{{a|{{b\nc}}|d}}'),
+                         [('a', OrderedDict((('1', '{{b\nc}}'),
+                                             ('2', 'd'))))])
+        self.assertEqual(func('{{a|b<!--c}}'), [])
+
+    def test_extract_templates_params_tokenizer_stripped(self):
+        """Test using the tokenizer with stripping."""
+        func = functools.partial(
+            textlib.extract_templates_and_params_tokenizer, strip=True)
+        self._common_results(func)
+        self._order_differs(func)
+        self._stripped(func)
+
+    def test_extract_templates_params_tokenizer_pages(self):
+        """Test that the tokenizer finds the templates of a page."""
+        text = textlib.removeDisabledParts(files['enwiki_help_editing'])
+        self.assertCountEqual(
+            textlib.extract_templates_and_params_tokenizer(text, strip=True),
+            textlib.extract_templates_and_params_regex(text))
+
     def test_extract_templates_params(self):
         """Test that the normal entry point works."""
         func = functools.partial(textlib.extract_templates_and_params,
@@ -674,6 +748,14 @@ class TestGenericTemplateParams(PatchingTestCase):
         self._args = args
         self._mwpfh = False
 
+    @PatchingTestCase.patched(textlib,
+                              'extract_templates_and_params_tokenizer')
+    def extract_tokenizer(self, text, *args, **kwargs):
+        """Patched call to extract_templates_and_params_tokenizer."""
+        self._text = text
+        self._args = args
+        self._mwpfh = None
+
     def test_removing_disabled_parts_regex(self):
         """Test removing disabled parts when using the regex variant."""
         self.patch(config, 'use_mwparserfromhell', False)
@@ -728,6 +810,21 @@ class TestGenericTemplateParams(PatchingTestCase):
         self.assertEqual(self._args, (False, ))
         self.assertTrue(self._mwpfh)
 
+    def test_tokenizer(self):
+        """Test using the tokenizer variant."""
+        self.patch(config, 'use_template_tokenizer', True)
+        for use_mwparserfromhell in (False, True):
+            self.patch(config, 'use_mwparserfromhell', use_mwparserfromhell)
+            textlib.extract_templates_and_params('{{a<!-- -->| foo }}')
+            self.assertEqual(self._text, '{{a<!-- -->| foo }}')
+            self.assertEqual(self._args, (False, ))
+            self.assertIsNone(self._mwpfh)
+            textlib.extract_templates_and_params('{{a<!-- -->| foo }}',
+                                                 True, True)
+            self.assertEqual(self._text, '{{a| foo }}')
+            self.assertEqual(self._args, (True, ))
+            self.assertIsNone(self._mwpfh)
+
 
 class TestReplaceLinks(TestCase):
 
@@ -1371,6 +1468,86 @@ class TestReplaceExcept(DefaultDrySiteTestCase):
                          r'X\g<bar>X')
 
 
+class TestReplaceExceptAll(DefaultDrySiteTestCase):
+
+    """Test applying several replacements in one pass."""
+
+    replacements = [
+        (r'a', 'b', []),
+        (r'x', '<!--', []),
+        (r'y', '-->', ['template']),
+        (r'b+', r'[\g<0>]', [re.compile(r'(?<=c)\[b')]),
+        (r'(?m)^c', '=c=', ['link']),
+        (r'\[', '', ['header']),
+        (r'z', 'a\n', ['startspace']),
+        (r'c\n', 'b', []),
+        (r'', '-', ['comment', 'startspace']),
+    ]
+    exceptions = ['comment', 'nowiki', 'link', re.compile(r'\bc\w')]
+
+    @staticmethod
+    def _search(matcher, regex, index):
+        """Search without reusing results."""
+        match = regex.search(matcher.text, index)
+        return match.span() if match else None
+
+    def _sequential(self, text, replacements, allowoverlap=False):
+        """Apply the replacements by replaceExcept without reusing results."""
+        with mock.patch.object(textlib._ExceptionMatcher, 'search',
+                               self._search):
+            for old, new, exceptions in replacements:
+                text = textlib.replaceExcept(text, old, new,
+                                             self.exceptions + exceptions,
+                                             allowoverlap=allowoverlap,
+                                             site=self.site)
+        return text
+
+    def test_replace(self):
+        """Test that the text is replaced and the changes are reported."""
+        self.assertEqual(
+            textlib.replace_except_all(
+                'ab<!--a-->[[a]]', [('a', 'c'), ('d', 'e'), ('b', 'd')],
+                ['comment'], site=self.site),
+            ('cd<!--a-->[[c]]', [0, 2]))
+        self.assertEqual(
+            textlib.replace_except_all(
+                'ab<!--a-->[[a]]', [('a', 'c', ['link'])], ['comment'],
+                site=self.site),
+            ('cb<!--a-->[[a]]', [0]))
+
+    def test_sequential(self):
+        """Test that the result is the same as of sequential replacements."""
+        random = __import__('random').Random(42)
+        parts = ['a', 'b', 'c', 'x', 'y', 'z', ' ', '\n', '<!--', '-->',
+                 '[[', ']]', '{{', '}}', '<nowiki>', '</nowiki>']
+        for i in range(300):
+            text = ''.join(random.choice(parts)
+                           for j in range(random.randint(0, 40)))
+            replacements = random.sample(self.replacements,
+                                         random.randint(1, 5))
+            # these would be applied endlessly with overlapping matches
+            allowoverlap = i % 2 == 0 and not any(
+                replacement[0] in ('', 'b+') for replacement in replacements)
+            expected = self._sequential(text, replacements, allowoverlap)
+            self.assertEqual(
+                textlib.replace_except_all(text, replacements,
+                                           self.exceptions, allowoverlap,
+                                           site=self.site)[0],
+                expected, 'Different result for {0!r} and {1!r}'.format(
+                    text, replacements))
+
+    def test_exception_searches(self):
+        """Test that an exception is not searched again for every match."""
+        regex = mock.Mock(wraps=re.compile(r'<!--.*?-->'),
+                          pattern=r'<!--.*?-->')
+        text = textlib._replace_except(
+            textlib._ExceptionMatcher('<!--a-->' + 'a' * 20),
+            re.compile('a'), 'b', [regex])
+        self.assertEqual(text, '<!--a-->' + 'b' * 20)
+        # the first search is from index 0 and then after the comment
+        self.assertEqual(regex.search.call_count, 2)
+
+
 class TestMultiTemplateMatchBuilder(DefaultDrySiteTestCase):
 
     """Test _MultiTemplateMatchBuilder."""
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""Tests for the throttle module."""
+#
+# (C) Pywikibot team, 2017
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import absolute_import, unicode_literals
+
+__version__ = '$Id$'
+
+import os
+import shutil
+import tempfile
+
+from pywikibot.throttle import SharedBuckets, Throttle, TokenBucketThrottle
+
+from tests.aspects import unittest, TestCase
+
+
+class TestTokenBucketThrottle(TestCase):
+
+    """Test the token bucket throttle with a temporary shared file."""
+
+    net = False
+
+    def setUp(self):
+        """Create the directory of the shared file."""
+        super(TestTokenBucketThrottle, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'throttle.buckets')
+
+    def tearDown(self):
+        """Remove the directory of the shared file."""
+        shutil.rmtree(self.directory)
+        super(TestTokenBucketThrottle, self).tearDown()
+
+    def _throttle(self, site='test:test', bucket_size=1):
+        """Return a throttle using the shared file."""
+        throttle = TokenBucketThrottle(site, mindelay=0, maxdelay=60,
+                                       writedelay=10, bucket_size=bucket_size,
+                                       filename=self.filename)
+        throttle.setDelays(delay=2, writedelay=10)
+        return throttle
+
+    def test_take(self):
+        """Test that missing tokens result in a waiting time."""
+        throttle = self._throttle()
+        self.assertEqual(throttle.take(), 0)
+        self.assertAlmostEqual(throttle.take(), 2, delta=0.1)
+        self.assertAlmostEqual(throttle.take(), 4, delta=0.1)
+        self.assertAlmostEqual(throttle.take(write=True), 0)
+        self.assertAlmostEqual(throttle.take(write=True), 10, delta=0.1)
+
+    def test_burst(self):
+        """Test that a full bucket allows several requests without delay."""
+        throttle = self._throttle(bucket_size=3)
+        self.assertEqual([throttle.take() for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(throttle.take(), 2, delta=0.1)
+
+    def test_shared(self):
+        """Test that throttles of other processes use the same buckets."""
+        first = self._throttle()
+        second = self._throttle()
+        other_site = self._throttle(site='test:other')
+        self.assertEqual(first.waittime(), 0)
+        self.assertEqual(first.take(), 0)
+        self.assertAlmostEqual(second.waittime(), 2, delta=0.1)
+        self.assertAlmostEqual(second.take(), 2, delta=0.1)
+        self.assertEqual(other_site.take(), 0)
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(len(f.read()), 2 * SharedBuckets.record.size)
+
+    def test_unthrottled_reads(self):
+        """Test that reads are not throttled without read delay."""
+        throttle = self._throttle()
+        throttle.setDelays(delay=0)
+        self.assertEqual([throttle.take() for _ in range(3)], [0, 0, 0])
+        self.assertFalse(os.path.exists(self.filename))
+
+    def test_long_key(self):
+        """Test that long site names are stored as hashes."""
+        throttle = self._throttle(site='x' * 100)
+        self.assertEqual(throttle.take(), 0)
+        self.assertAlmostEqual(throttle.take(), 2, delta=0.1)
+
+
+class TestAdaptiveThrottle(TestCase):
+
+    """Test adapting the delays to the server load."""
+
+    net = False
+
+    def _throttle(self, adaptive=True):
+        """Return a throttle without multiple process handling."""
+        throttle = Throttle('test:test', mindelay=0, maxdelay=60,
+                            writedelay=10, multiplydelay=False,
+                            adaptive=adaptive)
+        throttle.setDelays(delay=0, writedelay=10)
+        return throttle
+
+    def test_backoff(self):
+        """Test that congestion multiplies the delays up to maxdelay."""
+        throttle = self._throttle()
+        throttle.record_response(0.5, 503)
+        self.assertAlmostEqual(throttle.getDelay(), 0.2)
+        self.assertEqual(throttle.getDelay(write=True), 20)
+        throttle.record_lag(10)
+        throttle.record_response(0.5, 429)
+        self.assertAlmostEqual(throttle.getDelay(), 0.8)
+        self.assertEqual(throttle.getDelay(write=True), 60)
+        self.assertEqual(throttle.congestions, 3)
+
+    def test_recovery(self):
+        """Test that successful responses increase the rate again."""
+        throttle = self._throttle()
+        for _ in range(3):
+            throttle.record_response(None)
+        self.assertAlmostEqual(throttle.getDelay(), 0.8)
+        throttle.record_response(0.1, 200)
+        self.assertAlmostEqual(throttle.getDelay(), 1 / 1.35)
+        for _ in range(100):
+            throttle.record_response(0.1, 200)
+        self.assertEqual(throttle.getDelay(), 0)
+        self.assertEqual(throttle.getDelay(write=True), 10)
+
+    def test_not_adaptive(self):
+        """Test that the delays are not changed by default."""
+        throttle = self._throttle(adaptive=False)
+        throttle.record_response(0.5, 503)
+        throttle.record_lag(20)
+        self.assertEqual(throttle.getDelay(), 0)
+        self.assertEqual(throttle.getDelay(write=True), 10)
+        self.assertEqual(throttle.lag_delay(20), 10)
+
+    def test_lag_delay(self):
+        """Test that the pause uses the smoothed lag."""
+        throttle = self._throttle()
+        throttle.record_lag(4)
+        self.assertEqual(throttle.lag_delay(4), 2)
+        throttle.record_lag(104)
+        self.assertEqual(throttle.server_lag, 24)
+        self.assertEqual(throttle.lag_delay(104), 12)
+
+    def test_metrics(self):
+        """Test the reported metrics."""
+        throttle = self._throttle()
+        throttle.record_response(1.0, 200)
+        throttle.record_response(2.0, 200)
+        metrics = throttle.metrics
+        self.assertIsNone(metrics['read_rate'])
+        self.assertAlmostEqual(metrics['write_rate'], 0.1)
+        self.assertAlmostEqual(metrics['latency'], 1.2)
+        self.assertEqual(metrics['responses'], 2)
+        self.assertEqual(metrics['congestions'], 0)
+        self.assertIsNone(metrics['server_lag'])
+
+
+if __name__ == '__main__':  # pragma: no cover
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
@@ -14,7 +14,10 @@ import decimal
 import inspect
 import os.path
 import subprocess
+import sys
 import tempfile
+import threading
+import types
 import warnings
 
 try:
@@ -635,6 +638,84 @@ class TestFilterUnique(TestCase):
         self.assertRaises(StopIteration, next, deduper)
 
 
+class TestPrefetchResults(TestCase):
+
+    """Test prefetch_results."""
+
+    net = False
+
+    def _task(self, value):
+        """Return a task which records its thread."""
+        def task():
+            self.threads.append(threading.current_thread())
+            return value
+        return task
+
+    def setUp(self):
+        """Reset the recorded threads."""
+        super(TestPrefetchResults, self).setUp()
+        self.threads = []
+
+    def test_order(self):
+        """Test that the results are yielded in order of the tasks."""
+        tasks = [self._task(i) for i in range(10)]
+        self.assertEqual(list(tools.prefetch_results(tasks, 3)),
+                         list(range(10)))
+        self.assertNotIn(threading.current_thread(), self.threads)
+
+    def test_no_prefetch(self):
+        """Test that the tasks are called in the thread without depth."""
+        tasks = [self._task(i) for i in range(3)]
+        self.assertEqual(list(tools.prefetch_results(tasks, 0)), [0, 1, 2])
+        self.assertEqual(self.threads, [threading.current_thread()] * 3)
+
+    def test_exception(self):
+        """Test that an exception is raised when its result is due."""
+        def fail():
+            raise ValueError('failed')
+        gen = tools.prefetch_results([self._task(0), fail, self._task(2)], 2)
+        self.assertEqual(next(gen), 0)
+        self.assertRaisesRegex(ValueError, 'failed', next, gen)
+
+
+class TestPrefetchIterator(TestCase):
+
+    """Test PrefetchIterator."""
+
+    net = False
+
+    def _items(self, count):
+        """Yield numbers and record how many were taken."""
+        for i in range(count):
+            self.taken = i + 1
+            yield i
+
+    def test_items(self):
+        """Test that the items are iterated in order."""
+        items = tools.PrefetchIterator(self._items(10), 3)
+        self.assertEqual(list(items), list(range(10)))
+        self.assertEqual(list(items), [])
+
+    def test_exception(self):
+        """Test that an exception is raised after the previous items."""
+        def fail():
+            yield 0
+            raise ValueError('failed')
+        items = tools.PrefetchIterator(fail(), 3)
+        self.assertEqual(next(items), 0)
+        self.assertRaisesRegex(ValueError, 'failed', next, items)
+
+    def test_stop(self):
+        """Test that the thread only takes size items in advance."""
+        items = tools.PrefetchIterator(self._items(1000), 2)
+        self.assertEqual(next(items), 0)
+        items.stop()
+        items._thread.join(5)
+        self.assertFalse(items._thread.is_alive())
+        self.assertLessEqual(self.taken, 1 + 2 + 1)
+        self.assertEqual(list(items), [])
+
+
 class MetaTestArgSpec(MetaTestCaseClass):
 
     """Metaclass to create dynamically the tests. Set the net flag to false."""
@@ -826,6 +907,46 @@ class TestClassProperty(TestCase):
         self.assertEqual(Foo.bar, Foo._bar)
 
 
+class TestLazyModuleWrapper(TestCase):
+
+    """Test importing the attributes of a module on first use."""
+
+    net = False
+
+    def setUp(self):
+        """Create a module and its wrapper."""
+        super(TestLazyModuleWrapper, self).setUp()
+        self.module = types.ModuleType(str('lazy_test_module'))
+        sys.modules['lazy_test_module'] = self.module
+        self.addCleanup(sys.modules.pop, 'lazy_test_module')
+        self.wrapper = tools.LazyModuleWrapper(self.module)
+
+    def test_lazy_attr(self):
+        """Test that an attribute is imported on first use."""
+        self.assertIs(sys.modules['lazy_test_module'], self.wrapper)
+        self.wrapper._add_lazy_attr('Decimal', 'decimal', 'Decimal')
+        self.assertNotIn('Decimal', self.module.__dict__)
+        self.assertIs(self.wrapper.Decimal, decimal.Decimal)
+        self.assertIs(self.module.Decimal, decimal.Decimal)
+        self.assertRaises(AttributeError, getattr, self.wrapper, 'foo')
+
+    def test_update(self):
+        """Test that later attributes of the module are used."""
+        self.module.foo = 'bar'
+        self.assertEqual(self.wrapper.foo, 'bar')
+        self.wrapper._update()
+        self.assertIn('foo', self.wrapper.__dict__)
+
+    def test_pywikibot(self):
+        """Test the lazy attributes of the pywikibot package."""
+        import pywikibot
+        self.assertIsInstance(pywikibot, tools.LazyModuleWrapper)
+        self.assertIs(pywikibot.textlib, sys.modules['pywikibot.textlib'])
+        self.assertIs(pywikibot.Page, sys.modules['pywikibot.page'].Page)
+        self.assertIs(pywikibot.data.api,
+                      sys.modules['pywikibot.data.api'])
+
+
 if __name__ == '__main__':  # pragma: no cover
     try:
         unittest.main()
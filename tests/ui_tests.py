@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 """Tests for the user interface."""
 #
-# (C) Pywikibot team, 2008-2016
+# (C) Pywikibot team, 2008-2017
 #
 # Distributed under the terms of the MIT license.
 #
@@ -323,6 +323,32 @@ class TestTerminalOutput(UITestCase):
         self.assertEqual(newstdout.getvalue(), '')
         self.assertEqual(newstderr.getvalue(), '')
 
+    def test_log_args(self):
+        records = []
+        handler = logging.Handler(VERBOSE)
+        handler.emit = lambda record: records.append(record.getMessage())
+        logger.addHandler(handler)
+        try:
+            pywikibot.log('log %s %r', 'foo', 1)
+        finally:
+            logger.removeHandler(handler)
+        self.assertEqual(records, ['log foo 1'])
+        self.assertEqual(newstderr.getvalue(), '')
+
+    def test_debug_args(self):
+        class Unformatted(object):
+
+            """Object which must not be formatted."""
+
+            def __str__(self):
+                raise AssertionError('formatted a discarded record')
+
+            __repr__ = __str__
+
+        pywikibot.debug('debug %s %r', 'test', Unformatted(), Unformatted())
+        self.assertEqual(newstdout.getvalue(), '')
+        self.assertEqual(newstderr.getvalue(), '')
+
     def test_exception(self):
         class TestException(Exception):
 
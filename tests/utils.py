@@ -24,6 +24,11 @@ from collections import Mapping
 from types import ModuleType
 from warnings import warn
 
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
 from pywikibot.tools import PY2
 
 if not PY2:
@@ -512,6 +517,55 @@ class DryPage(pywikibot.Page):
         return self._disambig
 
 
+class DryCategoryMembers(object):
+
+    """Category graph which replaces L{APISite.categorymembers}."""
+
+    #: The titles of the members of each category
+    graph = {
+        'Category:Root': ['Category:A', 'Category:B', 'P1'],
+        'Category:A': ['Category:B', 'Category:Root', 'P2', 'File:F'],
+        'Category:B': ['Category:A', 'Category:C', 'P3'],
+        'Category:C': ['P4'],
+    }
+
+    def __init__(self, site):
+        """Constructor."""
+        self.site = site
+        self.graph = dict(self.graph)
+        self.requested = []
+        self.member_types = set()
+        self.retrieved = 0
+
+    def patch(self, test):
+        """Replace categorymembers of the site until the test is done."""
+        patcher = mock.patch.object(self.site, 'categorymembers',
+                                    side_effect=self.categorymembers)
+        test.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def categorymembers(self, category, namespaces=None, member_type=None,
+                        content=False, total=None):
+        """Yield the members of the category in the graph."""
+        self.requested.append(category.title())
+        if member_type is not None:
+            self.member_types.add(frozenset(member_type))
+        for title in self.graph[category.title()]:
+            page = pywikibot.Page(self.site, title)
+            ns = page.namespace()
+            if (member_type is not None and
+                    {6: 'file', 14: 'subcat'}.get(ns, 'page')
+                    not in member_type or
+                    namespaces is not None and ns not in namespaces):
+                continue
+            if total == 0:
+                return
+            self.retrieved += 1
+            yield page
+            if total is not None:
+                total -= 1
+
+
 class FakeLoginManager(pywikibot.data.api.LoginManager):
 
     """Loads a fake password."""
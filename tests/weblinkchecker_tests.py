@@ -10,11 +10,29 @@ from __future__ import absolute_import, unicode_literals
 __version__ = '$Id$'
 
 import datetime
+import os
+import pickle
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+import pywikibot
 
 from pywikibot.tools import PY2
 if not PY2:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
     from urllib.parse import urlparse
 else:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
     from urlparse import urlparse
 
 from scripts import weblinkchecker
@@ -92,6 +110,305 @@ class TestMementoDefault(MementoTestCase):
             self._get_archive_url, 'invalid')
 
 
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+
+    """HTTP server handling each request in a thread."""
+
+    daemon_threads = True
+
+
+class _LinkHandler(BaseHTTPRequestHandler):
+
+    """Answer the requests of the link checker tests."""
+
+    def log_message(self, *args):
+        """Don't log the requests."""
+
+    def _respond(self):
+        """Send the status depending on the path."""
+        server = self.server
+        with server.lock:
+            server.requests.append((self.command, self.path, time.time()))
+            server.running += 1
+            server.max_running = max(server.running, server.max_running)
+        try:
+            if self.path == '/slow':
+                time.sleep(0.2)
+            if self.path == '/dead':
+                status = 404
+            elif self.path == '/nohead' and self.command == 'HEAD':
+                status = 405
+            else:
+                status = 200
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        finally:
+            with server.lock:
+                server.running -= 1
+
+    do_GET = do_HEAD = _respond
+
+
+class TestLinkCheckEngine(TestCase):
+
+    """Test the link checking engine against a local HTTP server."""
+
+    net = False
+
+    def setUp(self):
+        """Start the HTTP server."""
+        super(TestLinkCheckEngine, self).setUp()
+        self.server = _ThreadingHTTPServer(('127.0.0.1', 0), _LinkHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.running = self.server.max_running = 0
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+        self.url = 'http://127.0.0.1:{0}'.format(self.server.server_port)
+        self.results = {}
+
+    def tearDown(self):
+        """Stop the HTTP server."""
+        self.server.shutdown()
+        self.server.server_close()
+        super(TestLinkCheckEngine, self).tearDown()
+
+    def _check(self, urls, **kwargs):
+        """Check the URLs and return the engine."""
+        engine = weblinkchecker.LinkCheckEngine(self._callback, **kwargs)
+        engine.session.trust_env = False
+        engine.start()
+        for url in urls:
+            engine.add(url, url[-5:])
+        engine.shutdown(timeout=30)
+        self.assertEqual(engine.unfinished, 0)
+        return engine
+
+    def _callback(self, url, data, status, error):
+        """Store the result."""
+        self.assertEqual(data, url[-5:])
+        self.results[url] = (status, error)
+
+    def test_status(self):
+        """Test the status of alive and dead links."""
+        self._check([self.url + '/alive', self.url + '/dead'], delay=0)
+        self.assertEqual(self.results, {self.url + '/alive': (200, None),
+                                        self.url + '/dead': (404, None)})
+        self.assertEqual(
+            sorted(request[:2] for request in self.server.requests),
+            [('GET', '/dead'), ('HEAD', '/alive'), ('HEAD', '/dead')])
+
+    def test_get_fallback(self):
+        """Test that GET is requested if HEAD fails."""
+        self._check([self.url + '/nohead'], delay=0)
+        self.assertEqual(self.results, {self.url + '/nohead': (200, None)})
+        self.assertEqual([request[:2] for request in self.server.requests],
+                         [('HEAD', '/nohead'), ('GET', '/nohead')])
+
+    def test_errors(self):
+        """Test that a request error is passed to the callback."""
+        self.server.server_close()
+        self._check([self.url + '/alive', 'http://a.invalid/'], delay=0)
+        for url in (self.url + '/alive', 'http://a.invalid/'):
+            self.assertIsNone(self.results[url][0])
+            self.assertIsInstance(self.results[url][1], Exception)
+
+    def test_per_host(self):
+        """Test the number of concurrent requests per host."""
+        engine = self._check([self.url + '/slow'] * 6, workers=4,
+                             per_host=2, delay=0)
+        self.assertEqual(len(self.server.requests), 6)
+        self.assertEqual(self.server.max_running, 2)
+        self.assertEqual(len(engine._threads), 4)
+        self.assertFalse(any(thread.isAlive() for thread in engine._threads))
+
+    def test_delay(self):
+        """Test the minimum time between two requests to a host."""
+        self._check([self.url + '/alive'] * 3, workers=3, per_host=3,
+                    delay=0.2)
+        times = [request[2] for request in self.server.requests]
+        self.assertEqual(len(times), 3)
+        for previous, current in zip(times, times[1:]):
+            self.assertGreaterEqual(current - previous, 0.15)
+
+    def test_hosts_interleaved(self):
+        """Test that a slow host doesn't block the other hosts."""
+        engine = self._check(
+            [self.url + '/slow'] * 3 + [self.url.replace('127.0.0.1',
+                                                         'localhost') +
+                                        '/alive'],
+            workers=2, per_host=1, delay=0)
+        paths = [request[1] for request in self.server.requests]
+        # it isn't delayed until the other URLs are checked
+        self.assertLessEqual(paths.index('/alive'), 1)
+        self.assertEqual(engine._unresolved, {})
+
+    def test_unresolved(self):
+        """Test that a host which can't be resolved isn't requested again."""
+        error = socket.gaierror(-2, 'Name or service not known')
+        requests = weblinkchecker.requests
+        with mock.patch.object(weblinkchecker.socket, 'getaddrinfo',
+                               side_effect=error) as getaddrinfo:
+            with mock.patch.object(
+                    requests.Session, 'head',
+                    side_effect=requests.exceptions.ConnectionError()) as head:
+                engine = self._check(['http://a.invalid/first',
+                                      'http://a.invalid/other'],
+                                     workers=1, delay=0)
+        self.assertEqual(head.call_count, 1)
+        getaddrinfo.assert_called_once_with('a.invalid', 80)
+        self.assertEqual(engine._unresolved, {'a.invalid': error})
+        self.assertEqual(self.results,
+                         {'http://a.invalid/first': (None, error),
+                          'http://a.invalid/other': (None, error)})
+
+    def test_unresolved_port(self):
+        """Test that the host is resolved with the port of the URL."""
+        error = socket.gaierror(-2, 'Name or service not known')
+        requests = weblinkchecker.requests
+        with mock.patch.object(weblinkchecker.socket, 'getaddrinfo',
+                               side_effect=error) as getaddrinfo:
+            with mock.patch.object(
+                    requests.Session, 'head',
+                    side_effect=requests.exceptions.ConnectionError()):
+                engine = self._check(['https://A.invalid/first',
+                                      'http://b.invalid:8080/other'],
+                                     workers=1, delay=0)
+        self.assertEqual(sorted(call[0] for call in getaddrinfo.call_args_list),
+                         [('a.invalid', 443), ('b.invalid', 8080)])
+        self.assertEqual(sorted(engine._unresolved), ['a.invalid', 'b.invalid'])
+
+
+class HistoryTestCase(object):
+
+    """Test the common behaviour of the dead link histories."""
+
+    family = 'wikipedia'
+    code = 'en'
+
+    dry = True
+
+    def setUp(self):
+        """Store the history in a temporary directory."""
+        super(HistoryTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        patcher = mock.patch.object(
+            pywikibot.config, 'datafilepath',
+            lambda *path: os.path.join(self.directory, path[-1]))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.history = self.history_class(None, self.get_site())
+        self.page = pywikibot.Page(self.get_site(), 'Foo')
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        if hasattr(self.history, 'close'):
+            self.history.close()
+        shutil.rmtree(self.directory)
+        super(HistoryTestCase, self).tearDown()
+
+    def _set_dead(self, url, days, title='Foo'):
+        """Record that the link was found dead days after the epoch."""
+        page = pywikibot.Page(self.get_site(), title)
+        with mock.patch.object(weblinkchecker.time, 'time',
+                               return_value=days * 24 * 60 * 60):
+            self.history.setLinkDead(url, '404', page, 7)
+
+    def test_dead(self):
+        """Test that a link is reported after it was dead for some days."""
+        with mock.patch.object(weblinkchecker, 'get_archive_url',
+                               return_value='http://archive/'):
+            with mock.patch.object(self.history, 'log') as log:
+                self._set_dead('http://a/', 1)
+                self._set_dead('http://a/', 1.01)
+                self._set_dead('http://a/', 2, 'Bar')
+                self.assertFalse(log.called)
+                self._set_dead('http://a/', 9)
+        log.assert_called_once_with('http://a/', '404', mock.ANY,
+                                    'http://archive/')
+        self.assertEqual(
+            self.history.get_records('http://a/'),
+            [('Foo', 86400, '404'), ('Bar', 172800, '404'),
+             ('Foo', 777600, '404')])
+
+    def test_alive(self):
+        """Test that a link found alive is removed."""
+        self._set_dead('http://a/', 1)
+        self._set_dead('http://b/', 1, 'Bar')
+        self.assertTrue(self.history.setLinkAlive('http://a/'))
+        self.assertFalse(self.history.setLinkAlive('http://a/'))
+        self.assertEqual(self.history.get_records('http://a/'), [])
+        self.assertEqual(self.history.page_titles(), set(['Bar']))
+
+    def test_dead_links(self):
+        """Test querying the links by the time they were found dead first."""
+        self._set_dead('http://a/', 3)
+        self._set_dead('http://b/', 1)
+        self._set_dead('http://c/', 5)
+        self._set_dead('http://b/', 6)
+        self.assertEqual(self.history.dead_links(4 * 24 * 60 * 60),
+                         ['http://b/', 'http://a/'])
+        self.assertEqual(len(self.history.dead_links()), 3)
+
+
+class TestPickleHistory(HistoryTestCase, TestCase):
+
+    """Test the history stored in a .dat file."""
+
+    history_class = weblinkchecker.History
+
+    def test_save(self):
+        """Test that the links are saved in the .dat file."""
+        self._set_dead('http://a/', 1)
+        self.history.save()
+        history = weblinkchecker.History(None, self.get_site())
+        self.assertEqual(history.historyDict,
+                         {'http://a/': [('Foo', 86400, '404')]})
+
+
+@require_modules('sqlite3')
+class TestSQLiteHistory(HistoryTestCase, TestCase):
+
+    """Test the history stored in an SQLite database."""
+
+    history_class = weblinkchecker.SQLiteHistory
+
+    def test_persistent(self):
+        """Test that each link is stored without saving the history."""
+        self._set_dead('http://a/', 1)
+        history = weblinkchecker.SQLiteHistory(None, self.get_site())
+        try:
+            self.assertEqual(history.get_records('http://a/'),
+                             [('Foo', 86400, '404')])
+        finally:
+            history.close()
+
+    def test_import(self):
+        """Test that the links of a .dat file are imported."""
+        self.history.close()
+        os.remove(self.history.dbfilename)
+        with open(self.history.datfilename, 'wb') as f:
+            pickle.dump({'http://a/': [('Foo', 1, '404'), ('Bar', 2, '404')]},
+                        f)
+        self.history = weblinkchecker.SQLiteHistory(None, self.get_site())
+        self.assertEqual(self.history.get_records('http://a/'),
+                         [('Foo', 1, '404'), ('Bar', 2, '404')])
+        self.assertEqual(self.history.dead_links(), ['http://a/'])
+        self.assertEqual(self.history.page_titles(), set(['Foo', 'Bar']))
+
+    def test_compact(self):
+        """Test that the database is compacted after links were removed."""
+        for i in range(500):
+            self._set_dead('http://a/{0}'.format(i) * 10, 1)
+        size = os.path.getsize(self.history.dbfilename)
+        for i in range(500):
+            self.history.setLinkAlive('http://a/{0}'.format(i) * 10)
+        self.history.save()
+        self.assertLess(os.path.getsize(self.history.dbfilename), size / 2)
+
+
 if __name__ == '__main__':  # pragma: no cover
     try:
         unittest.main()
@@ -12,13 +12,21 @@ __version__ = '$Id$'
 
 import copy
 import json
+import pickle
 
 from decimal import Decimal
 
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
 import pywikibot
 
 from pywikibot import pagegenerators
-from pywikibot.page import WikibasePage, ItemPage, PropertyPage
+from pywikibot.page import (
+    WikibasePage, ItemPage, PropertyPage, ClaimCollection, WikibaseEditBatch,
+)
 from pywikibot.site import Namespace, NamespacesDict
 from pywikibot.tools import MediaWikiVersion
 
@@ -202,6 +210,16 @@ class TestWbTime(WikidataTestCase):
                                              day=0, hour=12, minute=43,
                                              precision=14))
 
+    def test_WbTime_slots(self):
+        """Test that WbTime has no instance dict and can be pickled."""
+        repo = self.get_repo()
+        t = pywikibot.WbTime(site=repo, year=2010, hour=12, minute=43)
+        self.assertFalse(hasattr(t, '__dict__'))
+        self.assertEqual(pickle.loads(pickle.dumps(t)), t)
+        self.assertEqual(copy.deepcopy(t), t)
+        self.assertNotEqual(t, pywikibot.WbTime(site=repo, year=2010))
+        self.assertNotEqual(t, None)
+
     def test_WbTime_errors(self):
         """Test WbTime precision errors."""
         repo = self.get_repo()
@@ -1529,6 +1547,186 @@ class TestJSON(WikidataTestCase):
         self.assertEqual(diff, expected)
 
 
+class TestClaimCollection(WikidataTestCase):
+
+    """Test creating the claims of an item when they are accessed."""
+
+    dry = True
+
+    def setUp(self):
+        """Load an item."""
+        super(TestClaimCollection, self).setUp()
+        self.item = ItemPage(self.get_repo(), 'Q60')
+        with open(join_pages_path('Q60.wd')) as f:
+            self.item._content = json.load(f)
+        self.item.get()
+
+    def test_lazy(self):
+        """Test that only the accessed claims are created."""
+        claims = self.item.claims
+        self.assertIsInstance(claims, ClaimCollection)
+        self.assertEqual(list(claims), list(self.item._content['claims']))
+        self.assertIn('P213', claims)
+        self.assertNotIn('P1', claims)
+        self.assertEqual(claims._loaded, set())
+        claim = claims['P213'][0]
+        self.assertIsInstance(claim, pywikibot.Claim)
+        self.assertIs(claim.on_item, self.item)
+        self.assertIs(claims['P213'][0], claim)
+        self.assertEqual(claims._loaded, set(['P213']))
+        self.assertIsNone(claims.get('P1'))
+        self.assertFalse(hasattr(claim, '__dict__'))
+
+    def test_json(self):
+        """Test that the JSON doesn't depend on the loaded claims."""
+        expected = self.item.toJSON()
+        self.assertEqual(self.item.claims._loaded, set())
+        self.assertEqual(self.item.toJSON(diffto=self.item._content), {})
+        for prop in self.item.claims:
+            self.item.claims[prop]
+        self.assertEqual(self.item.toJSON(), expected)
+
+    def test_change(self):
+        """Test changing the claims of properties."""
+        claims = self.item.claims
+        claim = pywikibot.Claim(self.get_repo(), 'P1', datatype='string')
+        claims['P1'] = [claim]
+        self.assertIs(claims['P1'][0], claim)
+        del claims['P213']
+        self.assertNotIn('P213', claims)
+        self.assertEqual(len(claims), len(self.item._content['claims']))
+
+    def test_ids(self):
+        """Test the claim ids and the representation of the claims."""
+        claims = self.item.claims
+        ids = set(value['id']
+                  for values in self.item._content['claims'].values()
+                  for value in values)
+        claim = pywikibot.Claim(self.get_repo(), 'P1', datatype='string')
+        claim.snak = 'Q60$new'
+        claims['P1'] = [claim]
+        self.assertEqual(claims.ids(), ids | set(['Q60$new']))
+        self.assertEqual(repr(claims), 'ClaimCollection({0!r})'.format(
+            list(self.item._content['claims']) + ['P1']))
+        self.assertEqual(claims._loaded, set(['P1']))
+
+
+class TestPreloadItemProps(WikidataTestCase):
+
+    """Test loading only some parts of items."""
+
+    dry = True
+
+    def test_props(self):
+        """Test that the props are requested with the info of the items."""
+        repo = self.get_repo()
+        with open(join_pages_path('Q60.wd')) as f:
+            entity = json.load(f)
+        del entity['labels'], entity['sitelinks']
+        with mock.patch.object(repo, '_simple_request') as request:
+            request.return_value.submit.return_value = {
+                'entities': {'Q60': entity}}
+            items = list(repo.preloaditempages([ItemPage(repo, 'Q60')],
+                                               props=['claims']))
+        self.assertEqual(request.call_args[1]['props'], ['claims', 'info'])
+        self.assertEqual(len(items), 1)
+        items[0].get()
+        self.assertEqual(items[0].labels, {})
+        self.assertIn('P213', items[0].claims)
+        self.assertEqual(items[0].latest_revision_id, 122836617)
+
+
+class TestEditBatch(WikidataTestCase):
+
+    """Test collecting the changes of items in an edit batch."""
+
+    dry = True
+
+    def setUp(self):
+        """Load an item and patch the edits."""
+        super(TestEditBatch, self).setUp()
+        self.repo = self.get_repo()
+        self.item = ItemPage(self.repo, 'Q60')
+        with open(join_pages_path('Q60.wd')) as f:
+            self.item._content = json.load(f)
+        self.item.get()
+        patcher = mock.patch.object(self.repo, 'editEntity',
+                                    side_effect=self._edit_entity)
+        self.edit_entity = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _edit_entity(self, identification, data, **kwargs):
+        """Return the entity with the new claims like wbeditentity."""
+        entity = copy.deepcopy(self.item._content)
+        entity['lastrevid'] += 1
+        for i, claim in enumerate(data.get('claims', [])):
+            claim = dict(copy.deepcopy(claim), id='Q60$new-{0}'.format(i))
+            for reference in claim.get('references', []):
+                reference['hash'] = 'hash-{0}'.format(i)
+            entity['claims'].setdefault(
+                claim['mainsnak']['property'], []).append(claim)
+        return {'entity': entity, 'success': 1}
+
+    def _claim(self, pid, target):
+        """Return a new claim with the target."""
+        claim = pywikibot.Claim(self.repo, pid, datatype='string')
+        claim.setTarget(target)
+        return claim
+
+    def test_single_edit(self):
+        """Test that all changes of an item are saved with one edit."""
+        claims = [self._claim('P213', 'foo'), self._claim('P1', 'bar')]
+        source = self._claim('P143', 'baz')
+        with WikibaseEditBatch(self.repo, summary='test') as batch:
+            batch.addClaim(self.item, claims[0], sources=[source])
+            batch.addClaim(self.item, claims[1])
+            batch.editLabels(self.item, {self.repo: 'Foo', 'de': 'Bar'})
+            batch.editLabels(self.item, {'de': 'Baz'})
+            batch.setSitelinks(self.item, [{'site': 'dewiki',
+                                            'title': 'Foo'}])
+            self.assertEqual(len(batch), 1)
+            self.assertIn(claims[1], self.item.claims['P1'])
+            self.assertFalse(self.edit_entity.called)
+        self.assertEqual(len(batch), 0)
+        self.edit_entity.assert_called_once_with(
+            {'id': 'Q60'}, mock.ANY, bot=True, summary='test',
+            baserevid=122836617)
+        data = self.edit_entity.call_args[0][1]
+        self.assertEqual(data['labels'], {
+            'wikidata': {'language': 'wikidata', 'value': 'Foo'},
+            'de': {'language': 'de', 'value': 'Baz'}})
+        self.assertEqual(data['sitelinks'],
+                         {'dewiki': {'site': 'dewiki', 'title': 'Foo'}})
+        self.assertEqual([claim['mainsnak']['property']
+                          for claim in data['claims']], ['P213', 'P1'])
+        self.assertEqual(data['claims'][0]['references'][0]['snaks-order'],
+                         ['P143'])
+        self.assertEqual(self.item.latest_revision_id, 122836618)
+        self.assertEqual(claims[0].snak, 'Q60$new-0')
+        self.assertEqual(claims[1].snak, 'Q60$new-1')
+        self.assertEqual(source.hash, 'hash-0')
+        self.assertIs(claims[0].on_item, self.item)
+        # the claims of the other properties are not created
+        self.assertEqual(self.item.claims._loaded, set(['P213', 'P1']))
+
+    def test_exception(self):
+        """Test that the changes are not saved after an exception."""
+        with self.assertRaises(ValueError):
+            with WikibaseEditBatch(self.repo) as batch:
+                batch.addClaim(self.item, self._claim('P1', 'foo'))
+                raise ValueError
+        self.assertFalse(self.edit_entity.called)
+        self.assertEqual(len(batch), 1)
+
+    def test_other_object(self):
+        """Test that changes of another object of the item are refused."""
+        batch = WikibaseEditBatch(self.repo)
+        batch.editLabels(self.item, {'en': 'Foo'})
+        other = ItemPage(self.repo, 'Q60')
+        other._content = self.item._content
+        self.assertRaises(ValueError, batch.editLabels, other, {'en': 'Bar'})
+
+
 class TestDeprecatedDataSiteMethods(WikidataTestCase, DeprecationTestCase):
 
     """Test deprecated DataSite get_* methods."""
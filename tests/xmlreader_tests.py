@@ -9,6 +9,17 @@ from __future__ import absolute_import, unicode_literals
 
 __version__ = '$Id$'
 
+import bz2
+import os
+import re
+import shutil
+import tempfile
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
 from pywikibot import xmlreader
 
 from tests import join_xml_data_path
@@ -65,7 +76,7 @@ class ExportDotThreeTestCase(XmlReaderTestCase):
         """Compare the tested variant with the previous (if not None)."""
         entries = self._get_entries('article-pyrus' + variant,
                                     allrevisions=all_revisions)
-        result = [entry.__dict__ for entry in entries]
+        result = [entry._asdict() for entry in entries]
         if previous:
             self.assertEqual(previous, result)
         return result
@@ -127,6 +138,162 @@ class ExportDotTenTestCase(XmlReaderTestCase):
                          u'moved [[Çullu, Agdam]] to [[Çullu, Quzanlı]]:&#32;dab')
 
 
+class XmlEntryTestCase(XmlReaderTestCase):
+
+    """Test the compact entries and the metadata only mode."""
+
+    def test_slots(self):
+        """Test that the entries have no instance dict."""
+        entry = self._get_entries('article-pear.xml')[0]
+        self.assertFalse(hasattr(entry, '__dict__'))
+        self.assertRaises(AttributeError, setattr, entry, 'foo', 'bar')
+
+    def test_text(self):
+        """Test that a bytes text is decoded on access."""
+        entry = xmlreader.XmlEntry('Foo', '0', '1', b'bar', 'Baz', False,
+                                   None, None, None, '2', '', False)
+        self.assertEqual(entry.text, 'bar')
+        self.assertIsInstance(entry.text, type(''))
+        entry.text = 'foo'
+        self.assertEqual(entry._asdict()['text'], 'foo')
+
+    def test_metadata_only(self):
+        """Test that only the metadata of all revisions is read."""
+        entries = self._get_entries('pair-0.10.xml', allrevisions=True)
+        metadata = self._get_entries('pair-0.10.xml', allrevisions=True,
+                                     metadata_only=True)
+        self.assertEqual(len(metadata), 4)
+        for entry, other in zip(entries, metadata):
+            self.assertIsNone(other.text)
+            other.text = entry.text
+            self.assertEqual(other._asdict(), entry._asdict())
+
+    def test_metadata_only_text_filter(self):
+        """Test that the text can't be filtered in metadata only mode."""
+        self.assertRaises(ValueError, xmlreader.XmlDump, 'foo.xml',
+                          entry_filter=xmlreader.XmlEntryFilter(text='foo'),
+                          metadata_only=True)
+
+
+class XmlEntryFilterTestCase(XmlReaderTestCase):
+
+    """Test filtering the entries while parsing."""
+
+    def _titles(self, **kwargs):
+        """Return the titles of the entries matching the filter."""
+        entries = self._get_entries(
+            'pair-0.10.xml', allrevisions=True,
+            entry_filter=xmlreader.XmlEntryFilter(**kwargs))
+        return [entry.title for entry in entries]
+
+    def test_namespaces(self):
+        """Test filtering the namespaces."""
+        self.assertEqual(self._titles(namespaces=[1]),
+                         ['Talk:Çullu, Agdam'] * 2)
+        self.assertEqual(self._titles(namespaces=[2, 3]), [])
+
+    def test_title(self):
+        """Test filtering the titles."""
+        self.assertEqual(self._titles(title='^Talk:'),
+                         ['Talk:Çullu, Agdam'] * 2)
+
+    def test_text(self):
+        """Test filtering the texts with any of several regexes."""
+        self.assertEqual(self._titles(text='REDIRECT'),
+                         ['Çullu, Agdam', 'Talk:Çullu, Agdam'])
+        self.assertEqual(
+            self._titles(text=[re.compile(r'\[\[Talk:'), 'Disambig']),
+            ['Talk:Çullu, Agdam'] * 2)
+
+    def test_redirects(self):
+        """Test filtering redirects."""
+        self.assertEqual(self._titles(redirects=True), [])
+        self.assertEqual(len(self._titles(redirects=False)), 4)
+
+    def test_old_export(self):
+        """Test that dumps without namespaces are not filtered by them."""
+        entries = self._get_entries(
+            'article-pear.xml',
+            entry_filter=xmlreader.XmlEntryFilter(namespaces=[0]))
+        self.assertEqual(len(entries), 1)
+
+
+class MultistreamTestCase(TestCase):
+
+    """Test parsing a multistream dump in several processes."""
+
+    net = False
+
+    header = ('<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/" '
+              'version="0.10" xml:lang="en">\n'
+              '<siteinfo><sitename>Test</sitename></siteinfo>\n')
+    page = ('<page><title>{title}</title><ns>{ns}</ns><id>{id}</id>'
+            '<revision><id>{revid}</id><timestamp>2017-01-01T00:00:00Z'
+            '</timestamp><contributor><username>Foo</username><id>1</id>'
+            '</contributor><text xml:space="preserve">{text}</text>'
+            '</revision></page>\n')
+
+    def setUp(self):
+        """Write a multistream dump and its index."""
+        super(MultistreamTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(
+            self.directory, 'test-pages-articles-multistream.xml.bz2')
+        self.titles = []
+        streams = [bz2.compress(self.header.encode('utf-8'))]
+        index = []
+        offset = len(streams[0])
+        for stream in range(7):
+            pages = ''
+            for i in range(stream * 3 + 1, stream * 3 + 4):
+                title = 'Page {0}'.format(i)
+                self.titles.append(title)
+                index.append('{0}:{1}:{2}\n'.format(offset, i, title))
+                pages += self.page.format(
+                    title=title, ns=i % 2, id=i, revid=i * 10,
+                    text='Text &amp; {0}'.format(i))
+            streams.append(bz2.compress(pages.encode('utf-8')))
+            offset += len(streams[-1])
+        streams.append(bz2.compress(b'</mediawiki>\n'))
+        with open(self.filename, 'wb') as f:
+            f.write(b''.join(streams))
+        with open(self.filename.replace('.xml.bz2', '-index.txt'), 'w') as f:
+            f.write(''.join(index))
+
+    def tearDown(self):
+        """Remove the dump."""
+        shutil.rmtree(self.directory)
+        super(MultistreamTestCase, self).tearDown()
+
+    def test_parallel(self):
+        """Test that all entries are yielded in order."""
+        dump = xmlreader.XmlDump(self.filename, processes=2)
+        dump.streams_per_job = 2
+        entries = list(dump.parse())
+        self.assertEqual([entry.title for entry in entries], self.titles)
+        self.assertEqual(entries[4].text, 'Text & 5')
+        self.assertEqual(entries[4].revisionid, '50')
+        self.assertEqual(entries[4].username, 'Foo')
+
+    def test_filter(self):
+        """Test that the workers return only the matching entries."""
+        entry_filter = xmlreader.XmlEntryFilter(namespaces=[1],
+                                                text=r'Text & \d$')
+        dump = xmlreader.XmlDump(self.filename, entry_filter=entry_filter,
+                                 processes=3)
+        self.assertEqual([entry.title for entry in dump.parse()],
+                         ['Page 1', 'Page 3', 'Page 5', 'Page 7', 'Page 9'])
+
+    def test_without_index(self):
+        """Test that a dump without index is parsed by one process."""
+        os.remove(self.filename.replace('.xml.bz2', '-index.txt'))
+        dump = xmlreader.XmlDump(self.filename, processes=2)
+        with mock.patch('multiprocessing.Pool') as pool:
+            entries = list(dump.parse())
+        self.assertFalse(pool.called)
+        self.assertEqual(entries[0].title, 'Page 1')
+
+
 if __name__ == '__main__':  # pragma: no cover
     try:
         unittest.main()